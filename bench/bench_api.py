@@ -0,0 +1,134 @@
+# bench/bench_api.py
+"""Read API throughput and latency under a skewed dashboard load.
+
+    python -m bench.bench_api --tickers 2000 --days 1260 --clients 8 --requests 4000
+    python -m bench.bench_api --url http://127.0.0.1:8765 --tickers 2000   # a running `api` server
+
+Seeds a fresh SQLite file with bench_backtest.seed_db, starts the HTTP
+server in-process on a free port and drives it from client threads over
+keep-alive connections. Symbols are drawn from a Zipf distribution, so a
+few hot tickers take most requests, as on a dashboard; the mix is 70%
+/latest (20 symbols), 25% /history (the last year of one symbol) and 5%
+/signals. Runs once with the hot-symbol cache and once without, and
+reports req/s, p50/p95/p99 latency and the cache hit rate.
+"""
+from __future__ import annotations
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from bench import synthetic
+from bench.bench_backtest import seed_db
+from src.database import get_engine, init_schema
+from src.query import MetricsReader, make_server
+
+
+def request_mix(symbols: List[str], n: int, zipf: float, seed: int) -> List[str]:
+    """`n` GET paths over `symbols`, hot ones first by a Zipf(`zipf`) rank draw."""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(zipf, size=(n, 20)), len(symbols)) - 1
+    kinds = rng.random(n)
+    paths = []
+    for i in range(n):
+        if kinds[i] < 0.70:
+            paths.append("/latest?symbols=" + ",".join(symbols[r] for r in ranks[i]))
+        elif kinds[i] < 0.95:
+            paths.append(f"/history?symbol={symbols[ranks[i, 0]]}&start=2023-01-01&columns=close,sma50,sma200")
+        else:
+            paths.append("/signals?days=30")
+    return paths
+
+
+def drive(host: str, port: int, paths: List[str], clients: int) -> Dict[str, Any]:
+    """Split `paths` over `clients` threads, each on one keep-alive connection; returns latency stats."""
+    lat: List[float] = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(part: List[str]):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine = []
+        for p in part:
+            t0 = time.perf_counter()
+            conn.request("GET", p)
+            resp = conn.getresponse()
+            body = resp.read()
+            mine.append(time.perf_counter() - t0)
+            if resp.status != 200:
+                errors.append(body[:200])
+        conn.close()
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(paths[i::clients],)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    secs = time.perf_counter() - t0
+    ms = np.asarray(lat) * 1000
+    return {"requests": len(lat), "secs": secs, "rps": len(lat) / secs, "errors": len(errors),
+            "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99))}
+
+
+def _report(label: str, r: Dict[str, Any], stats: Dict[str, Any] = None):
+    hits = ""
+    if stats:
+        looked = stats["hits"] + stats["misses"]
+        hits = f"  hit rate {stats['hits'] / looked:6.1%}" if looked else ""
+    print(f"{label:<10} {r['rps']:9,.0f} req/s  p50 {r['p50']:7.2f} ms  p95 {r['p95']:7.2f} ms  "
+          f"p99 {r['p99']:7.2f} ms  errors {r['errors']}{hits}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tickers", type=int, default=2000)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=4000)
+    ap.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent of the symbol draw (higher = hotter)")
+    ap.add_argument("--cache-mb", type=int, default=64)
+    ap.add_argument("--url", help="Drive an already running server instead (its DB must hold the synthetic tickers)")
+    args = ap.parse_args()
+
+    paths = request_mix(synthetic.tickers(args.tickers), args.requests, args.zipf, args.seed)
+    if args.url:
+        u = urlsplit(args.url)
+        _report("remote", drive(u.hostname, u.port or 80, paths, args.clients))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(os.path.join(tmp, "bench.db"))
+        init_schema(engine)
+        t0 = time.perf_counter()
+        n = seed_db(engine, args.tickers, args.days, args.seed)
+        print(f"seeded {args.tickers} x {args.days} rows, {n:,} signals in {time.perf_counter() - t0:.1f}s")
+
+        for label, cache_mb in (("cache", args.cache_mb), ("no cache", 0)):
+            reader = MetricsReader(engine, cache_mb * 1024 * 1024)
+            server = make_server(reader, "127.0.0.1", 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            host, port = server.server_address[:2]
+            drive(host, port, paths[:200], args.clients)  # warm-up: imports, statement cache, page cache
+            r = drive(host, port, paths, args.clients)
+            _report(label, r, reader.cache_info() if cache_mb else None)
+            server.shutdown()
+            server.server_close()
+            reader.close()
+        engine.dispose()
+    print(json.dumps({"tickers": args.tickers, "days": args.days, "clients": args.clients, "zipf": args.zipf}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench/bench_backtest.py
+"""Backtest throughput and memory over a synthetic stored universe.
+
+    python -m bench.bench_backtest --tickers 2000 --days 1260 --chunk-sizes 100,500,2000
+
+Writes seeded GBM closes and their SMA-50/200 crossovers straight into a
+fresh SQLite file (no fetch or processing), then runs run_backtest once per
+chunk size. Reports the time, signals/s and the tracemalloc peak (from a
+second, traced pass), which grows with the chunk size rather than the
+universe.
+"""
+from __future__ import annotations
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench import synthetic
+from src.backtest import run_backtest
+from src.database import get_engine, init_schema, to_days
+from src.kernels import rolling_mean
+from src.signals import cross_transitions
+
+
+def seed_db(engine, tickers: int, days: int, seed: int = 0, block: int = 500) -> int:
+    """Store closes and crossover signals for `tickers` symbols; returns the number of signals."""
+    symbols = synthetic.tickers(tickers)
+    day = to_days(synthetic.gbm_prices(symbols[0], days, seed)["date"])
+    n_signals = 0
+    with engine.begin() as conn:
+        for lo in range(0, tickers, block):
+            part = symbols[lo:lo + block]
+            close = np.vstack([synthetic.gbm_prices(s, days, seed)["close"].to_numpy() for s in part])
+            cross, golden = cross_transitions(rolling_mean(close, 50), rolling_mean(close, 200))
+            ids = []
+            for s in part:
+                conn.exec_driver_sql("INSERT INTO tickers(symbol) VALUES(?)", (s,))
+                ids.append(conn.exec_driver_sql("SELECT id FROM tickers WHERE symbol=?", (s,)).scalar_one())
+            ids = np.asarray(ids, dtype=np.int64)
+            conn.exec_driver_sql("INSERT INTO metrics(symbol_id, day, close) VALUES(?,?,?)",
+                                 list(zip(np.repeat(ids, days).tolist(), np.tile(day, len(part)).tolist(),
+                                          close.ravel().tolist())))
+            ti, di = np.nonzero(cross)
+            kinds = np.where(golden[ti, di], "golden_cross", "death_cross")
+            if len(ti):
+                conn.exec_driver_sql("INSERT INTO signals(symbol_id, type, day) VALUES(?,?,?)",
+                                     list(zip(ids[ti].tolist(), kinds.tolist(), day[di].tolist())))
+            conn.exec_driver_sql("INSERT INTO latest_days(symbol_id, day) VALUES(?,?)",
+                                 [(int(i), int(day[-1])) for i in ids])
+            n_signals += len(ti)
+    return n_signals
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tickers", type=int, default=2000)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chunk-sizes", default="100,500,2000")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(os.path.join(tmp, "bench.db"))
+        init_schema(engine)
+        t0 = time.perf_counter()
+        n = seed_db(engine, args.tickers, args.days, args.seed)
+        print(f"seeded {args.tickers} x {args.days} closes, {n:,} signals in {time.perf_counter() - t0:.1f}s")
+
+        for size in (int(s) for s in args.chunk_sizes.split(",") if s.strip()):
+            t0 = time.perf_counter()
+            res = run_backtest(engine, chunk_size=size)
+            secs = time.perf_counter() - t0
+            tracemalloc.start()  # separate pass: tracing slows the row conversion several-fold
+            run_backtest(engine, chunk_size=size)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            port = res.to_dict()["portfolio"]
+            print(f"chunk {size:>6}: {secs:7.2f}s  {len(res.signals) / secs:10,.0f} signals/s  "
+                  f"peak {peak / 1e6:8.1f} MB  equity {port['total_return']:+.4f}")
+        engine.dispose()
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
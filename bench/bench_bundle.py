@@ -0,0 +1,57 @@
+# bench/bench_bundle.py
+"""Memory of a batch's bundles: RawBundle (a model per row) vs ArrayBundle (arrays).
+
+    python -m bench.bench_bundle --tickers 1000 --days 1260
+
+Reports the traced bytes needed to hold every bundle at once, per price
+point, the pickled size (what a compute worker receives) and the
+process_bundle time for each representation.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+from typing import Callable, List
+
+from bench import synthetic
+from src.models import ArrayBundle
+from src.processor import process_bundle
+
+
+def held_bytes(build: Callable[[], List]) -> tuple:
+    """(objects, traced bytes still allocated once `build` returns)."""
+    gc.collect()
+    tracemalloc.start()
+    objs = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return objs, size
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    symbols = synthetic.tickers(args.tickers)
+    points = args.tickers * args.days
+
+    models, model_bytes = held_bytes(lambda: [synthetic.raw_bundle(t, args.days, args.seed) for t in symbols])
+    arrays, array_bytes = held_bytes(lambda: [ArrayBundle.from_bundle(b) for b in models])
+
+    for name, bundles, size in (("RawBundle", models, model_bytes), ("ArrayBundle", arrays, array_bytes)):
+        pickled = sum(len(pickle.dumps(b, protocol=pickle.HIGHEST_PROTOCOL)) for b in bundles)
+        t0 = time.perf_counter()
+        for b in bundles:
+            process_bundle(b)
+        secs = time.perf_counter() - t0
+        print(f"{name:<12} held {size / 1e6:9.1f} MB ({size / points:6.1f} B/price)  "
+              f"pickled {pickled / 1e6:8.1f} MB  process_bundle {secs:7.2f}s")
+    print(f"reduction    {model_bytes / max(array_bytes, 1):.1f}x held")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# bench/bench_fetch.py
+"""Per-ticker vs batched price downloads against a stub with per-call latency.
+
+    python -m bench.bench_fetch --tickers 500 --chunk 100 --latency 0.25
+"""
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_fetcher import fetch_prices_batch, split_closes
+
+
+def stub_download(days: int, latency: float, per_symbol: float):
+    """yf.download-shaped frames after `latency + per_symbol * n` seconds."""
+    idx = pd.bdate_range("2020-01-01", periods=days)
+    rng = np.random.default_rng(0)
+
+    def download(tickers, period):
+        time.sleep(latency + per_symbol * len(tickers))
+        close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, (days, len(tickers))), axis=0))
+        cols = pd.MultiIndex.from_product([["Close", "Open"], list(tickers)], names=["Price", "Ticker"])
+        return pd.DataFrame(np.hstack([close, close]), index=idx, columns=cols)
+    return download
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--tickers", type=int, default=500)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--chunk", type=int, default=100)
+    ap.add_argument("--latency", type=float, default=0.25, help="Seconds of overhead per download call")
+    ap.add_argument("--per-symbol", type=float, default=0.002, help="Extra seconds per symbol in a call")
+    args = ap.parse_args()
+
+    tickers = [f"T{i:05d}" for i in range(args.tickers)]
+    download = stub_download(args.days, args.latency, args.per_symbol)
+
+    t0 = time.perf_counter()
+    for t in tickers:
+        split_closes(download([t], "5y"), [t])
+    single = time.perf_counter() - t0
+    print(f"one call per ticker : {single:.2f}s ({args.tickers} calls)")
+
+    t0 = time.perf_counter()
+    got, errors = fetch_prices_batch(tickers, chunk_size=args.chunk, download=download)
+    batched = time.perf_counter() - t0
+    calls = -(-args.tickers // args.chunk)
+    print(f"batched ({args.chunk}/call)  : {batched:.2f}s ({calls} calls, {len(got)} ok, {len(errors)} failed)"
+          f" -> {single / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench/bench_panel.py
+"""Panel engine vs per-ticker process_bundle over a synthetic universe.
+
+    python -m bench.bench_panel --tickers 5000 --days 1260 --sample 200
+"""
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.models import FundamentalsQuarter, PriceRow, RawBundle
+from src.panel import align_fundamentals_panel, process_panel
+from src.processor import process_bundle
+
+
+def synthetic_universe(tickers: int, days: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=days)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, (tickers, days)), axis=1))
+    # A tenth of the universe lists partway through the span
+    late = rng.choice(tickers, tickers // 10, replace=False)
+    close[late, :days // 4] = np.nan
+    quarters = pd.date_range(dates[0], dates[-1], freq="QE")
+    fqs = [[FundamentalsQuarter(period_end=q.date(), book_value=float(b), shares_out=1e8,
+                                total_debt=1e9, cash=5e8)
+            for q, b in zip(quarters, rng.uniform(1e9, 5e9, len(quarters)))]
+           for _ in range(tickers)]
+    return [f"T{i:05d}" for i in range(tickers)], dates, close, fqs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--tickers", type=int, default=5000)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--block", type=int, default=1000, help="Tickers per vectorized block")
+    ap.add_argument("--sample", type=int, default=200, help="Tickers timed through process_bundle (extrapolated)")
+    args = ap.parse_args()
+
+    tickers, dates, close, fqs = synthetic_universe(args.tickers, args.days)
+
+    t0 = time.perf_counter()
+    funds = align_fundamentals_panel(dates.to_numpy(), close, fqs)
+    t_align = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    wide = process_panel(tickers, dates, close, funds, layout="wide", block_rows=args.block)
+    t_wide = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    long = process_panel(tickers, dates, close, funds, layout="long", block_rows=args.block)
+    t_long = time.perf_counter() - t0
+    print(f"panel {args.tickers} x {args.days}: align {t_align:.2f}s, wide {t_wide:.2f}s, "
+          f"long {t_long:.2f}s ({len(long):,} rows)")
+
+    n = min(args.sample, args.tickers)
+    bundles = []
+    for i in range(n):
+        keep = ~np.isnan(close[i])
+        prices = [PriceRow.model_construct(date=d, close=c)
+                  for d, c in zip(dates[keep].date, close[i, keep].tolist())]
+        bundles.append(RawBundle(ticker=tickers[i], prices=prices, fundamentals_q=fqs[i]))
+    t0 = time.perf_counter()
+    for b in bundles:
+        process_bundle(b)
+    per = (time.perf_counter() - t0) / max(1, n)
+    est = per * args.tickers
+    print(f"process_bundle: {per * 1000:.2f} ms/ticker -> ~{est:.1f}s for {args.tickers} "
+          f"({est / (t_align + t_long):.1f}x slower than align + long panel)")
+    assert wide["sma50"].shape == close.shape
+
+
+if __name__ == "__main__":
+    main()
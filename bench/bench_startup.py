@@ -0,0 +1,116 @@
+# bench/bench_startup.py
+"""CLI startup cost, and cold per-command runs vs one warm `serve` process.
+
+    python -m bench.bench_startup                      # import + --help timings, heavy modules at startup
+    python -m bench.bench_startup --max-ms 500         # exit 1 past the budget or if a heavy module loads eagerly
+    python -m bench.bench_startup --jobs 5             # also time 5 cold `run`s vs the same jobs through `serve`
+
+Every measurement is a fresh interpreter; the fastest of --repeat counts.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import yaml
+
+from bench import synthetic
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules the CLI must not pay for before a command actually needs them
+HEAVY = ("pandas", "numpy", "sqlalchemy", "pydantic", "yfinance", "pyarrow", "yaml")
+
+_PROBE = ("import sys, time; t0 = time.perf_counter(); import src.main; "
+          "print((time.perf_counter() - t0) * 1000); print(','.join(m for m in {heavy!r} if m in sys.modules))")
+
+
+def _best(cmd: List[str], repeat: int, **kw) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=REPO, check=True, stdout=subprocess.DEVNULL, **kw)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def import_ms(repeat: int = 5):
+    """(fastest in-process `import src.main` in ms, heavy modules it loaded)."""
+    best, loaded = float("inf"), []
+    for _ in range(max(1, repeat)):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(heavy=HEAVY)], cwd=REPO, check=True,
+                             capture_output=True, text=True).stdout.splitlines()
+        best = min(best, float(out[0]))
+        loaded = [m for m in (out[1] if len(out) > 1 else "").split(",") if m]
+    return best, loaded
+
+
+def help_ms(repeat: int = 5) -> float:
+    return _best([sys.executable, "-m", "src.main", "--help"], repeat)
+
+
+def cold_vs_warm(jobs: int, days: int = 1260, seed: int = 0):
+    """Wall time of `jobs` separate `run` processes vs the same jobs sent to one `serve` process."""
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        symbols = synthetic.tickers(jobs)
+        root = os.path.join(workdir, "cache")
+        synthetic.seed_cache(root, symbols, days, seed)
+        cfg_path = os.path.join(workdir, "config.yaml")
+        with open(cfg_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(synthetic.cache_config(root, os.path.join(workdir, "app.db"),
+                                                  os.path.join(workdir, "out")), f)
+        t0 = time.perf_counter()
+        for t in symbols:
+            subprocess.run([sys.executable, "-m", "src.main", "run", "--ticker", t, "--config", cfg_path],
+                           cwd=REPO, check=True, stdout=subprocess.DEVNULL)
+        cold = time.perf_counter() - t0
+
+        requests = "".join(json.dumps({"id": i, "cmd": "run", "ticker": t}) + "\n" for i, t in enumerate(symbols))
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-m", "src.main", "serve", "--config", cfg_path], cwd=REPO,
+                              input=requests, capture_output=True, text=True, check=True)
+        warm = time.perf_counter() - t0
+        replies = [json.loads(line) for line in proc.stdout.splitlines()]
+        failed = [r for r in replies if not r.get("ok")]
+        if failed:
+            raise RuntimeError(f"serve jobs failed: {failed[:3]}")
+        job_ms = sorted(r["elapsed_ms"] for r in replies)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return cold * 1000, warm * 1000, job_ms
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--max-ms", type=float, default=None, help="Budget for `import src.main`")
+    ap.add_argument("--jobs", type=int, default=0, help="Also compare cold runs with a warm serve loop")
+    args = ap.parse_args(argv)
+
+    imp, loaded = import_ms(args.repeat)
+    print(f"import src.main   {imp:8.1f} ms   heavy modules loaded: {', '.join(loaded) or 'none'}")
+    print(f"src.main --help   {help_ms(args.repeat):8.1f} ms   (interpreter start included)")
+    if args.jobs:
+        cold, warm, job_ms = cold_vs_warm(args.jobs)
+        print(f"{args.jobs} cold runs      {cold:8.1f} ms   ({cold / args.jobs:.1f} ms/job)")
+        print(f"serve, {args.jobs} jobs     {warm:8.1f} ms   ({warm / args.jobs:.1f} ms/job, "
+              f"median job {job_ms[len(job_ms) // 2]:.1f} ms in-process)")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: startup imports {', '.join(loaded)}")
+        failed = True
+    if args.max_ms is not None and imp > args.max_ms:
+        print(f"FAIL: import took {imp:.1f} ms, budget {args.max_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
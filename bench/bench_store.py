@@ -0,0 +1,119 @@
+# bench/bench_store.py
+"""History backends: SQLite tables vs. the partitioned columnar store.
+
+    python -m bench.bench_store --tickers 1000 --days 1260
+
+Builds full metric frames (close, SMA-50/200, 52-week high, ...) for a
+synthetic universe with panel_metrics, then times on each backend:
+
+  write      one upsert_daily + upsert_signals per ticker (a full batch)
+  append     one more day per ticker (a nightly incremental run)
+  panel      close for every symbol over the last year (backtest chunk load)
+  wide       close, sma50, sma200 for every symbol over all history
+  cross      every metric for every symbol on one day (a cross-section)
+
+and reports seconds, rows/s and the bytes on disk.
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from bench import synthetic
+from src.database import get_engine, init_schema
+from src.panel import panel_metrics
+from src.signals import cross_transitions
+from src.store import ColumnarStore, SqliteStore
+
+
+def metric_frames(tickers: int, days: int, seed: int = 0):
+    """({symbol: metrics frame}, {symbol: signal events}, dates) for a synthetic universe."""
+    symbols = synthetic.tickers(tickers)
+    dates = synthetic.gbm_prices(symbols[0], days, seed)["date"]
+    close = np.vstack([synthetic.gbm_prices(s, days, seed)["close"].to_numpy() for s in symbols])
+    m = panel_metrics(close)
+    cross, golden = cross_transitions(m["sma50"], m["sma200"])
+    frames, events = {}, {}
+    for i, s in enumerate(symbols):
+        frames[s] = pd.DataFrame({"date": dates.dt.strftime("%Y-%m-%d"), "close": close[i],
+                                  **{k: v[i] for k, v in m.items() if k != "close"}})
+        events[s] = [{"date": dates.iloc[j].date(), "type": "golden_cross" if golden[i, j] else "death_cross"}
+                     for j in np.flatnonzero(cross[i]).tolist()]
+    return frames, events, dates
+
+
+def _timed(fn: Callable[[], object]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def run(store, frames: Dict[str, pd.DataFrame], events, dates, symbols: List[str]) -> Dict[str, float]:
+    out = {}
+
+    def write():
+        for s in symbols:
+            store.upsert_ticker(s)
+            store.upsert_daily(s, frames[s])
+            store.upsert_signals(s, events[s])
+    out["write"] = _timed(write)
+
+    next_day = (dates.iloc[-1] + pd.offsets.BDay(1)).strftime("%Y-%m-%d")
+
+    def append():
+        for s in symbols:
+            row = frames[s].iloc[[-1]].assign(date=next_day)
+            store.upsert_daily(s, row)
+    out["append"] = _timed(append)
+
+    year_ago = (dates.iloc[-1] - pd.Timedelta(days=365)).strftime("%Y-%m-%d")
+    last = dates.iloc[-1].strftime("%Y-%m-%d")
+    out["panel"] = _timed(lambda: store.load_panel(symbols, ["close"], start=year_ago))
+    out["wide"] = _timed(lambda: store.load_panel(symbols, ["close", "sma50", "sma200"]))
+    out["cross"] = _timed(lambda: store.load_panel(symbols, list(frames[symbols[0]].columns[1:]), last, last))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--format", default="npy", choices=("npy", "parquet"))
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    frames, events, dates = metric_frames(args.tickers, args.days, args.seed)
+    symbols = sorted(frames)
+    rows = args.tickers * args.days
+    print(f"built {args.tickers} x {args.days} metric rows in {time.perf_counter() - t0:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(os.path.join(tmp, "bench.db"))
+        init_schema(engine)
+        backends = [("sqlite", SqliteStore(engine), os.path.join(tmp, "bench.db")),
+                    (f"columnar/{args.format}", ColumnarStore(os.path.join(tmp, "store"), args.format),
+                     os.path.join(tmp, "store"))]
+        print(f"{'backend':<16}" + "".join(f"{k:>9}" for k in ("write", "append", "panel", "wide", "cross"))
+              + f"  {'rows/s written':>15}  disk")
+        for name, store, path in backends:
+            r = run(store, frames, events, dates, symbols)
+            if name == "sqlite":
+                engine.dispose()  # fold the WAL back so the file size is comparable
+            print(f"{name:<16}" + "".join(f"{r[k]:8.2f}s" for k in ("write", "append", "panel", "wide", "cross"))
+                  + f"  {rows / r['write']:15,.0f}  {_size(path) / 1e6:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
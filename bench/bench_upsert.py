@@ -0,0 +1,125 @@
+# bench/bench_upsert.py
+"""Bulk upsert throughput: 5y of daily metrics for many tickers.
+
+    python -m bench.bench_upsert --tickers 1000 --days 1260
+    python -m bench.bench_upsert --tickers 1000 --legacy   # old TEXT-keyed layout -> migrate
+"""
+from __future__ import annotations
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.database import DAILY_COLUMNS, get_engine, init_schema, symbol_id, to_days, upsert_daily, upsert_ticker
+
+
+def synthetic_metrics(days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, days)))
+    s = pd.Series(close)
+    df = pd.DataFrame({
+        "date": pd.bdate_range("2020-01-01", periods=days),
+        "close": close,
+        "sma50": s.rolling(50, min_periods=50).mean(),
+        "sma200": s.rolling(200, min_periods=200).mean(),
+        "high_52w": s.rolling(252, min_periods=252).max(),
+    })
+    df["bvps"] = np.nan
+    df["pb"] = np.nan
+    df["ev"] = np.nan
+    df["pct_from_52w_high"] = (df["close"] - df["high_52w"]) / df["high_52w"]
+    df["is_52w_high"] = (df["close"] - df["high_52w"]).abs() <= 1e-8
+    return df
+
+
+def _row_by_row(engine, symbol: str, df: pd.DataFrame):
+    """The previous per-row execute path, kept here as the comparison baseline."""
+    sid = symbol_id(engine, symbol)
+    with engine.begin() as conn:
+        for _, r in df.iterrows():
+            conn.execute(text(
+                "INSERT INTO metrics(symbol_id,day,close,sma50,sma200,high_52w) "
+                "VALUES(:sid,:day,:close,:sma50,:sma200,:high_52w) "
+                "ON CONFLICT(symbol_id,day) DO UPDATE SET close=excluded.close"
+            ), {
+                "sid": sid, "day": int(to_days([r["date"]])[0]),
+                "close": float(r["close"]),
+                "sma50": None if pd.isna(r["sma50"]) else float(r["sma50"]),
+                "sma200": None if pd.isna(r["sma200"]) else float(r["sma200"]),
+                "high_52w": None if pd.isna(r["high_52w"]) else float(r["high_52w"]),
+            })
+
+
+def _legacy_db(path: str, tickers: int, frame: pd.DataFrame):
+    """The pre-v2 layout (TEXT symbol/date, rowid table + UNIQUE index) filled with `frame` per ticker."""
+    with sqlite3.connect(path) as raw:
+        raw.execute("CREATE TABLE tickers(id INTEGER PRIMARY KEY, symbol TEXT UNIQUE)")
+        raw.execute("CREATE TABLE daily_metrics(symbol TEXT, date TEXT, close REAL, sma50 REAL, sma200 REAL, "
+                    "high_52w REAL, bvps REAL, pb REAL, ev REAL, pct_from_52w_high REAL, is_52w_high INTEGER, "
+                    "UNIQUE(symbol,date))")
+        raw.execute("CREATE TABLE signal_events(symbol TEXT, date TEXT, type TEXT, UNIQUE(symbol,date,type))")
+        dates = frame["date"].dt.strftime("%Y-%m-%d").tolist()
+        values = frame[DAILY_COLUMNS].astype(float).to_numpy().tolist()
+        for i in range(tickers):
+            sym = f"T{i:05d}"
+            raw.execute("INSERT INTO tickers(symbol) VALUES(?)", (sym,))
+            raw.executemany(f"INSERT INTO daily_metrics VALUES({','.join('?' * 11)})",
+                            [(sym, d, *v) for d, v in zip(dates, values)])
+
+
+def _mb(path: str) -> float:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 1e6
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--tickers", type=int, default=1000)
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--compare-row", type=int, default=20,
+                    help="Tickers to push through the per-row baseline (0 to skip)")
+    ap.add_argument("--legacy", action="store_true",
+                    help="Build the old schema with the same rows, then time the migration")
+    args = ap.parse_args()
+
+    frame = synthetic_metrics(args.days)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.legacy:
+            path = os.path.join(tmp, "legacy.db")
+            _legacy_db(path, args.tickers, frame)
+            before = _mb(path)
+            t0 = time.perf_counter()
+            init_schema(get_engine(path))
+            print(f"migration: {time.perf_counter() - t0:.2f}s, {before:.1f} MB -> {_mb(path):.1f} MB")
+            return
+
+        path = os.path.join(tmp, "bench.db")
+        engine = get_engine(path)
+        init_schema(engine)
+
+        t0 = time.perf_counter()
+        for i in range(args.tickers):
+            sym = f"T{i:05d}"
+            upsert_ticker(engine, sym)
+            upsert_daily(engine, sym, frame)
+        dt = time.perf_counter() - t0
+        rows = args.tickers * args.days
+        print(f"bulk upsert_daily: {rows:,} rows in {dt:.2f}s -> {rows / dt:,.0f} rows/s")
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"database size    : {_mb(path):.1f} MB")
+
+        if args.compare_row:
+            t0 = time.perf_counter()
+            for i in range(args.compare_row):
+                _row_by_row(engine, f"R{i:05d}", frame)
+            dt = time.perf_counter() - t0
+            rows = args.compare_row * args.days
+            print(f"per-row baseline : {rows:,} rows in {dt:.2f}s -> {rows / dt:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# bench/suite.py
+"""Throughput suite over seeded synthetic data; runs offline.
+
+    python -m bench.suite                                  # every case at 1, 100 and 5000 tickers
+    python -m bench.suite --tickers 1,100 --cases process_bundle,detect_crossovers
+    python -m bench.suite --save main                      # write bench/baselines/main.json
+    python -m bench.suite --compare main                   # exit 1 if rows/s regressed past --threshold
+
+Each (case, size) runs in a fresh process so peak RSS is its own. Timing is
+the best of --repeat untraced passes; one more pass under tracemalloc reports
+the peak of Python allocations (skipped with --no-alloc, and for the CLI case,
+which runs as a subprocess). Single-ticker cases take milliseconds, so compare
+them with a looser --threshold than the 100/5000 sizes.
+"""
+from __future__ import annotations
+import argparse
+import datetime as dt
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from bench import synthetic
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+CASES = ["fetch_raw_bundle", "process_bundle", "detect_crossovers", "upsert", "screen", "cli"]
+
+
+# ---------------------------------------------------------------------------
+# Cases: setup(n, days, seed, workdir) -> (run, rows); only `run` is measured
+# ---------------------------------------------------------------------------
+
+def _fetch_raw_bundle(n: int, days: int, seed: int, workdir: str):
+    from src.data_fetcher import fetch_raw_bundle, set_cache
+    symbols = synthetic.tickers(n)
+    set_cache(synthetic.seed_cache(os.path.join(workdir, "cache"), symbols, days, seed))
+
+    def run():
+        for t in symbols:
+            fetch_raw_bundle(t)
+    return run, n * days
+
+
+def _process_bundle(n: int, days: int, seed: int, workdir: str):
+    from src.models import ArrayBundle
+    from src.processor import process_bundle
+    # Array-backed, as the fetch layer hands them over
+    bundles = [ArrayBundle.from_bundle(synthetic.raw_bundle(t, days, seed)) for t in synthetic.tickers(n)]
+
+    def run():
+        for b in bundles:
+            process_bundle(b)
+    return run, n * days
+
+
+def _detect_crossovers(n: int, days: int, seed: int, workdir: str):
+    from src.processor import process_bundle
+    from src.signals import detect_crossovers
+    frames = [(b.ticker, process_bundle(b)[0]) for b in
+              (synthetic.raw_bundle(t, days, seed) for t in synthetic.tickers(n))]
+
+    def run():
+        for t, df in frames:
+            detect_crossovers(t, df)
+    return run, n * days
+
+
+def _upsert(n: int, days: int, seed: int, workdir: str):
+    from src.database import get_engine, init_schema
+    from src.pipeline import compute_ticker, persist_result
+    results = [compute_ticker(synthetic.raw_bundle(t, days, seed)) for t in synthetic.tickers(n)]
+    db = os.path.join(workdir, "bench.db")
+
+    def run():
+        if os.path.exists(db):
+            os.remove(db)
+        engine = get_engine(db)
+        init_schema(engine)
+        for res in results:
+            persist_result(engine, res)  # upsert_ticker + upsert_daily + upsert_signals
+        engine.dispose()
+    return run, n * days
+
+
+def _screen(n: int, days: int, seed: int, workdir: str):
+    from src.database import get_engine, init_schema
+    from src.pipeline import compute_ticker, persist_result
+    from src.screen import screen
+    engine = get_engine(os.path.join(workdir, "screen.db"))
+    init_schema(engine)
+    for t in synthetic.tickers(n):
+        persist_result(engine, compute_ticker(synthetic.raw_bundle(t, days, seed)))
+
+    def run():
+        screen(engine, "pct_from_52w_high >= -5% and sma50 > sma200 and not death_cross within 30 days")
+    return run, n
+
+
+def _cli(n: int, days: int, seed: int, workdir: str):
+    symbols = synthetic.tickers(n)
+    root = os.path.join(workdir, "cache")
+    synthetic.seed_cache(root, symbols, days, seed)
+    cfg_path = os.path.join(workdir, "config.yaml")
+    with open(cfg_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(synthetic.cache_config(root, os.path.join(workdir, "cli.db"), os.path.join(workdir, "out")), f)
+    tickers_file = os.path.join(workdir, "tickers.txt")
+    with open(tickers_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(symbols) + "\n")
+    cmd = [sys.executable, "-m", "src.main", "batch", "--tickers-file", tickers_file, "--config", cfg_path]
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def run():
+        subprocess.run(cmd, cwd=repo, check=True, stdout=subprocess.DEVNULL)
+    return run, n * days
+
+
+SETUPS: Dict[str, Callable[..., Tuple[Callable[[], None], int]]] = {
+    "fetch_raw_bundle": _fetch_raw_bundle,
+    "process_bundle": _process_bundle,
+    "detect_crossovers": _detect_crossovers,
+    "upsert": _upsert,
+    "screen": _screen,
+    "cli": _cli,
+}
+
+
+def _measure(case: str, n: int, days: int, seed: int, alloc: bool, repeat: int = 3) -> Dict[str, Any]:
+    """One case in this (fresh) process: best of `repeat` timed passes, then optionally a traced one."""
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        run, rows = SETUPS[case](n, days, seed, workdir)
+        seconds = float("inf")
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            run()
+            seconds = min(seconds, time.perf_counter() - t0)
+        who = resource.RUSAGE_CHILDREN if case == "cli" else resource.RUSAGE_SELF
+        peak_kb = resource.getrusage(who).ru_maxrss  # KiB on Linux
+        alloc_mb = None
+        if alloc and case != "cli":
+            tracemalloc.start()
+            run()
+            alloc_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "case": case, "tickers": n, "days": days, "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "alloc_peak_mb": None if alloc_mb is None else round(alloc_mb, 1),
+    }
+
+
+def run_suite(cases: List[str], sizes: List[int], days: int = 1260, seed: int = 0, alloc: bool = True,
+              repeat: int = 3, echo: Callable[[str], None] = print) -> List[Dict[str, Any]]:
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for n in sizes:
+        for case in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                r = pool.submit(_measure, case, n, days, seed, alloc, repeat).result()
+            results.append(r)
+            echo(_row(r))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, results: List[Dict[str, Any]]) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    doc = {"commit": _commit(), "created": dt.datetime.utcnow().isoformat(timespec="seconds"),
+           "python": platform.python_version(), "machine": platform.machine(), "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
+    return path
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float = 0.2,
+            echo: Callable[[str], None] = print) -> List[str]:
+    """Print rows/s and peak RSS changes against `baseline`; return the regressed (case, size) labels."""
+    base = {(r["case"], r["tickers"], r["days"]): r for r in baseline["results"]}
+    regressed = []
+    echo(f"vs baseline {baseline.get('commit') or '?'} ({baseline.get('created', '?')}):")
+    for r in results:
+        b = base.get((r["case"], r["tickers"], r["days"]))
+        if b is None or not b.get("rows_per_sec") or not r.get("rows_per_sec"):
+            continue
+        speed = r["rows_per_sec"] / b["rows_per_sec"] - 1.0
+        rss = r["peak_rss_mb"] / b["peak_rss_mb"] - 1.0 if b.get("peak_rss_mb") else 0.0
+        label = f"{r['case']}@{r['tickers']}"
+        flag = ""
+        if speed < -threshold:
+            regressed.append(label)
+            flag = "  REGRESSION"
+        echo(f"  {label:<24} rows/s {speed:+7.1%}   peak RSS {rss:+7.1%}{flag}")
+    return regressed
+
+
+def _row(r: Dict[str, Any]) -> str:
+    alloc = "-" if r["alloc_peak_mb"] is None else f"{r['alloc_peak_mb']:.1f}"
+    return (f"{r['case']:<18} {r['tickers']:>5} tickers  {r['seconds']:>9.3f}s  {r['rows_per_sec'] or 0:>12,.0f} rows/s"
+            f"  peak RSS {r['peak_rss_mb']:>7.1f} MB  alloc peak {alloc:>7} MB")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tickers", default="1,100,5000", help="Comma-separated universe sizes")
+    ap.add_argument("--days", type=int, default=1260)
+    ap.add_argument("--cases", default=",".join(CASES), help=f"Subset of {','.join(CASES)}")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="Timed passes per case; the fastest counts")
+    ap.add_argument("--no-alloc", action="store_true", help="Skip the tracemalloc pass")
+    ap.add_argument("--save", metavar="NAME", help="Write results as a baseline (name or .json path)")
+    ap.add_argument("--compare", metavar="NAME", help="Compare against a saved baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="Allowed rows/s drop before failing (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = set(cases) - set(SETUPS)
+    if unknown:
+        ap.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.tickers.split(",") if s.strip()]
+
+    results = run_suite(cases, sizes, args.days, args.seed, alloc=not args.no_alloc, repeat=args.repeat)
+    if args.save:
+        print(f"saved {save_baseline(args.save, results)}")
+    if args.compare:
+        with open(baseline_path(args.compare), encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print(f"{len(regressed)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressed)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
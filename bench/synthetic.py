@@ -0,0 +1,106 @@
+# bench/synthetic.py
+"""Seeded synthetic market data: GBM closes and quarterly fundamentals.
+
+The same seed always gives the same universe, so benchmark runs on different
+commits see identical inputs.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.cache import DataCache
+from src.models import FundamentalsQuarter, PriceRow, RawBundle
+
+
+def tickers(n: int) -> List[str]:
+    return [f"S{i:05d}" for i in range(n)]
+
+
+def _rng(seed: int, ticker: str) -> np.random.Generator:
+    # Per-ticker stream: a ticker's series doesn't depend on how many others are generated
+    return np.random.default_rng([seed, int(ticker.lstrip("S") or 0)])
+
+
+def gbm_prices(ticker: str, days: int = 1260, seed: int = 0, start: str = "2020-01-01",
+               mu: float = 0.08, sigma: float = 0.3) -> pd.DataFrame:
+    """Business-day OHLCV frame whose closes follow geometric Brownian motion (annualized mu/sigma).
+
+    Open gaps from the previous close and high/low bracket both; closes are
+    drawn first, so they don't depend on the other fields.
+    """
+    rng = _rng(seed, ticker)
+    dt_year = 1.0 / 252
+    steps = (mu - 0.5 * sigma ** 2) * dt_year + sigma * np.sqrt(dt_year) * rng.standard_normal(days)
+    s0 = rng.uniform(10.0, 500.0)
+    close = s0 * np.exp(np.cumsum(steps))
+    day_vol = sigma * np.sqrt(dt_year)
+    open_ = np.r_[s0, close[:-1]] * np.exp(0.25 * day_vol * rng.standard_normal(days))
+    wick = np.abs(rng.standard_normal((2, days))) * 0.5 * day_vol
+    return pd.DataFrame({
+        "date": pd.bdate_range(start, periods=days),
+        "open": open_,
+        "high": np.maximum(open_, close) * (1.0 + wick[0]),
+        "low": np.minimum(open_, close) * (1.0 - wick[1]),
+        "close": close,
+        "volume": np.round(rng.lognormal(13.0, 0.5, days)),
+    })
+
+
+def quarterly_fundamentals(ticker: str, start: str = "2019-12-31", end: str = "2025-01-01",
+                           seed: int = 0) -> List[FundamentalsQuarter]:
+    """Quarter-end balance sheets with drifting book value and occasional missing fields."""
+    rng = _rng(seed + 1, ticker)
+    quarters = pd.date_range(start, end, freq="QE")
+    shares = rng.uniform(1e7, 5e9)
+    book = shares * rng.uniform(1.0, 50.0)
+    rows = []
+    for q in quarters:
+        book *= 1.0 + rng.normal(0.02, 0.05)
+        missing = rng.random() < 0.05
+        rows.append(FundamentalsQuarter(
+            period_end=q.date(),
+            book_value=None if missing else float(book),
+            shares_out=float(shares),
+            total_debt=float(book * rng.uniform(0.1, 1.5)),
+            cash=float(book * rng.uniform(0.05, 0.5)),
+        ))
+    return rows
+
+
+def raw_bundle(ticker: str, days: int = 1260, seed: int = 0) -> RawBundle:
+    p = gbm_prices(ticker, days, seed)
+    rows = [PriceRow.model_construct(date=d, open=o, high=h, low=lo, close=c, volume=int(v))
+            for d, o, h, lo, c, v in zip(p["date"].dt.date, *(p[f].tolist() for f in ("open", "high", "low", "close", "volume")))]
+    return RawBundle(ticker=ticker, prices=rows, fundamentals_q=quarterly_fundamentals(ticker, seed=seed))
+
+
+class FakeFetch:
+    """In-process stand-in for `fetch_raw_bundle` (pass as `run_batch(fetch=...)`)."""
+
+    def __init__(self, days: int = 1260, seed: int = 0, fail: Sequence[str] = ()):
+        self.days, self.seed, self.fail = days, seed, set(fail)
+
+    def __call__(self, ticker: str, period: str = "5y") -> RawBundle:
+        if ticker in self.fail:
+            raise RuntimeError(f"No price data for {ticker}. Check symbol/network.")
+        return raw_bundle(ticker, self.days, self.seed)
+
+
+def seed_cache(root: str, symbols: Sequence[str], days: int = 1260, seed: int = 0,
+               period: str = "5y") -> DataCache:
+    """Offline cache holding every symbol's prices and fundamentals, for runs through the real fetch layer."""
+    cache = DataCache(root, max_bytes=1 << 40, offline=True)
+    for t in symbols:
+        cache.put_prices(t, period, gbm_prices(t, days, seed), ttl=None)
+        cache.put_fundamentals(t, quarterly_fundamentals(t, seed=seed), ttl=None)
+    return cache
+
+
+def cache_config(root: str, db_path: str, out_dir: str, extra: Optional[Dict] = None) -> Dict:
+    """Config dict for CLI runs against a `seed_cache` directory."""
+    cfg = {"db_path": db_path, "output_dir": out_dir, "log_level": "WARNING", "historical_period": "5y",
+           "cache": {"dir": root, "offline": True}, "fetch_batch_size": 0}
+    cfg.update(extra or {})
+    return cfg
@@ -0,0 +1,295 @@
+# src/async_fetch.py
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.data_fetcher import bundle_from_prices, download_prices, get_cache, get_fundamentals
+from src.fundamentals import download_fundamentals
+from src.instrument import count
+from src.models import ArrayBundle, FundamentalsQuarter
+from src.retry import PermanentError, backoff_delay, is_transient
+
+
+@dataclass
+class FetchError:
+    ticker: str
+    kind: str          # "prices" or "fundamentals"
+    error: str         # exception type name, "Timeout" for per-attempt timeouts
+    message: str
+    transient: bool
+    attempts: int
+
+    def __str__(self) -> str:
+        return f"{self.kind}: {self.error}: {self.message} (after {self.attempts} attempt(s))"
+
+
+@dataclass
+class FetchResult:
+    """Outcome for one ticker; `bundle` is None when prices could not be fetched."""
+    ticker: str
+    bundle: Optional[ArrayBundle]
+    errors: List[FetchError] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.bundle is not None
+
+
+class YFinanceProvider:
+    """The blocking yfinance calls run on worker threads; honours the shared data cache."""
+    hosts = {"prices": "query2.finance.yahoo.com", "fundamentals": "query2.finance.yahoo.com"}
+
+    async def prices(self, ticker: str, period: str = "5y", start: Optional[str] = None) -> pd.DataFrame:
+        cache = get_cache()
+        if cache is not None:
+            hit = cache.get_prices(ticker, period)
+            if hit is not None:
+                return hit if start is None else hit[hit["date"] >= pd.Timestamp(start)].reset_index(drop=True)
+            if cache.offline:
+                raise PermanentError(f"No cached price data for {ticker} ({period}) and cache is offline.")
+        df = await asyncio.to_thread(download_prices, ticker, period, start)
+        if cache is not None and start is None and not df.empty:
+            cache.put_prices(ticker, period, df)
+        return df
+
+    async def fundamentals(self, ticker: str) -> Sequence[FundamentalsQuarter]:
+        store = get_fundamentals()
+        if store is not None:  # loaded by the batch's refresh, so normally no I/O here
+            return await asyncio.to_thread(store.get, ticker)
+        cache = get_cache()
+        if cache is not None:
+            hit = cache.get_fundamentals(ticker)
+            if hit is not None:
+                return hit
+            if cache.offline:
+                return []
+        cols = await asyncio.to_thread(download_fundamentals, ticker)
+        if cache is not None:
+            cache.put_fundamentals(ticker, cols)
+        return cols
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `capacity` banked; rate <= 0 disables limiting."""
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.clock = clock
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, n: float = 1.0):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:  # FIFO: waiters are served in arrival order
+            while True:
+                now = self.clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                await asyncio.sleep((n - self._tokens) / self.rate)
+
+
+class AsyncFetcher:
+    """Concurrent price + fundamentals fetches with rate limiting, retries and timeouts.
+
+    Every provider call takes a token from the bucket and holds a slot of the
+    global `concurrency` cap and of its host's `per_host` cap until it returns.
+    Each attempt is waited on for `timeout` seconds; a timed-out call keeps
+    its slots until it ends (a thread can't be stopped) and is not retried
+    before then. Waiting on a call's attempts, abandoned ones included, is
+    capped at `timeout * (retries + 1)` seconds in all, after which it fails
+    with a Timeout even if an abandoned attempt is still running. Transient failures (timeouts, throttling, connection
+    errors) are retried up to `retries` times with full-jitter exponential
+    backoff, permanent ones are not. A ticker whose prices fail
+    comes back as a `FetchResult` with errors instead of raising; failed
+    fundamentals are reported but the bundle is still built without them.
+    """
+
+    def __init__(self, provider: Any = None, rate: float = 2.0, burst: float = 5, concurrency: int = 8,
+                 per_host: Optional[Dict[str, int]] = None, timeout: float = 30.0, retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, seed: Optional[int] = None):
+        self.provider = provider or YFinanceProvider()
+        self.rate, self.burst = rate, burst
+        self.concurrency = max(1, int(concurrency))
+        self.per_host = dict(per_host or {})
+        self.timeout = timeout
+        self.retries = max(0, int(retries))
+        self.backoff_base, self.backoff_max = backoff_base, backoff_max
+        self._rng = random.Random(seed)
+        self._loop_state: Optional[Tuple[Any, TokenBucket, asyncio.Semaphore, Dict[str, asyncio.Semaphore]]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> Optional["AsyncFetcher"]:
+        """Fetcher from the `async_fetch:` config section; None unless it's enabled."""
+        c = (cfg or {}).get("async_fetch")
+        if not c or (isinstance(c, dict) and not c.get("enabled", True)):
+            return None
+        if c is True:
+            c = {}
+        return cls(
+            rate=float(c.get("rate_per_sec", 2.0)),
+            burst=float(c.get("burst", 5)),
+            concurrency=int(c.get("concurrency", 8)),
+            per_host=c.get("per_host"),
+            timeout=float(c.get("timeout_sec", 30)),
+            retries=int(c.get("retries", 3)),
+            backoff_base=float(c.get("backoff_base_sec", 0.5)),
+            backoff_max=float(c.get("backoff_max_sec", 30)),
+        )
+
+    # -- primitives are bound to the running loop, so build them per loop --
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        if self._loop_state is None or self._loop_state[0] is not loop:
+            self._loop_state = (loop, TokenBucket(self.rate, self.burst), asyncio.Semaphore(self.concurrency), {})
+        return self._loop_state
+
+    def _host_slot(self, kind: str) -> asyncio.Semaphore:
+        _, _, _, hosts = self._state()
+        host = getattr(self.provider, "hosts", {}).get(kind, kind)
+        if host not in hosts:
+            hosts[host] = asyncio.Semaphore(self.per_host.get(host, self.concurrency))
+        return hosts[host]
+
+    @staticmethod
+    async def _start(make: Callable[[], Awaitable[Any]], *slots: asyncio.Semaphore) -> "asyncio.Task[Any]":
+        """`make()` as a task that holds `slots` until it finishes, even after its caller stops waiting."""
+        held: List[asyncio.Semaphore] = []
+        try:
+            for s in slots:
+                await s.acquire()
+                held.append(s)
+            task = asyncio.ensure_future(make())
+        except BaseException:
+            for s in held:
+                s.release()
+            raise
+
+        def release(t: "asyncio.Task[Any]"):
+            if not t.cancelled():
+                t.exception()  # retrieved, so an abandoned attempt's failure isn't logged as unhandled
+            for s in held:
+                s.release()
+
+        task.add_done_callback(release)
+        return task
+
+    async def _call(self, ticker: str, kind: str, make: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[FetchError]]:
+        _, bucket, slots, _ = self._state()
+        host_slot = self._host_slot(kind)
+        budget = self.timeout * (self.retries + 1)  # seconds of waiting on the provider, slot queues excluded
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            task = await self._start(make, slots, host_slot)
+            t0 = time.perf_counter()
+            done, _ = await asyncio.wait({task}, timeout=min(self.timeout, budget))
+            budget -= time.perf_counter() - t0
+            if task in done:
+                try:
+                    return task.result(), None
+                except Exception as e:
+                    err = FetchError(ticker, kind, type(e).__name__, str(e), is_transient(e), attempt + 1)
+            else:
+                err = FetchError(ticker, kind, "Timeout", f"no response in {self.timeout:g}s", True, attempt + 1)
+                if attempt < self.retries and budget > 0:
+                    # A provider call running on a thread can't be interrupted: let it finish before retrying
+                    # rather than download twice at once, and keep its result if it got one after all
+                    t0 = time.perf_counter()
+                    done, _ = await asyncio.wait({task}, timeout=budget)
+                    budget -= time.perf_counter() - t0
+                    if task not in done:
+                        return None, err  # still hung with the budget spent
+                    if not task.cancelled() and task.exception() is None:
+                        return task.result(), None
+            if not err.transient or attempt == self.retries or budget <= 0:
+                return None, err
+            count("retries")
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, self._rng)
+            logging.debug(f"{ticker}: {kind} attempt {attempt + 1} failed ({err.error}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        return None, err  # pragma: no cover - loop always returns
+
+    async def fetch(self, ticker: str, period: str = "5y") -> FetchResult:
+        t0 = time.perf_counter()
+        (prices, perr), (funds, ferr) = await asyncio.gather(
+            self._call(ticker, "prices", lambda: self.provider.prices(ticker, period)),
+            self._call(ticker, "fundamentals", lambda: self.provider.fundamentals(ticker)),
+        )
+        errors = [e for e in (perr, ferr) if e is not None]
+        if perr is None and (prices is None or prices.empty):
+            errors.insert(0, FetchError(ticker, "prices", "NoData",
+                                        f"No price data for {ticker}. Check symbol/network.", False, 1))
+        bundle = None
+        if not errors or errors[0].kind != "prices":
+            try:
+                bundle = bundle_from_prices(ticker, prices, funds or [])
+            except Exception as e:
+                errors.insert(0, FetchError(ticker, "prices", type(e).__name__, str(e), False, 1))
+        return FetchResult(ticker, bundle, errors, time.perf_counter() - t0)
+
+    async def fetch_all(self, tickers: Iterable[str], period: str = "5y") -> AsyncIterator[FetchResult]:
+        """Results in completion order, so one slow symbol never holds up the rest."""
+        tasks = [asyncio.ensure_future(self.fetch(t, period)) for t in dict.fromkeys(tickers)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    def run(self, tickers: Iterable[str], period: str = "5y") -> List[FetchResult]:
+        async def _collect():
+            return [r async for r in self.fetch_all(tickers, period)]
+        return asyncio.run(_collect())
+
+    # -- bridge for the thread/process pipeline: a private loop on a daemon thread --
+    def start(self) -> "AsyncFetcher":
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="async-fetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, ticker: str, period: str = "5y") -> "Future[FetchResult]":
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.fetch(ticker, period), self._loop)
+
+    @staticmethod
+    async def _cancel_pending():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        if self._loop is not None:
+            # Timed-out attempts may still be pending; cancel them so the loop closes cleanly
+            asyncio.run_coroutine_threadsafe(self._cancel_pending(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = None
+
+    def __enter__(self) -> "AsyncFetcher":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
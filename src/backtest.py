@@ -0,0 +1,232 @@
+# src/backtest.py
+from __future__ import annotations
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.database import from_days
+from src.instrument import count, stage
+from src.kernels import rolling_max, rolling_min
+from src.store import SqliteStore
+
+DEFAULT_HORIZONS = (5, 20, 60, 120)
+# Position each signal type opens: +1 long, -1 short (flat instead of short when long_only)
+DIRECTIONS: Dict[str, int] = {"golden_cross": 1, "death_cross": -1}
+
+
+@dataclass
+class BacktestResult:
+    signals: pd.DataFrame  # one row per signal: ticker, date, type, then ret_<h>, dd_<h> per horizon
+    summary: pd.DataFrame  # per (type, horizon): signals, mean/median return, hit rate, drawdowns
+    tickers: pd.DataFrame  # per ticker: signals, trades, total return, max drawdown, exposure
+    equity: pd.DataFrame   # equal-weight portfolio of open positions: date, ret, equity, drawdown, positions
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready summary, portfolio stats, per-ticker stats and equity curve (NaN as None)."""
+        eq = self.equity
+        return {
+            "summary": json.loads(self.summary.to_json(orient="records")),
+            "portfolio": {
+                "days": int(len(eq)),
+                "total_return": float(eq["equity"].iloc[-1] - 1.0) if len(eq) else 0.0,
+                "max_drawdown": float(eq["drawdown"].min()) if len(eq) else 0.0,
+            },
+            "tickers": json.loads(self.tickers.to_json(orient="records")),
+            "equity": {"date": eq["date"].dt.strftime("%Y-%m-%d").tolist(),
+                       "equity": eq["equity"].round(6).tolist()},
+        }
+
+
+# ---------------------------------------------------------------------------
+# Loading: one (tickers x days) close panel and its signals per symbol chunk
+# ---------------------------------------------------------------------------
+
+def _chunk_events(names: Sequence[str], days: np.ndarray, sig: pd.DataFrame) -> List[Tuple[int, int, str]]:
+    """Signals as (row, column, type) on the chunk's calendar; those on days without a stored close are skipped."""
+    row = {s: i for i, s in enumerate(names)}
+    c = np.searchsorted(days, sig["day"].to_numpy())
+    ok = c < len(days)
+    ok[ok] = days[c[ok]] == sig["day"].to_numpy()[ok]
+    return [(row[t], int(j), kind) for t, j, kind, keep in zip(sig["ticker"], c.tolist(), sig["type"], ok) if keep]
+
+
+def _ffill(x: np.ndarray) -> np.ndarray:
+    """Forward-fill NaN along the last axis; leading NaN stay."""
+    idx = np.where(np.isnan(x), 0, np.arange(x.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return np.take_along_axis(x, idx, axis=1)
+
+
+def _max_drawdown(equity: np.ndarray) -> np.ndarray:
+    """Worst peak-to-trough drop along the last axis (<= 0)."""
+    return np.min(equity / np.maximum.accumulate(equity, axis=-1) - 1.0, axis=-1, initial=0.0)
+
+
+# ---------------------------------------------------------------------------
+# One vectorized pass per chunk
+# ---------------------------------------------------------------------------
+
+def _chunk_stats(names: Sequence[str], days: np.ndarray, raw_close: np.ndarray, events, horizons: Sequence[int],
+                 directions: Dict[str, int], long_only: bool):
+    k, n = raw_close.shape
+    traded = ~np.isnan(raw_close)
+    first = np.where(traded.any(axis=1), traded.argmax(axis=1), n)
+    last = n - 1 - traded[:, ::-1].argmax(axis=1)
+    cols = np.arange(n)
+    alive = (cols >= first[:, None]) & (cols <= last[:, None])
+    close = _ffill(raw_close)
+
+    # -- forward returns and in-horizon drawdowns per signal --
+    # Horizons count each symbol's own trading days (its stored closes), not the chunk's union
+    # calendar, so a signal's numbers don't depend on which other exchanges share its chunk.
+    own = np.cumsum(traded, axis=1) - 1  # position in the symbol's own closes of the last one up to each day
+    n_own = traded.sum(axis=1)
+    packed = np.full((k, max(int(n_own.max(initial=0)), 1)), np.nan)
+    packed[np.nonzero(traded)[0], own[traded]] = raw_close[traded]
+    ev = [e for e in events if e[2] in directions]
+    r = np.array([e[0] for e in ev], dtype=np.int64)
+    c = np.array([e[1] for e in ev], dtype=np.int64)
+    sign = np.array([directions[e[2]] for e in ev], dtype=np.float64)
+    sig = pd.DataFrame({"ticker": [names[i] for i in r.tolist()], "day": days[c], "type": [e[2] for e in ev]})
+    entry = close[r, c]
+    at = own[r, c]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for h in horizons:
+            ok = (at >= 0) & (at + h < n_own[r])
+            end = np.where(ok, at + h, 0)
+            # Worst close inside [signal day, h own trading days later] against the position
+            hi = rolling_max(packed, h + 1)[r, end] if len(ev) else entry
+            lo = rolling_min(packed, h + 1)[r, end] if len(ev) else entry
+            worst = np.where(sign > 0, lo / entry - 1.0, 1.0 - hi / entry)
+            sig[f"ret_{h}"] = np.where(ok, sign * (packed[r, end] / entry - 1.0), np.nan)
+            sig[f"dd_{h}"] = np.where(ok, np.minimum(worst, 0.0), np.nan)
+
+    # -- positions held from each signal's close until the next signal --
+    pos = np.full((k, n), np.nan)
+    if len(ev):
+        pos[r, c] = np.where((sign < 0) & long_only, 0.0, sign)
+    pos = np.nan_to_num(_ffill(pos), nan=0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        daily = close[:, 1:] / close[:, :-1] - 1.0
+    # A position earns (and counts toward the portfolio) only on days its symbol trades
+    held = (pos[:, :-1] != 0) & alive[:, :-1] & traded[:, 1:]
+    strat = np.where(held, pos[:, :-1] * np.nan_to_num(daily), 0.0)
+    equity = np.cumprod(1.0 + strat, axis=1)
+    n_signals = np.bincount(r, minlength=k)
+    tickers = pd.DataFrame({
+        "ticker": list(names),
+        "signals": n_signals,
+        "trades": ((pos[:, 1:] != 0) & (pos[:, 1:] != pos[:, :-1])).sum(axis=1) + (pos[:, 0] != 0),
+        "total_return": equity[:, -1] - 1.0 if n > 1 else np.zeros(k),
+        "max_drawdown": _max_drawdown(equity) if n > 1 else np.zeros(k),
+        "exposure": held.sum(axis=1) / np.maximum(n_own - 1, 1),
+    })
+    # Portfolio accumulators: summed position returns and open positions, by the day each return lands on
+    return sig, tickers, days[1:], strat.sum(axis=0), held.sum(axis=0)
+
+
+def iter_chunks(store, symbols: Optional[Sequence[str]] = None, chunk_size: int = 500,
+                start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Tuple[List[str], Any]]:
+    """(symbols, (days, close panel, signals)) for `chunk_size` symbols at a time from a src.store backend."""
+    syms = store.symbols()
+    if symbols is not None:
+        wanted = set(symbols)
+        syms = [s for s in syms if s in wanted]
+    for i in range(0, len(syms), max(1, chunk_size)):
+        part = syms[i:i + chunk_size]
+        with stage("backtest_load"):
+            panel = store.load_panel(part, ["close"], start, end)
+            events = _chunk_events(part, panel.days, store.load_signals(part, start, end))
+        yield part, (panel.days, panel.values["close"], events)
+
+
+def run_backtest(engine, symbols: Optional[Sequence[str]] = None, horizons: Sequence[int] = DEFAULT_HORIZONS,
+                 chunk_size: int = 500, long_only: bool = True, start: Optional[str] = None,
+                 end: Optional[str] = None, directions: Optional[Dict[str, int]] = None,
+                 store=None) -> BacktestResult:
+    """Forward returns, hit rates, drawdowns and equity curves for stored signals.
+
+    Reads closes and signals from `store` (src.store; the SQLite tables of
+    `engine` by default), `chunk_size` symbols at a time, so memory is
+    bounded by one (chunk x days) panel.
+    A signal enters at its day's close; returns are signed by its direction.
+    `ret_<h>`/`dd_<h>` are the return h of the symbol's own trading days
+    later and the worst close against the position within those days, so
+    they don't depend on `chunk_size` or on other symbols' calendars.
+    Positions are held until the next signal (flat after a death cross when
+    `long_only`); the portfolio weights open positions equally each day.
+    """
+    horizons = sorted({int(h) for h in horizons})
+    if not horizons or horizons[0] <= 0:
+        raise ValueError("horizons must be positive trading-day counts")
+    directions = dict(DIRECTIONS if directions is None else directions)
+    sig_parts: List[pd.DataFrame] = []
+    ticker_parts: List[pd.DataFrame] = []
+    acc_days: List[np.ndarray] = []
+    acc_ret: List[np.ndarray] = []
+    acc_pos: List[np.ndarray] = []
+
+    if store is None:
+        store = SqliteStore(engine)
+    for names, (days, close, events) in iter_chunks(store, symbols, chunk_size, start, end):
+        if close.shape[1] == 0:
+            continue
+        with stage("backtest_compute"):
+            sig, tick, d, ret, pos = _chunk_stats(names, days, close, events, horizons, directions, long_only)
+        sig_parts.append(sig)
+        ticker_parts.append(tick)
+        acc_days.append(d)
+        acc_ret.append(ret)
+        acc_pos.append(pos)
+        count("backtest_symbols", len(names))
+
+    signal_cols = ["ticker", "date", "type"] + [f"{p}_{h}" for h in horizons for p in ("ret", "dd")]
+    if sig_parts:
+        signals = pd.concat(sig_parts, ignore_index=True)
+        signals["date"] = from_days(signals.pop("day").to_numpy(dtype=np.int64))
+        signals = signals[signal_cols].sort_values(["date", "ticker"], kind="stable").reset_index(drop=True)
+        tickers = pd.concat(ticker_parts, ignore_index=True)
+    else:
+        signals = pd.DataFrame(columns=signal_cols)
+        tickers = pd.DataFrame(columns=["ticker", "signals", "trades", "total_return", "max_drawdown", "exposure"])
+
+    # Chunks have their own calendars; merge the per-day sums by day number
+    if acc_days:
+        all_days = np.concatenate(acc_days)
+        cal, inv = np.unique(all_days, return_inverse=True)
+        ret_sum = np.bincount(inv, weights=np.concatenate(acc_ret), minlength=len(cal))
+        pos_sum = np.bincount(inv, weights=np.concatenate(acc_pos), minlength=len(cal))
+    else:
+        cal, ret_sum, pos_sum = np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    daily = np.where(pos_sum > 0, ret_sum / np.maximum(pos_sum, 1), 0.0)
+    eq = np.cumprod(1.0 + daily)
+    equity = pd.DataFrame({
+        "date": from_days(cal),
+        "ret": daily,
+        "equity": eq,
+        "drawdown": eq / np.maximum.accumulate(eq) - 1.0 if len(eq) else eq,
+        "positions": pos_sum.astype(np.int64),
+    })
+    return BacktestResult(signals, summarize(signals, horizons), tickers, equity)
+
+
+def summarize(signals: pd.DataFrame, horizons: Sequence[int]) -> pd.DataFrame:
+    """Per (signal type, horizon): count, mean/median signed return, hit rate, mean and worst drawdown."""
+    out = []
+    for kind, g in signals.groupby("type", sort=True):
+        for h in horizons:
+            ret = pd.to_numeric(g[f"ret_{h}"], errors="coerce").dropna()
+            dd = pd.to_numeric(g[f"dd_{h}"], errors="coerce").dropna()
+            out.append({
+                "type": kind, "horizon": h, "signals": int(len(ret)),
+                "mean_return": float(ret.mean()) if len(ret) else np.nan,
+                "median_return": float(ret.median()) if len(ret) else np.nan,
+                "hit_rate": float((ret > 0).mean()) if len(ret) else np.nan,
+                "mean_drawdown": float(dd.mean()) if len(dd) else np.nan,
+                "worst_drawdown": float(dd.min()) if len(dd) else np.nan,
+            })
+    return pd.DataFrame(out, columns=["type", "horizon", "signals", "mean_return", "median_return", "hit_rate",
+                                      "mean_drawdown", "worst_drawdown"])
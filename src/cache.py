@@ -0,0 +1,247 @@
+# src/cache.py
+from __future__ import annotations
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.models import FundamentalsColumns, FundamentalsQuarter, OHLCV_FIELDS
+
+FUND_COLUMNS = ["total_debt", "cash", "shares_out", "book_value", "revenue", "ebitda"]
+PRICE_COLUMNS = OHLCV_FIELDS
+_DEFAULT = object()  # "use the cache's TTL for this kind"
+
+
+def cache_key(*parts: Any) -> str:
+    """Content address for a request: sha1 over the normalized key parts."""
+    return hashlib.sha1(json.dumps([str(p) for p in parts]).encode("utf-8")).hexdigest()
+
+
+class DataCache:
+    """On-disk cache of fetched series with per-entry TTL and size-bounded LRU eviction.
+
+    Each entry is a directory of ``.npy`` column files plus ``meta.json``; columns
+    are memory-mapped back on read, so a hit costs no parsing. The meta file's
+    mtime is the entry's last access time for LRU. The first write scans the
+    entries once into an in-memory LRU index; after that, gets and puts keep it
+    current, so eviction never rescans the directory.
+    """
+
+    def __init__(self, root: str, ttl_prices: Optional[float] = 12 * 3600,
+                 ttl_fundamentals: Optional[float] = 92 * 86400,
+                 max_bytes: int = 512 * 1024 * 1024, offline: bool = False):
+        self.root = root
+        self.ttl_prices = ttl_prices
+        self.ttl_fundamentals = ttl_fundamentals
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._total = 0
+        self._index: Optional["OrderedDict[str, int]"] = None  # entry path -> bytes, least recent first
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> Optional["DataCache"]:
+        c = (cfg or {}).get("cache")
+        if not c:
+            return None
+        if c is True:
+            c = {}
+
+        def _secs(key: str, scale: float, default: float) -> Optional[float]:
+            v = c.get(key, default)
+            return None if v is None else float(v) * scale
+
+        return cls(
+            root=c.get("dir", "data/cache"),
+            ttl_prices=_secs("ttl_prices_hours", 3600, 12),
+            ttl_fundamentals=_secs("ttl_fundamentals_days", 86400, 92),
+            max_bytes=int(float(c.get("max_mb", 512)) * 1024 * 1024),
+            offline=bool(c.get("offline", False)),
+        )
+
+    # -- generic column store -------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._path(key)
+        meta_path = os.path.join(path, "meta.json")
+        cols = None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            expires = meta.get("expires_at")
+            if expires is None or time.time() <= expires:
+                # np.load parses each header with ast.literal_eval, which CPython 3.11 can fail with a
+                # SystemError when threads parse at once; mapping a file is cheap, so open them one at a time
+                with self._load_lock:
+                    cols = {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r") for c in meta["columns"]}
+                os.utime(meta_path)  # LRU touch
+        except (OSError, ValueError, KeyError):
+            cols = None
+        # Fetch threads share the cache, so the counters move under the lock with the LRU index
+        with self._lock:
+            if cols is None:
+                self.misses += 1
+                return None
+            if self._index is not None and path in self._index:
+                self._index.move_to_end(path)
+            self.hits += 1
+        return cols
+
+    def put(self, key: str, columns: Dict[str, np.ndarray], ttl: Optional[float],
+            info: Optional[Dict[str, Any]] = None):
+        parent = os.path.join(self.root, key[:2])
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+        size = 0
+        for name, arr in columns.items():
+            fp = os.path.join(tmp, f"{name}.npy")
+            np.save(fp, np.ascontiguousarray(arr))
+            size += os.path.getsize(fp)
+        meta = {
+            "columns": list(columns),
+            "created_at": time.time(),
+            "expires_at": None if ttl is None else time.time() + ttl,
+            "bytes": size,
+            **(info or {}),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        path = self._path(key)
+        with self._lock:
+            index = self._lru_locked()
+            old = index.pop(path, None)
+            if old is not None or os.path.isdir(path):  # the latter written by another process
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+            index[path] = size
+            self._total += size - (old or 0)
+            self._evict_locked()
+
+    def _entry_bytes(self, path: str) -> Optional[int]:
+        try:
+            with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                return int(json.load(f).get("bytes", 0))
+        except (OSError, ValueError):
+            return None
+
+    def _entries(self) -> List[tuple]:
+        out = []
+        for shard in os.listdir(self.root):
+            sdir = os.path.join(self.root, shard)
+            if not os.path.isdir(sdir):
+                continue
+            for key in os.listdir(sdir):
+                path = os.path.join(sdir, key)
+                if key.startswith(".tmp-"):
+                    continue
+                size = self._entry_bytes(path)
+                if size is None:
+                    continue
+                out.append((os.path.getmtime(os.path.join(path, "meta.json")), size, path))
+        return out
+
+    def _lru_locked(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            self._index = OrderedDict((path, size) for _, size, path in sorted(self._entries()))
+            self._total = sum(self._index.values())
+        return self._index
+
+    def _evict_locked(self):
+        index = self._lru_locked()
+        while self._total > self.max_bytes and index:
+            path, size = index.popitem(last=False)
+            shutil.rmtree(path, ignore_errors=True)
+            self._total -= size
+            logging.debug(f"cache: evicted {os.path.basename(path)} ({size} bytes)")
+
+    # -- typed helpers --------------------------------------------------------
+
+    def get_prices(self, ticker: str, period: str, auto_adjust: bool = True) -> Optional[pd.DataFrame]:
+        cols = self.get(cache_key("prices", ticker.upper(), period, auto_adjust))
+        if cols is None:
+            return None
+        # Entries written before OHLCV was kept hold only `close`
+        return pd.DataFrame({"date": cols["date"].astype("datetime64[ns]"),
+                             **{f: cols[f] for f in PRICE_COLUMNS if f in cols}})
+
+    def put_prices(self, ticker: str, period: str, df: pd.DataFrame, auto_adjust: bool = True,
+                   ttl: Any = _DEFAULT):
+        self.put(
+            cache_key("prices", ticker.upper(), period, auto_adjust),
+            {
+                "date": pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[D]"),
+                **{f: pd.to_numeric(df[f]).to_numpy(dtype=np.float64, na_value=np.nan)
+                   for f in PRICE_COLUMNS if f in df.columns},
+            },
+            ttl=self.ttl_prices if ttl is _DEFAULT else ttl,
+            info={"kind": "prices", "ticker": ticker.upper(), "period": period},
+        )
+
+    def get_fundamentals(self, ticker: str) -> Optional[FundamentalsColumns]:
+        cols = self.get(cache_key("fundamentals", ticker.upper()))
+        if cols is None:
+            return None
+        # Entries written before revenue/ebitda were stored come back with those as NaN
+        return FundamentalsColumns(cols["period_end"].astype("datetime64[D]").astype(np.int64),
+                                   {c: cols[c] for c in FUND_COLUMNS if c in cols})
+
+    def put_fundamentals(self, ticker: str, rows: Sequence[FundamentalsQuarter], ttl: Any = _DEFAULT):
+        """Store quarters (models or FundamentalsColumns) under `ticker`."""
+        rows = FundamentalsColumns.from_quarters(rows)
+        cols: Dict[str, np.ndarray] = {"period_end": rows.period_end.astype("datetime64[D]"),
+                                       **{c: rows.values[c] for c in FUND_COLUMNS}}
+        self.put(
+            cache_key("fundamentals", ticker.upper()), cols,
+            ttl=self.ttl_fundamentals if ttl is _DEFAULT else ttl,
+            info={"kind": "fundamentals", "ticker": ticker.upper()},
+        )
+
+
+def _read_table(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return df
+
+
+def seed_from_file(cache: DataCache, path: str, kind: str = "prices", ticker: Optional[str] = None,
+                   period: str = "5y"):
+    """Load a CSV (prices: date, close; fundamentals: period_end + FUND_COLUMNS) into the
+    cache without expiry, so the pipeline can run offline. The ticker defaults to the file stem."""
+    ticker = ticker or os.path.splitext(os.path.basename(path))[0]
+    df = _read_table(path)
+    if kind == "prices":
+        close_col = "close" if "close" in df.columns else next((c for c in df.columns if "close" in c), None)
+        if "date" not in df.columns or close_col is None:
+            raise KeyError(f"Expected columns 'date' and 'close' in {path}, found: {df.columns.tolist()}")
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        df = df.dropna(subset=["date", close_col]).sort_values("date").reset_index(drop=True)
+        cache.put_prices(ticker, period, df.rename(columns={close_col: "close"}), ttl=None)
+    elif kind == "fundamentals":
+        rows = [
+            FundamentalsQuarter(
+                period_end=pd.to_datetime(r["period_end"]).date(),
+                **{c: (None if c not in df.columns or pd.isna(r[c]) else float(r[c])) for c in FUND_COLUMNS},
+            )
+            for _, r in df.iterrows()
+        ]
+        cache.put_fundamentals(ticker, rows, ttl=None)
+    else:
+        raise ValueError(f"Unknown cache kind: {kind}")
+    return ticker
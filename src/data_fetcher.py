@@ -1,110 +1,292 @@
 from __future__ import annotations
+import logging
+from dataclasses import dataclass
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from typing import List
-from src.models import RawBundle, PriceRow, FundamentalsQuarter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from src.models import (ArrayBundle, FundamentalsColumns, FundamentalsQuarter, OHLCV_FIELDS, PriceColumns,
+                        validate_price_columns, validate_price_frame)
+from src.cache import DataCache
+from src.fundamentals import FundamentalsStore, download_fundamentals
+from src.retry import retry_call
+from src.lazy import lazy_import
+
+# yfinance (and its HTTP stack) loads on the first download, so cached runs never import it
+yf = lazy_import("yfinance")
+
+# Optional on-disk cache shared by all fetches in this process (see set_cache)
+_cache: Optional[DataCache] = None
+
+def set_cache(cache: Optional[DataCache]):
+    global _cache
+    _cache = cache
+
+def get_cache() -> Optional[DataCache]:
+    return _cache
+
+# Optional stored fundamentals (src.fundamentals) that fetch_fundamentals_q reads instead (see set_fundamentals)
+_fundamentals: Optional[FundamentalsStore] = None
+
+def set_fundamentals(store: Optional[FundamentalsStore]):
+    global _fundamentals
+    _fundamentals = store
+
+def get_fundamentals() -> Optional[FundamentalsStore]:
+    return _fundamentals
 
 def _retry(fn, tries: int = 3):
-    last = None
-    for _ in range(tries):
-        try:
-            return fn()
-        except Exception as e:
-            last = e
-    if last:
-        raise last
+    # Backoff with jitter on transient errors only; permanent ones raise at once
+    return retry_call(fn, tries=tries)
+
+def fetch_prices(ticker: str, period: str = "5y", start: Optional[str] = None) -> pd.DataFrame:
+    """Daily closes; with `start` (YYYY-MM-DD, inclusive) only that range is downloaded.
 
-def fetch_prices(ticker: str, period: str = "5y") -> pd.DataFrame:
-    def _call():
+    When a cache is set, a fresh cached `period` series is served instead (sliced
+    from `start`), and full-period downloads are stored back.
+    """
+    cache = _cache
+    if cache is not None:
+        hit = cache.get_prices(ticker, period)
+        if hit is not None:
+            return hit if start is None else hit[hit["date"] >= pd.Timestamp(start)].reset_index(drop=True)
+        if cache.offline:
+            raise RuntimeError(f"No cached price data for {ticker} ({period}) and cache is offline.")
+
+    df = _retry(lambda: download_prices(ticker, period, start), tries=3)
+    if cache is not None and start is None and not df.empty:
+        cache.put_prices(ticker, period, df)
+    return df
+
+def download_prices(ticker: str, period: str = "5y", start: Optional[str] = None) -> pd.DataFrame:
+    """One uncached yfinance download as a (date, open, high, low, close, volume) frame.
+
+    Only `close` is required; fields missing from the download are left out.
+    """
+    if start is not None:
+        df = yf.download(ticker, start=start, auto_adjust=True, progress=False)
+    else:
         df = yf.download(ticker, period=period, auto_adjust=True, progress=False)
-        if df is None or df.empty:
-            return pd.DataFrame(columns=["date", "close"])
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["date", "close"])
+
+    df = df.copy()
+
+    # Flatten MultiIndex columns
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [
+            "_".join([str(c) for c in col if c is not None]).strip() or "unnamed"
+            for col in df.columns
+        ]
+
+    # Reset index if it's a DatetimeIndex
+    if isinstance(df.index, pd.DatetimeIndex):
+        df.index.name = "date"
+        df = df.reset_index()
+
+    # Normalize column names
+    df.columns = [str(c).lower() for c in df.columns]
+
+    # Find the OHLCV columns ("close" or flattened "close_nvda")
+    fields = {f: next((c for c in df.columns if c == f or c.startswith(f + "_")), None) for f in OHLCV_FIELDS}
+    if fields["close"] is None:
+        fields["close"] = next((c for c in df.columns if "close" in c), None)
+    if "date" not in df.columns or fields["close"] is None:
+        raise KeyError(f"Expected columns 'date' and 'close', found: {df.columns.tolist()}")
+
+    # Keep only date and OHLCV
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.dropna(subset=["date", fields["close"]]).sort_values("date").reset_index(drop=True)
+    df = df.rename(columns={c: f for f, c in fields.items() if c is not None})
+    return df[["date"] + [f for f in OHLCV_FIELDS if fields[f] is not None]]
 
-        df = df.copy()
 
-        # Flatten MultiIndex columns
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = [
-                "_".join([str(c) for c in col if c is not None]).strip() or "unnamed"
-                for col in df.columns
-            ]
+@dataclass
+class PriceArrays:
+    """One ticker's prices as arrays; usually views into a chunk's shared blocks."""
+    ticker: str
+    dates: np.ndarray  # datetime64, ascending
+    close: np.ndarray  # float64
+    open: Optional[np.ndarray] = None   # float64, like high/low/volume; None when not downloaded
+    high: Optional[np.ndarray] = None
+    low: Optional[np.ndarray] = None
+    volume: Optional[np.ndarray] = None
 
-        # Reset index if it's a DatetimeIndex
-        if isinstance(df.index, pd.DatetimeIndex):
-            df.index.name = "date"
-            df = df.reset_index()
+    def fields(self) -> Dict[str, np.ndarray]:
+        """The OHLCV arrays that are present."""
+        return {f: getattr(self, f) for f in OHLCV_FIELDS if getattr(self, f) is not None}
 
-        # Normalize column names
-        df.columns = [str(c).lower() for c in df.columns]
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"date": self.dates, **self.fields()}, copy=False)
 
-        # Find the 'close' column
-        close_col = next((c for c in df.columns if "close" in c), None)
-        if "date" not in df.columns or close_col is None:
-            raise KeyError(f"Expected columns 'date' and 'close', found: {df.columns.tolist()}")
 
-        # Keep only date and close
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date", close_col]).sort_values("date").reset_index(drop=True)
-        df.rename(columns={close_col: "close"}, inplace=True)
-        return df[["date", "close"]]
+# download(tickers, period) -> yf.download-shaped frame (Price x Ticker columns)
+Download = Callable[[List[str], str], pd.DataFrame]
 
-    return _retry(_call, tries=3)
+def _yf_download(tickers: List[str], period: str) -> pd.DataFrame:
+    return yf.download(tickers, period=period, auto_adjust=True, progress=False,
+                       group_by="column", threads=True)
 
+def _field_block(df: Optional[pd.DataFrame], tickers: Sequence[str], field: str = "Close") -> pd.DataFrame:
+    """The (days x tickers) `field` block of a single- or multi-symbol download (empty if absent)."""
+    if df is None or df.empty:
+        return pd.DataFrame()
+    if isinstance(df.columns, pd.MultiIndex):
+        for level in range(df.columns.nlevels):
+            if field in df.columns.get_level_values(level):
+                return df.xs(field, axis=1, level=level)
+    elif field in df.columns and len(tickers) == 1:
+        return df[[field]].set_axis(list(tickers), axis=1)
+    if field == "Close":
+        raise KeyError(f"No Close column in download: {df.columns.tolist()[:5]}")
+    return pd.DataFrame()
 
-def fetch_fundamentals_q(ticker: str) -> List[FundamentalsQuarter]:
+def _transposed(block: pd.DataFrame, order: Optional[np.ndarray]) -> np.ndarray:
+    arr = block.to_numpy(dtype=np.float64).T
+    return np.ascontiguousarray(arr if order is None else arr[:, order])
+
+def split_closes(df: Optional[pd.DataFrame], tickers: Sequence[str]) -> Dict[str, PriceArrays]:
+    """Per-ticker arrays from a wide download.
+
+    The Close block is transposed once into a contiguous (tickers x days)
+    array; each ticker gets views of its row and of the shared dates, trimmed
+    to its first..last traded day. Only tickers with gaps inside that range
+    (e.g. mixed exchange holidays) get a filtered copy. Open/High/Low/Volume
+    blocks, when downloaded, are split the same way, on the Close days.
+    """
+    close = _field_block(df, tickers)
+    if close.empty:
+        return {}
+    idx = pd.DatetimeIndex(close.index)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    order = None if idx.is_monotonic_increasing else np.argsort(idx.to_numpy(), kind="stable")
+    dates = idx.to_numpy() if order is None else idx.to_numpy()[order]
+    block = _transposed(close, order)
+    valid = ~np.isnan(block)
+    extra = {}
+    for f in ("open", "high", "low", "volume"):
+        b = _field_block(df, tickers, f.capitalize())
+        if not b.empty:
+            extra[f] = _transposed(b.reindex(columns=close.columns), order)
+
+    out: Dict[str, PriceArrays] = {}
+    for j, t in enumerate(close.columns):
+        pos = np.flatnonzero(valid[j])
+        if pos.size == 0:
+            continue
+        lo, hi = pos[0], pos[-1] + 1
+        rows = slice(lo, hi) if hi - lo == pos.size else valid[j]
+        out[str(t)] = PriceArrays(str(t), dates[rows], block[j, rows], **{f: b[j, rows] for f, b in extra.items()})
+    return out
+
+def fetch_price_chunk(tickers: Sequence[str], period: str = "5y", retries: int = 2,
+                      download: Optional[Download] = None) -> Tuple[Dict[str, PriceArrays], Dict[str, str]]:
+    """Closes for several tickers in one download call.
+
+    Returns (arrays by ticker, error by ticker). Symbols missing from a
+    response are retried together, up to `retries` more calls; symbols that
+    came back are never downloaded again. Cache hits skip the download and
+    downloads are stored back, as in `fetch_prices`.
+    """
+    download = download or _yf_download
+    cache = _cache
+    got: Dict[str, PriceArrays] = {}
+    errors: Dict[str, str] = {}
+    todo: List[str] = []
+    for t in dict.fromkeys(tickers):
+        hit = cache.get_prices(t, period) if cache is not None else None
+        if hit is not None:
+            got[t] = PriceArrays(t, hit["date"].to_numpy(),
+                                 **{f: hit[f].to_numpy(dtype=np.float64) for f in OHLCV_FIELDS if f in hit.columns})
+        elif cache is not None and cache.offline:
+            errors[t] = f"No cached price data for {t} ({period}) and cache is offline."
+        else:
+            todo.append(t)
+
+    for attempt in range(retries + 1):
+        if not todo:
+            break
+        try:
+            arrays = split_closes(download(list(todo), period), todo)
+        except Exception as e:
+            logging.warning(f"Download of {len(todo)} symbols failed (attempt {attempt + 1}): {e}")
+            arrays, last_error = {}, str(e)
+        else:
+            last_error = None
+        for t in todo:
+            if t in arrays:
+                got[t] = arrays[t]
+                if cache is not None:
+                    cache.put_prices(t, period, arrays[t].frame())
+        todo = [t for t in todo if t not in arrays]
+        for t in todo:
+            errors[t] = last_error or f"No price data for {t}. Check symbol/network."
+    for t in got:
+        errors.pop(t, None)
+    return got, errors
+
+def fetch_prices_batch(tickers: Sequence[str], period: str = "5y", chunk_size: int = 100, retries: int = 2,
+                       download: Optional[Download] = None) -> Tuple[Dict[str, PriceArrays], Dict[str, str]]:
+    """`fetch_price_chunk` over `chunk_size`-symbol chunks."""
+    tickers = list(dict.fromkeys(tickers))
+    got: Dict[str, PriceArrays] = {}
+    errors: Dict[str, str] = {}
+    for i in range(0, len(tickers), max(1, chunk_size)):
+        g, e = fetch_price_chunk(tickers[i:i + chunk_size], period, retries, download)
+        got.update(g)
+        errors.update(e)
+    return got, errors
+
+def fetch_fundamentals_q(ticker: str) -> FundamentalsColumns:
+    """Quarterly fundamentals: from the stored table when a store is set, else the data cache or yfinance."""
+    store = _fundamentals
+    if store is not None:
+        return store.get(ticker)
+    cache = _cache
+    if cache is not None:
+        hit = cache.get_fundamentals(ticker)
+        if hit is not None:
+            return hit
+        if cache.offline:
+            return FundamentalsColumns(np.empty(0, dtype=np.int64))
     try:
-        t = yf.Ticker(ticker)
-        qb = t.quarterly_balance_sheet
-        ab = t.balance_sheet
-        info = getattr(t, "info", {}) or {}
-        shares = info.get("sharesOutstanding") or info.get("floatShares")
-
-        src = qb if isinstance(qb, pd.DataFrame) and not qb.empty else ab
-        rows: List[FundamentalsQuarter] = []
-
-        if isinstance(src, pd.DataFrame) and not src.empty:
-            df = src.copy()
-            df.index = df.index.astype(str).str.lower()
-            for c in df.columns:
-                try:
-                    pe = pd.to_datetime(c).date()
-                except Exception:
-                    continue
-
-                def pick(keys):
-                    for k in keys:
-                        if k in df.index:
-                            v = df.loc[k, c]
-                            return float(v) if pd.notna(v) else None
-                    return None
-
-                total_debt = pick(["totaldebt", "total debt", "total debt net"])
-                cash = pick(["cash", "cashandcashequivalents", "cash and cash equivalents"])
-                book_value = pick(["totalstockholdersequity", "total stockholder equity", "total equity"])
-                rows.append(FundamentalsQuarter(
-                    period_end=pe,
-                    total_debt=total_debt,
-                    cash=cash,
-                    shares_out=float(shares) if shares else None,
-                    book_value=book_value,
-                ))
-        return rows
-    except Exception:
-        return []
-
-def fetch_raw_bundle(ticker: str, period: str = "5y") -> RawBundle:
-    prices_df = fetch_prices(ticker, period=period)
-    if prices_df.empty:
-        raise RuntimeError(f"No price data for {ticker}. Check symbol/network.")
+        cols = download_fundamentals(ticker)
+    except Exception as e:
+        # Prices are still usable without fundamentals; the async fetcher reports these as errors
+        logging.warning(f"{ticker}: fundamentals fetch failed: {type(e).__name__}: {e}")
+        return FundamentalsColumns(np.empty(0, dtype=np.int64))
+    if cache is not None:
+        cache.put_fundamentals(ticker, cols)
+    return cols
 
+def bundle_from_prices(ticker: str, prices_df: pd.DataFrame,
+                       fundamentals_q: Optional[List[FundamentalsQuarter]] = None) -> ArrayBundle:
+    """Validate a (date, close) frame into an ArrayBundle, fetching fundamentals if not given."""
     # Ensure 'date' exists
     if "date" not in prices_df.columns:
         raise KeyError(f"'date' column missing from prices DataFrame for {ticker}")
 
-    prices: List[PriceRow] = [
-        PriceRow(date=pd.to_datetime(r["date"]).date(), close=float(r["close"]))
-        for _, r in prices_df.iterrows()
-    ]
+    # Checked column-wise and kept as arrays, so no per-row objects are built
+    prices = PriceColumns.from_frame(validate_price_frame(prices_df))
+
+    if fundamentals_q is None:
+        fundamentals_q = fetch_fundamentals_q(ticker)
+    return ArrayBundle(ticker, prices, FundamentalsColumns.from_quarters(fundamentals_q))
 
-    fundamentals_q = fetch_fundamentals_q(ticker)
-    return RawBundle(ticker=ticker, prices=prices, fundamentals_q=fundamentals_q)
+def bundle_from_arrays(prices: PriceArrays,
+                       fundamentals_q: Optional[List[FundamentalsQuarter]] = None) -> ArrayBundle:
+    """`bundle_from_prices` for arrays from a batched download, without a DataFrame round trip."""
+    if len(prices.close) == 0:
+        raise RuntimeError(f"No price data for {prices.ticker}. Check symbol/network.")
+    day = np.asarray(prices.dates).astype("datetime64[D]").astype(np.int64)
+    fields = {f: v for f, v in prices.fields().items() if f == "close" or not np.isnan(v).all()}
+    cols = validate_price_columns(PriceColumns(day, **fields))
+    if fundamentals_q is None:
+        fundamentals_q = fetch_fundamentals_q(prices.ticker)
+    return ArrayBundle(prices.ticker, cols, FundamentalsColumns.from_quarters(fundamentals_q))
+
+def fetch_raw_bundle(ticker: str, period: str = "5y") -> ArrayBundle:
+    prices_df = fetch_prices(ticker, period=period)
+    if prices_df.empty:
+        raise RuntimeError(f"No price data for {ticker}. Check symbol/network.")
+    return bundle_from_prices(ticker, prices_df)
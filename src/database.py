@@ -1,120 +1,545 @@
 # src/database.py
-from typing import Iterable, List, Dict, Any
+import json
+import logging
+import re
+import weakref
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, event, text, inspect
 
-def get_engine(db_path: str):
-    return create_engine(f"sqlite:///{db_path}", future=True)
+from src.models import FUNDAMENTAL_FIELDS, OHLCV_FIELDS, FundamentalsColumns, PriceColumns, to_days
 
-def init_schema(engine):
-    """Create tables if they don't exist."""
-    with engine.begin() as conn:
-        conn.execute(text("""
-        CREATE TABLE IF NOT EXISTS tickers(
-          id INTEGER PRIMARY KEY,
-          symbol TEXT UNIQUE
-        );
-        """))
-
-        conn.execute(text("""
-        CREATE TABLE IF NOT EXISTS daily_metrics(
-          symbol TEXT,
-          date TEXT,
-          close REAL,
-          sma50 REAL,
-          sma200 REAL,
-          high_52w REAL,
-          bvps REAL,
-          pb REAL,
-          ev REAL,
-          pct_from_52w_high REAL,
-          is_52w_high INTEGER,
-          UNIQUE(symbol,date)
-        );
-        """))
-
-        conn.execute(text("""
-        CREATE TABLE IF NOT EXISTS signal_events(
-          symbol TEXT,
-          date TEXT,
-          type TEXT,
-          UNIQUE(symbol,date,type)
-        );
-        """))
-
-def add_missing_columns(engine, table: str, columns: Dict[str, str]):
-    """Automatically add missing columns to a table."""
+DAILY_COLUMNS = ["close", "sma50", "sma200", "high_52w", "bvps", "pb", "ev", "pct_from_52w_high", "is_52w_high"]
+
+# Storage layout version, kept in PRAGMA user_version.
+#   0/1: daily_metrics/signal_events as TEXT-keyed rowid tables
+#   2:   WITHOUT ROWID `metrics`/`signals` keyed by (tickers.id, day number);
+#        daily_metrics/signal_events are read-only views over them
+#   3:   WITHOUT ROWID `prices` (raw OHLCV, same key) so metrics can be rebuilt offline
+#   4:   `fingerprints` (symbol id, stage) -> digest of the inputs/config/code a stage last ran with
+#   5:   latest_days.rev, bumped by every metrics/signals write for the symbol, so readers can
+#        invalidate cached symbols (src.query); index on signals(day) for universe-wide recent signals
+#   6:   WITHOUT ROWID `fundamentals` (symbol id, period-end day) and `fundamentals_meta` (when a
+#        symbol's statements were fetched and are next due), so runs only refetch due symbols
+SCHEMA_VERSION = 6
+
+# Applied on every new connection; override per key via the `sqlite:` config section.
+# WAL lets screens/dashboards read while the nightly writer commits.
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,        # negative = KiB, i.e. 64 MiB
+    "mmap_size": 268435456,      # 256 MiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,        # ms
+}
+_PRAGMA_VALUE = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+# Per-engine caches so schema checks and symbol lookups run once, not per upsert
+_known_columns = weakref.WeakKeyDictionary()
+_symbol_ids = weakref.WeakKeyDictionary()
+# Symbols a connection's open transaction inserted into `tickers`; dropped from the id cache on rollback
+_pending_ids = weakref.WeakKeyDictionary()
+
+def get_engine(db_path: str, pragmas: Optional[Dict[str, Any]] = None):
+    """SQLite engine with `DEFAULT_PRAGMAS` (updated by `pragmas`) set on each connection."""
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+    for key, val in settings.items():
+        if key not in DEFAULT_PRAGMAS or not _PRAGMA_VALUE.match(str(val)):
+            raise ValueError(f"Unsupported sqlite pragma {key}={val!r}")
+    engine = create_engine(f"sqlite:///{db_path}", future=True)
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for key, val in settings.items():
+            cur.execute(f"PRAGMA {key}={val}")
+        cur.close()
+
+    return engine
+
+def from_days(days) -> pd.Series:
+    return pd.Series(pd.to_datetime(np.asarray(days, dtype=np.int64), unit="D"))
+
+def _schema_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar_one()
+
+def _object_type(conn, name: str) -> Optional[str]:
+    row = conn.exec_driver_sql("SELECT type FROM sqlite_master WHERE name=?", (name,)).first()
+    return row[0] if row else None
+
+def _metric_columns(conn) -> List[Tuple[str, str]]:
+    """(name, type) of the value columns in `metrics`, in table order."""
+    rows = conn.exec_driver_sql("PRAGMA table_info(metrics)").all()
+    return [(r[1], r[2]) for r in rows if r[1] not in ("symbol_id", "day")]
+
+def _create_views(conn):
+    """(Re)create the TEXT-keyed compatibility views; run after `metrics` gains columns."""
+    cols = "".join(f", m.{c}" for c, _ in _metric_columns(conn))
+    conn.exec_driver_sql("DROP VIEW IF EXISTS daily_metrics")
+    conn.exec_driver_sql(f"""
+    CREATE VIEW daily_metrics AS
+    SELECT t.symbol AS symbol, date(m.day * 86400, 'unixepoch') AS date{cols}
+    FROM metrics m JOIN tickers t ON t.id = m.symbol_id
+    """)
+    conn.exec_driver_sql("DROP VIEW IF EXISTS signal_events")
+    conn.exec_driver_sql("""
+    CREATE VIEW signal_events AS
+    SELECT t.symbol AS symbol, date(s.day * 86400, 'unixepoch') AS date, s.type AS type
+    FROM signals s JOIN tickers t ON t.id = s.symbol_id
+    """)
+
+def _create_tables(conn):
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS tickers(
+      id INTEGER PRIMARY KEY,
+      symbol TEXT UNIQUE
+    );
+    """)
+    # WITHOUT ROWID: the (symbol_id, day) key is the table, no separate UNIQUE index
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS metrics(
+      symbol_id INTEGER NOT NULL REFERENCES tickers(id),
+      day INTEGER NOT NULL,
+      close REAL,
+      sma50 REAL,
+      sma200 REAL,
+      high_52w REAL,
+      bvps REAL,
+      pb REAL,
+      ev REAL,
+      pct_from_52w_high REAL,
+      is_52w_high INTEGER,
+      PRIMARY KEY(symbol_id, day)
+    ) WITHOUT ROWID;
+    """)
+    # Keyed for "has <type> happened for this symbol since <day>" probes
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS signals(
+      symbol_id INTEGER NOT NULL REFERENCES tickers(id),
+      type TEXT NOT NULL,
+      day INTEGER NOT NULL,
+      PRIMARY KEY(symbol_id, type, day)
+    ) WITHOUT ROWID;
+    """)
+    # Latest stored day per symbol, so screens read one row per symbol by key
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS latest_days(
+      symbol_id INTEGER PRIMARY KEY REFERENCES tickers(id),
+      day INTEGER NOT NULL,
+      rev INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    if "rev" not in {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(latest_days)").all()}:
+        conn.exec_driver_sql("ALTER TABLE latest_days ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+    # Raw daily OHLCV, apart from the derived metrics; NULL where a field wasn't downloaded
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS prices(
+      symbol_id INTEGER NOT NULL REFERENCES tickers(id),
+      day INTEGER NOT NULL,
+      open REAL,
+      high REAL,
+      low REAL,
+      close REAL NOT NULL,
+      volume INTEGER,
+      PRIMARY KEY(symbol_id, day)
+    ) WITHOUT ROWID;
+    """)
+    # What each stage last completed with, so unchanged tickers can be skipped (see src.fingerprint)
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS fingerprints(
+      symbol_id INTEGER NOT NULL REFERENCES tickers(id),
+      stage TEXT NOT NULL,
+      digest TEXT NOT NULL,
+      PRIMARY KEY(symbol_id, stage)
+    ) WITHOUT ROWID;
+    """)
+    # Quarterly statements, kept across fetches (a download only returns the last few quarters)
+    conn.exec_driver_sql(f"""
+    CREATE TABLE IF NOT EXISTS fundamentals(
+      symbol_id INTEGER NOT NULL REFERENCES tickers(id),
+      period_end INTEGER NOT NULL,
+      {"".join(f"{c} REAL, " for c in FUNDAMENTAL_FIELDS)}
+      PRIMARY KEY(symbol_id, period_end)
+    ) WITHOUT ROWID;
+    """)
+    conn.exec_driver_sql("""
+    CREATE TABLE IF NOT EXISTS fundamentals_meta(
+      symbol_id INTEGER PRIMARY KEY REFERENCES tickers(id),
+      fetched_at REAL,
+      due_at REAL NOT NULL,
+      error TEXT
+    );
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_metrics_day ON metrics(day)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_signals_type_day ON signals(type, day)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_signals_day ON signals(day)")
+
+def _migrate_legacy(conn):
+    """Copy TEXT-keyed daily_metrics/signal_events tables into the v2 layout and drop them."""
+    legacy = [(r[1], r[2] or "REAL") for r in conn.exec_driver_sql("PRAGMA table_info(daily_metrics)").all()]
+    legacy_cols = [c for c, _ in legacy if c not in ("symbol", "date")]
+    known = {c for c, _ in _metric_columns(conn)}
+    for col, col_type in legacy:
+        if col not in ("symbol", "date") and col not in known:
+            conn.exec_driver_sql(f"ALTER TABLE metrics ADD COLUMN {col} {col_type}")
+
+    has_signals = _object_type(conn, "signal_events") == "table"
+    conn.exec_driver_sql("INSERT OR IGNORE INTO tickers(symbol) SELECT DISTINCT symbol FROM daily_metrics")
+    if has_signals:
+        conn.exec_driver_sql("INSERT OR IGNORE INTO tickers(symbol) SELECT DISTINCT symbol FROM signal_events")
+
+    day = "CAST(julianday(date(d.date)) - 2440587.5 AS INTEGER)"
+    names = "".join(f", {c}" for c in legacy_cols)
+    values = "".join(f", d.{c}" for c in legacy_cols)
+    conn.exec_driver_sql(f"""
+    INSERT OR REPLACE INTO metrics(symbol_id, day{names})
+    SELECT t.id, {day}{values}
+    FROM daily_metrics d JOIN tickers t ON t.symbol = d.symbol
+    WHERE date(d.date) IS NOT NULL
+    """)
+    if has_signals:
+        conn.exec_driver_sql(f"""
+        INSERT OR IGNORE INTO signals(symbol_id, type, day)
+        SELECT t.id, d.type, {day}
+        FROM signal_events d JOIN tickers t ON t.symbol = d.symbol
+        WHERE date(d.date) IS NOT NULL
+        """)
+        conn.exec_driver_sql("DROP TABLE signal_events")
+    conn.exec_driver_sql("DROP TABLE daily_metrics")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS latest_dates")
+
+def init_schema(engine, vacuum: bool = True):
+    """Create tables if they don't exist, migrating older layouts to `SCHEMA_VERSION`.
+
+    A migration runs in one transaction and is followed by VACUUM (unless
+    `vacuum=False`) so the file shrinks to the new layout.
+    """
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if _schema_version(conn) >= SCHEMA_VERSION and _object_type(conn, "metrics") == "table":
+            return
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            _create_tables(conn)
+            migrated = _object_type(conn, "daily_metrics") == "table"
+            if migrated:
+                _migrate_legacy(conn)
+            _create_views(conn)
+            # Backfill for databases written before latest_days existed
+            conn.exec_driver_sql("""
+            INSERT OR IGNORE INTO latest_days(symbol_id, day)
+            SELECT symbol_id, MAX(day) FROM metrics GROUP BY symbol_id
+            """)
+            conn.exec_driver_sql(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.exec_driver_sql("COMMIT")
+        except Exception:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        if migrated:
+            logging.info(f"Migrated {engine.url.database} to schema v{SCHEMA_VERSION}")
+            if vacuum:
+                conn.exec_driver_sql("VACUUM")
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    _known_columns.pop(engine, None)
+
+def add_missing_columns(engine, table: str, columns: Dict[str, str]) -> List[str]:
+    """Automatically add missing columns to a table (inspected once per engine).
+
+    Returns the columns that were added; new `metrics` columns also show up in
+    the `daily_metrics` view.
+    """
+    known = _known_columns.setdefault(engine, {})
+    existing = known.get(table)
+    if existing is not None and all(col in existing for col in columns):
+        return []
     inspector = inspect(engine)
-    existing = [col["name"] for col in inspector.get_columns(table)]
+    existing = {col["name"] for col in inspector.get_columns(table)}
+    added = []
     with engine.begin() as conn:
         for col, col_type in columns.items():
             if col not in existing:
                 conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
+                existing.add(col)
+                added.append(col)
+        if added and table == "metrics":
+            _create_views(conn)
+    known[table] = existing
+    return added
 
-def upsert_ticker(engine, symbol: str):
+def _ids_committed(conn):
+    _pending_ids.pop(conn, None)
+
+def _ids_rolled_back(conn):
+    ids = _symbol_ids.get(conn.engine, {})
+    for symbol in _pending_ids.pop(conn, ()):
+        ids.pop(symbol, None)
+
+def _symbol_id(conn, engine, symbol: str) -> int:
+    ids = _symbol_ids.get(engine)
+    if ids is None:
+        ids = _symbol_ids[engine] = {}
+        # An id inserted by a transaction that rolls back never existed, so it mustn't stay cached
+        event.listen(engine, "commit", _ids_committed)
+        event.listen(engine, "rollback", _ids_rolled_back)
+    if symbol not in ids:
+        if conn.exec_driver_sql("INSERT OR IGNORE INTO tickers(symbol) VALUES(?)", (symbol,)).rowcount:
+            _pending_ids.setdefault(conn, []).append(symbol)
+        ids[symbol] = conn.exec_driver_sql("SELECT id FROM tickers WHERE symbol=?", (symbol,)).scalar_one()
+    return ids[symbol]
+
+def symbol_id(engine, symbol: str) -> int:
+    """`tickers.id` for a symbol, registering it if new."""
     with engine.begin() as conn:
-        conn.execute(text("INSERT OR IGNORE INTO tickers(symbol) VALUES(:s)"), {"s": symbol})
+        return _symbol_id(conn, engine, symbol)
 
-def _to_scalar(v):
-    if isinstance(v, (list, tuple)):
-        return v[0] if v else None
-    if hasattr(v, "item"):
-        try:
-            return v.item()
-        except Exception:
-            pass
-    return None if pd.isna(v) else v
+def upsert_ticker(engine, symbol: str):
+    symbol_id(engine, symbol)
+
+def _column_values(df: pd.DataFrame, col: str, n: int) -> List[Any]:
+    """One DataFrame column as a list of Python scalars with NaN/NaT -> None."""
+    if col not in df.columns:
+        return [None] * n
+    s = df[col]
+    mask = s.isna().to_numpy()
+    if col == "is_52w_high":
+        vals = s.fillna(False).astype(bool).astype(int).tolist()
+    else:
+        vals = pd.to_numeric(s, errors="coerce").astype(float).tolist()
+    if mask.any():
+        vals = [None if m else v for v, m in zip(vals, mask)]
+    return vals
 
-def upsert_daily(engine, symbol: str, df: pd.DataFrame):
+def daily_rows(sid: int, df: pd.DataFrame, extra_columns: Sequence[str] = ()) -> List[tuple]:
+    """Columnar conversion of a metrics frame into DB parameter tuples keyed by (symbol id, day)."""
+    n = len(df)
+    days = to_days(df["date"]).tolist()
+    cols = [_column_values(df, c, n) for c in DAILY_COLUMNS + list(extra_columns)]
+    return list(zip([sid] * n, days, *cols))
+
+@lru_cache(maxsize=None)
+def _upsert_daily_sql(columns: Tuple[str, ...]) -> str:
+    names = ",".join(("symbol_id", "day") + columns)
+    marks = ",".join("?" * (len(columns) + 2))
+    updates = ",\n  ".join(f"{c}=excluded.{c}" for c in columns)
+    return f"""
+INSERT INTO metrics({names})
+VALUES({marks})
+ON CONFLICT(symbol_id,day) DO UPDATE SET
+  {updates}
+"""
+
+def upsert_daily(engine, symbol: str, df: pd.DataFrame, chunk_size: int = 50_000,
+                 extra_columns: Sequence[str] = ()):
+    """Upsert metric rows; `extra_columns` (indicator outputs) are added to the table as REAL if missing."""
     if df.empty:
         return
 
     # Ensure columns exist in DB
-    add_missing_columns(engine, "daily_metrics", {
+    add_missing_columns(engine, "metrics", {
         "pct_from_52w_high": "REAL",
-        "is_52w_high": "INTEGER"
+        "is_52w_high": "INTEGER",
+        **{c: "REAL" for c in extra_columns},
     })
 
-    rows = []
-    for _, r in df.iterrows():
-        rows.append({
-            "symbol": symbol,
-            "date": str(pd.to_datetime(r["date"]).date()),
-            "close": _to_scalar(r.get("close")),
-            "sma50": _to_scalar(r.get("sma50")),
-            "sma200": _to_scalar(r.get("sma200")),
-            "high_52w": _to_scalar(r.get("high_52w")),
-            "bvps": _to_scalar(r.get("bvps")),
-            "pb": _to_scalar(r.get("pb")),
-            "ev": _to_scalar(r.get("ev")),
-            "pct_from_52w_high": _to_scalar(r.get("pct_from_52w_high")),
-            "is_52w_high": int(bool(_to_scalar(r.get("is_52w_high")))) if r.get("is_52w_high") is not None else None,
-        })
+    sql = _upsert_daily_sql(tuple(DAILY_COLUMNS) + tuple(extra_columns))
+    with engine.begin() as conn:
+        sid = _symbol_id(conn, engine, symbol)
+        rows = daily_rows(sid, df, extra_columns)
+        for i in range(0, len(rows), chunk_size):
+            conn.exec_driver_sql(sql, rows[i:i + chunk_size])
+        conn.exec_driver_sql("""
+INSERT INTO latest_days(symbol_id, day) VALUES(?, ?)
+ON CONFLICT(symbol_id) DO UPDATE SET day=MAX(latest_days.day, excluded.day), rev=latest_days.rev + 1
+""", (sid, max(r[1] for r in rows)))
 
+def upsert_daily_panel(engine, df: pd.DataFrame, chunk_size: int = 50_000):
+    """Upsert a long panel frame (ticker, date, metrics...) from `process_panel` in one transaction."""
+    if df.empty:
+        return
+    add_missing_columns(engine, "metrics", {"pct_from_52w_high": "REAL", "is_52w_high": "INTEGER"})
+    sql = _upsert_daily_sql(tuple(DAILY_COLUMNS))
     with engine.begin() as conn:
-        for row in rows:
-            conn.execute(text("""
-INSERT INTO daily_metrics(symbol,date,close,sma50,sma200,high_52w,bvps,pb,ev,pct_from_52w_high,is_52w_high)
-VALUES(:symbol,:date,:close,:sma50,:sma200,:high_52w,:bvps,:pb,:ev,:pct_from_52w_high,:is_52w_high)
-ON CONFLICT(symbol,date) DO UPDATE SET
-  close=excluded.close,
-  sma50=excluded.sma50,
-  sma200=excluded.sma200,
-  high_52w=excluded.high_52w,
-  bvps=excluded.bvps,
-  pb=excluded.pb,
-  ev=excluded.ev,
-  pct_from_52w_high=excluded.pct_from_52w_high,
-  is_52w_high=excluded.is_52w_high
-"""), row)
+        latest = []
+        for symbol, g in df.groupby("ticker", sort=False):
+            sid = _symbol_id(conn, engine, str(symbol))
+            rows = daily_rows(sid, g)
+            for i in range(0, len(rows), chunk_size):
+                conn.exec_driver_sql(sql, rows[i:i + chunk_size])
+            latest.append((sid, max(r[1] for r in rows)))
+        conn.exec_driver_sql("""
+INSERT INTO latest_days(symbol_id, day) VALUES(?, ?)
+ON CONFLICT(symbol_id) DO UPDATE SET day=MAX(latest_days.day, excluded.day), rev=latest_days.rev + 1
+""", latest)
 
 def upsert_signals(engine, symbol: str, events: List[Dict[str, Any]]):
     if not events:
         return
+    days = to_days([str(e["date"]) for e in events]).tolist()
+    with engine.begin() as conn:
+        sid = _symbol_id(conn, engine, symbol)
+        rows = [(sid, e["type"], d) for e, d in zip(events, days)]
+        conn.exec_driver_sql("""
+INSERT INTO signals(symbol_id,type,day)
+VALUES(?,?,?)
+ON CONFLICT(symbol_id,type,day) DO NOTHING
+""", rows)
+        conn.exec_driver_sql("UPDATE latest_days SET rev = rev + 1 WHERE symbol_id=?", (sid,))
+
+def _price_values(prices: PriceColumns, field: str) -> List[Any]:
+    v = getattr(prices, field)
+    if v is None:
+        return [None] * len(prices)
+    mask = np.isnan(v)
+    vals = np.where(mask, 0, v).astype(np.int64).tolist() if field == "volume" else v.tolist()
+    if mask.any():
+        vals = [None if m else x for x, m in zip(vals, mask)]
+    return vals
+
+def upsert_prices(engine, symbol: str, prices: PriceColumns, chunk_size: int = 50_000):
+    """Upsert raw OHLCV rows; a re-download replaces the stored fields of its days."""
+    if len(prices) == 0:
+        return
     with engine.begin() as conn:
-        for e in events:
-            conn.execute(text("""
-INSERT INTO signal_events(symbol,date,type)
-VALUES(:symbol,:date,:type)
-ON CONFLICT(symbol,date,type) DO NOTHING
-"""), {"symbol": symbol, "date": str(e["date"]), "type": e["type"]})
+        sid = _symbol_id(conn, engine, symbol)
+        rows = list(zip([sid] * len(prices), prices.day.tolist(), *(_price_values(prices, f) for f in OHLCV_FIELDS)))
+        sql = f"""
+INSERT INTO prices(symbol_id,day,{",".join(OHLCV_FIELDS)})
+VALUES(?,?,?,?,?,?,?)
+ON CONFLICT(symbol_id,day) DO UPDATE SET
+  {",".join(f"{f}=excluded.{f}" for f in OHLCV_FIELDS)}
+"""
+        for i in range(0, len(rows), chunk_size):
+            conn.exec_driver_sql(sql, rows[i:i + chunk_size])
+
+def load_prices(engine, symbol: str, since_day: Optional[int] = None) -> PriceColumns:
+    """Stored OHLCV for a symbol (days after `since_day` if given), oldest first.
+
+    Fields that are NULL on every row come back as None, as from a download without them.
+    """
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"""
+SELECT p.day,{",".join(f"p.{f}" for f in OHLCV_FIELDS)} FROM prices p JOIN tickers t ON t.id = p.symbol_id
+WHERE t.symbol=? AND p.day>? ORDER BY p.day
+""", (symbol, -2**62 if since_day is None else int(since_day))).all()
+    if not rows:
+        return PriceColumns(np.empty(0, dtype=np.int64), np.empty(0))
+    arr = np.array(rows, dtype=np.float64)  # None -> nan
+    cols = {f: arr[:, i + 1] for i, f in enumerate(OHLCV_FIELDS)}
+    return PriceColumns(arr[:, 0].astype(np.int64),
+                        **{f: v for f, v in cols.items() if f == "close" or not np.isnan(v).all()})
+
+def stored_symbols(engine, table: str = "prices") -> List[str]:
+    """Symbols with at least one row in `table` (prices or metrics)."""
+    if table not in ("prices", "metrics"):
+        raise ValueError(f"table must be prices or metrics, got {table!r}")
+    with engine.connect() as conn:
+        return [r[0] for r in conn.exec_driver_sql(f"""
+SELECT t.symbol FROM tickers t WHERE EXISTS (SELECT 1 FROM {table} x WHERE x.symbol_id = t.id) ORDER BY t.symbol
+""").all()]
+
+def load_fingerprints(engine, symbols: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, str]]:
+    """{symbol: {stage: digest}} for `symbols` (default all)."""
+    with engine.connect() as conn:
+        if symbols is None:
+            rows = conn.exec_driver_sql("""
+SELECT t.symbol, f.stage, f.digest FROM fingerprints f JOIN tickers t ON t.id = f.symbol_id
+""").all()
+        else:
+            # One probe per wanted symbol through the tickers.symbol index, not a scan of every fingerprint
+            rows = conn.exec_driver_sql("""
+SELECT t.symbol, f.stage, f.digest FROM json_each(?) j
+CROSS JOIN tickers t ON t.symbol = j.value
+CROSS JOIN fingerprints f ON f.symbol_id = t.id
+""", (json.dumps(list(dict.fromkeys(symbols))),)).all()
+    out: Dict[str, Dict[str, str]] = {}
+    for sym, stage, digest in rows:
+        out.setdefault(sym, {})[stage] = digest
+    return out
+
+def save_fingerprints(engine, symbol: str, digests: Dict[str, Optional[str]]):
+    """Record the digest each stage completed with for `symbol`; None forgets that stage's."""
+    with engine.begin() as conn:
+        sid = _symbol_id(conn, engine, symbol)
+        for stage, digest in digests.items():
+            if digest is None:
+                conn.exec_driver_sql("DELETE FROM fingerprints WHERE symbol_id=? AND stage=?", (sid, stage))
+            else:
+                conn.exec_driver_sql("""
+INSERT INTO fingerprints(symbol_id, stage, digest) VALUES(?,?,?)
+ON CONFLICT(symbol_id, stage) DO UPDATE SET digest=excluded.digest
+""", (sid, stage, digest))
+
+def load_tail(engine, symbol: str, n: Optional[int] = 252) -> pd.DataFrame:
+    """Last `n` stored metric rows for a symbol (all with None), oldest first, with the stored volume."""
+    with engine.connect() as conn:
+        res = conn.exec_driver_sql("""
+SELECT m.*, p.volume FROM metrics m JOIN tickers t ON t.id = m.symbol_id
+LEFT JOIN prices p ON p.symbol_id = m.symbol_id AND p.day = m.day
+WHERE t.symbol=? ORDER BY m.day DESC LIMIT ?
+""", (symbol, -1 if n is None else int(n)))
+        df = pd.DataFrame(res.all(), columns=list(res.keys())).drop(columns=["symbol_id"])
+    df.insert(0, "date", from_days(df.pop("day")))
+    return df.iloc[::-1].reset_index(drop=True)
+
+def save_fundamentals(engine, symbol: str, cols: Optional[FundamentalsColumns], fetched_at: Optional[float],
+                      due_at: float, error: Optional[str] = None):
+    """Upsert a symbol's quarters and its fetch bookkeeping in one transaction.
+
+    A field missing from a new fetch keeps its stored value, and quarters the
+    fetch no longer returns stay. On a failed fetch pass `cols=None` and the
+    `error`; `fetched_at` None keeps the previous one.
+    """
+    names = ", ".join(FUNDAMENTAL_FIELDS)
+    updates = ", ".join(f"{c}=COALESCE(excluded.{c}, fundamentals.{c})" for c in FUNDAMENTAL_FIELDS)
+    with engine.begin() as conn:
+        sid = _symbol_id(conn, engine, symbol)
+        if cols is not None and len(cols):
+            vals = [[None if v != v else v for v in cols.values[c].tolist()] for c in FUNDAMENTAL_FIELDS]
+            conn.exec_driver_sql(f"""
+INSERT INTO fundamentals(symbol_id, period_end, {names}) VALUES(?, ?{", ?" * len(FUNDAMENTAL_FIELDS)})
+ON CONFLICT(symbol_id, period_end) DO UPDATE SET {updates}
+""", [(sid, d, *v) for d, *v in zip(cols.period_end.tolist(), *vals)])
+        conn.exec_driver_sql("""
+INSERT INTO fundamentals_meta(symbol_id, fetched_at, due_at, error) VALUES(?, ?, ?, ?)
+ON CONFLICT(symbol_id) DO UPDATE SET fetched_at=COALESCE(excluded.fetched_at, fundamentals_meta.fetched_at),
+  due_at=excluded.due_at, error=excluded.error
+""", (sid, fetched_at, float(due_at), error))
+
+def load_fundamentals(engine, symbols: Sequence[str]) -> Dict[str, FundamentalsColumns]:
+    """{symbol: stored quarters, oldest first} for the `symbols` that have any."""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"""
+SELECT t.symbol, f.period_end, {", ".join(f"f.{c}" for c in FUNDAMENTAL_FIELDS)}
+FROM json_each(?) j CROSS JOIN tickers t ON t.symbol = j.value CROSS JOIN fundamentals f ON f.symbol_id = t.id
+ORDER BY t.symbol, f.period_end
+""", (json.dumps(symbols),)).all()
+    out: Dict[str, FundamentalsColumns] = {}
+    i = 0
+    while i < len(rows):
+        j = i
+        while j < len(rows) and rows[j][0] == rows[i][0]:
+            j += 1
+        a = np.array([r[1:] for r in rows[i:j]], dtype=np.float64)  # None -> nan
+        out[rows[i][0]] = FundamentalsColumns(a[:, 0].astype(np.int64),
+                                              {c: a[:, k + 1] for k, c in enumerate(FUNDAMENTAL_FIELDS)})
+        i = j
+    return out
+
+def fundamentals_due(engine, symbols: Sequence[str], now: float) -> List[str]:
+    """The `symbols` never fetched or whose `due_at` has passed, in the given order."""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return []
+    with engine.connect() as conn:
+        fresh = {r[0] for r in conn.exec_driver_sql("""
+SELECT t.symbol FROM json_each(?) j CROSS JOIN tickers t ON t.symbol = j.value
+CROSS JOIN fundamentals_meta m ON m.symbol_id = t.id WHERE m.due_at > ?
+""", (json.dumps(symbols), float(now))).all()}
+    return [s for s in symbols if s not in fresh]
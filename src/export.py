@@ -0,0 +1,242 @@
+# src/export.py
+from __future__ import annotations
+import os
+import json
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, IO, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.lazy import available, lazy_import
+from src.models import PROCESSED_FIELDS, ProcessedRows
+
+# Optional: columnar exports are Parquet when pyarrow is installed; imported on first use
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+
+FORMATS = ("json", "ndjson", "columnar")
+CHUNK_ROWS = 256
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def has_parquet() -> bool:
+    return available("pyarrow")
+
+
+def extension(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; choose from {', '.join(FORMATS)}")
+    if fmt == "columnar":
+        return ".parquet" if has_parquet() else ".columns.json"
+    return "." + fmt
+
+
+def output_path(out_dir: str, ticker: str, fmt: str = "json", delta: bool = False) -> str:
+    """Default export file for `ticker`; `delta` names the incremental-refresh file beside the full one."""
+    return os.path.join(out_dir, f"{ticker.upper()}{'.delta' if delta else ''}{extension(fmt)}")
+
+
+def result_notes(res) -> Dict[str, Any]:
+    return {
+        "rows": int(len(res.df)),
+        "min_sma_days": res.min_sma_days,
+        "data_source": "yfinance",
+        "short_history": res.short_history,
+        "event_contexts": res.contexts,
+        **({"incremental_since": res.since.isoformat()} if res.since else {}),
+    }
+
+
+def metrics_frame(res) -> pd.DataFrame:
+    """The exported metric columns of a result, without building row objects."""
+    if isinstance(res.rows, ProcessedRows):
+        return res.rows.frame
+    return res.df.loc[:, PROCESSED_FIELDS]
+
+
+def json_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    """Metric columns as JSON-ready lists: ISO dates, NaN -> None, nullable bool flag."""
+    cols: Dict[str, List[Any]] = {"date": pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d").tolist()}
+    for c in PROCESSED_FIELDS[1:]:
+        s = df[c]
+        mask = s.isna().to_numpy()
+        if c == "is_52w_high":
+            vals = [bool(v) for v in s.fillna(False).astype(bool).tolist()]
+        else:
+            vals = s.astype(float).tolist()
+        cols[c] = [None if m else v for v, m in zip(vals, mask)] if mask.any() else vals
+    return cols
+
+
+def _record_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS):
+    """Row dicts, `chunk_rows` at a time, so only one chunk is ever materialized as objects."""
+    cols = json_columns(df)
+    rows = zip(*(cols[n] for n in PROCESSED_FIELDS))
+    while True:
+        chunk = [dict(zip(PROCESSED_FIELDS, vals)) for vals in islice(rows, chunk_rows)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def _signal_dicts(res) -> List[Dict[str, Any]]:
+    return [{"ticker": e.ticker, "date": str(e.date), "type": e.type} for e in res.events]
+
+
+def _header(res, generated_at: str) -> str:
+    return f'{{"ticker":{_dumps(res.ticker)},"generated_at":{_dumps(generated_at)}'
+
+
+def write_json(f: IO[str], res, generated_at: str, chunk_rows: int = CHUNK_ROWS):
+    """Compact `ExportPayload` JSON, written a chunk of metric rows at a time."""
+    f.write(_header(res, generated_at) + ',"metrics":[')
+    first = True
+    for chunk in _record_chunks(metrics_frame(res), chunk_rows):
+        f.write(("" if first else ",") + _dumps(chunk)[1:-1])
+        first = False
+    f.write(f'],"signals":{_dumps(_signal_dicts(res))},"notes":{_dumps(result_notes(res))}}}')
+
+
+def write_ndjson(f: IO[str], res, generated_at: str, chunk_rows: int = CHUNK_ROWS):
+    """One JSON object per line: a `meta` line, then `metric` and `signal` lines, all tagged with the ticker."""
+    t = res.ticker
+    f.write(_dumps({"kind": "meta", "ticker": t, "generated_at": generated_at, "notes": result_notes(res)}) + "\n")
+    for chunk in _record_chunks(metrics_frame(res), chunk_rows):
+        f.write("".join(_dumps({"kind": "metric", "ticker": t, **r}) + "\n" for r in chunk))
+    f.write("".join(_dumps({"kind": "signal", **s}) + "\n" for s in _signal_dicts(res)))
+
+
+def write_columns_json(f: IO[str], res, generated_at: str):
+    """Column-oriented JSON: one array per metric instead of one object per row."""
+    f.write(_header(res, generated_at) + ',"columns":{')
+    cols = json_columns(metrics_frame(res))
+    f.write(",".join(f"{_dumps(name)}:{_dumps(vals)}" for name, vals in cols.items()))
+    f.write(f'}},"signals":{_dumps(_signal_dicts(res))},"notes":{_dumps(result_notes(res))}}}')
+
+
+def write_sidecar(f: IO[str], res, generated_at: str):
+    """Notes and signals that accompany a Parquet metrics table, as NDJSON."""
+    f.write(_dumps({"kind": "meta", "ticker": res.ticker, "generated_at": generated_at,
+                    "notes": result_notes(res)}) + "\n")
+    f.write("".join(_dumps({"kind": "signal", **s}) + "\n" for s in _signal_dicts(res)))
+
+
+def sidecar_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".signals.ndjson"
+
+
+def _write_body(f: IO[str], fmt: str, res, generated_at: str, chunk_rows: int = CHUNK_ROWS):
+    if fmt == "json":
+        write_json(f, res, generated_at, chunk_rows)
+    elif fmt == "ndjson":
+        write_ndjson(f, res, generated_at, chunk_rows)
+    elif has_parquet():
+        write_sidecar(f, res, generated_at)
+    else:
+        write_columns_json(f, res, generated_at)
+
+
+def _arrow_table(res):
+    df = metrics_frame(res)
+    return pa.table({
+        "ticker": pa.array([res.ticker] * len(df), pa.string()),
+        "date": pa.array(pd.to_datetime(df["date"]).dt.date.tolist(), pa.date32()),
+        **{c: pa.array(df[c].to_numpy(dtype=np.float64), pa.float64(), from_pandas=True)
+           for c in PROCESSED_FIELDS[1:] if c != "is_52w_high"},
+        "is_52w_high": pa.array(df["is_52w_high"].astype(object).where(df["is_52w_high"].notna(), None).tolist(),
+                                pa.bool_()),
+    })
+
+
+class Exporter:
+    """Writes results as they arrive, one file per ticker or a single combined file.
+
+    Formats: ``json`` (compact `ExportPayload`), ``ndjson`` (one record per
+    line) and ``columnar`` (Parquet with pyarrow, otherwise column-oriented
+    JSON). With Parquet, signals and notes go to a ``.signals.ndjson``
+    sidecar since the metrics table is written before they're all known.
+    With `delta`, per-ticker files go to ``<TICKER>.delta.<ext>`` so an
+    incremental refresh never replaces a full-history export.
+    """
+
+    def __init__(self, out_dir: str = "out", fmt: str = "json", combined: Optional[str] = None,
+                 chunk_rows: int = CHUNK_ROWS, delta: bool = False):
+        extension(fmt)
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.combined = combined
+        self.delta = delta
+        self.chunk_rows = chunk_rows
+        self.generated_at = datetime.utcnow().isoformat()
+        self._f: Optional[IO[str]] = None
+        self._pq = None
+        self._count = 0
+
+    @property
+    def _array(self) -> bool:
+        """Combined file is one JSON document holding an array of per-ticker objects."""
+        return self.fmt == "json" or (self.fmt == "columnar" and not has_parquet())
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_combined(self):
+        path = self.combined
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        parquet = self.fmt == "columnar" and has_parquet()
+        self._f = open(sidecar_path(path) if parquet else path, "w", encoding="utf-8")
+        if self._array:
+            self._f.write(f'{{"generated_at":{_dumps(self.generated_at)},"tickers":[')
+
+    def write(self, res) -> str:
+        """Export one result; returns the file written to."""
+        if self.combined is None:
+            path = output_path(self.out_dir, res.ticker, self.fmt, self.delta)
+            os.makedirs(self.out_dir, exist_ok=True)
+            export_file(res, path, self.fmt, self.chunk_rows, self.generated_at)
+            return path
+        if self._f is None:
+            self._open_combined()
+        if self.fmt == "columnar" and has_parquet():
+            table = _arrow_table(res)
+            if self._pq is None:
+                self._pq = pq.ParquetWriter(self.combined, table.schema)
+            self._pq.write_table(table)
+        elif self._array and self._count:
+            self._f.write(",")
+        _write_body(self._f, self.fmt, res, self.generated_at, self.chunk_rows)
+        self._count += 1
+        return self.combined
+
+    def close(self):
+        if self._f is not None:
+            if self._array:
+                self._f.write("]}")
+            self._f.close()
+            self._f = None
+        if self._pq is not None:
+            self._pq.close()
+            self._pq = None
+
+
+def export_file(res, path: str, fmt: str = "json", chunk_rows: int = CHUNK_ROWS,
+                generated_at: Optional[str] = None):
+    """Stream one result to `path` in `fmt`."""
+    extension(fmt)
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    generated_at = generated_at or datetime.utcnow().isoformat()
+    if fmt == "columnar" and has_parquet():
+        pq.write_table(_arrow_table(res), path)
+        path = sidecar_path(path)
+    with open(path, "w", encoding="utf-8") as f:
+        _write_body(f, fmt, res, generated_at, chunk_rows)
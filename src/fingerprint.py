@@ -0,0 +1,98 @@
+# src/fingerprint.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from src.models import OHLCV_FIELDS, ArrayBundle, RawBundle
+
+# Modules whose code decides what is stored or exported; editing any of them invalidates every fingerprint
+CODE_MODULES = ("processor", "panel", "kernels", "indicators", "signals", "models", "export", "pipeline", "store",
+                "database", "fundamentals")
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """Digest of the source of `CODE_MODULES`."""
+    h = _hasher()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_MODULES:
+        with open(os.path.join(here, f"{name}.py"), "rb") as f:
+            h.update(name.encode())
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def bundle_digest(bundle: Union[RawBundle, ArrayBundle]) -> str:
+    """Digest of a bundle's price and fundamentals arrays (the fetched inputs)."""
+    b = ArrayBundle.from_bundle(bundle)
+    h = _hasher()
+    h.update(b.ticker.encode())
+    for name in ("day",) + tuple(OHLCV_FIELDS):
+        v = getattr(b.prices, name)
+        if v is not None:
+            h.update(name.encode())
+            h.update(np.ascontiguousarray(v).tobytes())
+    f = b.fundamentals_q
+    h.update(f.period_end.tobytes())
+    for name in sorted(f.values):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(f.values[name]).tobytes())
+    return h.hexdigest()
+
+
+def run_params(period: str, min_sma_days: int, fundamentals_lag_days: int = 0,
+               indicators: Sequence[Dict[str, Any]] = (),
+               signal_rules: Sequence[Dict[str, Any]] = (), storage: str = "sqlite") -> Dict[str, Any]:
+    """The configuration that shapes a ticker's results (and the backend they're persisted to)."""
+    return {"period": period, "min_sma_days": int(min_sma_days), "fundamentals_lag_days": int(fundamentals_lag_days),
+            "indicators": list(indicators), "signal_rules": list(signal_rules), "storage": storage}
+
+
+def run_key(inputs: str, params: Dict[str, Any]) -> str:
+    """Fingerprint of one ticker's run: input digest, parameters and code version."""
+    h = _hasher()
+    h.update(inputs.encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(code_version().encode())
+    return h.hexdigest()
+
+
+def export_key(key: str, fmt: str, path: str) -> str:
+    h = _hasher()
+    h.update(f"{key}|{fmt}|{os.path.abspath(path)}".encode())
+    return h.hexdigest()
+
+
+@dataclass
+class StagePlan:
+    """Which stages a ticker still needs. process/signals run only when a stage below them does."""
+    key: str
+    persist: bool
+    export: bool
+    export_key: Optional[str] = None  # None when exporting into a combined file (always rewritten)
+
+    @property
+    def compute(self) -> bool:
+        return self.persist or self.export
+
+
+def plan_stages(stored: Dict[str, str], key: str, fmt: str = "json", output: Optional[str] = None,
+                force: bool = False) -> StagePlan:
+    """Compare a run's fingerprint with the ones `stored` after the last successful persist/export.
+
+    The export is redone when its file is gone even if the fingerprint matches.
+    """
+    ek = export_key(key, fmt, output) if output else None
+    persist = force or stored.get("persist") != key
+    export = force or ek is None or stored.get("export") != ek or not os.path.exists(output)
+    return StagePlan(key, persist, export, ek)
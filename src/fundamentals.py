@@ -0,0 +1,234 @@
+# src/fundamentals.py
+from __future__ import annotations
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.cache import DataCache
+from src.database import fundamentals_due, load_fundamentals, save_fundamentals
+from src.instrument import count, stage
+from src.lazy import lazy_import
+from src.models import FUNDAMENTAL_FIELDS, FundamentalsColumns
+from src.retry import retry_call
+
+# Loaded on the first download only; stored and cached fundamentals never import it
+yf = lazy_import("yfinance")
+
+# Statement row labels per field, most specific first. yfinance has renamed rows over the years
+# ("Total Stockholder Equity" -> "Stockholders Equity"), so old and current spellings are both listed.
+LABEL_ALIASES: Dict[str, List[str]] = {
+    "total_debt": ["Total Debt", "Total Debt Net", "Long Term Debt And Capital Lease Obligation", "Long Term Debt"],
+    "cash": ["Cash And Cash Equivalents", "Cash", "Cash Cash Equivalents And Short Term Investments",
+             "Cash Financial"],
+    "shares_out": ["Ordinary Shares Number", "Share Issued"],
+    "book_value": ["Total Stockholders Equity", "Total Stockholder Equity", "Stockholders Equity",
+                   "Common Stock Equity", "Total Equity", "Total Equity Gross Minority Interest"],
+    "revenue": ["Total Revenue", "Operating Revenue"],
+    "ebitda": ["EBITDA", "Normalized EBITDA"],
+}
+
+
+def _norm(label: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(label).lower())
+
+
+# normalized label -> (field, priority), built once; labels are matched with one dict lookup per row
+_FIELD_OF: Dict[str, Tuple[str, int]] = {_norm(a): (f, p) for f, aliases in LABEL_ALIASES.items()
+                                         for p, a in enumerate(aliases)}
+
+
+def parse_statement(df: Optional[pd.DataFrame]) -> FundamentalsColumns:
+    """A yfinance statement (row labels x period-end columns) as columns, oldest period first.
+
+    Rows are matched against LABEL_ALIASES; where the preferred row is empty
+    for a period the next alias fills it. Columns that aren't dates are ignored.
+    """
+    if not isinstance(df, pd.DataFrame) or df.empty:
+        return FundamentalsColumns(np.empty(0, dtype=np.int64))
+    ends = pd.to_datetime(pd.Index(df.columns), errors="coerce")
+    keep = np.flatnonzero(~ends.isna())
+    days = ends[keep].to_numpy(dtype="datetime64[D]").astype(np.int64)
+    order = keep[np.argsort(days, kind="stable")]
+    days = np.sort(days)
+    mat = df.iloc[:, order].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    rows: Dict[str, List[Tuple[int, int]]] = {}
+    for i, label in enumerate(df.index.map(_norm)):
+        hit = _FIELD_OF.get(label)
+        if hit is not None:
+            rows.setdefault(hit[0], []).append((hit[1], i))
+    values = {}
+    for field, found in rows.items():
+        found.sort()
+        v = mat[found[0][1]].copy()
+        for _, i in found[1:]:
+            gap = np.isnan(v)
+            if not gap.any():
+                break
+            v[gap] = mat[i, gap]
+        values[field] = v
+    uniq, first = np.unique(days, return_index=True)  # one column per period end
+    return FundamentalsColumns(uniq, {k: v[first] for k, v in values.items()})
+
+
+def merge_statements(*parts: FundamentalsColumns) -> FundamentalsColumns:
+    """Statements combined on period end; earlier parts win where both have a value."""
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return FundamentalsColumns(np.empty(0, dtype=np.int64))
+    days = np.unique(np.concatenate([p.period_end for p in parts]))
+    values = {k: np.full(len(days), np.nan) for k in FUNDAMENTAL_FIELDS}
+    for p in parts:
+        pos = np.searchsorted(days, p.period_end)
+        for k in FUNDAMENTAL_FIELDS:
+            v = values[k]
+            gap = np.isnan(v[pos])
+            v[pos[gap]] = p.values[k][gap]
+    return FundamentalsColumns(days, values)
+
+
+def download_fundamentals(ticker: str) -> FundamentalsColumns:
+    """Balance sheet and income statement quarters for `ticker` from yfinance.
+
+    Each statement falls back to the annual one when no quarters come back,
+    and `info` is only requested when the balance sheet has no share count.
+    Errors raise (after retries on transient ones).
+    """
+    t = yf.Ticker(ticker)
+
+    def statement(quarterly: str, annual: str) -> FundamentalsColumns:
+        cols = parse_statement(retry_call(lambda: getattr(t, quarterly)))
+        return cols if len(cols) else parse_statement(retry_call(lambda: getattr(t, annual)))
+
+    cols = merge_statements(statement("quarterly_balance_sheet", "balance_sheet"),
+                            statement("quarterly_income_stmt", "income_stmt"))
+    if len(cols) and np.isnan(cols.values["shares_out"]).all():
+        info = retry_call(lambda: t.info) or {}
+        shares = info.get("sharesOutstanding") or info.get("floatShares")
+        if shares:
+            cols.values["shares_out"][:] = float(shares)
+    return cols
+
+
+def next_due(cols: FundamentalsColumns, now: float, ttl_days: float = 92, report_lag_days: float = 45,
+             retry_days: float = 3) -> float:
+    """When to look for a newer quarter: the next period end plus its reporting lag.
+
+    Never sooner than `retry_days` from `now` (a late filing is polled at that
+    pace); `ttl_days` from now when nothing has been reported yet.
+    """
+    if not len(cols):
+        return now + ttl_days * 86400
+    expected = (int(cols.period_end.max()) + ttl_days + report_lag_days) * 86400
+    return max(expected, now + retry_days * 86400)
+
+
+class FundamentalsStore:
+    """Quarterly fundamentals kept in the `fundamentals` table and fetched only when due.
+
+    A symbol is due when it was never fetched or a new quarter should have
+    been reported since (see `next_due`), so daily runs read the table only.
+    Due symbols are downloaded on `workers` threads (a data cache copy is
+    used instead only offline or when it holds a quarter newer than the
+    stored ones); writes stay on the calling thread. A failed download
+    keeps the stored quarters and is retried after `retry_days`.
+    """
+
+    def __init__(self, engine, cache: Optional[DataCache] = None, ttl_days: float = 92,
+                 report_lag_days: float = 45, retry_days: float = 3, workers: int = 8,
+                 offline: Optional[bool] = None):
+        self.engine = engine
+        self.cache = cache
+        self.ttl_days = float(ttl_days)
+        self.report_lag_days = float(report_lag_days)
+        self.retry_days = float(retry_days)
+        self.workers = max(1, int(workers))
+        self.offline = bool(cache is not None and cache.offline) if offline is None else offline
+        self._data: Dict[str, FundamentalsColumns] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], engine, cache: Optional[DataCache] = None) -> "FundamentalsStore":
+        f = cfg.get("fundamentals") or {}
+        return cls(engine, cache, ttl_days=f.get("ttl_days", 92), report_lag_days=f.get("report_lag_days", 45),
+                   retry_days=f.get("retry_days", 3), workers=f.get("workers", 8))
+
+    def get(self, ticker: str) -> FundamentalsColumns:
+        """Stored quarters for `ticker`, refreshing it first if it wasn't loaded yet."""
+        with self._lock:
+            hit = self._data.get(ticker)
+        if hit is None:
+            self.refresh([ticker])
+            with self._lock:
+                hit = self._data[ticker]
+        return hit
+
+    def refresh(self, tickers: Sequence[str], force: bool = False) -> Dict[str, str]:
+        """Fetch the due `tickers` (all with `force`), store them and load every ticker's quarters.
+
+        Returns {ticker: error} for the downloads that failed.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        now = time.time()
+        due = tickers if force else fundamentals_due(self.engine, tickers, now)
+        errors: Dict[str, str] = {}
+        if due:
+            with stage("fundamentals"):
+                known = {t: int(c.period_end.max()) for t, c in load_fundamentals(self.engine, due).items() if len(c)}
+                fetched = self._fetch_all(due, known)
+            for t in due:
+                got = fetched.get(t)
+                if isinstance(got, Exception):
+                    errors[t] = f"{type(got).__name__}: {got}"
+                    count("fundamentals_failed")
+                    logging.warning(f"{t}: fundamentals fetch failed: {errors[t]}")
+                    save_fundamentals(self.engine, t, None, None, now + self.retry_days * 86400, errors[t])
+                elif got is not None:
+                    count("fundamentals_fetched")
+                    save_fundamentals(self.engine, t, got, now, self.due_at(got, now))
+        stale = set(due)
+        with self._lock:
+            load = [t for t in tickers if t in stale or t not in self._data]
+        loaded = load_fundamentals(self.engine, load) if load else {}
+        with self._lock:
+            for t in load:
+                self._data[t] = loaded.get(t, FundamentalsColumns(np.empty(0, dtype=np.int64)))
+        return errors
+
+    def due_at(self, cols: FundamentalsColumns, now: float) -> float:
+        return next_due(cols, now, self.ttl_days, self.report_lag_days, self.retry_days)
+
+    def _fetch_one(self, ticker: str, latest: Optional[int] = None) -> Optional[FundamentalsColumns]:
+        # None: nothing to record (offline with no cached copy). A due symbol is looked for a newer
+        # quarter, so a cached copy only counts offline or when it is newer than the stored `latest`.
+        if self.cache is not None:
+            hit = self.cache.get_fundamentals(ticker)
+            if hit is not None:
+                hit = FundamentalsColumns.from_quarters(hit)
+                if self.offline or (len(hit) and (latest is None or int(hit.period_end.max()) > latest)):
+                    return hit
+        if self.offline:
+            return None
+        cols = download_fundamentals(ticker)
+        if self.cache is not None:
+            self.cache.put_fundamentals(ticker, cols)
+        return cols
+
+    def _fetch_all(self, tickers: List[str], latest: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        latest = latest or {}
+
+        def one(t: str):
+            try:
+                return self._fetch_one(t, latest.get(t))
+            except Exception as e:
+                return e
+
+        if len(tickers) == 1 or self.workers == 1:
+            return {t: one(t) for t in tickers}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tickers))) as pool:
+            return dict(zip(tickers, pool.map(one, tickers)))
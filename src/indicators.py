@@ -0,0 +1,289 @@
+# src/indicators.py
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.kernels import rolling_max_windows, rolling_min_windows
+
+Spec = Dict[str, Any]  # {"name": "ema", "window": 12}
+
+
+@dataclass
+class Indicator:
+    fn: Callable[["Context", Dict[str, Any]], Dict[str, np.ndarray]]
+    columns: Callable[[Dict[str, Any]], List[str]]
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    # Rolling extrema the indicator reads, so all windows share one doubling sweep
+    extrema: Callable[[Dict[str, Any]], List[Tuple[str, int]]] = lambda p: []
+    # Trailing rows a value depends on; None for recursive ones (EMA-based), which read the whole history
+    lookback: Callable[[Dict[str, Any]], Optional[int]] = lambda p: None
+
+
+INDICATORS: Dict[str, Indicator] = {}
+
+
+def indicator(name: str, columns: Callable[[Dict[str, Any]], List[str]], defaults: Optional[Dict[str, Any]] = None,
+              extrema: Optional[Callable[[Dict[str, Any]], List[Tuple[str, int]]]] = None,
+              lookback: Optional[Callable[[Dict[str, Any]], Optional[int]]] = None):
+    """Register an indicator: `fn(ctx, params) -> {column: array}`."""
+    def deco(fn):
+        INDICATORS[name] = Indicator(fn, columns, dict(defaults or {}), extrema or (lambda p: []),
+                                     lookback or (lambda p: None))
+        return fn
+    return deco
+
+
+def _k(v: Any) -> str:
+    return f"{float(v):g}".replace(".", "p")
+
+
+def rolling_extrema(x: np.ndarray, windows: Iterable[int], kind: str = "max") -> Dict[int, np.ndarray]:
+    """Strict rolling max/min for several windows from one doubling sweep (see src.kernels).
+
+    Matches `rolling(w, min_periods=w)`: any NaN inside a window gives NaN.
+    """
+    fn = rolling_max_windows if kind == "max" else rolling_min_windows
+    return {w: v[0] for w, v in fn(np.asarray(x, dtype=np.float64)[None, :], windows).items()}
+
+
+class Context:
+    """Price arrays for one ticker plus memoized intermediates shared by every indicator."""
+
+    def __init__(self, close: np.ndarray, volume: Optional[np.ndarray] = None):
+        self.close = np.asarray(close, dtype=np.float64)
+        self.n = len(self.close)
+        self.volume = np.full(self.n, np.nan) if volume is None else np.asarray(volume, dtype=np.float64)
+        self._memo: Dict[Any, Any] = {}
+        self._extrema: Dict[str, set] = {"max": set(), "min": set()}
+
+    def series(self, name: str) -> np.ndarray:
+        return self.close if name == "close" else self.volume
+
+    def _cached(self, key, fn):
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def plan_extrema(self, kind: str, window: int):
+        self._extrema[kind].add(int(window))
+
+    def prefix(self, name: str = "close") -> Dict[str, np.ndarray]:
+        """Prefix sums shared by every SMA and std window over `name`, each with a leading 0.
+
+        Values are centered on the series mean first, so window sums of squares
+        don't cancel at high price levels; NaNs count as 0 in the sums and are
+        tracked by `nans`, and `steps` counts changes from the previous value.
+        """
+        def _calc():
+            x = self.series(name)
+            nan = np.isnan(x)
+            center = float(x[~nan].mean()) if (~nan).any() else 0.0
+            d = np.where(nan, 0.0, x - center)
+            zero = lambda a: np.concatenate([[0], np.cumsum(a)])
+            return {"center": center, "sum": zero(d), "sum2": zero(d * d), "nans": zero(nan),
+                    "steps": zero(np.r_[False, x[1:] != x[:-1]])}
+        return self._cached(("prefix", name), _calc)
+
+    def _windows(self, w: int, name: str):
+        """(window sum, sum of squares, flat mask) of the centered values for windows ending at rows w-1..
+
+        Sums are NaN where the window holds a NaN; a flat window holds one repeated value.
+        """
+        p = self.prefix(name)
+        s1, s2 = p["sum"][w:] - p["sum"][:-w], p["sum2"][w:] - p["sum2"][:-w]
+        bad = (p["nans"][w:] - p["nans"][:-w]) > 0
+        s1[bad] = s2[bad] = np.nan
+        return s1, s2, (p["steps"][w:] - p["steps"][1:self.n - w + 2]) == 0
+
+    def sma(self, w: int, name: str = "close") -> np.ndarray:
+        """Strict rolling mean; exact on a flat window, as pandas."""
+        def _calc():
+            out = np.full(self.n, np.nan)
+            if self.n >= w:
+                s1, _, flat = self._windows(w, name)
+                m = self.prefix(name)["center"] + s1 / w
+                m[flat] = self.series(name)[w - 1:][flat]
+                out[w - 1:] = m
+            return out
+        return self._cached(("sma", name, w), _calc)
+
+    def std(self, w: int, name: str = "close") -> np.ndarray:
+        """Population rolling standard deviation; 0 on a flat window."""
+        def _calc():
+            out = np.full(self.n, np.nan)
+            if self.n >= w:
+                s1, s2, flat = self._windows(w, name)
+                mean = s1 / w
+                var = s2 / w - mean * mean
+                var[flat] = 0.0
+                out[w - 1:] = np.sqrt(np.maximum(var, 0.0))
+            return out
+        return self._cached(("std", name, w), _calc)
+
+    def ema(self, span: int, name: str = "close", x: Optional[np.ndarray] = None, key: Any = None) -> np.ndarray:
+        def _calc():
+            src = self.series(name) if x is None else x
+            return pd.Series(src).ewm(span=span, adjust=False, min_periods=span).mean().to_numpy()
+        return self._cached(("ema", key or name, span), _calc)
+
+    def rolling(self, kind: str, w: int) -> np.ndarray:
+        if ("extrema", kind, w) not in self._memo:
+            windows = self._extrema[kind] | {w}
+            for win, arr in rolling_extrema(self.close, windows, kind).items():
+                self._memo.setdefault(("extrema", kind, win), arr)
+        return self._memo[("extrema", kind, w)]
+
+
+# ---------------------------------------------------------------------------
+# Built-in indicators
+# ---------------------------------------------------------------------------
+
+@indicator("sma", columns=lambda p: [f"sma_{p['window']}"], defaults={"window": 20},
+           lookback=lambda p: p["window"])
+def _sma(ctx: Context, p):
+    return {f"sma_{p['window']}": ctx.sma(p["window"])}
+
+
+@indicator("ema", columns=lambda p: [f"ema_{p['window']}"], defaults={"window": 20})
+def _ema(ctx: Context, p):
+    return {f"ema_{p['window']}": ctx.ema(p["window"])}
+
+
+@indicator("rsi", columns=lambda p: [f"rsi_{p['window']}"], defaults={"window": 14})
+def _rsi(ctx: Context, p):
+    w = p["window"]
+    delta = np.diff(ctx.close, prepend=np.nan)
+    gain = pd.Series(np.where(delta > 0, delta, 0.0))
+    loss = pd.Series(np.where(delta < 0, -delta, 0.0))
+    gain[0] = loss[0] = np.nan
+    avg_gain = gain.ewm(alpha=1.0 / w, adjust=False, min_periods=w).mean().to_numpy()
+    avg_loss = loss.ewm(alpha=1.0 / w, adjust=False, min_periods=w).mean().to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    rsi[np.isnan(avg_gain) | np.isnan(avg_loss)] = np.nan
+    return {f"rsi_{w}": rsi}
+
+
+def _macd_cols(p):
+    f, s, g = p["fast"], p["slow"], p["signal"]
+    return [f"macd_{f}_{s}", f"macd_signal_{f}_{s}_{g}", f"macd_hist_{f}_{s}_{g}"]
+
+
+@indicator("macd", columns=_macd_cols, defaults={"fast": 12, "slow": 26, "signal": 9})
+def _macd(ctx: Context, p):
+    line = ctx.ema(p["fast"]) - ctx.ema(p["slow"])
+    sig = ctx.ema(p["signal"], x=line, key=("macd", p["fast"], p["slow"]))
+    cols = _macd_cols(p)
+    return {cols[0]: line, cols[1]: sig, cols[2]: line - sig}
+
+
+def _bb_cols(p):
+    w, k = p["window"], _k(p["k"])
+    return [f"bb_mid_{w}", f"bb_upper_{w}_{k}", f"bb_lower_{w}_{k}"]
+
+
+@indicator("bollinger", columns=_bb_cols, defaults={"window": 20, "k": 2}, lookback=lambda p: p["window"])
+def _bollinger(ctx: Context, p):
+    mid, sd = ctx.sma(p["window"]), ctx.std(p["window"])
+    cols = _bb_cols(p)
+    return {cols[0]: mid, cols[1]: mid + p["k"] * sd, cols[2]: mid - p["k"] * sd}
+
+
+@indicator("high", columns=lambda p: [f"high_{p['window']}"], defaults={"window": 20},
+           extrema=lambda p: [("max", p["window"])], lookback=lambda p: p["window"])
+def _high(ctx: Context, p):
+    return {f"high_{p['window']}": ctx.rolling("max", p["window"])}
+
+
+@indicator("low", columns=lambda p: [f"low_{p['window']}"], defaults={"window": 20},
+           extrema=lambda p: [("min", p["window"])], lookback=lambda p: p["window"])
+def _low(ctx: Context, p):
+    return {f"low_{p['window']}": ctx.rolling("min", p["window"])}
+
+
+@indicator("volume_avg", columns=lambda p: [f"vol_avg_{p['window']}"], defaults={"window": 20},
+           lookback=lambda p: p["window"])
+def _volume_avg(ctx: Context, p):
+    return {f"vol_avg_{p['window']}": ctx.sma(p["window"], name="volume")}
+
+
+# ---------------------------------------------------------------------------
+# Spec handling and the engine
+# ---------------------------------------------------------------------------
+
+_COLUMN_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+
+
+def normalize_spec(spec: Any, registry: Dict[str, Any]) -> Spec:
+    """Fill defaults and check the name against a registry; a bare string means defaults."""
+    if isinstance(spec, str):
+        spec = {"name": spec}
+    spec = dict(spec)
+    name = spec.get("name")
+    if name not in registry:
+        raise ValueError(f"Unknown {('indicator' if registry is INDICATORS else 'signal')}: {name!r}")
+    return {"name": name, **registry[name].defaults, **{k: v for k, v in spec.items() if k != "name"}}
+
+
+def _dedupe(specs: Iterable[Spec]) -> List[Spec]:
+    seen, out = set(), []
+    for s in specs:
+        key = tuple(sorted(s.items()))
+        if key not in seen:
+            seen.add(key)
+            out.append(s)
+    return out
+
+
+def indicator_columns(specs: Sequence[Spec]) -> List[str]:
+    cols: List[str] = []
+    for s in specs:
+        for c in INDICATORS[s["name"]].columns(s):
+            if not _COLUMN_RE.match(c):
+                raise ValueError(f"Bad indicator column name {c!r}")
+            if c not in cols:
+                cols.append(c)
+    return cols
+
+
+def indicator_lookback(specs: Sequence[Spec]) -> Optional[int]:
+    """Trailing rows the `specs` need to reproduce a full run; None when one needs the whole history."""
+    need = 0
+    for s in specs:
+        n = INDICATORS[s["name"]].lookback(s)
+        if n is None:
+            return None
+        need = max(need, int(n))
+    return need
+
+
+def compute_indicators(close: np.ndarray, specs: Sequence[Spec],
+                       volume: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Every requested indicator in one pass over the price arrays, sharing intermediates."""
+    ctx = Context(close, volume)
+    for s in specs:
+        for kind, w in INDICATORS[s["name"]].extrema(s):
+            ctx.plan_extrema(kind, w)
+    out: Dict[str, np.ndarray] = {}
+    for s in specs:
+        out.update(INDICATORS[s["name"]].fn(ctx, s))
+    return out
+
+
+def load_engine_config(cfg: Optional[Dict[str, Any]]) -> Tuple[List[Spec], List[Spec]]:
+    """(indicator specs, signal specs) from the `indicators:` / `signals:` config keys.
+
+    Indicators a signal rule reads are added automatically.
+    """
+    from src.signals import SIGNAL_RULES
+
+    cfg = cfg or {}
+    rules = [normalize_spec(s, SIGNAL_RULES) for s in cfg.get("signals") or []]
+    specs = [normalize_spec(s, INDICATORS) for s in cfg.get("indicators") or []]
+    for r in rules:
+        specs += [normalize_spec(s, INDICATORS) for s in SIGNAL_RULES[r["name"]].requires(r)]
+    return _dedupe(specs), _dedupe(rules)
@@ -0,0 +1,136 @@
+# src/instrument.py
+from __future__ import annotations
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Process-wide recorder, None (the default) disables every hook below (see set_recorder)
+_recorder: Optional["Recorder"] = None
+_NULL = contextlib.nullcontext()
+
+REPORT_FORMATS = ("json", "prom")
+
+
+class Recorder:
+    """Stage timings (count, total and max seconds) and counters for one run."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            t = self.timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            t["count"] += calls
+            t["total"] += seconds
+            t["max"] = max(t["max"], seconds / max(1, calls))
+
+    def count(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge_timings(self, timings: Dict[str, float]):
+        """Fold per-call stage seconds measured elsewhere (e.g. in a worker process)."""
+        for name, seconds in timings.items():
+            self.add_time(name, seconds)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(self.started)),
+                "wall_seconds": round(time.time() - self.started, 6),
+                "stages": {k: {"count": int(v["count"]), "total_sec": round(v["total"], 6),
+                               "max_sec": round(v["max"], 6)} for k, v in sorted(self.timings.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def prometheus(self, prefix: str = "funds") -> str:
+        """The report in Prometheus text exposition format."""
+        r = self.report()
+        lines = [f"# TYPE {prefix}_run_wall_seconds gauge", f"{prefix}_run_wall_seconds {r['wall_seconds']}"]
+        if r["stages"]:
+            for metric, key in (("stage_seconds_total", "total_sec"), ("stage_calls_total", "count"),
+                                ("stage_max_seconds", "max_sec")):
+                lines.append(f"# TYPE {prefix}_{metric} {'gauge' if metric.endswith('max_seconds') else 'counter'}")
+                lines += [f'{prefix}_{metric}{{stage="{k}"}} {v[key]}' for k, v in r["stages"].items()]
+        for name, value in r["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, fmt: str = "json"):
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"report format must be one of {REPORT_FORMATS}, got {fmt!r}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus() if fmt == "prom" else json.dumps(self.report(), indent=2) + "\n")
+
+
+def set_recorder(recorder: Optional[Recorder]):
+    global _recorder
+    _recorder = recorder
+
+
+def get_recorder() -> Optional[Recorder]:
+    return _recorder
+
+
+def stage(name: str):
+    """Context manager timing `name`; a shared no-op when no recorder is set."""
+    rec = _recorder
+    return _NULL if rec is None else rec.stage(name)
+
+
+def count(name: str, n: float = 1):
+    rec = _recorder
+    if rec is not None:
+        rec.count(name, n)
+
+
+def timed(name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """`fn` timed as stage `name` (for work handed to pools); `fn` itself when disabled."""
+    if _recorder is None:
+        return fn
+
+    def _run(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    return _run
+
+
+def report_path(out_dir: str, fmt: str) -> str:
+    return os.path.join(out_dir, f"run_report.{fmt}")
+
+
+@contextlib.contextmanager
+def profiled(path: Optional[str], top: int = 25) -> Iterator[None]:
+    """cProfile the block and dump stats to `path` (load with pstats/snakeviz); no-op without a path.
+
+    Only the calling thread is profiled; fetch threads and compute processes show as waits.
+    """
+    if not path:
+        yield
+        return
+    import cProfile
+    import pstats
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
+        with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(top)
@@ -0,0 +1,377 @@
+# src/kernels.py
+from __future__ import annotations
+import math
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Batch kernels over (tickers x days) arrays; a single ticker is a 1-row panel.
+# Every window is strict: NaN unless all `w` values are present, as with
+# ``rolling(w, min_periods=w)``.
+# ---------------------------------------------------------------------------
+
+def _check_window(w: int):
+    if w < 1:
+        raise ValueError(f"window must be >= 1, got {w}")
+
+
+def rolling_mean(x: np.ndarray, w: int) -> np.ndarray:
+    """Strict rolling mean along the last axis from prefix sums restarted every `w` days.
+
+    A window ending at i is the prefix of its own block plus the part of the
+    previous block after i - w, so the rounding error scales with the window
+    rather than the length of the series. Blocks start at each row's first
+    value, so leading NaN padding (a panel row for a late listing) doesn't
+    change a single bit.
+
+    The NaN mask is pandas' ``rolling(w, min_periods=w).mean()``, and so are
+    its exact cases: a window of one repeated value is that value, and a mean
+    whose sign disagrees with every value in the window is 0. Elsewhere values
+    agree to a relative ~1e-13 but aren't bit-identical, since pandas sums with
+    a sequential compensated add/remove loop that doesn't vectorize. The exact
+    cases are what keep sma50 == sma200 on a flat stretch, so crossovers match.
+    """
+    _check_window(w)
+    rows, n = x.shape
+    out = np.full((rows, n), np.nan)
+    if n < w:
+        return out
+    nan = np.isnan(x)
+    first = np.where(nan.all(axis=1), 0, np.argmin(nan, axis=1))
+    late = np.flatnonzero(first)
+    blocks = -(-n // w)
+    c = np.zeros((rows, blocks * w))
+    c[:, :n] = x
+    c[:, :n][nan] = 0.0
+    if late.size:
+        shifted = np.minimum(np.arange(n)[None, :] + first[late, None], n - 1)
+        c[late, :n] = np.take_along_axis(c[late, :n], shifted, axis=1)
+    np.cumsum(c.reshape(rows, blocks, w), axis=2, out=c.reshape(rows, blocks, w))
+    s = np.empty((rows, n))
+    s[:, :w] = c[:, :w]
+    i = np.arange(w, n)
+    s[:, w:] = c[:, w:n] + (c[:, (i // w) * w - 1] - c[:, :n - w])
+    if late.size:
+        back = np.arange(n)[None, :] - first[late, None]
+        s[late] = np.where(back >= 0, np.take_along_axis(s[late], np.maximum(back, 0), axis=1), np.nan)
+    cn = np.zeros((rows, n + 1), dtype=np.int64)
+    np.cumsum(nan, axis=1, out=cn[:, 1:])
+    s = s[:, w - 1:] / w
+    s[(cn[:, w:] - cn[:, :-w]) > 0] = np.nan
+    # pandas' calc_mean: a window of one repeated value returns it, and a sign no value has is clamped to 0
+    steps = np.zeros((rows, n), dtype=np.int64)
+    np.cumsum(x[:, 1:] != x[:, :-1], axis=1, out=steps[:, 1:])
+    flat = (steps[:, w - 1:] - steps[:, :n - w + 1]) == 0
+    s[flat] = x[:, w - 1:][flat]
+    neg = np.zeros((rows, n + 1), dtype=np.int64)
+    np.cumsum(np.signbit(x) & ~nan, axis=1, out=neg[:, 1:])
+    neg = neg[:, w:] - neg[:, :-w]
+    with np.errstate(invalid="ignore"):
+        s[((neg == 0) & (s < 0)) | ((neg == w) & (s > 0))] = 0.0
+    out[:, w - 1:] = s
+    return out
+
+
+def rolling_max_windows(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """Strict rolling max along the last axis for several windows from one doubling sweep.
+
+    The sweep builds max(x[j:j+span]) for span = 1, 2, 4, ... up to the largest
+    window, in O(log w) vectorized passes; each window reads the two overlapping
+    spans of the largest power of two <= w that it needs. NaN propagates.
+    """
+    windows = sorted(set(int(w) for w in windows))
+    for w in windows:
+        _check_window(w)
+    x = np.asarray(x, dtype=np.float64)
+    rows, n = x.shape
+    out = {w: np.full((rows, n), np.nan) for w in windows}
+    fits = [w for w in windows if w <= n]
+    if not fits:
+        return out
+    need = {1 << (w.bit_length() - 1) for w in fits}
+    m, span = x, 1
+    spans = {1: x}
+    while span * 2 <= fits[-1]:
+        m = np.maximum(m[:, :-span], m[:, span:])
+        span *= 2
+        if span in need:
+            spans[span] = m
+    for w in fits:
+        span = 1 << (w.bit_length() - 1)
+        m = spans[span]
+        out[w][:, w - 1:] = np.maximum(m[:, :n - w + 1], m[:, w - span:])
+    return out
+
+
+def rolling_max(x: np.ndarray, w: int) -> np.ndarray:
+    """Strict rolling max along the last axis by doubling: O(log w) vectorized passes."""
+    return rolling_max_windows(x, [w])[w]
+
+
+def rolling_min(x: np.ndarray, w: int) -> np.ndarray:
+    return -rolling_max(-np.asarray(x, dtype=np.float64), w)
+
+
+def rolling_min_windows(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    return {w: -v for w, v in rolling_max_windows(-np.asarray(x, dtype=np.float64), windows).items()}
+
+
+# ---------------------------------------------------------------------------
+# Streaming accumulators: O(1) amortized per value, with a JSON-ready state so
+# a resumed run or an intraday tick continues a window without re-scanning it.
+# ---------------------------------------------------------------------------
+
+class RollingMean:
+    """Strict rolling mean as a compensated running sum over a ring of the last `window` values.
+
+    Each push adds the new value and subtracts the evicted one with Kahan
+    compensation, and every `resync` pushes the sum is recomputed exactly
+    (math.fsum over the ring), so drift can't build up over a long stream.
+    A run of one repeated value and a sign no value in the window has are
+    exact, as in `rolling_mean`.
+    """
+    __slots__ = ("window", "resync", "_ring", "_pos", "_filled", "_sum", "_comp", "_nans", "_since",
+                 "_run", "_negs")
+
+    def __init__(self, window: int, resync: Optional[int] = None):
+        if window < 1:
+            raise ValueError(f"window must be >= 1, got {window}")
+        self.window = int(window)
+        self.resync = max(1, int(resync or window))
+        self._ring = [0.0] * self.window
+        self._pos = 0
+        self._filled = 0
+        self._sum = 0.0
+        self._comp = 0.0
+        self._nans = 0
+        self._since = 0
+        self._run = 0  # trailing pushes equal to the last one
+        self._negs = 0  # values in the ring with the sign bit set
+
+    def _add(self, v: float):
+        y = v - self._comp
+        t = self._sum + y
+        self._comp = (t - self._sum) - y
+        self._sum = t
+
+    def _exact(self):
+        self._sum, self._comp, self._since = math.fsum(v for v in self._ring if v == v), 0.0, 0
+
+    def _mean(self, total: float, last: float, run: int, negs: int) -> float:
+        # pandas' calc_mean special cases, so equal windows compare equal
+        if run >= self.window:
+            return last
+        m = total / self.window
+        if (negs == 0 and m < 0) or (negs == self.window and m > 0):
+            return 0.0
+        return m
+
+    @property
+    def value(self) -> float:
+        if self._filled < self.window or self._nans:
+            return math.nan
+        return self._mean(self._sum, self._ring[self._pos - 1], self._run, self._negs)
+
+    def push(self, x: float) -> float:
+        """Append one value; returns the mean of the window ending at it."""
+        x = float(x)
+        self._run = self._run + 1 if self._filled and x == self._ring[self._pos - 1] else int(x == x)
+        if self._filled == self.window:
+            old = self._ring[self._pos]
+            self._negs -= old == old and math.copysign(1.0, old) < 0
+            if old != old:
+                self._nans -= 1
+            else:
+                self._add(-old)
+        else:
+            self._filled += 1
+        self._negs += x == x and math.copysign(1.0, x) < 0
+        self._ring[self._pos] = x
+        if x != x:
+            self._nans += 1
+        else:
+            self._add(x)
+        self._pos = (self._pos + 1) % self.window
+        self._since += 1
+        if self._since >= self.resync:
+            self._exact()
+        return self.value
+
+    def peek(self, x: float) -> float:
+        """The mean `push(x)` would return, without changing the state."""
+        x = float(x)
+        old = self._ring[self._pos] if self._filled == self.window else 0.0
+        nans = self._nans + (x != x) - (old != old)
+        if self._filled + (self._filled < self.window) < self.window or nans:
+            return math.nan
+        run = self._run + 1 if x == self._ring[self._pos - 1] else 1
+        old = old if old == old else 0.0
+        negs = self._negs + (math.copysign(1.0, x) < 0) - (self._filled == self.window and math.copysign(1.0, old) < 0)
+        return self._mean(self._sum - self._comp - old + x, x, run, negs)
+
+    def extend(self, xs: Iterable[float]) -> np.ndarray:
+        return np.array([self.push(x) for x in xs], dtype=np.float64)
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = self._ring[self._pos:] + self._ring[:self._pos] if self._filled == self.window \
+            else self._ring[:self._filled]
+        return {"window": self.window, "resync": self.resync, "values": [None if v != v else v for v in values]}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RollingMean":
+        k = cls(d["window"], d.get("resync"))
+        values = [math.nan if v is None else float(v) for v in d["values"]][-k.window:]
+        k._ring[:len(values)] = values
+        k._filled = len(values)
+        k._pos = len(values) % k.window
+        k._nans = sum(v != v for v in values)
+        k._negs = sum(v == v and math.copysign(1.0, v) < 0 for v in values)
+        for v in reversed(values):
+            if v != values[-1]:
+                break
+            k._run += 1
+        k._exact()
+        return k
+
+
+class RollingMax:
+    """Strict rolling max (or min, `kind="min"`) over a monotonic deque of (index, value).
+
+    The deque holds only values that can still become the window's extreme,
+    in decreasing order, so its front is the answer and each value is
+    appended and dropped once.
+    """
+    __slots__ = ("window", "kind", "_sign", "_idx", "_val", "_next", "_last_nan")
+
+    def __init__(self, window: int, kind: str = "max"):
+        if window < 1:
+            raise ValueError(f"window must be >= 1, got {window}")
+        if kind not in ("max", "min"):
+            raise ValueError(f"kind must be 'max' or 'min', got {kind!r}")
+        self.window = int(window)
+        self.kind = kind
+        self._sign = 1.0 if kind == "max" else -1.0
+        self._idx: deque = deque()
+        self._val: deque = deque()  # signed, so the deque is always a max-deque
+        self._next = 0
+        self._last_nan = -self.window
+
+    def _valid(self, i: int) -> bool:
+        return i + 1 >= self.window and i - self._last_nan >= self.window
+
+    @property
+    def value(self) -> float:
+        i = self._next - 1
+        return self._sign * self._val[0] if self._val and self._valid(i) else math.nan
+
+    def push(self, x: float) -> float:
+        """Append one value; returns the extreme of the window ending at it."""
+        i = self._next
+        self._next += 1
+        v = self._sign * float(x)
+        if v != v:
+            self._last_nan = i
+        else:
+            while self._val and self._val[-1] <= v:
+                self._idx.pop()
+                self._val.pop()
+            self._idx.append(i)
+            self._val.append(v)
+        while self._idx and self._idx[0] <= i - self.window:
+            self._idx.popleft()
+            self._val.popleft()
+        return self.value
+
+    def peek(self, x: float) -> float:
+        """The extreme `push(x)` would return, without changing the state."""
+        i = self._next
+        v = self._sign * float(x)
+        if v != v or not self._valid(i):
+            return math.nan
+        for j, u in zip(self._idx, self._val):  # only the front can fall out, so this stops by the second entry
+            if j > i - self.window:
+                v = max(v, u)
+                break
+        return self._sign * v
+
+    def extend(self, xs: Iterable[float]) -> np.ndarray:
+        return np.array([self.push(x) for x in xs], dtype=np.float64)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"window": self.window, "kind": self.kind, "next": self._next, "last_nan": self._last_nan,
+                "idx": list(self._idx), "val": [self._sign * v for v in self._val]}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RollingMax":
+        k = cls(d["window"], d.get("kind", "max"))
+        k._next, k._last_nan = int(d["next"]), int(d["last_nan"])
+        k._idx.extend(int(i) for i in d["idx"])
+        k._val.extend(k._sign * float(v) for v in d["val"])
+        return k
+
+
+def _window_metrics(close: float, sma50: float, sma_long: float, high: float) -> Dict[str, Any]:
+    # Same derivations as panel.panel_metrics
+    has_high = high == high
+    return {
+        "close": close,
+        "sma50": sma50,
+        "sma200": sma_long,
+        "high_52w": high,
+        "pct_from_52w_high": (close - high) / high if has_high else math.nan,
+        "is_52w_high": abs(close - high) <= 1e-8 if has_high else False,
+    }
+
+
+class MetricWindows:
+    """Streaming SMA-50, SMA-`min_sma_days` and 52-week high for one ticker.
+
+    `push` appends a day's close; `peek` prices a provisional close (an
+    intraday tick) against the same windows without advancing them. Both are
+    O(1), and `to_dict`/`from_dict` carry the state between runs.
+    """
+    __slots__ = ("min_sma_days", "last_day", "sma50", "sma_long", "high_52w")
+
+    def __init__(self, min_sma_days: int = 200):
+        self.min_sma_days = int(min_sma_days)
+        self.last_day: Optional[int] = None  # days since epoch of the last pushed close
+        self.sma50 = RollingMean(50)
+        self.sma_long = RollingMean(self.min_sma_days)
+        self.high_52w = RollingMax(252)
+
+    @classmethod
+    def from_closes(cls, closes: Iterable[float], min_sma_days: int = 200,
+                    last_day: Optional[int] = None) -> "MetricWindows":
+        """Windows primed with trailing closes (at least `max(252, min_sma_days)` of them for full state)."""
+        mw = cls(min_sma_days)
+        for c in closes:
+            mw.push(c)
+        mw.last_day = None if last_day is None else int(last_day)
+        return mw
+
+    def push(self, close: float, day: Optional[int] = None) -> Dict[str, Any]:
+        if day is not None:
+            if self.last_day is not None and day <= self.last_day:
+                raise ValueError(f"day {day} is not after the last pushed day {self.last_day}")
+            self.last_day = int(day)
+        close = float(close)
+        return _window_metrics(close, self.sma50.push(close), self.sma_long.push(close), self.high_52w.push(close))
+
+    def peek(self, close: float) -> Dict[str, Any]:
+        close = float(close)
+        return _window_metrics(close, self.sma50.peek(close), self.sma_long.peek(close), self.high_52w.peek(close))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"min_sma_days": self.min_sma_days, "last_day": self.last_day, "sma50": self.sma50.to_dict(),
+                "sma_long": self.sma_long.to_dict(), "high_52w": self.high_52w.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "MetricWindows":
+        mw = cls(d["min_sma_days"])
+        mw.last_day = d.get("last_day")
+        mw.sma50 = RollingMean.from_dict(d["sma50"])
+        mw.sma_long = RollingMean.from_dict(d["sma_long"])
+        mw.high_52w = RollingMax.from_dict(d["high_52w"])
+        return mw
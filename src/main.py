@@ -1,117 +1,94 @@
 # main.py
-import os
-import json
+import sys
 import logging
+import contextlib
+from typing import List, Optional
 import typer
-import pandas as pd
-import yaml
-from datetime import datetime, date
 
-# Package-local imports (adjust 'BRC' if your folder is named differently)
-from src.data_fetcher import fetch_raw_bundle
-from src.processor import process_bundle
-from src.signals import detect_crossovers
-from src.database import get_engine, init_schema, upsert_daily, upsert_signals, upsert_ticker
-from src.models import ExportPayload, SignalEvent
+# Only typer and the stdlib load with the module, so `--help` and the argument
+# parsing stay fast; each command imports the heavy stack (pandas, SQLAlchemy,
+# pydantic, yfinance on first download) when it actually runs.
+from src.instrument import REPORT_FORMATS
+
+EXPORT_FORMATS = ("json", "ndjson", "columnar")  # mirrors src.export.FORMATS
+SCREEN_FORMATS = ("table", "csv", "json")
 
 app = typer.Typer(add_completion=False)
 
+def __getattr__(name: str):
+    # Kept importable from src.main without loading the pipeline at startup
+    if name == "EnhancedJSONEncoder":
+        from src.pipeline import EnhancedJSONEncoder
+        return EnhancedJSONEncoder
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def load_cfg(path: str):
+    import yaml
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, (date, datetime)):
-            return o.isoformat()
-        if isinstance(o, SignalEvent):
-            try:
-                return o.model_dump()
-            except Exception:
-                return {"date": getattr(o, "date", None), "type": getattr(o, "type", None)}
-        return super().default(o)
-
-def _ensure_parent(path: str):
-    parent = os.path.dirname(path)
-    if parent:
-        os.makedirs(parent, exist_ok=True)
+def _check_formats(fmt: str, report: Optional[str] = None):
+    if fmt not in EXPORT_FORMATS:
+        raise typer.BadParameter(f"--format must be one of {', '.join(EXPORT_FORMATS)}")
+    if report is not None and report not in REPORT_FORMATS:
+        raise typer.BadParameter(f"--report must be one of {', '.join(REPORT_FORMATS)}")
+
+@contextlib.contextmanager
+def _instrumentation(report: Optional[str], profile: Optional[str], out_dir: str):
+    """Record stages/counters for `--report` and profile for `--profile`; free when neither is set."""
+    from src.instrument import Recorder, profiled, report_path, set_recorder
+    from src.data_fetcher import get_cache
+    rec = Recorder() if report else None
+    set_recorder(rec)
+    try:
+        with profiled(profile):
+            yield
+    finally:
+        set_recorder(None)
+        if rec is not None:
+            cache = get_cache()
+            if cache is not None:
+                rec.count("cache_hits", cache.hits)
+                rec.count("cache_misses", cache.misses)
+            path = report_path(out_dir, report)
+            rec.write(path, report)
+            typer.echo(f" Run report: {path}")
+        if profile:
+            typer.echo(f" Profile: {profile}")
 
 @app.command()
 def run(
     ticker: str = typer.Option(..., "--ticker", "-t", help="Stock symbol"),
     output: str = typer.Option(None, "--output", "-o", help="Output JSON file"),
     config: str = typer.Option("config.yaml", "--config"),
+    incremental: bool = typer.Option(False, "--incremental", help="Only fetch/store days after the last stored row"),
+    fmt: str = typer.Option("json", "--format", help="Export format: json, ndjson or columnar"),
+    report: str = typer.Option(None, "--report", help="Write stage timings/counters to <output_dir>/run_report.{json,prom}"),
+    profile: str = typer.Option(None, "--profile", help="cProfile the run into this .prof file (+ .txt summary)"),
+    force: bool = typer.Option(False, "--force", help="Redo every stage even if inputs, config and code are unchanged"),
 ):
+    _check_formats(fmt, report)
     # Load config
     cfg = load_cfg(config)
     logging.basicConfig(level=getattr(logging, cfg.get("log_level", "INFO")))
     logging.info(f"Starting run for {ticker}")
 
-    # Ensure DB and output directories
-    db_path = cfg.get("db_path", "data/app.db")
-    _ensure_parent(db_path)
-    out_dir = cfg.get("output_dir", "out")
-    os.makedirs(out_dir, exist_ok=True)
-
-    if output is None:
-        output = os.path.join(out_dir, f"{ticker.upper()}.json")
-    _ensure_parent(output)
-
-    # DB setup
-    engine = get_engine(db_path)
-    init_schema(engine)
-
-    # Fetch and process
-    period = cfg.get("historical_period", "5y")
-    min_sma_days = int(cfg.get("min_sma_days", 200))
-
-    raw = fetch_raw_bundle(ticker, period=period)
-    logging.info(f"Fetched {len(raw.prices)} price rows for {ticker}")
-
-    df, rows_validated = process_bundle(raw, min_sma_days=min_sma_days)
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    short_history = len(df) < min_sma_days
-    logging.info(f"Processed {len(df)} rows; short_history={short_history}")
-
-    # Prepare rows for DB
-    tmp = df.copy()
-    tmp["date_str"] = tmp["date"].dt.strftime("%Y-%m-%d")
-    wanted = ["date_str","close","sma50","sma200","high_52w","bvps","pb","ev","pct_from_52w_high","is_52w_high"]
-    present = [c for c in wanted if c in tmp.columns]
-    subset = tmp.loc[:, present].rename(columns={"date_str": "date"})
-    subset = subset.where(pd.notna(subset), None)
-
-    # Persist metrics and ticker
-    upsert_ticker(engine, ticker)
-    upsert_daily(engine, ticker, subset)
-
-    # Detect and persist signals
-    events, contexts = detect_crossovers(ticker, df)
-    upsert_signals(engine, ticker, [{"date": e.date, "type": e.type} for e in events])
-
-    # Build payload
-    payload = ExportPayload(
-        ticker=ticker,
-        generated_at=datetime.utcnow().isoformat(),
-        metrics=[r.model_dump() for r in rows_validated],
-        signals=events,
-        notes={
-            "rows": int(len(df)),
-            "min_sma_days": min_sma_days,
-            "data_source": "yfinance",
-            "short_history": short_history,
-            "event_contexts": contexts,
-        },
-    )
-
-    # Save JSON
-    logging.info(f"Writing JSON to {output}")
-    with open(output, "w", encoding="utf-8") as f:
-        json.dump(payload.model_dump(), f, ensure_ascii=False, indent=2, cls=EnhancedJSONEncoder)
+    from src.service import Session
+    with Session(cfg) as session:
+        session.engine  # DB setup before the timed part, as the batch command does
+        with _instrumentation(report, profile, session.out_dir):
+            out = session.run_ticker(ticker, output, incremental=incremental, fmt=fmt, force=force)
+    if out.unchanged:
+        typer.echo(f" {ticker} is unchanged since the last run; kept {out.output} (--force to redo).")
+        return
+    if out.up_to_date:
+        typer.echo(f" {ticker} is up to date (last stored {out.result.since}).")
+        return
 
     # Console summary
-    typer.echo(f" Saved: {output}")
-    typer.echo(f" Database updated at {db_path}")
+    events = out.result.events
+    typer.echo(f" Saved: {out.output}")
+    typer.echo(f" Database updated at {session.db_path}")
     if events:
         typer.echo(f"⚡ Signals found: {len(events)}")
         for e in events[:5]:
@@ -119,8 +96,218 @@ def run(
     else:
         typer.echo(" No crossovers in the selected period.")
 
+@app.command()
+def batch(
+    tickers: str = typer.Option(None, "--tickers", help="Comma-separated symbols"),
+    tickers_file: str = typer.Option(None, "--tickers-file", help="File with one or more symbols per line"),
+    config: str = typer.Option("config.yaml", "--config"),
+    fetch_workers: int = typer.Option(None, "--fetch-workers", help="Concurrent downloads"),
+    compute_workers: int = typer.Option(None, "--compute-workers", help="Processing processes (0 = inline)"),
+    incremental: bool = typer.Option(False, "--incremental", help="Only fetch/store days after the last stored row"),
+    fmt: str = typer.Option("json", "--format", help="Export format: json, ndjson or columnar"),
+    combined: str = typer.Option(None, "--combined", help="Write every ticker into this one file instead"),
+    fetch_batch_size: int = typer.Option(None, "--fetch-batch-size", help="Symbols per price download (0 = one by one)"),
+    async_fetch: bool = typer.Option(False, "--async-fetch",
+                                     help="Rate-limited async fetcher (settings in `async_fetch:` config)"),
+    report: str = typer.Option(None, "--report", help="Write stage timings/counters to <output_dir>/run_report.{json,prom}"),
+    profile: str = typer.Option(None, "--profile", help="cProfile the run into this .prof file (+ .txt summary)"),
+    force: bool = typer.Option(False, "--force", help="Redo every stage even if inputs, config and code are unchanged"),
+):
+    """Run the full pipeline for many tickers in one process."""
+    _check_formats(fmt, report)
+    cfg = load_cfg(config)
+    logging.basicConfig(level=getattr(logging, cfg.get("log_level", "INFO")))
+
+    from src.pipeline import resolve_tickers
+    from src.service import Session
+    symbols = resolve_tickers(tickers, tickers_file, cfg)
+    if not symbols:
+        raise typer.BadParameter("No tickers given: use --tickers, --tickers-file or `tickers:` in config")
+
+    with Session(cfg) as session:
+        session.engine
+        with _instrumentation(report, profile, session.out_dir):
+            summary = session.batch(symbols, fetch_workers, compute_workers, incremental, fmt, combined,
+                                    fetch_batch_size, async_fetch, force)
+
+    typer.echo(f" Processed {len(summary.ok)}/{len(symbols)} tickers into {combined or session.out_dir}")
+    if summary.unchanged:
+        typer.echo(f" Skipped {len(summary.unchanged)} unchanged (--force to redo)")
+    typer.echo(f" Database updated at {session.db_path}")
+    typer.echo(f"⚡ Signals found: {summary.signals}")
+    for t, err in summary.failed.items():
+        typer.echo(f"  ! {t}: {err}")
+    if summary.failed:
+        raise typer.Exit(code=1)
+
+@app.command()
+def recompute(
+    tickers: str = typer.Option(None, "--tickers", help="Comma-separated symbols (default: every stored one)"),
+    tickers_file: str = typer.Option(None, "--tickers-file", help="File with one or more symbols per line"),
+    config: str = typer.Option("config.yaml", "--config"),
+    fmt: str = typer.Option("json", "--format", help="Export format: json, ndjson or columnar"),
+    force: bool = typer.Option(False, "--force", help="Redo every stage even if inputs, config and code are unchanged"),
+):
+    """Rebuild metrics, signals and exports from stored prices, without downloading anything."""
+    _check_formats(fmt)
+    cfg = load_cfg(config)
+    logging.basicConfig(level=getattr(logging, cfg.get("log_level", "INFO")))
+
+    from src.pipeline import resolve_tickers
+    from src.service import Session
+    symbols = resolve_tickers(tickers, tickers_file) or None
+    with Session(cfg) as session:
+        summary = session.recompute(symbols, fmt, force)
+
+    done = len(summary.ok) - len(summary.unchanged)
+    typer.echo(f" Recomputed {done} tickers from stored prices into {session.out_dir}")
+    if summary.unchanged:
+        typer.echo(f" Skipped {len(summary.unchanged)} unchanged (--force to redo)")
+    typer.echo(f"⚡ Signals found: {summary.signals}")
+    for t, err in summary.failed.items():
+        typer.echo(f"  ! {t}: {err}")
+    if summary.failed:
+        raise typer.Exit(code=1)
+
+@app.command()
+def backtest(
+    tickers: str = typer.Option(None, "--tickers", help="Comma-separated symbols (default: every stored one)"),
+    tickers_file: str = typer.Option(None, "--tickers-file", help="File with one or more symbols per line"),
+    horizons: str = typer.Option("5,20,60,120", "--horizons", help="Forward-return horizons in trading days"),
+    chunk_size: int = typer.Option(500, "--chunk-size", help="Symbols loaded per pass (bounds memory)"),
+    long_short: bool = typer.Option(False, "--long-short", help="Short after death crosses instead of going flat"),
+    start: str = typer.Option(None, "--start", help="First day (YYYY-MM-DD)"),
+    end: str = typer.Option(None, "--end", help="Last day (YYYY-MM-DD)"),
+    output: str = typer.Option(None, "--output", "-o", help="Write summary, per-ticker stats and equity curve as JSON"),
+    config: str = typer.Option("config.yaml", "--config"),
+):
+    """Score stored golden/death crosses: forward returns, hit rates, drawdowns and an equity curve."""
+    import json
+    cfg = load_cfg(config)
+    logging.basicConfig(level=getattr(logging, cfg.get("log_level", "INFO")))
+    try:
+        hs = [int(h) for h in horizons.split(",") if h.strip()]
+    except ValueError:
+        raise typer.BadParameter("--horizons must be comma-separated integers")
+
+    from src.pipeline import ensure_parent, resolve_tickers
+    from src.service import Session
+    symbols = resolve_tickers(tickers, tickers_file) or None
+    with Session(cfg) as session:
+        try:
+            res = session.backtest(symbols, hs, chunk_size=chunk_size, long_only=not long_short, start=start, end=end)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+
+    if res.summary.empty:
+        typer.echo(" No stored signals to backtest.")
+    else:
+        typer.echo(res.summary.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    port = res.to_dict()["portfolio"]
+    typer.echo(f" Portfolio over {port['days']} days: total return {port['total_return']:+.2%}, "
+               f"max drawdown {port['max_drawdown']:.2%} ({len(res.tickers)} tickers)")
+    if output:
+        ensure_parent(output)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(res.to_dict(), f, default=float)
+        typer.echo(f" Saved: {output}")
+
+@app.command()
+def screen(
+    where: List[str] = typer.Option([], "--where", "-w",
+                                    help="Filter, e.g. 'pct_from_52w_high >= -5% and pb < 3 and golden_cross within 10 days'"),
+    columns: str = typer.Option(None, "--columns", help="Comma-separated metric columns to show"),
+    sort: str = typer.Option(None, "--sort", help="Sort column"),
+    desc: bool = typer.Option(False, "--desc", help="Sort descending"),
+    limit: int = typer.Option(None, "--limit"),
+    fmt: str = typer.Option("table", "--format", help="table, csv or json"),
+    config: str = typer.Option("config.yaml", "--config"),
+):
+    """Screen the latest stored metrics across all tickers."""
+    if fmt not in SCREEN_FORMATS:
+        raise typer.BadParameter(f"--format must be one of {', '.join(SCREEN_FORMATS)}")
+    from src.service import Session
+    cfg = load_cfg(config)
+    cols = [c.strip() for c in columns.split(",")] if columns else None
+    with Session(cfg) as session:
+        try:
+            df = session.screen(where, columns=cols, order_by=sort, descending=desc, limit=limit)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+    if fmt == "json":
+        typer.echo(df.to_json(orient="records"))
+    elif fmt == "csv":
+        typer.echo(df.to_csv(index=False), nl=False)
+    else:
+        typer.echo(df.to_string(index=False) if not df.empty else " No matches.")
+
+@app.command("cache-seed")
+def cache_seed(
+    paths: List[str] = typer.Argument(..., help="CSV files named <TICKER>.csv"),
+    kind: str = typer.Option("prices", "--kind", help="prices (date, close) or fundamentals (period_end, ...)"),
+    config: str = typer.Option("config.yaml", "--config"),
+):
+    """Seed the local data cache from files so runs work without a network."""
+    from src.cache import DataCache, seed_from_file
+    cfg = load_cfg(config)
+    cache = DataCache.from_config(cfg) or DataCache.from_config({"cache": True})
+    period = cfg.get("historical_period", "5y")
+    for path in paths:
+        ticker = seed_from_file(cache, path, kind=kind, period=period)
+        typer.echo(f" Seeded {kind} for {ticker} from {path}")
+
+@app.command()
+def serve(
+    config: str = typer.Option("config.yaml", "--config"),
+):
+    """Warm job loop: JSON requests on stdin, one JSON reply per line on stdout.
+
+    Requests look like {"id": 1, "cmd": "run", "ticker": "NVDA", "incremental": true};
+    cmd is run, batch, recompute, backtest, tick, screen, latest, history, signals, ping or quit. Modules,
+    the engine, the data cache and the compute pool are loaded once and reused by every request.
+    """
+    cfg = load_cfg(config)
+    # Replies own stdout; logs go to stderr
+    logging.basicConfig(level=getattr(logging, cfg.get("log_level", "INFO")), stream=sys.stderr)
+    from src.service import Session
+    with Session(cfg) as session:
+        session.engine
+        n = session.serve(sys.stdin, sys.stdout)
+    logging.info(f"serve: handled {n} job(s)")
+
+@app.command()
+def api(
+    host: str = typer.Option("127.0.0.1", "--host"),
+    port: int = typer.Option(8765, "--port"),
+    cache_mb: Optional[int] = typer.Option(None, "--cache-mb", help="Hot-symbol cache size; 0 disables it"),
+    config: str = typer.Option("config.yaml", "--config"),
+):
+    """Read-only HTTP API over the stored metrics for dashboards.
+
+    GET /latest?symbols=A,B[&columns=close,sma50], /history?symbol=A[&start=&end=&columns=],
+    /signals[?days=30&types=golden_cross&limit=500&since=] and /stats, all answering JSON.
+    """
+    cfg = load_cfg(config)
+    logging.basicConfig(level=getattr(logging, cfg.get("log_level", "INFO")))
+    if cache_mb is not None:
+        cfg["api_cache_mb"] = cache_mb
+    from src.query import make_server
+    from src.service import Session
+    with Session(cfg) as session:
+        server = make_server(session.reader, host, port)
+        logging.info(f"api: listening on http://{server.server_address[0]}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) == 1:
-        sys.argv.append("run")
+    # Bare options (`python -m src.main --ticker NVDA`) still mean `run`
+    if len(sys.argv) == 1 or (sys.argv[1].startswith("-") and sys.argv[1] not in ("--help", "-h")):
+        sys.argv.insert(1, "run")
+    # README form: `--tickers A,B,C` goes to the batch command
+    if sys.argv[1] == "run" and any(a.split("=")[0] in ("--tickers", "--tickers-file") for a in sys.argv[2:]):
+        sys.argv[1] = "batch"
     app()
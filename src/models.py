@@ -1,8 +1,11 @@
 # src/models.py
 from __future__ import annotations
+from collections.abc import Sequence
 from datetime import date, datetime
 from decimal import Decimal
 from typing import List, Optional, Dict, Any
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel, Field, field_validator
 
 class PriceRow(BaseModel):
@@ -58,3 +61,307 @@ class ExportPayload(BaseModel):
     metrics: List[Dict[str, Any]]
     signals: List[SignalEvent]
     notes: Dict[str, Any]
+
+
+# ---------------------------------------------------------------------------
+# Column-wise validation: the same constraints as the models above, checked on
+# whole DataFrame columns so hot paths don't build one object per row.
+# ---------------------------------------------------------------------------
+PROCESSED_FIELDS = list(ProcessedRow.model_fields)
+_PROCESSED_FLOATS = [f for f in PROCESSED_FIELDS if f not in ("date", "is_52w_high")]
+
+
+def _bad_rows(mask: np.ndarray, index: pd.Index, limit: int = 5) -> List[Any]:
+    return index[mask][:limit].tolist()
+
+
+def _float_column(df: pd.DataFrame, col: str, required: bool = False) -> pd.Series:
+    s = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+    vals = pd.to_numeric(s, errors="coerce").astype(float)
+    bad = vals.isna().to_numpy() & s.notna().to_numpy()
+    if bad.any():
+        raise ValueError(f"{col}: not a number at rows {_bad_rows(bad, df.index)}")
+    if required and vals.isna().any():
+        raise ValueError(f"{col}: missing at rows {_bad_rows(vals.isna().to_numpy(), df.index)}")
+    return vals
+
+
+def _date_column(df: pd.DataFrame) -> pd.Series:
+    if "date" not in df.columns:
+        raise ValueError("date: column missing")
+    d = pd.to_datetime(df["date"], errors="coerce")
+    if d.isna().any():
+        raise ValueError(f"date: invalid at rows {_bad_rows(d.isna().to_numpy(), df.index)}")
+    return d.dt.normalize()
+
+
+def validate_price_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized PriceRow validation; returns a normalized copy (date, open, high, low, close, volume)."""
+    out = pd.DataFrame({"date": _date_column(df)}, index=df.index)
+    for col in ("open", "high", "low"):
+        out[col] = _float_column(df, col)
+    out["close"] = _float_column(df, "close", required=True)
+    vol = _float_column(df, "volume")
+    frac = vol.notna().to_numpy() & (vol.fillna(0) % 1 != 0).to_numpy()
+    if frac.any():
+        raise ValueError(f"volume: not an integer at rows {_bad_rows(frac, df.index)}")
+    out["volume"] = vol.astype("Int64")
+    bad = (out["high"] < out["low"]).to_numpy()  # NaN compares False, as in high_ge_low
+    if bad.any():
+        raise ValueError(f"high must be >= low at rows {_bad_rows(bad, df.index)}")
+    return out
+
+
+def validate_processed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized ProcessedRow validation; returns the ProcessedRow columns in field order."""
+    out = pd.DataFrame({"date": _date_column(df)}, index=df.index)
+    for col in _PROCESSED_FLOATS:
+        out[col] = _float_column(df, col, required=(col == "close"))
+    flag = df["is_52w_high"] if "is_52w_high" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    ok = flag.isna() | flag.isin([True, False, 0, 1])
+    if not ok.all():
+        raise ValueError(f"is_52w_high: not a boolean at rows {_bad_rows(~ok.to_numpy(), df.index)}")
+    out["is_52w_high"] = flag.astype("boolean")
+    return out[PROCESSED_FIELDS].reset_index(drop=True)
+
+
+class ProcessedRows(Sequence):
+    """Validated processed rows held column-wise.
+
+    Behaves like the ``List[ProcessedRow]`` it replaces, but ``ProcessedRow``
+    objects are only built when an item is accessed; ``records()`` gives the
+    ``model_dump()`` dicts straight from the columns.
+    """
+
+    def __init__(self, df: pd.DataFrame, validated: bool = False):
+        self._df = df if validated else validate_processed_frame(df)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        return self._df
+
+    def __len__(self) -> int:
+        return len(self._df)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ProcessedRows(self._df.iloc[i].reset_index(drop=True), validated=True)
+        return ProcessedRow.model_construct(**self._record_at(i))
+
+    def _record_at(self, i: int) -> Dict[str, Any]:
+        r = self._df.iloc[i]
+        rec: Dict[str, Any] = {"date": r["date"].date()}
+        for c in _PROCESSED_FLOATS:
+            rec[c] = None if pd.isna(r[c]) else float(r[c])
+        rec["is_52w_high"] = None if pd.isna(r["is_52w_high"]) else bool(r["is_52w_high"])
+        return {f: rec[f] for f in PROCESSED_FIELDS}
+
+    def records(self) -> List[Dict[str, Any]]:
+        df = self._df
+        cols: Dict[str, List[Any]] = {"date": df["date"].dt.date.tolist()}
+        for c in _PROCESSED_FLOATS:
+            mask = df[c].isna().to_numpy()
+            vals = df[c].tolist()
+            cols[c] = [None if m else v for v, m in zip(vals, mask)] if mask.any() else vals
+        flag = df["is_52w_high"]
+        cols["is_52w_high"] = [None if pd.isna(v) else bool(v) for v in flag.astype(object).tolist()]
+        names = PROCESSED_FIELDS
+        return [dict(zip(names, vals)) for vals in zip(*(cols[n] for n in names))]
+
+    def __eq__(self, other):
+        if isinstance(other, ProcessedRows):
+            return self.records() == other.records()
+        if isinstance(other, list):
+            return self.records() == [r.model_dump() if isinstance(r, BaseModel) else r for r in other]
+        return NotImplemented
+
+
+# ---------------------------------------------------------------------------
+# Array-backed bundles: RawBundle's data in a few contiguous arrays per ticker
+# instead of one Pydantic object (and one Decimal per field) per row.
+# ---------------------------------------------------------------------------
+OHLCV_FIELDS = ["open", "high", "low", "close", "volume"]
+FUNDAMENTAL_FIELDS = [f for f in FundamentalsQuarter.model_fields if f != "period_end"]
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_days(dates) -> np.ndarray:
+    """Dates -> int64 days since 1970-01-01: the `day` key of every store (re-exported by src.database)."""
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+
+class PriceColumns(Sequence):
+    """Price history as an int64 day array and float64 OHLCV arrays.
+
+    Stands in for ``List[PriceRow]``: ``PriceRow`` objects are only built when
+    an item is accessed, and slices are views. Only ``close`` is required;
+    absent columns are None rather than arrays of NaN. Volume is float64 so
+    missing days can be NaN.
+    """
+
+    __slots__ = ("day", "open", "high", "low", "close", "volume")
+
+    def __init__(self, day: np.ndarray, close: np.ndarray, open: Optional[np.ndarray] = None,
+                 high: Optional[np.ndarray] = None, low: Optional[np.ndarray] = None,
+                 volume: Optional[np.ndarray] = None):
+        self.day = np.ascontiguousarray(day, dtype=np.int64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        for name, v in (("open", open), ("high", high), ("low", low), ("volume", volume)):
+            v = None if v is None else np.ascontiguousarray(v, dtype=np.float64)
+            if v is not None and len(v) != len(self.day):
+                raise ValueError(f"{name}: {len(v)} values for {len(self.day)} days")
+            setattr(self, name, v)
+        if len(self.close) != len(self.day):
+            raise ValueError(f"close: {len(self.close)} values for {len(self.day)} days")
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PriceColumns":
+        """From a `validate_price_frame` result; all-missing columns are dropped."""
+        cols = {}
+        for c in ("open", "high", "low", "volume"):
+            if c in df.columns and df[c].notna().any():
+                cols[c] = pd.to_numeric(df[c]).to_numpy(dtype=np.float64, na_value=np.nan)
+        return cls(to_days(df["date"]), df["close"].to_numpy(dtype=np.float64), **cols)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[PriceRow]) -> "PriceColumns":
+        if isinstance(rows, PriceColumns):
+            return rows
+        cols = {c: [getattr(r, c) for r in rows] for c in ("open", "high", "low", "volume")}
+        return cls(
+            np.array([r.date for r in rows], dtype="datetime64[D]").astype(np.int64),
+            np.array([r.close for r in rows], dtype=np.float64),
+            **{c: np.array([np.nan if v is None else v for v in vals], dtype=np.float64)
+               for c, vals in cols.items() if any(v is not None for v in vals)},
+        )
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.day.astype("datetime64[D]")
+
+    def frame(self, columns: Sequence[str] = ("close",)) -> pd.DataFrame:
+        """`date` (datetime64[ns]) plus `columns`; absent ones come back as NaN."""
+        data: Dict[str, Any] = {"date": self.dates.astype("datetime64[ns]")}
+        for c in columns:
+            v = getattr(self, c)
+            data[c] = np.full(len(self), np.nan) if v is None else v
+        return pd.DataFrame(data, copy=False)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, c).nbytes for c in self.__slots__ if getattr(self, c) is not None)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return PriceColumns(self.day[i], self.close[i],
+                                **{c: getattr(self, c)[i] for c in ("open", "high", "low", "volume")
+                                   if getattr(self, c) is not None})
+        day = int(self.day[i])
+        rec: Dict[str, Any] = {"date": date.fromordinal(_EPOCH_ORDINAL + day), "close": float(self.close[i])}
+        for c in ("open", "high", "low", "volume"):
+            v = getattr(self, c)
+            rec[c] = None if v is None or np.isnan(v[i]) else (int(v[i]) if c == "volume" else float(v[i]))
+        return PriceRow.model_construct(**rec)
+
+
+def validate_price_columns(p: PriceColumns) -> PriceColumns:
+    """`validate_price_frame` for arrays: the PriceRow constraints checked column-wise.
+
+    Also requires strictly ascending days, as stored and batch-downloaded
+    series are. Returns `p` unchanged.
+    """
+    def check(mask: np.ndarray, what: str):
+        if mask.any():
+            raise ValueError(f"{what} at rows {np.flatnonzero(mask)[:5].tolist()}")
+
+    check(np.isnan(p.close), "close: missing")
+    check(np.r_[False, np.diff(p.day) <= 0], "date: not strictly ascending")
+    if p.volume is not None:
+        check(~np.isnan(p.volume) & (p.volume % 1 != 0), "volume: not an integer")
+    if p.high is not None and p.low is not None:
+        with np.errstate(invalid="ignore"):
+            check(p.high < p.low, "high must be >= low")  # NaN compares False, as in high_ge_low
+    return p
+
+
+class FundamentalsColumns(Sequence):
+    """Quarterly fundamentals as an int64 period-end day array and one float64 array per field.
+
+    Stands in for ``List[FundamentalsQuarter]`` (missing values are NaN);
+    items are built as models on access.
+    """
+
+    __slots__ = ("period_end", "values")
+
+    def __init__(self, period_end: np.ndarray, values: Optional[Dict[str, np.ndarray]] = None):
+        self.period_end = np.ascontiguousarray(period_end, dtype=np.int64)
+        n = len(self.period_end)
+        values = values or {}
+        self.values = {k: np.ascontiguousarray(values[k], dtype=np.float64) if k in values else np.full(n, np.nan)
+                       for k in FUNDAMENTAL_FIELDS}
+
+    @classmethod
+    def from_quarters(cls, fqs: Sequence[FundamentalsQuarter]) -> "FundamentalsColumns":
+        if isinstance(fqs, FundamentalsColumns):
+            return fqs
+        return cls(
+            np.array([q.period_end for q in fqs], dtype="datetime64[D]").astype(np.int64),
+            {k: np.array([np.nan if getattr(q, k) is None else float(getattr(q, k)) for q in fqs], dtype=np.float64)
+             for k in FUNDAMENTAL_FIELDS},
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.period_end.nbytes + sum(v.nbytes for v in self.values.values())
+
+    def __len__(self) -> int:
+        return len(self.period_end)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return FundamentalsColumns(self.period_end[i], {k: v[i] for k, v in self.values.items()})
+        vals = {k: None if np.isnan(v[i]) else float(v[i]) for k, v in self.values.items()}
+        return FundamentalsQuarter(period_end=date.fromordinal(_EPOCH_ORDINAL + int(self.period_end[i])), **vals)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, FundamentalsColumns)):
+            return list(self) == list(other)
+        return NotImplemented
+
+
+class ArrayBundle:
+    """`RawBundle` held column-wise; what the fetch layer returns.
+
+    ``prices`` and ``fundamentals_q`` behave like the model's lists, so code
+    written against `RawBundle` keeps working; `process_bundle` reads the
+    arrays directly. Use `from_bundle` / `to_bundle` to convert.
+    """
+
+    __slots__ = ("ticker", "prices", "fundamentals_q")
+
+    def __init__(self, ticker: str, prices: PriceColumns, fundamentals_q: Optional[FundamentalsColumns] = None):
+        self.ticker = ticker
+        self.prices = prices
+        self.fundamentals_q = fundamentals_q if fundamentals_q is not None else FundamentalsColumns(np.empty(0))
+
+    @classmethod
+    def from_bundle(cls, raw: "RawBundle | ArrayBundle") -> "ArrayBundle":
+        if isinstance(raw, ArrayBundle):
+            return raw
+        return cls(raw.ticker, PriceColumns.from_rows(raw.prices), FundamentalsColumns.from_quarters(raw.fundamentals_q))
+
+    def to_bundle(self) -> RawBundle:
+        return RawBundle.model_construct(ticker=self.ticker, prices=list(self.prices),
+                                         fundamentals_q=list(self.fundamentals_q))
+
+    @property
+    def nbytes(self) -> int:
+        return self.prices.nbytes + self.fundamentals_q.nbytes
+
+    def __repr__(self) -> str:
+        return f"ArrayBundle(ticker={self.ticker!r}, days={len(self.prices)}, quarters={len(self.fundamentals_q)})"
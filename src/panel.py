@@ -0,0 +1,178 @@
+# src/panel.py
+from __future__ import annotations
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.kernels import rolling_max, rolling_mean
+from src.models import FundamentalsColumns, FundamentalsQuarter
+
+FUND_FIELDS = ["book_value", "shares_out", "total_debt", "cash"]
+METRIC_FIELDS = ["sma50", "sma200", "high_52w", "bvps", "pb", "ev", "pct_from_52w_high", "is_52w_high"]
+
+
+def panel_metrics(close: np.ndarray, funds: Optional[Dict[str, np.ndarray]] = None,
+                  min_sma_days: int = 200) -> Dict[str, np.ndarray]:
+    """Every daily metric for aligned (tickers x days) closes and fundamentals.
+
+    `funds` maps FUND_FIELDS to arrays of the same shape (missing -> NaN).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    f = {k: np.broadcast_to(np.asarray((funds or {}).get(k, np.nan), dtype=np.float64), close.shape)
+         for k in FUND_FIELDS}
+    high = rolling_max(close, 252)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bv, sh = f["book_value"], f["shares_out"]
+        bvps = np.where((bv > 0) & (sh > 0), bv / sh, np.nan)
+        market_cap = np.where(~np.isnan(sh), close * sh, np.nan)
+        has_high = ~np.isnan(high)
+        return {
+            "sma50": rolling_mean(close, 50),
+            "sma200": rolling_mean(close, min_sma_days),
+            "high_52w": high,
+            "bvps": bvps,
+            "pb": np.where(bvps > 0, close / bvps, np.nan),
+            "ev": market_cap + np.nan_to_num(f["total_debt"], nan=0.0) - np.nan_to_num(f["cash"], nan=0.0),
+            "pct_from_52w_high": np.where(has_high, (close - high) / high, np.nan),
+            "is_52w_high": np.where(has_high, np.abs(close - high) <= 1e-8, False),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Fundamentals alignment
+# ---------------------------------------------------------------------------
+
+def _quarter_arrays(fqs: Sequence[FundamentalsQuarter], lag_days: int):
+    """(day each quarter becomes known, {field: values}) for one ticker's quarters."""
+    cols = FundamentalsColumns.from_quarters(fqs)
+    known = cols.period_end.astype("datetime64[D]") + np.timedelta64(int(lag_days), "D")
+    return known, {k: cols.values[k] for k in FUND_FIELDS}
+
+
+def _last_valid(v: np.ndarray) -> np.ndarray:
+    """For each position, the index of the latest non-NaN entry at or before it (-1 if none)."""
+    return np.maximum.accumulate(np.where(np.isnan(v), -1, np.arange(len(v))))
+
+
+def align_fundamentals(dates: np.ndarray, fqs: Sequence[FundamentalsQuarter], lag_days: int = 0) -> Dict[str, np.ndarray]:
+    """Each field's latest non-missing quarterly value known on every date (an as-of join).
+
+    A quarter counts from `period_end + lag_days`; set `lag_days` to the
+    reporting delay (e.g. 45) for point-in-time values free of look-ahead.
+    `dates` must be ascending.
+    """
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    out = {k: np.full(len(dates), np.nan) for k in FUND_FIELDS}
+    if not fqs or len(dates) == 0:
+        return out
+    known, vals = _quarter_arrays(fqs, lag_days)
+    order = np.argsort(known, kind="stable")
+    idx = np.searchsorted(known[order].astype("datetime64[ns]"), dates, side="right") - 1
+    for k in FUND_FIELDS:
+        v = vals[k][order]
+        j = _last_valid(v)[np.maximum(idx, 0)]
+        out[k] = np.where((idx >= 0) & (j >= 0), v[np.maximum(j, 0)], np.nan)
+    return out
+
+
+def align_fundamentals_panel(dates: np.ndarray, close: np.ndarray,
+                             fqs_by_ticker: Sequence[Sequence[FundamentalsQuarter]],
+                             lag_days: int = 0) -> Dict[str, np.ndarray]:
+    """`align_fundamentals` for (tickers x days) at once, NaN where `close` is NaN.
+
+    Every ticker's quarters go into one array keyed by (ticker, day), so the
+    whole panel takes a single searchsorted; no calendars are built.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    rows, n = close.shape
+    out = {k: np.full((rows, n), np.nan) for k in FUND_FIELDS}
+    per = [(i, *_quarter_arrays(fqs, lag_days)) for i, fqs in enumerate(fqs_by_ticker) if fqs]
+    if not per or n == 0:
+        return out
+    group = np.concatenate([np.full(len(known), i) for i, known, _ in per])
+    known = np.concatenate([known for _, known, _ in per]).astype(np.int64)
+    # Clip quarters to the span so each ticker's keys live in its own [i * width, (i + 1) * width)
+    # band: earlier quarters land on 0, later ones on width - 1, one past the last traded day
+    lo, width = dates[0] - 1, int(dates[-1] - dates[0]) + 3
+    key = group * width + np.clip(known - lo, 0, width - 1)
+    order = np.lexsort((known, key))  # clipped keys tie; keep those quarters in date order
+    key, group = key[order], group[order]
+
+    flat = np.flatnonzero(~np.isnan(close))
+    qi = flat // n
+    idx = np.searchsorted(key, qi * width + (dates[flat % n] - lo), side="right") - 1
+    ok = idx >= 0
+    ok[ok] = group[idx[ok]] == qi[ok]  # the nearest earlier key may belong to an earlier ticker
+    idx = np.where(ok, idx, 0)
+    for k in FUND_FIELDS:
+        v = np.concatenate([vals[k] for _, _, vals in per])[order]
+        # Resolve each quarter to its ticker's latest non-missing value, then gather per day
+        j = _last_valid(v)
+        jj = np.maximum(j, 0)
+        resolved = np.where((j >= 0) & (group[jj] == group), v[jj], np.nan)
+        out[k].reshape(-1)[flat] = np.where(ok, resolved[idx], np.nan)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Panel entry point
+# ---------------------------------------------------------------------------
+
+def _metrics_with_gaps(close: np.ndarray, funds: Dict[str, np.ndarray], min_sma_days: int) -> Dict[str, np.ndarray]:
+    """`panel_metrics`, except rows with holes inside their traded range are computed on
+    their traded days only (as the per-ticker path sees them) and scattered back."""
+    out = panel_metrics(close, funds, min_sma_days)
+    valid = ~np.isnan(close)
+    for i in np.flatnonzero(valid.any(axis=1)):
+        pos = np.flatnonzero(valid[i])
+        if pos[-1] - pos[0] + 1 == pos.size:
+            continue
+        row = panel_metrics(close[i, pos][None, :], {k: v[i, pos][None, :] for k, v in funds.items()}, min_sma_days)
+        for k in METRIC_FIELDS:
+            out[k][i] = np.nan if k != "is_52w_high" else False
+            out[k][i, pos] = row[k][0]
+    return out
+
+
+def process_panel(tickers: Sequence[str], dates: Sequence[Any], close: np.ndarray,
+                  funds: Optional[Dict[str, np.ndarray]] = None, min_sma_days: int = 200,
+                  layout: str = "long", block_rows: int = 1000):
+    """`process_bundle` metrics for a whole universe at once.
+
+    `close` is (tickers x days) aligned on ascending `dates`, NaN where a
+    ticker didn't trade; `funds` are FUND_FIELDS arrays of the same shape
+    (see `align_fundamentals_panel`). Tickers are processed `block_rows` at a
+    time to bound temporaries.
+
+    layout="wide" returns {column: (tickers x days) array}; "long" returns a
+    DataFrame (ticker, date, OUTPUT_COLUMNS...) with one row per traded day,
+    ordered by ticker then date, as `upsert_daily_panel` expects.
+    """
+    if layout not in ("long", "wide"):
+        raise ValueError(f"layout must be 'long' or 'wide', got {layout!r}")
+    close = np.asarray(close, dtype=np.float64)
+    dates = np.asarray(pd.to_datetime(np.asarray(dates)), dtype="datetime64[ns]")
+    if close.shape != (len(tickers), len(dates)):
+        raise ValueError(f"close is {close.shape}, expected {(len(tickers), len(dates))}")
+    funds = {k: np.asarray(v, dtype=np.float64) for k, v in (funds or {}).items()}
+
+    wide: Dict[str, np.ndarray] = {"close": close}
+    wide.update({k: np.empty(close.shape, dtype=bool if k == "is_52w_high" else np.float64) for k in METRIC_FIELDS})
+    for lo in range(0, len(tickers), max(1, block_rows)):
+        hi = min(lo + block_rows, len(tickers))
+        block = _metrics_with_gaps(close[lo:hi], {k: v[lo:hi] for k, v in funds.items()}, min_sma_days)
+        for k in METRIC_FIELDS:
+            wide[k][lo:hi] = block[k]
+    if layout == "wide":
+        return wide
+
+    ti, di = np.nonzero(~np.isnan(close))
+    out = pd.DataFrame({
+        "ticker": np.asarray(tickers, dtype=object)[ti],
+        "date": dates[di],
+        "close": close[ti, di],
+    })
+    for k in METRIC_FIELDS:
+        out[k] = wide[k][ti, di]
+    return out
@@ -0,0 +1,460 @@
+# src/pipeline.py
+from __future__ import annotations
+import os
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import datetime, date
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src.data_fetcher import (fetch_raw_bundle, fetch_prices, fetch_price_chunk, bundle_from_prices, bundle_from_arrays,
+                              get_cache, get_fundamentals)
+from src.processor import process_bundle, extend_bundle, history_window, OUTPUT_COLUMNS
+from src.signals import detect_crossovers, detect_signals
+from src.indicators import Spec, indicator_columns
+from src.export import Exporter, export_file, output_path, result_notes
+from src.instrument import count, get_recorder, stage, timed
+from src.database import (load_fingerprints, load_fundamentals, load_prices, load_tail, save_fingerprints, to_days,
+                          upsert_daily, upsert_prices, upsert_signals, upsert_ticker)
+from src.fingerprint import StagePlan, bundle_digest, plan_stages, run_key, run_params
+from src.kernels import MetricWindows
+from src.models import (ArrayBundle, ExportPayload, FundamentalsColumns, PriceColumns, ProcessedRow, ProcessedRows,
+                        RawBundle, SignalEvent)
+
+DB_COLUMNS = ["date", "close", "sma50", "sma200", "high_52w", "bvps", "pb", "ev", "pct_from_52w_high", "is_52w_high"]
+
+
+class EnhancedJSONEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, (date, datetime)):
+            return o.isoformat()
+        if isinstance(o, SignalEvent):
+            try:
+                return o.model_dump()
+            except Exception:
+                return {"date": getattr(o, "date", None), "type": getattr(o, "type", None)}
+        return super().default(o)
+
+
+@dataclass
+class TickerResult:
+    ticker: str
+    df: pd.DataFrame
+    rows: Sequence[ProcessedRow]
+    events: List[SignalEvent]
+    contexts: List[Dict[str, Any]]
+    min_sma_days: int
+    since: Optional[date] = None  # set for incremental results: rows are dated after this
+    extra_columns: List[str] = field(default_factory=list)  # configured indicator outputs
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per compute stage
+    prices: Optional[PriceColumns] = None  # fetched OHLCV to store; None when already stored
+    fingerprint: Optional[str] = None  # run key (src.fingerprint) of a full run; None for incremental results
+
+    @property
+    def short_history(self) -> bool:
+        return self.since is None and len(self.df) < self.min_sma_days
+
+
+@dataclass
+class IncrementalInput:
+    ticker: str
+    tail: pd.DataFrame            # last stored rows (date, close, sma50, sma200, high_52w)
+    raw: Optional[ArrayBundle]    # prices after the tail, None when already up to date
+
+
+@dataclass
+class BatchSummary:
+    ok: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    signals: int = 0
+    unchanged: List[str] = field(default_factory=list)  # also in `ok`; skipped on matching fingerprints
+
+
+def ensure_parent(path: str):
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+def resolve_tickers(tickers: Optional[str] = None, tickers_file: Optional[str] = None,
+                    cfg: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Ticker list from a comma-separated string, a file, or the config `tickers:` key."""
+    items: List[str] = []
+    if tickers:
+        items = tickers.split(",")
+    elif tickers_file:
+        with open(tickers_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0]
+                items.extend(line.split(","))
+    elif cfg and cfg.get("tickers"):
+        items = [str(t) for t in cfg["tickers"]]
+    # De-duplicate but keep the caller's order
+    return list(dict.fromkeys(t.strip() for t in items if t.strip()))
+
+
+def fetch_incremental(ticker: str, engine, period: str = "5y", min_sma_days: int = 200,
+                      indicators: Sequence[Spec] = ()) -> Union[ArrayBundle, IncrementalInput]:
+    """Fetch only the days missing from `daily_metrics`; full history on first run.
+
+    The stored tail is long enough for every window of `indicators`.
+    """
+    tail = load_tail(engine, ticker, history_window(min_sma_days, indicators))
+    if tail.empty:
+        return fetch_raw_bundle(ticker, period=period)
+    last = tail["date"].iloc[-1]
+    prices_df = fetch_prices(ticker, period=period, start=(last + pd.Timedelta(days=1)).strftime("%Y-%m-%d"))
+    if not prices_df.empty:
+        prices_df = prices_df[prices_df["date"] > last]
+    if prices_df.empty:
+        return IncrementalInput(ticker, tail, None)
+    return IncrementalInput(ticker, tail, bundle_from_prices(ticker, prices_df))
+
+
+def load_bundle(engine, ticker: str) -> ArrayBundle:
+    """A bundle from local data only: stored OHLCV plus stored fundamentals, no network calls.
+
+    Fundamentals come from the `fundamentals` table, else the data cache, else are empty.
+    """
+    prices = load_prices(engine, ticker)
+    if len(prices) == 0:
+        raise RuntimeError(f"No stored prices for {ticker}; run it once with a download first.")
+    fqs = load_fundamentals(engine, [ticker]).get(ticker)
+    cache = get_cache()
+    if fqs is None and cache is not None:
+        fqs = cache.get_fundamentals(ticker)
+    return ArrayBundle(ticker, prices, FundamentalsColumns.from_quarters(fqs or []))
+
+
+def load_windows(engine, ticker: str, min_sma_days: int = 200) -> MetricWindows:
+    """Streaming SMA/52w-high windows primed from the stored tail, to update past the last stored day in O(1)."""
+    tail = load_tail(engine, ticker, history_window(min_sma_days))
+    if tail.empty:
+        raise RuntimeError(f"No stored metrics for {ticker}; run it once with a download first.")
+    return MetricWindows.from_closes(tail["close"].to_numpy(dtype=np.float64), min_sma_days,
+                                     last_day=int(to_days(tail["date"].iloc[-1:])[0]))
+
+
+def plan_ticker(engine, raw: Union[RawBundle, ArrayBundle], params: Dict[str, Any], fmt: str = "json",
+                output: Optional[str] = None, force: bool = False,
+                stored: Optional[Dict[str, str]] = None) -> StagePlan:
+    """Stages `raw` still needs given the fingerprints stored for its ticker (`stored` saves the lookup)."""
+    if stored is None:
+        stored = {} if force else load_fingerprints(engine, [raw.ticker]).get(raw.ticker, {})
+    return plan_stages(stored, run_key(bundle_digest(raw), params), fmt, output, force)
+
+
+def compute_ticker(raw: Union[RawBundle, ArrayBundle, IncrementalInput], min_sma_days: int = 200,
+                   indicators: Sequence[Spec] = (), signal_rules: Sequence[Spec] = (),
+                   fundamentals_lag_days: int = 0) -> TickerResult:
+    """CPU stage: metrics, indicators and signals for one bundle. Safe to run in a worker process."""
+    if isinstance(raw, IncrementalInput):
+        return _compute_incremental(raw, min_sma_days, indicators, signal_rules, fundamentals_lag_days)
+    # Timed here and carried back on the result, since this often runs in a worker process
+    t0 = time.perf_counter()
+    df, rows = process_bundle(raw, min_sma_days=min_sma_days, indicators=indicators,
+                              fundamentals_lag_days=fundamentals_lag_days)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    t1 = time.perf_counter()
+    prices = PriceColumns.from_rows(raw.prices)
+    events, contexts = detect_crossovers(raw.ticker, df)
+    events += detect_signals(raw.ticker, _with_volume(df, prices), signal_rules)
+    return TickerResult(raw.ticker, df, rows, events, contexts, min_sma_days,
+                        extra_columns=indicator_columns(indicators),
+                        timings={"process": t1 - t0, "signals": time.perf_counter() - t1},
+                        prices=prices)
+
+
+def _with_volume(df: pd.DataFrame, prices: Optional[PriceColumns]) -> pd.DataFrame:
+    """`df` plus the day's volume, which volume rules read but the metrics don't store."""
+    if prices is None or prices.volume is None or df.empty:
+        return df
+    vol = pd.Series(prices.volume, index=pd.DatetimeIndex(prices.day.astype("datetime64[D]")))
+    vol = vol[~vol.index.duplicated(keep="last")]
+    return df.assign(volume=vol.reindex(pd.DatetimeIndex(df["date"])).to_numpy())
+
+
+def _compute_incremental(inp: IncrementalInput, min_sma_days: int, indicators: Sequence[Spec],
+                         signal_rules: Sequence[Spec], fundamentals_lag_days: int = 0) -> TickerResult:
+    since = inp.tail["date"].iloc[-1].date()
+    extra = indicator_columns(indicators)
+    t0 = time.perf_counter()
+    if inp.raw is None:
+        df, rows = pd.DataFrame(columns=OUTPUT_COLUMNS + extra), []
+    else:
+        df, rows = extend_bundle(inp.tail, inp.raw, min_sma_days=min_sma_days, indicators=indicators,
+                                 fundamentals_lag_days=fundamentals_lag_days)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    t1 = time.perf_counter()
+    prices = None if inp.raw is None else PriceColumns.from_rows(inp.raw.prices)
+    if df.empty:
+        return TickerResult(inp.ticker, df, [], [], [], min_sma_days, since=since, extra_columns=extra,
+                            timings={"process": t1 - t0}, prices=prices)
+
+    # Signals can only appear between the last stored row and the new ones
+    new = _with_volume(df, prices)
+    boundary = pd.concat([inp.tail.iloc[[-1]].reindex(columns=new.columns), new], ignore_index=True)
+    events, contexts = detect_crossovers(inp.ticker, boundary)
+    events += detect_signals(inp.ticker, boundary, signal_rules)
+    return TickerResult(inp.ticker, df, rows, events, contexts, min_sma_days, since=since, extra_columns=extra,
+                        timings={"process": t1 - t0, "signals": time.perf_counter() - t1}, prices=prices)
+
+
+def persist_result(engine, res: TickerResult, store=None):
+    """Upsert a result into SQLite and, when given, a second history backend (src.store.ColumnarStore)."""
+    tmp = res.df.copy()
+    tmp["date_str"] = tmp["date"].dt.strftime("%Y-%m-%d")
+    wanted = ["date_str"] + DB_COLUMNS[1:] + res.extra_columns
+    present = [c for c in wanted if c in tmp.columns]
+    subset = tmp.loc[:, present].rename(columns={"date_str": "date"})
+    subset = subset.where(pd.notna(subset), None)
+
+    upsert_ticker(engine, res.ticker)
+    if res.prices is not None:
+        with stage("upsert_prices"):
+            upsert_prices(engine, res.ticker, res.prices)
+    with stage("upsert_daily"):
+        upsert_daily(engine, res.ticker, subset, extra_columns=res.extra_columns)
+    events = [{"date": e.date, "type": e.type} for e in res.events]
+    with stage("upsert_signals"):
+        upsert_signals(engine, res.ticker, events)
+    if store is not None:
+        with stage("store_write"):
+            if not store.has(res.ticker):
+                # First write of this symbol (e.g. the backend was just switched on): copy what SQLite
+                # holds, which now includes this result, so an incremental run can't leave a partial history
+                n = store.backfill(engine, res.ticker)
+                logging.info(f"{res.ticker}: backfilled {n} rows into the {store.name} store")
+            else:
+                store.upsert_daily(res.ticker, subset, extra_columns=res.extra_columns)
+                store.upsert_signals(res.ticker, events)
+    # An incremental write leaves the stored rows matching no full-run key, and the full export missing the new days
+    save_fingerprints(engine, res.ticker, {"persist": res.fingerprint} if res.fingerprint
+                      else {"persist": None, "export": None})
+    count("rows_upserted", len(subset))
+    count("signals", len(res.events))
+
+
+def metric_records(rows: Sequence[ProcessedRow]) -> List[Dict[str, Any]]:
+    if isinstance(rows, ProcessedRows):
+        return rows.records()
+    return [r.model_dump() for r in rows]
+
+
+def build_payload(res: TickerResult) -> ExportPayload:
+    return ExportPayload(
+        ticker=res.ticker,
+        generated_at=datetime.utcnow().isoformat(),
+        metrics=metric_records(res.rows),
+        signals=res.events,
+        notes=result_notes(res),
+    )
+
+
+def export_result(res: TickerResult, output: str, fmt: str = "json"):
+    """Stream `res` to `output` (see src.export for the formats)."""
+    with stage("export"):
+        export_file(res, output, fmt)
+    if get_recorder() is not None:
+        count("export_bytes", os.path.getsize(output))
+
+
+def record_compute(res: TickerResult):
+    """Fold a result's compute timings into the run's recorder, if any."""
+    rec = get_recorder()
+    if rec is not None:
+        rec.merge_timings(res.timings)
+
+
+def _bundle_or_raise(result) -> ArrayBundle:
+    """Bundle from an async FetchResult; price failures raise, others are logged."""
+    for err in result.errors:
+        if err.kind != "prices" or result.ok:
+            logging.warning(f"{result.ticker}: {err}")
+    if not result.ok:
+        raise RuntimeError("; ".join(str(e) for e in result.errors if e.kind == "prices"))
+    return result.bundle
+
+
+def run_batch(
+    tickers: Iterable[str],
+    engine,
+    period: str = "5y",
+    min_sma_days: int = 200,
+    out_dir: str = "out",
+    fetch_workers: int = 8,
+    compute_workers: Optional[int] = None,
+    fetch: Optional[Callable[..., Any]] = None,
+    incremental: bool = False,
+    indicators: Sequence[Spec] = (),
+    signal_rules: Sequence[Spec] = (),
+    export_format: str = "json",
+    combined: Optional[str] = None,
+    fetch_batch_size: int = 0,
+    download: Optional[Callable[..., Any]] = None,
+    fetcher: Optional[Any] = None,
+    fundamentals_lag_days: int = 0,
+    compute_pool: Optional[ProcessPoolExecutor] = None,
+    force: bool = False,
+    store: Optional[Any] = None,
+) -> BatchSummary:
+    """Run fetch -> process -> signals -> persist -> export over many tickers.
+
+    Fetches run on a bounded thread pool, the CPU stages on a process pool
+    (``compute_workers=0`` runs them inline) and the calling thread is the only
+    database writer, so upserts are serialized. With ``incremental`` only the
+    days after the last stored row are fetched, computed, stored and exported;
+    per-ticker exports then go to ``<TICKER>.delta.<ext>``, leaving the full ones.
+    ``indicators``/``signal_rules`` are normalized specs from ``load_engine_config``.
+    Exports are streamed in ``export_format``, per ticker or into one ``combined`` file.
+    With ``fetch_batch_size`` > 0 (full runs with the default fetcher), prices
+    are downloaded ``fetch_batch_size`` symbols per call (``download`` replaces
+    the yfinance call) and only fundamentals are fetched per ticker. A started
+    ``fetcher`` (``src.async_fetch.AsyncFetcher``) takes over full-run fetches
+    instead: rate limited, retried and timed out per ticker on its own loop.
+    ``fundamentals_lag_days`` delays each quarter until it would have been reported.
+    A caller-owned ``compute_pool`` (kept warm across batches) is used instead of
+    a fresh pool of ``compute_workers`` and is left running.
+    Full runs skip the CPU stages, the upserts and the export for tickers whose
+    fetched inputs, parameters and code match the fingerprints stored by the
+    last successful run (listed in ``summary.unchanged``) unless ``force``.
+    A columnar history ``store`` (``src.store``) is written alongside SQLite.
+    With a fundamentals store set (``set_fundamentals``) the due symbols' statements
+    are refreshed up front, so the fetch workers only read them from memory.
+    """
+    compute = partial(compute_ticker, min_sma_days=min_sma_days, indicators=list(indicators),
+                      signal_rules=list(signal_rules), fundamentals_lag_days=fundamentals_lag_days)
+    use_fetcher = fetcher is not None and fetch is None and not incremental
+    batched = fetch_batch_size > 0 and fetch is None and not incremental and not use_fetcher
+    if fetch is None:
+        fetch = (partial(fetch_incremental, engine=engine, min_sma_days=min_sma_days, indicators=list(indicators))
+                 if incremental else fetch_raw_bundle)
+    summary = BatchSummary()
+    tickers = list(tickers)
+    params = run_params(period, min_sma_days, fundamentals_lag_days, indicators, signal_rules,
+                        store.name if store is not None else "sqlite")
+    stored = {} if incremental or force else load_fingerprints(engine, tickers)
+    funds = get_fundamentals()
+    if funds is not None:
+        funds.refresh(tickers)
+    plans: Dict[str, StagePlan] = {}
+    if batched:
+        queue = iter([tickers[i:i + fetch_batch_size] for i in range(0, len(tickers), fetch_batch_size)])
+    else:
+        queue = iter(tickers)
+    own_pool = compute_pool is None
+    if compute_workers is None:
+        compute_workers = os.cpu_count() or 1
+    if own_pool:
+        compute_pool = ProcessPoolExecutor(max_workers=compute_workers) if compute_workers > 0 else None
+    else:
+        compute_workers = max(1, compute_workers)
+    # Cap in-flight work so fetched bundles can't pile up faster than we process them
+    max_inflight = (max(fetch_workers, fetcher.concurrency) if use_fetcher else fetch_workers) + 2 * compute_workers
+    exporter = Exporter(out_dir, export_format, combined, delta=incremental)
+    rec = get_recorder()
+    # Pool work is wrapped only when a recorder is set, so disabled runs call the functions directly
+    fetch = timed("fetch", fetch)
+    fetch_chunk = timed("download", fetch_price_chunk)
+    from_arrays = timed("fetch", bundle_from_arrays)
+
+    def _write(res: TickerResult):
+        record_compute(res)
+        plan = plans.pop(res.ticker, None)
+        if res.df.empty:
+            summary.ok.append(res.ticker)
+            logging.info(f"{res.ticker}: up to date")
+            return
+        if plan is not None:
+            res.fingerprint = plan.key
+        if plan is None or plan.persist:
+            persist_result(engine, res, store)
+        if plan is None or plan.export:
+            with stage("export"):
+                path = exporter.write(res)
+            if rec is not None and combined is None:
+                rec.count("export_bytes", os.path.getsize(path))
+            if plan is not None and plan.export_key:
+                save_fingerprints(engine, res.ticker, {"export": plan.export_key})
+        summary.ok.append(res.ticker)
+        summary.signals += len(res.events)
+        logging.info(f"{res.ticker}: {len(res.df)} rows, {len(res.events)} signals")
+
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool:
+            pending: Dict[Any, tuple] = {}
+
+            def _top_up():
+                while len(pending) < max_inflight:
+                    t = next(queue, None)
+                    if t is None:
+                        return
+                    if batched:
+                        pending[fetch_pool.submit(fetch_chunk, t, period, download=download)] = ("download", t)
+                    elif use_fetcher:
+                        pending[fetcher.submit(t, period)] = ("fetch", t)
+                    else:
+                        pending[fetch_pool.submit(fetch, t, period=period)] = ("fetch", t)
+
+            _top_up()
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    step, t = pending.pop(fut)
+                    if step == "download":
+                        try:
+                            arrays, errors = fut.result()
+                        except Exception as e:
+                            arrays, errors = {}, {sym: str(e) for sym in t}
+                        for sym, err in errors.items():
+                            logging.warning(f"{sym}: fetch failed: {err}")
+                            summary.failed[sym] = f"fetch: {err}"
+                        for sym, prices in arrays.items():
+                            pending[fetch_pool.submit(from_arrays, prices)] = ("fetch", sym)
+                        continue
+                    try:
+                        value = fut.result()
+                        if step == "fetch" and use_fetcher:
+                            if rec is not None:
+                                rec.add_time("fetch", value.elapsed)
+                            value = _bundle_or_raise(value)
+                        if step == "fetch" and not isinstance(value, IncrementalInput):
+                            plan = plan_ticker(engine, value, params, export_format,
+                                               None if combined else output_path(out_dir, t, export_format),
+                                               force, stored.get(t, {}))
+                            if not plan.compute:
+                                summary.ok.append(t)
+                                summary.unchanged.append(t)
+                                logging.info(f"{t}: unchanged, skipped")
+                                continue
+                            plans[t] = plan
+                        if step == "fetch":
+                            if compute_pool is not None:
+                                pending[compute_pool.submit(compute, value)] = ("compute", t)
+                                continue
+                            step = "compute"
+                            value = compute(value)
+                        step = "persist"
+                        _write(value)
+                    except Exception as e:
+                        logging.warning(f"{t}: {step} failed: {e}")
+                        summary.failed[t] = f"{step}: {e}"
+                        plans.pop(t, None)
+                _top_up()
+    finally:
+        exporter.close()
+        if own_pool and compute_pool is not None:
+            compute_pool.shutdown()
+    if rec is not None:
+        rec.count("tickers_ok", len(summary.ok))
+        rec.count("tickers_failed", len(summary.failed))
+        rec.count("tickers_unchanged", len(summary.unchanged))
+        if combined is not None and os.path.exists(combined):
+            rec.count("export_bytes", os.path.getsize(combined))
+    return summary
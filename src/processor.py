@@ -2,60 +2,51 @@
 from __future__ import annotations
 import numpy as np
 import pandas as pd
-from typing import List, Tuple
-from src.models import RawBundle, ProcessedRow, FundamentalsQuarter
-def _funds_to_df(fqs: List[FundamentalsQuarter]) -> pd.DataFrame:
-    if not fqs:
-        return pd.DataFrame(columns=["date","book_value","shares_out","total_debt","cash"])
-    rows = []
-    for q in fqs:
-        rows.append({
-            "date": pd.to_datetime(q.period_end),
-            "book_value": float(q.book_value) if q.book_value is not None else np.nan,
-            "shares_out": float(q.shares_out) if q.shares_out is not None else np.nan,
-            "total_debt": float(q.total_debt) if q.total_debt is not None else np.nan,
-            "cash": float(q.cash) if q.cash is not None else np.nan,
-        })
-    df = pd.DataFrame(rows).sort_values("date")
-    return df
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from src.models import ArrayBundle, PriceColumns, RawBundle, ProcessedRow, ProcessedRows, FundamentalsQuarter
+from src.indicators import compute_indicators, indicator_columns, indicator_lookback
+from src.panel import METRIC_FIELDS, align_fundamentals, panel_metrics
 
-def process_bundle(raw: RawBundle, min_sma_days: int = 200) -> Tuple[pd.DataFrame, List[ProcessedRow]]:
-    p = pd.DataFrame([{"date": r.date, "close": r.close} for r in raw.prices])
-    if p.empty:
-        return p, []
-    p["date"] = pd.to_datetime(p["date"], errors="coerce")
-    p = p.dropna(subset=["date"]).sort_values("date").reset_index(drop=True)
+def history_window(min_sma_days: int = 200, indicators: Sequence[Dict[str, Any]] = ()) -> Optional[int]:
+    """Trailing rows needed to continue every rolling window from stored history.
+
+    None (all of it) when an indicator is recursive, since an EMA depends on every earlier row.
+    """
+    need = indicator_lookback(indicators)
+    if need is None:
+        return None
+    return max(50, min_sma_days, 252, need)
 
-    # Strict windows to avoid early signals
-    p["sma50"] = p["close"].rolling(50, min_periods=50).mean()
-    p["sma200"] = p["close"].rolling(min_sma_days, min_periods=min_sma_days).mean()
-    p["high_52w"] = p["close"].rolling(252, min_periods=252).max()
+def _prices_frame(raw: Union[RawBundle, ArrayBundle]) -> pd.DataFrame:
+    if isinstance(raw.prices, PriceColumns):
+        return raw.prices.frame(["close", "volume"])
+    return pd.DataFrame([{"date": r.date, "close": r.close, "volume": r.volume} for r in raw.prices],
+                        columns=["date", "close", "volume"])
 
-    # Fundamentals merge (quarterly -> daily ffill)
-    fdf = _funds_to_df(raw.fundamentals_q)
-    if not fdf.empty:
-        # Reindex to daily over price range for ffill
-        rng = pd.date_range(start=p["date"].min(), end=p["date"].max(), freq="D")
-        fdf = fdf.set_index("date").reindex(rng).ffill().rename_axis("date").reset_index()
-        p = p.merge(fdf, on="date", how="left")
-    else:
-        for col in ["book_value","shares_out","total_debt","cash"]:
-            p[col] = np.nan
+def _add_indicators(p: pd.DataFrame, indicators: Optional[Sequence[Dict[str, Any]]]) -> pd.DataFrame:
+    if indicators:
+        volume = pd.to_numeric(p["volume"], errors="coerce").to_numpy(dtype=float) if "volume" in p.columns else None
+        for col, arr in compute_indicators(p["close"].to_numpy(dtype=float), indicators, volume=volume).items():
+            p[col] = arr
+    return p
 
-    # Ratios
-    with np.errstate(invalid="ignore", divide="ignore"):
-        bvps = np.where((p["book_value"] > 0) & (p["shares_out"] > 0),
-                        p["book_value"] / p["shares_out"], np.nan)
-        p["bvps"] = bvps
-        p["pb"] = np.where(bvps > 0, p["close"] / bvps, np.nan)
-        market_cap = np.where(p["shares_out"].notna(), p["close"] * p["shares_out"], np.nan)
-        p["ev"] = market_cap + p["total_debt"].fillna(0.0) - p["cash"].fillna(0.0)
-        p["pct_from_52w_high"] = np.where(p["high_52w"].notna(),
-                                          (p["close"] - p["high_52w"]) / p["high_52w"], np.nan)
-        p["is_52w_high"] = np.where(p["high_52w"].notna(),
-                                    (p["close"] - p["high_52w"]).abs() <= 1e-8, False)
+def _metrics_frame(p: pd.DataFrame, fqs: Sequence[FundamentalsQuarter], min_sma_days: int,
+                   lag_days: int = 0) -> pd.DataFrame:
+    # One-row panel through the shared kernels (strict windows, as-of fundamentals)
+    close = p["close"].to_numpy(dtype=np.float64)
+    funds = align_fundamentals(p["date"].to_numpy(dtype="datetime64[ns]"), fqs, lag_days)
+    metrics = panel_metrics(close[None, :], {k: v[None, :] for k, v in funds.items()}, min_sma_days)
+    for col, arr in funds.items():
+        p[col] = arr
+    for col in METRIC_FIELDS:
+        p[col] = metrics[col][0]
+    return p
 
-    # Validate rows
+def _validate_rows(p: pd.DataFrame, validate: str = "columns") -> Sequence[ProcessedRow]:
+    if validate == "columns":
+        return ProcessedRows(p)
+    if validate != "rows":
+        raise ValueError(f"validate must be 'columns' or 'rows', got {validate!r}")
     validated: List[ProcessedRow] = []
     for _, r in p.iterrows():
         validated.append(
@@ -72,7 +63,61 @@ def process_bundle(raw: RawBundle, min_sma_days: int = 200) -> Tuple[pd.DataFram
                 ev=None if pd.isna(r["ev"]) else float(r["ev"]),
             )
         )
-    # Keep only columns needed for DB upsert
-    cols = ["date","close","sma50","sma200","high_52w","bvps","pb","ev","pct_from_52w_high","is_52w_high"]
-    p = p[cols].copy()
+    return validated
+
+# Keep only columns needed for DB upsert
+OUTPUT_COLUMNS = ["date","close","sma50","sma200","high_52w","bvps","pb","ev","pct_from_52w_high","is_52w_high"]
+
+def process_bundle(raw: Union[RawBundle, ArrayBundle], min_sma_days: int = 200, validate: str = "columns",
+                   indicators: Optional[Sequence[Dict[str, Any]]] = None,
+                   fundamentals_lag_days: int = 0) -> Tuple[pd.DataFrame, Sequence[ProcessedRow]]:
+    """Metrics frame plus validated rows.
+
+    `validate="columns"` checks the schema column-wise and returns a lazy
+    `ProcessedRows`; `validate="rows"` builds one `ProcessedRow` per day.
+    `indicators` (normalized specs, see src.indicators) adds one column each.
+    Each day uses the latest quarter known by then: one whose period ended
+    at least `fundamentals_lag_days` earlier (0 = as of the period end).
+    An `ArrayBundle` is read straight from its arrays, with no row objects.
+    """
+    p = _prices_frame(raw)
+    if p.empty:
+        return p[["date", "close"]], []
+    p["date"] = pd.to_datetime(p["date"], errors="coerce")
+    p = p.dropna(subset=["date"]).sort_values("date").reset_index(drop=True)
+
+    p = _add_indicators(_metrics_frame(p, raw.fundamentals_q, min_sma_days, fundamentals_lag_days), indicators)
+    validated = _validate_rows(p, validate)
+    p = p[OUTPUT_COLUMNS + indicator_columns(indicators or [])].copy()
     return p, validated
+
+def extend_bundle(tail: pd.DataFrame, raw_new: Union[RawBundle, ArrayBundle], min_sma_days: int = 200, validate: str = "columns",
+                  indicators: Optional[Sequence[Dict[str, Any]]] = None,
+                  fundamentals_lag_days: int = 0) -> Tuple[pd.DataFrame, Sequence[ProcessedRow]]:
+    """Metrics for the new rows only, continuing the rolling windows of `tail`.
+
+    `tail` holds the last `history_window(min_sma_days, indicators)` stored rows
+    (date, close and volume, which volume indicators read).
+    Only prices dated after the tail are processed and returned; the result
+    matches what a full recompute would produce for those dates.
+    """
+    if tail.empty:
+        return process_bundle(raw_new, min_sma_days=min_sma_days, validate=validate, indicators=indicators,
+                              fundamentals_lag_days=fundamentals_lag_days)
+    cols = OUTPUT_COLUMNS + indicator_columns(indicators or [])
+    hist = tail[[c for c in ("date", "close", "volume") if c in tail.columns]].copy()
+    hist["date"] = pd.to_datetime(hist["date"], errors="coerce")
+    last = hist["date"].max()
+
+    new = _prices_frame(raw_new)
+    new["date"] = pd.to_datetime(new["date"], errors="coerce")
+    new = new.dropna(subset=["date"])
+    new = new[new["date"] > last]
+    if new.empty:
+        return pd.DataFrame(columns=cols), []
+
+    p = pd.concat([hist, new], ignore_index=True).sort_values("date").reset_index(drop=True)
+    p = _add_indicators(_metrics_frame(p, raw_new.fundamentals_q, min_sma_days, fundamentals_lag_days), indicators)
+    p = p[p["date"] > last].reset_index(drop=True)
+    validated = _validate_rows(p, validate)
+    return p[cols].copy(), validated
@@ -0,0 +1,313 @@
+# src/query.py
+from __future__ import annotations
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from src.database import to_days
+
+# Every statement is a constant string with bound parameters (symbol lists go in as one JSON
+# array through json_each), so sqlite3's per-connection statement cache prepares each once.
+_META_SQL = """
+SELECT t.symbol, t.id, l.day, l.rev FROM latest_days l JOIN tickers t ON t.id = l.symbol_id
+"""
+_LATEST_SQL = """
+SELECT l.symbol_id, m.day, {cols} FROM json_each(?) j
+CROSS JOIN latest_days l ON l.symbol_id = j.value
+CROSS JOIN metrics m ON m.symbol_id = l.symbol_id AND m.day = l.day
+"""
+_HISTORY_SQL = "SELECT day, {cols} FROM metrics WHERE symbol_id=? AND day BETWEEN ? AND ? ORDER BY day"
+_SYMBOL_SIGNALS_SQL = "SELECT day, type FROM signals WHERE symbol_id=? AND day BETWEEN ? AND ? ORDER BY day, type"
+_RECENT_SIGNALS_SQL = """
+SELECT t.symbol, s.type, s.day FROM signals s JOIN tickers t ON t.id = s.symbol_id
+WHERE s.day >= ?1 AND (?2 IS NULL OR s.type IN (SELECT value FROM json_each(?2)))
+ORDER BY s.day DESC, t.symbol, s.type LIMIT ?3
+"""
+_ALL = (-2**62, 2**62)
+
+
+def _dates(days: np.ndarray) -> List[str]:
+    return np.datetime_as_string(np.asarray(days, dtype="datetime64[D]")).tolist()
+
+
+def _values(a: np.ndarray) -> List[Any]:
+    """Column as JSON-ready scalars, NaN -> None."""
+    vals = a.tolist()
+    nan = np.isnan(a)
+    if nan.any():
+        for i in np.flatnonzero(nan).tolist():
+            vals[i] = None
+    return vals
+
+
+class _Series:
+    """One symbol's stored metric rows and signals, column-wise."""
+    __slots__ = ("days", "values", "dates", "sig_days", "sig_types", "nbytes")
+
+    def __init__(self, days: np.ndarray, values: np.ndarray, sig_days: np.ndarray, sig_types: List[str]):
+        self.days = days
+        self.values = values  # (rows x columns) float64
+        self.dates = _dates(days)  # formatted once; a cache hit only slices
+        self.sig_days = sig_days
+        self.sig_types = sig_types
+        self.nbytes = days.nbytes + values.nbytes + 60 * len(self.dates) + sig_days.nbytes + 64 * len(sig_types) + 200
+
+
+class MetricsReader:
+    """Read-only queries for dashboards: latest rows, one symbol's history and recent signals.
+
+    Uses one connection with prepared, key-ordered queries and an LRU of hot
+    symbols bounded to `cache_bytes` (0 disables it). Before each request
+    ``PRAGMA data_version`` tells whether any connection has committed since;
+    if so the per-symbol write counters (latest_days.rev) are re-read and only
+    the symbols that changed are evicted. Safe to share between threads.
+    """
+
+    def __init__(self, engine, cache_bytes: int = 64 * 1024 * 1024):
+        self.engine = engine
+        self.cache_bytes = int(cache_bytes)
+        self._conn = engine.raw_connection()
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._sizes: Dict[Tuple, int] = {}
+        self._used = 0
+        self._data_version: Optional[int] = None
+        self._meta: Dict[str, Tuple[int, int, int]] = {}  # symbol -> (id, latest day, rev)
+        self.columns: List[str] = []
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "MetricsReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "cache_entries": len(self._cache), "cache_bytes": self._used}
+
+    # -- cache --
+
+    def _get(self, key: Tuple) -> Any:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._cache[key]
+        self.stats["misses"] += 1
+        return None
+
+    def _put(self, key: Tuple, value: Any, size: int):
+        if size > self.cache_bytes:
+            return
+        self._drop(key)
+        self._cache[key] = value
+        self._sizes[key] = size
+        self._used += size
+        while self._used > self.cache_bytes:
+            old = next(iter(self._cache))
+            self._drop(old)
+            self.stats["evictions"] += 1
+
+    def _drop(self, key: Tuple):
+        if key in self._cache:
+            del self._cache[key]
+            self._used -= self._sizes.pop(key)
+
+    def _sync(self):
+        """Evict what other writers changed since the last request."""
+        cur = self._conn.cursor()
+        version = cur.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        meta = {sym: (sid, day, rev) for sym, sid, day, rev in cur.execute(_META_SQL)}
+        columns = [r[1] for r in cur.execute("PRAGMA table_info(metrics)") if r[1] not in ("symbol_id", "day")]
+        if self._data_version is not None:
+            if columns != self.columns:
+                stale = list(self._cache)
+            else:
+                changed = {s for s, m in meta.items() if self._meta.get(s) != m} | (set(self._meta) - set(meta))
+                stale = [k for k in self._cache if k[0] == "signals" or k[1] in changed]
+            for k in stale:
+                self._drop(k)
+            self.stats["invalidations"] += len(stale)
+        self._data_version, self._meta, self.columns = version, meta, columns
+
+    def _pick(self, columns: Optional[Sequence[str]]) -> List[int]:
+        if not columns:
+            return list(range(len(self.columns)))
+        unknown = [c for c in columns if c not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) {', '.join(unknown)}; available: {', '.join(self.columns)}")
+        return [self.columns.index(c) for c in columns]
+
+    # -- queries --
+
+    def latest(self, symbols: Sequence[str], columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Latest stored row per symbol: {"columns", "rows", "missing"}, rows in request order."""
+        with self._lock:
+            self.stats["requests"] += 1
+            self._sync()
+            idx = self._pick(columns)
+            known = [s for s in dict.fromkeys(symbols) if s in self._meta]
+            rows: Dict[str, Any] = {}
+            todo = []
+            for s in known:
+                row = self._get(("latest", s)) if self.cache_bytes else None
+                if row is None:
+                    todo.append(s)
+                else:
+                    rows[s] = row
+            if todo:
+                by_id = {self._meta[s][0]: s for s in todo}
+                sql = _LATEST_SQL.format(cols=", ".join(f"m.{c}" for c in self.columns))
+                for sid, day, *vals in self._conn.cursor().execute(sql, (json.dumps(list(by_id)),)):
+                    row = (_dates([day])[0], np.array(vals, dtype=np.float64))
+                    rows[by_id[sid]] = row
+                    if self.cache_bytes:
+                        self._put(("latest", by_id[sid]), row, 8 * len(vals) + 150)
+            out = []
+            for s in known:
+                if s in rows:
+                    date, vals = rows[s]
+                    out.append([s, date] + _values(vals[idx]))
+            return {"columns": ["symbol", "date"] + [self.columns[i] for i in idx], "rows": out,
+                    "missing": [s for s in dict.fromkeys(symbols) if s not in rows]}
+
+    def _series(self, symbol: str, lo: int, hi: int) -> _Series:
+        sid = self._meta[symbol][0]
+        cached = self.cache_bytes > 0
+        if cached:
+            hit = self._get(("history", symbol))
+            if hit is not None:
+                return hit
+            lo, hi = _ALL  # cache the whole series; ranges are cut from it
+        cur = self._conn.cursor()
+        sql = _HISTORY_SQL.format(cols=", ".join(self.columns))
+        rows = cur.execute(sql, (sid, lo, hi)).fetchall()
+        a = np.array(rows, dtype=np.float64).reshape(len(rows), len(self.columns) + 1)  # None -> nan
+        sigs = cur.execute(_SYMBOL_SIGNALS_SQL, (sid, lo, hi)).fetchall()
+        s = _Series(a[:, 0].astype(np.int64), np.ascontiguousarray(a[:, 1:]),
+                    np.array([r[0] for r in sigs], dtype=np.int64), [r[1] for r in sigs])
+        if cached:
+            self._put(("history", symbol), s, s.nbytes)
+        return s
+
+    def history(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+                columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """One symbol's rows from `start` to `end` (inclusive dates), plus its signals in that range."""
+        lo = _ALL[0] if start is None else int(to_days([start])[0])
+        hi = _ALL[1] if end is None else int(to_days([end])[0])
+        with self._lock:
+            self.stats["requests"] += 1
+            self._sync()
+            idx = self._pick(columns)
+            if symbol not in self._meta:
+                raise KeyError(symbol)
+            s = self._series(symbol, lo, hi)
+            a, b = np.searchsorted(s.days, lo), np.searchsorted(s.days, hi, side="right")
+            block = s.values[a:b][:, idx]
+            dates = s.dates[a:b]
+            cols = [_values(block[:, j]) for j in range(block.shape[1])]
+            sa, sb = np.searchsorted(s.sig_days, lo), np.searchsorted(s.sig_days, hi, side="right")
+            return {"symbol": symbol, "columns": ["date"] + [self.columns[i] for i in idx],
+                    "rows": [list(r) for r in zip(dates, *cols)],
+                    "signals": [[d, t] for d, t in zip(_dates(s.sig_days[sa:sb]), s.sig_types[sa:sb])]}
+
+    def signals(self, days: int = 30, types: Optional[Sequence[str]] = None, limit: int = 500,
+                since: Optional[str] = None) -> Dict[str, Any]:
+        """Signals across the universe since `since`, or in the last `days` days up to the latest stored day."""
+        with self._lock:
+            self.stats["requests"] += 1
+            self._sync()
+            if since is not None:
+                lo = int(to_days([since])[0])
+            else:
+                last = max((m[1] for m in self._meta.values()), default=0)
+                lo = last - int(days) + 1
+            types = sorted(set(types)) if types else None
+            key = ("signals", lo, tuple(types or ()), int(limit))
+            hit = self._get(key) if self.cache_bytes else None
+            if hit is not None:
+                return hit
+            rows = self._conn.cursor().execute(
+                _RECENT_SIGNALS_SQL, (lo, None if types is None else json.dumps(types), int(limit))).fetchall()
+            out = {"columns": ["symbol", "type", "date"],
+                   "rows": [[s, t, d] for (s, t, _), d in zip(rows, _dates([r[2] for r in rows]))]}
+            if self.cache_bytes:
+                self._put(key, out, 60 * len(rows) + 100)
+            return out
+
+
+# ---------------------------------------------------------------------------
+# Local HTTP mode
+# ---------------------------------------------------------------------------
+
+def _csv(q: Dict[str, List[str]], name: str) -> Optional[List[str]]:
+    vals = [v.strip() for raw in q.get(name, []) for v in raw.split(",") if v.strip()]
+    return vals or None
+
+
+def _one(q: Dict[str, List[str]], name: str) -> Optional[str]:
+    return q[name][-1] if q.get(name) else None
+
+
+def route(reader: MetricsReader, path: str, q: Dict[str, List[str]]) -> Any:
+    """Answer one GET: /latest, /history, /signals or /stats."""
+    if path == "/latest":
+        symbols = _csv(q, "symbols")
+        if not symbols:
+            raise ValueError("symbols is required")
+        return reader.latest(symbols, _csv(q, "columns"))
+    if path == "/history":
+        symbol = _one(q, "symbol")
+        if not symbol:
+            raise ValueError("symbol is required")
+        return reader.history(symbol, _one(q, "start"), _one(q, "end"), _csv(q, "columns"))
+    if path == "/signals":
+        return reader.signals(int(_one(q, "days") or 30), _csv(q, "types"), int(_one(q, "limit") or 500),
+                              _one(q, "since"))
+    if path == "/stats":
+        return reader.cache_info()
+    raise LookupError(path)
+
+
+def make_server(reader: MetricsReader, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """A threaded HTTP server answering `route` with compact JSON; call serve_forever() on it."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive for dashboards polling
+        disable_nagle_algorithm = True  # headers and body are separate writes; don't wait on the delayed ACK
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                status, body = 200, route(reader, url.path.rstrip("/") or "/", parse_qs(url.query))
+            except KeyError as e:
+                status, body = 404, {"error": f"unknown symbol {e.args[0]}"}
+            except LookupError as e:
+                status, body = 404, {"error": f"no route {e.args[0]}; try /latest, /history, /signals, /stats"}
+            except ValueError as e:
+                status, body = 400, {"error": str(e)}
+            data = json.dumps(body, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            logging.debug(f"api: {self.address_string()} {fmt % args}")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
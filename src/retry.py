@@ -0,0 +1,60 @@
+# src/retry.py
+from __future__ import annotations
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+from src.instrument import count
+
+T = TypeVar("T")
+
+
+class TransientError(Exception):
+    """A failure worth retrying (throttling, dropped connection, upstream hiccup)."""
+
+
+class PermanentError(Exception):
+    """A failure retrying won't fix (unknown symbol, malformed response)."""
+
+
+# Rate limiting and network errors from yfinance and its HTTP clients (requests, curl_cffi), matched by
+# name anywhere in the class hierarchy so neither client has to be importable here
+TRANSIENT_NAMES = frozenset({"YFRateLimitError", "Timeout", "ReadTimeout", "ConnectTimeout", "ConnectionError",
+                             "ChunkedEncodingError"})
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, PermanentError):
+        return False
+    if isinstance(exc, (TransientError, TimeoutError, ConnectionError)):
+        return True
+    names = {k.__name__ for k in type(exc).__mro__}
+    if "HTTPError" in names:
+        code = _status(exc)
+        return code is not None and (code == 429 or code >= 500)
+    # A bare RequestException is an unclassified transport failure; its other subclasses (bad URL, ...) are not
+    return bool(names & TRANSIENT_NAMES) or type(exc).__name__ == "RequestException"
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0, rng: Optional[random.Random] = None) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return (rng or random).uniform(0.0, min(cap, base * (2 ** attempt)))
+
+
+def retry_call(fn: Callable[[], T], tries: int = 3, base: float = 0.5, cap: float = 30.0,
+               sleep: Callable[[float], None] = time.sleep) -> T:
+    """Call `fn`, retrying transient errors with backoff; permanent errors raise at once."""
+    for attempt in range(tries):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == tries - 1 or not is_transient(e):
+                raise
+            count("retries")
+            sleep(backoff_delay(attempt, base, cap))
+    raise RuntimeError("retry_call needs tries >= 1")
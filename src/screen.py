@@ -0,0 +1,199 @@
+# src/screen.py
+from __future__ import annotations
+import re
+from typing import Any, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+from sqlalchemy import inspect
+
+DEFAULT_COLUMNS = ["close", "sma50", "sma200", "high_52w", "pct_from_52w_high", "is_52w_high", "pb"]
+# Always detected (src.signals.detect_crossovers); configured rules add their types once stored
+CROSSOVER_TYPES = ("golden_cross", "death_cross")
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<num>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?%?)
+    | (?P<op><=|>=|==|!=|<>|<|>|=)
+    | (?P<paren>[()])
+    | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+_OPS = {"=": "=", "==": "=", "!=": "!=", "<>": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _tokenize(expr: str) -> List[Tuple[str, str]]:
+    out, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Unexpected input at {pos}: {expr[pos:pos + 20]!r}")
+        kind = m.lastgroup
+        out.append((kind, m.group(kind)))
+        pos = m.end()
+    return out
+
+
+class _Parser:
+    """expr := term (OR term)* ; term := factor (AND factor)* ;
+    factor := NOT factor | '(' expr ')' | operand OP operand | SIGNAL WITHIN n [days]
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]], columns: Set[str], signals: Set[str]):
+        self.toks = tokens
+        self.i = 0
+        self.columns = columns
+        self.signals = signals
+        self.params: List[Any] = []
+
+    def _peek(self, kw: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        if self.i >= len(self.toks):
+            return None
+        tok = self.toks[self.i]
+        if kw is not None and not (tok[0] == "ident" and tok[1].lower() == kw):
+            return None
+        return tok
+
+    def _next(self) -> Tuple[str, str]:
+        if self.i >= len(self.toks):
+            raise ValueError("Unexpected end of filter expression")
+        self.i += 1
+        return self.toks[self.i - 1]
+
+    def parse(self) -> str:
+        sql = self._expr()
+        if self.i != len(self.toks):
+            raise ValueError(f"Unexpected token {self.toks[self.i][1]!r}")
+        return sql
+
+    def _expr(self) -> str:
+        parts = [self._term()]
+        while self._peek("or"):
+            self._next()
+            parts.append(self._term())
+        return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+    def _term(self) -> str:
+        parts = [self._factor()]
+        while self._peek("and"):
+            self._next()
+            parts.append(self._factor())
+        return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+    def _factor(self) -> str:
+        if self._peek("not"):
+            self._next()
+            return f"NOT {self._factor()}"
+        tok = self._peek()
+        if tok == ("paren", "("):
+            self._next()
+            inner = self._expr()
+            if self._next() != ("paren", ")"):
+                raise ValueError("Missing ')'")
+            return f"({inner})"
+        if tok and tok[0] == "ident" and self.i + 1 < len(self.toks) \
+                and self.toks[self.i + 1][0] == "ident" and self.toks[self.i + 1][1].lower() == "within":
+            return self._signal()
+        left = self._operand()
+        kind, op = self._next()
+        if kind != "op":
+            raise ValueError(f"Expected a comparison operator, got {op!r}")
+        right = self._operand()
+        return f"{left} {_OPS[op]} {right}"
+
+    def _operand(self) -> str:
+        kind, val = self._next()
+        if kind == "num":
+            num = float(val[:-1]) / 100.0 if val.endswith("%") else float(val)
+            self.params.append(num)
+            return "?"
+        if kind == "ident":
+            low = val.lower()
+            if low in ("true", "false"):
+                self.params.append(1 if low == "true" else 0)
+                return "?"
+            if val not in self.columns:
+                raise ValueError(f"Unknown column {val!r}; known: {sorted(self.columns)}")
+            return f"m.{val}"
+        raise ValueError(f"Expected a column or number, got {val!r}")
+
+    def _signal(self) -> str:
+        _, sig = self._next()
+        if sig not in self.signals:
+            raise ValueError(f"Unknown signal {sig!r}; known: {sorted(self.signals)}")
+        self._next()  # within
+        kind, n = self._next()
+        if kind != "num" or n.endswith("%"):
+            raise ValueError(f"Expected a day count after 'within', got {n!r}")
+        if self._peek("days") or self._peek("day") or self._peek("d"):
+            self._next()
+        self.params += [sig, int(float(n))]
+        return ("EXISTS (SELECT 1 FROM signals s WHERE s.symbol_id = m.symbol_id "
+                "AND s.type = ? AND s.day > m.day - ?)")
+
+
+def metric_columns(engine) -> List[str]:
+    return [c["name"] for c in inspect(engine).get_columns("metrics") if c["name"] not in ("symbol_id", "day")]
+
+
+def signal_types(engine) -> List[str]:
+    """The crossover types plus every signal type stored in `signals`."""
+    with engine.connect() as conn:
+        stored = [r[0] for r in conn.exec_driver_sql("SELECT DISTINCT type FROM signals").all()]
+    return sorted(set(CROSSOVER_TYPES).union(stored))
+
+
+def compile_filter(where: Union[str, Sequence[str]], columns: Sequence[str],
+                   signals: Sequence[str] = CROSSOVER_TYPES) -> Tuple[str, List[Any]]:
+    """Filter expression(s) -> (SQL condition over the latest `metrics` row `m`, params).
+
+    Comparisons take columns of daily_metrics, numbers (``5%`` = 0.05) or
+    true/false; ``golden_cross within 10 days`` matches a signal of that type in
+    the 10 calendar days up to the symbol's latest row. Unknown columns and
+    signal types (not in `signals`) raise ValueError. Several expressions are
+    ANDed.
+    """
+    exprs = [where] if isinstance(where, str) else list(where)
+    conds, params = [], []
+    for e in exprs:
+        if not e or not e.strip():
+            continue
+        p = _Parser(_tokenize(e), set(columns), set(signals))
+        conds.append(p.parse())
+        params += p.params
+    return (" AND ".join(conds) or "1=1"), params
+
+
+def screen_query(engine, where: Union[str, Sequence[str]] = (), columns: Optional[Sequence[str]] = None,
+                 order_by: Optional[str] = None, descending: bool = False,
+                 limit: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """The (SQL, params) `screen` runs; unknown columns or signal types raise ValueError."""
+    known = metric_columns(engine)
+    cols = list(columns or DEFAULT_COLUMNS)
+    unknown = [c for c in cols if c not in known]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown}; known: {sorted(known)}")
+    cond, params = compile_filter(where, known, signal_types(engine))
+    if order_by is not None and order_by not in known:
+        raise ValueError(f"Unknown sort column {order_by!r}")
+    sql = (
+        f"SELECT t.symbol, date(m.day * 86400, 'unixepoch') AS date{''.join(f', m.{c}' for c in cols)} "
+        # CROSS JOIN pins latest_days as the outer loop: one primary-key probe per symbol
+        "FROM latest_days l CROSS JOIN metrics m ON m.symbol_id = l.symbol_id AND m.day = l.day "
+        "JOIN tickers t ON t.id = m.symbol_id "
+        f"WHERE {cond}"
+        f" ORDER BY {('m.' + order_by + (' DESC' if descending else '')) if order_by else 't.symbol'}"
+    )
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return sql, params
+
+
+def screen(engine, where: Union[str, Sequence[str]] = (), columns: Optional[Sequence[str]] = None,
+           order_by: Optional[str] = None, descending: bool = False,
+           limit: Optional[int] = None) -> pd.DataFrame:
+    """Symbols whose latest `daily_metrics` row matches `where`, one row per symbol."""
+    sql, params = screen_query(engine, where, columns, order_by, descending, limit)
+    with engine.connect() as conn:
+        res = conn.exec_driver_sql(sql, tuple(params))
+        return pd.DataFrame(res.all(), columns=list(res.keys()))
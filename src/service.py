@@ -0,0 +1,398 @@
+# src/service.py
+from __future__ import annotations
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, IO, List, Optional, Sequence
+
+import pandas as pd
+
+from src.async_fetch import AsyncFetcher
+from src.backtest import DEFAULT_HORIZONS, BacktestResult, run_backtest
+from src.cache import DataCache
+from src.data_fetcher import fetch_raw_bundle, set_cache, set_fundamentals
+from src.database import (from_days, get_engine, init_schema, load_fingerprints, save_fingerprints, stored_symbols,
+                          to_days)
+from src.export import FORMATS as EXPORT_FORMATS, output_path as export_output_path
+from src.fundamentals import FundamentalsStore
+from src.indicators import load_engine_config
+from src.fingerprint import StagePlan, run_params
+from src.instrument import count, stage
+from src.kernels import MetricWindows
+from src.pipeline import (
+    BatchSummary, IncrementalInput, TickerResult, compute_ticker, ensure_parent, export_result, fetch_incremental,
+    load_bundle, load_windows, persist_result, plan_ticker, record_compute, run_batch,
+)
+from src.screen import screen as run_screen
+from src.store import open_store
+
+
+@dataclass
+class RunOutcome:
+    ticker: str
+    output: str
+    result: TickerResult
+    unchanged: bool = False  # inputs, config and code match the last run; nothing was redone
+
+    @property
+    def up_to_date(self) -> bool:
+        return self.result.df.empty
+
+
+class Session:
+    """Config, data cache, engine and worker pool, set up once and reused by every request.
+
+    The CLI commands build one per invocation; `serve` keeps one for its whole
+    life, so modules, the schema check, symbol ids and cached series stay warm.
+    """
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None):
+        self.cfg = cfg or {}
+        self.cache = DataCache.from_config(self.cfg)
+        set_cache(self.cache)
+        self.db_path = self.cfg.get("db_path", "data/app.db")
+        self.out_dir = self.cfg.get("output_dir", "out")
+        self.period = self.cfg.get("historical_period", "5y")
+        self.min_sma_days = int(self.cfg.get("min_sma_days", 200))
+        self.lag_days = int(self.cfg.get("fundamentals_lag_days", 0))
+        self.indicators, self.signal_rules = load_engine_config(self.cfg)
+        self.storage = (self.cfg.get("storage") or {}).get("backend", "sqlite")
+        self.params = run_params(self.period, self.min_sma_days, self.lag_days, self.indicators, self.signal_rules,
+                                 self.storage)
+        self._engine = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+        self._windows: Dict[str, MetricWindows] = {}  # streaming SMA/52w-high state per ticker, for tick
+        self._reader = None
+        self._store = None
+        self.fundamentals: Optional[FundamentalsStore] = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            ensure_parent(self.db_path)
+            self._engine = get_engine(self.db_path, self.cfg.get("sqlite"))
+            init_schema(self._engine)
+            # Fundamentals are read from the table from here on; downloads happen only when due
+            self.fundamentals = FundamentalsStore.from_config(self.cfg, self._engine, self.cache)
+            set_fundamentals(self.fundamentals)
+        return self._engine
+
+    @property
+    def store(self):
+        """The configured history backend (src.store): what backtests read from."""
+        if self._store is None:
+            self._store = open_store(self.cfg, self.engine)
+        return self._store
+
+    @property
+    def _columnar(self):
+        """The history backend written alongside SQLite on persist, if it isn't SQLite itself."""
+        return self.store if self.store.name != "sqlite" else None
+
+    @property
+    def reader(self):
+        """Cached read-only queries over the stored metrics (src.query.MetricsReader)."""
+        if self._reader is None:
+            from src.query import MetricsReader
+            self._reader = MetricsReader(self.engine, int(self.cfg.get("api_cache_mb", 64)) * 1024 * 1024)
+        return self._reader
+
+    def compute_pool(self, workers: Optional[int]) -> Optional[ProcessPoolExecutor]:
+        """A process pool kept across batches (recreated only when the size changes)."""
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 0:
+            return None
+        if self._pool is None or self._pool_workers != workers:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool, self._pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+        return self._pool
+
+    def run_ticker(self, ticker: str, output: Optional[str] = None, incremental: bool = False,
+                   fmt: str = "json", force: bool = False) -> RunOutcome:
+        """Fetch, compute, store and export one ticker.
+
+        A full run whose inputs, parameters and code match the stored
+        fingerprints stops after the fetch (`unchanged`); stages whose own
+        fingerprint still matches are skipped. `force` redoes everything.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        os.makedirs(self.out_dir, exist_ok=True)
+        # Incremental rows go beside the full-history export by default, never over it
+        output = output or export_output_path(self.out_dir, ticker, fmt, delta=incremental)
+        ensure_parent(output)
+        engine = self.engine
+
+        with stage("fetch"):
+            if incremental:
+                raw = fetch_incremental(ticker, engine, period=self.period, min_sma_days=self.min_sma_days,
+                                        indicators=self.indicators)
+            else:
+                raw = fetch_raw_bundle(ticker, period=self.period)
+        if not incremental:
+            logging.info(f"Fetched {len(raw.prices)} price rows for {ticker}")
+        plan = None
+        if not isinstance(raw, IncrementalInput):
+            plan = plan_ticker(engine, raw, self.params, fmt, output, force)
+            if not plan.compute:
+                count("tickers_unchanged")
+                logging.info(f"{ticker}: inputs, config and code unchanged; skipped")
+                return RunOutcome(ticker, output, TickerResult(ticker, pd.DataFrame(), [], [], [], self.min_sma_days),
+                                  unchanged=True)
+
+        res = compute_ticker(raw, min_sma_days=self.min_sma_days, indicators=self.indicators,
+                             signal_rules=self.signal_rules, fundamentals_lag_days=self.lag_days)
+        record_compute(res)
+        logging.info(f"Processed {len(res.df)} rows; short_history={res.short_history}")
+        if not res.df.empty:
+            self._write(res, plan, output, fmt)
+        return RunOutcome(ticker, output, res)
+
+    def _write(self, res: TickerResult, plan: Optional[StagePlan], output: str, fmt: str):
+        """Persist and export `res`, skipping the stages `plan` marks as current."""
+        if plan is not None:
+            res.fingerprint = plan.key
+        if plan is None or plan.persist:
+            persist_result(self.engine, res, self._columnar)
+            self._advance_windows(res.ticker, res.df)
+        if plan is None or plan.export:
+            logging.info(f"Writing {fmt} to {output}")
+            export_result(res, output, fmt)
+            if plan is not None:
+                save_fingerprints(self.engine, res.ticker, {"export": plan.export_key})
+
+    def batch(self, symbols: Sequence[str], fetch_workers: Optional[int] = None,
+              compute_workers: Optional[int] = None, incremental: bool = False, fmt: str = "json",
+              combined: Optional[str] = None, fetch_batch_size: Optional[int] = None,
+              async_fetch: bool = False, force: bool = False) -> BatchSummary:
+        cfg = self.cfg
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        if fetch_workers is None:
+            fetch_workers = int(cfg.get("fetch_workers", 8))
+        if fetch_batch_size is None:
+            fetch_batch_size = int(cfg.get("fetch_batch_size", 0))
+        if compute_workers is None and cfg.get("compute_workers") is not None:
+            compute_workers = int(cfg["compute_workers"])
+        os.makedirs(self.out_dir, exist_ok=True)
+        engine = self.engine
+
+        fetch_cfg = cfg.get("async_fetch") or {}
+        fetcher = None
+        if async_fetch or fetch_cfg.get("enabled"):
+            fetcher = AsyncFetcher.from_config({"async_fetch": {**fetch_cfg, "enabled": True}}).start()
+        logging.info(f"Starting batch for {len(symbols)} tickers")
+        self._windows.clear()
+        try:
+            pool = self.compute_pool(compute_workers)
+            return run_batch(
+                symbols, engine,
+                period=self.period,
+                min_sma_days=self.min_sma_days,
+                out_dir=self.out_dir,
+                fetch_workers=fetch_workers,
+                compute_workers=self._pool_workers if pool is not None else 0,
+                incremental=incremental,
+                indicators=self.indicators,
+                signal_rules=self.signal_rules,
+                export_format=fmt,
+                combined=combined,
+                fetch_batch_size=fetch_batch_size,
+                fetcher=fetcher,
+                fundamentals_lag_days=self.lag_days,
+                compute_pool=pool,
+                force=force,
+                store=self._columnar,
+            )
+        finally:
+            if fetcher:
+                fetcher.close()
+
+    def recompute(self, symbols: Optional[Sequence[str]] = None, fmt: str = "json",
+                  force: bool = False) -> BatchSummary:
+        """Rebuild metrics, signals and exports from stored prices, without any network calls.
+
+        For when indicators, signal rules or `min_sma_days` change. `symbols`
+        defaults to every symbol with stored prices. Symbols whose stored
+        inputs and config match their fingerprints are skipped unless `force`.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        engine = self.engine
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._windows.clear()
+        summary = BatchSummary()
+        symbols = list(symbols) if symbols is not None else stored_symbols(engine)
+        stored = {} if force else load_fingerprints(engine, symbols)
+        for t in symbols:
+            try:
+                with stage("load"):
+                    raw = load_bundle(engine, t)
+                output = export_output_path(self.out_dir, t, fmt)
+                plan = plan_ticker(engine, raw, self.params, fmt, output, force, stored.get(t, {}))
+                if not plan.compute:
+                    summary.ok.append(t)
+                    summary.unchanged.append(t)
+                    count("tickers_unchanged")
+                    continue
+                res = compute_ticker(raw, min_sma_days=self.min_sma_days, indicators=self.indicators,
+                                     signal_rules=self.signal_rules, fundamentals_lag_days=self.lag_days)
+                res.prices = None  # already stored
+                record_compute(res)
+                self._write(res, plan, output, fmt)
+            except Exception as e:
+                logging.warning(f"{t}: recompute failed: {type(e).__name__}: {e}")
+                summary.failed[t] = f"{type(e).__name__}: {e}"
+                continue
+            summary.ok.append(t)
+            summary.signals += len(res.events)
+        return summary
+
+    def tick(self, ticker: str, close: float) -> Dict[str, Any]:
+        """SMA-50/`min_sma_days` and 52-week high with a provisional close after the last stored day.
+
+        The windows are primed from stored history on first use, then kept:
+        an incremental run pushes its new days into them in O(1) per day, so
+        a tick never re-reads the history.
+        """
+        w = self._windows.get(ticker)
+        if w is None:
+            w = self._windows[ticker] = load_windows(self.engine, ticker, self.min_sma_days)
+        out = {k: (None if isinstance(v, float) and v != v else v) for k, v in w.peek(close).items()}
+        return {"ticker": ticker, "after": str(from_days([w.last_day])[0].date()), **out}
+
+    def _advance_windows(self, ticker: str, df: pd.DataFrame):
+        w = self._windows.get(ticker)
+        if w is None:
+            return
+        days = to_days(df["date"])
+        if w.last_day is not None and days[0] > w.last_day:
+            for d, c in zip(days.tolist(), df["close"].tolist()):
+                w.push(c, d)
+        else:  # history rewritten, prime again on the next tick
+            del self._windows[ticker]
+
+    def backtest(self, symbols: Optional[Sequence[str]] = None, horizons: Sequence[int] = DEFAULT_HORIZONS,
+                 chunk_size: int = 500, long_only: bool = True, start: Optional[str] = None,
+                 end: Optional[str] = None) -> BacktestResult:
+        return run_backtest(self.engine, symbols, horizons, chunk_size=chunk_size, long_only=long_only,
+                            start=start, end=end, store=self.store)
+
+    def screen(self, where: Sequence[str] = (), columns: Optional[List[str]] = None, order_by: Optional[str] = None,
+               descending: bool = False, limit: Optional[int] = None) -> pd.DataFrame:
+        return run_screen(self.engine, list(where), columns=columns, order_by=order_by,
+                          descending=descending, limit=limit)
+
+    # -- warm mode --
+
+    def handle(self, job: Dict[str, Any]) -> Any:
+        """Run one `serve` job and return its JSON-ready result."""
+        cmd = job.get("cmd")
+        if cmd == "ping":
+            return "pong"
+        if cmd == "run":
+            out = self.run_ticker(job["ticker"], job.get("output"), bool(job.get("incremental")),
+                                  job.get("format", "json"), bool(job.get("force")))
+            res = out.result
+            return {"ticker": out.ticker, "up_to_date": out.up_to_date, "unchanged": out.unchanged,
+                    "rows": int(len(res.df)),
+                    "output": out.output if out.unchanged or not out.up_to_date else None,
+                    "signals": [{"type": e.type, "date": str(e.date)} for e in res.events]}
+        if cmd == "batch":
+            tickers = job.get("tickers") or []
+            if isinstance(tickers, str):
+                tickers = [t.strip() for t in tickers.split(",") if t.strip()]
+            summary = self.batch(tickers, job.get("fetch_workers"), job.get("compute_workers"),
+                                 bool(job.get("incremental")), job.get("format", "json"), job.get("combined"),
+                                 job.get("fetch_batch_size"), bool(job.get("async_fetch")), bool(job.get("force")))
+            return {"ok": summary.ok, "failed": summary.failed, "signals": summary.signals,
+                    "unchanged": summary.unchanged}
+        if cmd == "recompute":
+            tickers = job.get("tickers")
+            if isinstance(tickers, str):
+                tickers = [t.strip() for t in tickers.split(",") if t.strip()]
+            summary = self.recompute(tickers, job.get("format", "json"), bool(job.get("force")))
+            return {"ok": summary.ok, "failed": summary.failed, "signals": summary.signals,
+                    "unchanged": summary.unchanged}
+        if cmd == "tick":
+            return self.tick(job["ticker"], float(job["close"]))
+        if cmd == "backtest":
+            tickers = job.get("tickers")
+            if isinstance(tickers, str):
+                tickers = [t.strip() for t in tickers.split(",") if t.strip()]
+            res = self.backtest(tickers, job.get("horizons") or DEFAULT_HORIZONS, int(job.get("chunk_size", 500)),
+                                not job.get("long_short"), job.get("start"), job.get("end"))
+            out = res.to_dict()
+            out.pop("equity")  # one point per day; use the CLI's --output for the curve
+            return out
+        if cmd == "latest":
+            tickers = job["tickers"]
+            if isinstance(tickers, str):
+                tickers = [t.strip() for t in tickers.split(",") if t.strip()]
+            return self.reader.latest(tickers, job.get("columns"))
+        if cmd == "history":
+            return self.reader.history(job["ticker"], job.get("start"), job.get("end"), job.get("columns"))
+        if cmd == "signals":
+            return self.reader.signals(int(job.get("days", 30)), job.get("types"), int(job.get("limit", 500)),
+                                       job.get("since"))
+        if cmd == "screen":
+            df = self.screen(job.get("where") or [], job.get("columns"), job.get("sort"),
+                             bool(job.get("desc")), job.get("limit"))
+            return json.loads(df.to_json(orient="records"))
+        raise ValueError(f"unknown cmd {cmd!r}; expected run, batch, recompute, backtest, tick, screen, "
+                         "latest, history, signals, ping or quit")
+
+    def serve(self, lines: IO[str], out: IO[str]) -> int:
+        """JSON-lines job loop: one request per input line, one response per output line.
+
+        Stops at EOF or ``{"cmd": "quit"}``; returns the number of jobs handled.
+        A failing job gets ``"ok": false`` and an error message; the loop goes on.
+        """
+        handled = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            t0 = time.perf_counter()
+            job: Dict[str, Any] = {}
+            try:
+                job = json.loads(line)
+                if job.get("cmd") == "quit":
+                    break
+                reply = {"ok": True, "result": self.handle(job)}
+            except Exception as e:
+                logging.warning(f"job failed: {type(e).__name__}: {e}")
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            if isinstance(job, dict) and "id" in job:
+                reply = {"id": job["id"], **reply}
+            reply["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+            out.write(json.dumps(reply, default=str) + "\n")
+            out.flush()
+            handled += 1
+        return handled
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._store = None
+        if self._engine is not None:
+            set_fundamentals(None)
+            self.fundamentals = None
+            self._engine.dispose()
+            self._engine = None
+
+    def __enter__(self) -> "Session":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
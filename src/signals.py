@@ -1,54 +1,189 @@
 # src/signals.py
 from __future__ import annotations
+import numpy as np
 import pandas as pd
-from typing import List, Tuple, Dict, Any
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple, Dict, Any
 from src.models import SignalEvent
+from src.indicators import INDICATORS, normalize_spec
+
+def cross_transitions(sma50: np.ndarray, sma200: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Crossover masks along the last axis of 1-D (days) or 2-D (tickers x days) arrays.
+
+    Returns (cross, golden): `cross[..., i]` is True when day i and day i-1 both
+    have both SMAs and the sma50 >= sma200 state flips; `golden` marks the
+    upward flips. A NaN in either SMA resets the state, so no cross is reported
+    on the first valid day after a gap.
+    """
+    a = np.asarray(sma50, dtype=np.float64)
+    b = np.asarray(sma200, dtype=np.float64)
+    valid = ~(np.isnan(a) | np.isnan(b))
+    if a.shape[-1] == 0:
+        return np.zeros(a.shape, dtype=bool), np.zeros(a.shape, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        state = (a >= b).astype(np.int8)
+    flip = np.diff(state, axis=-1)
+    cross = (flip != 0) & valid[..., 1:] & valid[..., :-1]
+    pad = np.zeros(cross.shape[:-1] + (1,), dtype=bool)
+    cross = np.concatenate([pad, cross], axis=-1)
+    golden = cross & (state == 1)
+    return cross, golden
+
 def detect_crossovers(ticker: str, df: pd.DataFrame) -> Tuple[List[SignalEvent], List[Dict[str, Any]]]:
-    d = df.copy()
-    d["date"] = pd.to_datetime(d["date"], errors="coerce")
-    d = d.dropna(subset=["date"]).sort_values("date").reset_index(drop=True)
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    keep = dates.notna().to_numpy()
+    dates = dates.to_numpy()[keep]
+    if "sma50" not in df.columns or "sma200" not in df.columns:
+        return [], []
+    a = pd.to_numeric(df["sma50"], errors="coerce").to_numpy(dtype=np.float64)[keep]
+    b = pd.to_numeric(df["sma200"], errors="coerce").to_numpy(dtype=np.float64)[keep]
+    order = np.argsort(dates, kind="stable")
+    dates, a, b = dates[order], a[order], b[order]
+
+    cross, golden = cross_transitions(a, b)
+    idx = np.flatnonzero(cross)
 
     events: List[SignalEvent] = []
     contexts: List[Dict[str, Any]] = []
-    prev_state = None
-    prev_sma50 = None
-    prev_sma200 = None
-
-    for _, row in d.iterrows():
-        sma50 = row.get("sma50")
-        sma200 = row.get("sma200")
-        if pd.isna(sma50) or pd.isna(sma200):
-            prev_state = None
-            prev_sma50 = None
-            prev_sma200 = None
-            continue
-
-        cur = 1 if float(sma50) >= float(sma200) else 0
-        dt = pd.to_datetime(row["date"]).date()
-
-        if prev_state is not None:
-            if prev_state == 0 and cur == 1:
-                events.append(SignalEvent(ticker=ticker, date=dt, type="golden_cross"))
-                contexts.append({
-                    "date": str(dt),
-                    "sma50_prev": float(prev_sma50),
-                    "sma200_prev": float(prev_sma200),
-                    "sma50_cur": float(sma50),
-                    "sma200_cur": float(sma200),
-                    "type": "golden_cross",
-                })
-            elif prev_state == 1 and cur == 0:
-                events.append(SignalEvent(ticker=ticker, date=dt, type="death_cross"))
-                contexts.append({
-                    "date": str(dt),
-                    "sma50_prev": float(prev_sma50),
-                    "sma200_prev": float(prev_sma200),
-                    "sma50_cur": float(sma50),
-                    "sma200_cur": float(sma200),
-                    "type": "death_cross",
-                })
-        prev_state = cur
-        prev_sma50 = float(sma50)
-        prev_sma200 = float(sma200)
-
+    day_list = pd.DatetimeIndex(dates[idx]).date
+    for i, dt, g in zip(idx.tolist(), day_list, golden[idx].tolist()):
+        kind = "golden_cross" if g else "death_cross"
+        events.append(SignalEvent(ticker=ticker, date=dt, type=kind))
+        contexts.append({
+            "date": str(dt),
+            "sma50_prev": float(a[i - 1]),
+            "sma200_prev": float(b[i - 1]),
+            "sma50_cur": float(a[i]),
+            "sma200_cur": float(b[i]),
+            "type": kind,
+        })
     return events, contexts
+
+def detect_crossovers_panel(tickers: Sequence[str], dates: Sequence[Any],
+                            sma50: np.ndarray, sma200: np.ndarray) -> List[SignalEvent]:
+    """Crossovers for a whole universe at once from aligned (tickers x days) SMA arrays.
+
+    `dates` must be sorted ascending; days a ticker didn't trade should be NaN.
+    Events come out ordered by ticker, then date.
+    """
+    cross, golden = cross_transitions(np.atleast_2d(sma50), np.atleast_2d(sma200))
+    ti, di = np.nonzero(cross)
+    day_list = pd.DatetimeIndex(pd.to_datetime(np.asarray(dates)[di])).date
+    return [
+        SignalEvent(ticker=tickers[t], date=d, type="golden_cross" if g else "death_cross")
+        for t, d, g in zip(ti.tolist(), day_list, golden[ti, di].tolist())
+    ]
+
+# ---------------------------------------------------------------------------
+# Configurable signal rules over indicator columns (see src.indicators)
+# ---------------------------------------------------------------------------
+Column = Callable[[str], np.ndarray]
+
+
+@dataclass
+class SignalRule:
+    fn: Callable[[Column, Dict[str, Any]], List[Tuple[np.ndarray, str]]]
+    requires: Callable[[Dict[str, Any]], List[Dict[str, Any]]]
+    defaults: Dict[str, Any] = field(default_factory=dict)
+
+
+SIGNAL_RULES: Dict[str, SignalRule] = {}
+
+
+def signal_rule(name: str, requires: Callable[[Dict[str, Any]], List[Dict[str, Any]]],
+                defaults: Optional[Dict[str, Any]] = None):
+    """Register a rule: `fn(col, params) -> [(mask over days, event type), ...]`."""
+    def deco(fn):
+        SIGNAL_RULES[name] = SignalRule(fn, requires, dict(defaults or {}))
+        return fn
+    return deco
+
+
+def _columns_of(spec: Dict[str, Any]) -> List[str]:
+    spec = normalize_spec(spec, INDICATORS)
+    return INDICATORS[spec["name"]].columns(spec)
+
+
+def _level(x: np.ndarray, v: float) -> np.ndarray:
+    return np.full(x.shape, float(v))
+
+
+@signal_rule("ema_cross", defaults={"fast": 12, "slow": 26},
+             requires=lambda p: [{"name": "ema", "window": p["fast"]}, {"name": "ema", "window": p["slow"]}])
+def _ema_cross(col: Column, p):
+    fast, slow = _columns_of({"name": "ema", "window": p["fast"]})[0], _columns_of({"name": "ema", "window": p["slow"]})[0]
+    cross, up = cross_transitions(col(fast), col(slow))
+    tag = f"{p['fast']}_{p['slow']}"
+    return [(up, f"ema_cross_up_{tag}"), (cross & ~up, f"ema_cross_down_{tag}")]
+
+
+@signal_rule("macd_cross", defaults={"fast": 12, "slow": 26, "signal": 9},
+             requires=lambda p: [{"name": "macd", **{k: p[k] for k in ("fast", "slow", "signal")}}])
+def _macd_cross(col: Column, p):
+    line, sig, _ = _columns_of({"name": "macd", **{k: p[k] for k in ("fast", "slow", "signal")}})
+    cross, up = cross_transitions(col(line), col(sig))
+    return [(up, "macd_cross_up"), (cross & ~up, "macd_cross_down")]
+
+
+@signal_rule("rsi", defaults={"window": 14, "low": 30, "high": 70},
+             requires=lambda p: [{"name": "rsi", "window": p["window"]}])
+def _rsi_extremes(col: Column, p):
+    rsi = col(_columns_of({"name": "rsi", "window": p["window"]})[0])
+    low_cross, low_up = cross_transitions(rsi, _level(rsi, p["low"]))
+    high_cross, high_up = cross_transitions(rsi, _level(rsi, p["high"]))
+    w = p["window"]
+    return [(low_cross & ~low_up, f"rsi_oversold_{w}"), (high_cross & high_up, f"rsi_overbought_{w}")]
+
+
+@signal_rule("bollinger_break", defaults={"window": 20, "k": 2},
+             requires=lambda p: [{"name": "bollinger", "window": p["window"], "k": p["k"]}])
+def _bollinger_break(col: Column, p):
+    _, upper, lower = _columns_of({"name": "bollinger", "window": p["window"], "k": p["k"]})
+    close = col("close")
+    up_cross, up = cross_transitions(close, col(upper))
+    down_cross, down_up = cross_transitions(close, col(lower))
+    w = p["window"]
+    return [(up_cross & up, f"bb_break_up_{w}"), (down_cross & ~down_up, f"bb_break_down_{w}")]
+
+
+@signal_rule("new_low", defaults={"window": 20}, requires=lambda p: [{"name": "low", "window": p["window"]}])
+def _new_low(col: Column, p):
+    # Close breaks below the lowest close of the previous `window` days
+    low = col(_columns_of({"name": "low", "window": p["window"]})[0])
+    prev_low = np.concatenate([[np.nan], low[:-1]])
+    with np.errstate(invalid="ignore"):
+        broke = col("close") < prev_low
+    return [(broke, f"new_low_{p['window']}")]
+
+
+@signal_rule("volume_spike", defaults={"window": 20, "k": 3},
+             requires=lambda p: [{"name": "volume_avg", "window": p["window"]}])
+def _volume_spike(col: Column, p):
+    avg = col(_columns_of({"name": "volume_avg", "window": p["window"]})[0])
+    prev_avg = np.concatenate([[np.nan], avg[:-1]])
+    with np.errstate(invalid="ignore"):
+        spike = col("volume") > p["k"] * prev_avg
+    return [(spike, f"volume_spike_{p['window']}")]
+
+
+def detect_signals(ticker: str, df: pd.DataFrame, rules: Sequence[Dict[str, Any]]) -> List[SignalEvent]:
+    """Events for the configured rules, read from indicator columns already on `df`."""
+    if not rules or df.empty:
+        return []
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    keep = dates.notna().to_numpy()
+    order = np.argsort(dates.to_numpy()[keep], kind="stable")
+    day_list = pd.DatetimeIndex(dates.to_numpy()[keep][order]).date
+
+    def col(name: str) -> np.ndarray:
+        if name not in df.columns:
+            return np.full(len(order), np.nan)
+        return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)[keep][order]
+
+    found: List[Tuple[int, str]] = []
+    for r in rules:
+        r = normalize_spec(r, SIGNAL_RULES)
+        for mask, kind in SIGNAL_RULES[r["name"]].fn(col, r):
+            found += [(i, kind) for i in np.flatnonzero(mask).tolist()]
+    found.sort()
+    return [SignalEvent(ticker=ticker, date=day_list[i], type=kind) for i, kind in found]
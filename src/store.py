@@ -0,0 +1,418 @@
+# src/store.py
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from src.database import DAILY_COLUMNS, from_days, load_tail, to_days, upsert_daily, upsert_signals, upsert_ticker
+from src.lazy import available, lazy_import
+
+# Optional: columnar partitions are Parquet when pyarrow is installed and asked for; imported on first use
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+
+BACKENDS = ("sqlite", "columnar")
+FORMATS = ("auto", "npy", "parquet")
+_FETCH_ROWS = 100_000
+_PART = re.compile(r"^(\d{4})\.(npy|parquet)$")
+_ALL = (-2**62, 2**62)
+# Signal rows are deduplicated on one int64 key, day * _TYPE_CODES + type code, so a store holds at
+# most _TYPE_CODES distinct signal types (codes 0.._TYPE_CODES - 1, assigned in upsert_signals)
+_TYPE_CODES = 4096
+
+
+@dataclass
+class StoredPanel:
+    """Stored columns for several symbols on one calendar: each value is (symbols x days), NaN where absent."""
+    symbols: List[str]
+    days: np.ndarray  # int64 days since epoch, ascending
+    values: Dict[str, np.ndarray]
+
+
+def _bounds(start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+    lo = _ALL[0] if start is None else int(to_days([start])[0])
+    hi = _ALL[1] if end is None else int(to_days([end])[0])
+    return lo, hi
+
+
+def _float_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    """A metrics column as float64 with missing -> NaN (is_52w_high as 0/1)."""
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    s = df[col]
+    if col == "is_52w_high":
+        return np.where(s.isna().to_numpy(), np.nan, s.fillna(False).astype(bool).to_numpy(dtype=np.float64))
+    return pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _panel(symbols: Sequence[str], series: Dict[str, Tuple[np.ndarray, Dict[str, np.ndarray]]],
+           columns: Sequence[str]) -> StoredPanel:
+    """Scatter per-symbol (days, {column: values}) onto their union calendar."""
+    parts = [series[s][0] for s in symbols if s in series]
+    days = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+    values = {c: np.full((len(symbols), len(days)), np.nan) for c in columns}
+    for i, s in enumerate(symbols):
+        if s not in series:
+            continue
+        d, cols = series[s]
+        at = np.searchsorted(days, d)
+        for c in columns:
+            values[c][i, at] = cols[c]
+    return StoredPanel(list(symbols), days, values)
+
+
+class SqliteStore:
+    """History in the SQLite `metrics`/`signals` tables (the default backend)."""
+    name = "sqlite"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def upsert_ticker(self, symbol: str):
+        upsert_ticker(self.engine, symbol)
+
+    def upsert_daily(self, symbol: str, df: pd.DataFrame, extra_columns: Sequence[str] = ()):
+        upsert_daily(self.engine, symbol, df, extra_columns=extra_columns)
+
+    def upsert_signals(self, symbol: str, events: List[Dict[str, Any]]):
+        upsert_signals(self.engine, symbol, events)
+
+    def _ids(self, conn, symbols: Optional[Sequence[str]]) -> List[Tuple[int, str]]:
+        rows = conn.exec_driver_sql("""
+SELECT t.id, t.symbol FROM tickers t
+WHERE EXISTS (SELECT 1 FROM latest_days l WHERE l.symbol_id = t.id) ORDER BY t.symbol
+""").all()
+        if symbols is not None:
+            wanted = set(symbols)
+            rows = [r for r in rows if r[1] in wanted]
+        return [(int(i), s) for i, s in rows]
+
+    def symbols(self) -> List[str]:
+        """Symbols with stored metrics, sorted."""
+        with self.engine.connect() as conn:
+            return [s for _, s in self._ids(conn, None)]
+
+    def load_panel(self, symbols: Sequence[str], columns: Sequence[str] = ("close",),
+                   start: Optional[str] = None, end: Optional[str] = None) -> StoredPanel:
+        """`columns` for `symbols` between `start` and `end`; days where all of them are NULL are left out."""
+        lo, hi = _bounds(start, end)
+        symbols = list(symbols)
+        with self.engine.connect() as conn:
+            ids = self._ids(conn, symbols)
+            if not ids or not columns:
+                return _panel(symbols, {}, columns)
+            marks = ",".join("?" * len(ids))
+            res = conn.exec_driver_sql(
+                f"SELECT symbol_id, day, {', '.join(columns)} FROM metrics WHERE symbol_id IN ({marks})"
+                f" AND day BETWEEN ? AND ? AND ({' OR '.join(f'{c} IS NOT NULL' for c in columns)})"
+                " ORDER BY symbol_id, day", (*(i for i, _ in ids), lo, hi))
+            width = 2 + len(columns)
+            # Converted a partition at a time with fromiter over the flattened rows, since np.array probes
+            # each Row as a mapping first (~5us per row). A lone column is never NULL here, so needs no mapping
+            flat = chain.from_iterable if len(columns) == 1 else \
+                (lambda rows: (np.nan if v is None else v for v in chain.from_iterable(rows)))
+            parts = [np.fromiter(flat(rows), dtype=np.float64, count=width * len(rows)).reshape(-1, width)
+                     for rows in res.partitions(_FETCH_ROWS)]
+        a = np.concatenate(parts) if parts else np.empty((0, width))
+        names = dict(ids)
+        sid = a[:, 0].astype(np.int64)
+        cuts = np.flatnonzero(np.diff(sid)) + 1
+        series = {}
+        for block in np.split(np.arange(len(a)), cuts):
+            if block.size:
+                series[names[int(sid[block[0]])]] = (a[block, 1].astype(np.int64),
+                                                     {c: a[block, 2 + j] for j, c in enumerate(columns)})
+        return _panel(symbols, series, columns)
+
+    def load_signals(self, symbols: Sequence[str], start: Optional[str] = None,
+                     end: Optional[str] = None) -> pd.DataFrame:
+        """Stored signals as a (ticker, day, type) frame ordered by ticker, day and type."""
+        lo, hi = _bounds(start, end)
+        with self.engine.connect() as conn:
+            ids = self._ids(conn, list(symbols))
+            if not ids:
+                return pd.DataFrame({"ticker": [], "day": np.empty(0, dtype=np.int64), "type": []})
+            marks = ",".join("?" * len(ids))
+            rows = conn.exec_driver_sql(
+                f"SELECT symbol_id, day, type FROM signals WHERE symbol_id IN ({marks}) AND day BETWEEN ? AND ?",
+                (*(i for i, _ in ids), lo, hi)).all()
+        names = dict(ids)
+        df = pd.DataFrame({"ticker": [names[r[0]] for r in rows], "day": np.array([r[1] for r in rows], np.int64),
+                           "type": [r[2] for r in rows]})
+        return df.sort_values(["ticker", "day", "type"], ignore_index=True)
+
+
+class ColumnarStore:
+    """History as column-oriented files partitioned by symbol and year.
+
+    Layout under `root`::
+
+        _schema.json                       column and signal-type order, file format
+        metrics/<SYMBOL>/<YYYY>.npy        float64 (1 + columns, days): row 0 is the day number
+        signals/<SYMBOL>/<YYYY>.npy        float64 (2, signals): day number and signal-type code
+
+    (``.parquet`` with named columns instead when `fmt` is ``parquet``.) A
+    column is one contiguous row of its file, so reads memory-map each
+    partition and touch only the requested columns; partitions outside
+    `start`/`end` aren't opened. Columns are only ever appended to the
+    schema, so older partitions simply lack the newer ones (read as NaN).
+    Every write builds the new partition in a temporary file and renames it
+    over the old one, so readers see either the old or the new year, never
+    a torn one. One writer per store at a time.
+    """
+    name = "columnar"
+
+    def __init__(self, root: str, fmt: str = "auto"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown storage format {fmt!r}; choose from {', '.join(FORMATS)}")
+        self.root = root
+        self._lock = threading.Lock()
+        schema = self._read_schema()
+        if schema is None:
+            resolved = fmt if fmt != "auto" else ("parquet" if available("pyarrow") else "npy")
+            if resolved == "parquet" and not available("pyarrow"):
+                raise ValueError("storage format parquet needs pyarrow; use npy or install pyarrow")
+            schema = {"format": resolved, "columns": list(DAILY_COLUMNS), "signal_types": []}
+            os.makedirs(root, exist_ok=True)
+            self._write_json(os.path.join(root, "_schema.json"), schema)
+        elif fmt not in ("auto", schema["format"]):
+            raise ValueError(f"Store at {root} holds {schema['format']} partitions, not {fmt}")
+        self.schema = schema
+        self.ext = "." + schema["format"]
+
+    # -- files --
+
+    def _read_schema(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.root, "_schema.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _tmp(path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _write_json(self, path: str, obj: Any):
+        tmp = self._tmp(path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+
+    def _extend_schema(self, key: str, names: Sequence[str]):
+        new = [n for n in dict.fromkeys(names) if n not in self.schema[key]]
+        if new:
+            self.schema = {**self.schema, key: self.schema[key] + new}
+            self._write_json(os.path.join(self.root, "_schema.json"), self.schema)
+
+    def _dir(self, kind: str, symbol: str) -> str:
+        return os.path.join(self.root, kind, quote(symbol, safe=""))
+
+    def _parts(self, kind: str, symbol: str, lo: int = _ALL[0], hi: int = _ALL[1]) -> List[Tuple[int, str]]:
+        """(year, path) of the symbol's partitions overlapping days lo..hi, oldest first."""
+        d = self._dir(kind, symbol)
+        if not os.path.isdir(d):
+            return []
+        y0 = -1 if lo == _ALL[0] else int(np.datetime64(lo, "D").astype("datetime64[Y]").astype(int)) + 1970
+        y1 = 10_000 if hi == _ALL[1] else int(np.datetime64(hi, "D").astype("datetime64[Y]").astype(int)) + 1970
+        parts = []
+        for name in os.listdir(d):
+            m = _PART.match(name)
+            if m and m.group(2) == self.schema["format"] and y0 <= int(m.group(1)) <= y1:
+                parts.append((int(m.group(1)), os.path.join(d, name)))
+        return sorted(parts)
+
+    def _layout(self, kind: str) -> List[str]:
+        return ["day"] + (self.schema["columns"] if kind == "metrics" else ["type"])
+
+    def _load(self, path: str, kind: str, names: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """(days, {name: values}) of one partition; names the file predates come back as NaN."""
+        if self.ext == ".parquet":
+            table = pq.read_table(path, memory_map=True)
+            present = set(table.column_names)
+            days = table.column("day").to_numpy().astype(np.int64)
+            return days, {c: (table.column(c).to_numpy().astype(np.float64) if c in present
+                              else np.full(len(days), np.nan)) for c in names}
+        m = np.load(path, mmap_mode="r")
+        layout = self._layout(kind)
+        days = m[0].astype(np.int64)
+        out = {}
+        for c in names:
+            i = layout.index(c)
+            out[c] = m[i] if i < m.shape[0] else np.full(len(days), np.nan)
+        return days, out
+
+    def _save(self, path: str, kind: str, days: np.ndarray, cols: Dict[str, np.ndarray]):
+        layout = self._layout(kind)
+        tmp = self._tmp(path)
+        if self.ext == ".parquet":
+            pq.write_table(pa.table({"day": pa.array(days, pa.int64()),
+                                     **{c: pa.array(cols[c], pa.float64()) for c in layout[1:]}}), tmp)
+        else:
+            m = np.empty((len(layout), len(days)))
+            m[0] = days
+            for i, c in enumerate(layout[1:], 1):
+                m[i] = cols[c]
+            with open(tmp, "wb") as f:
+                np.save(f, m)
+        os.replace(tmp, path)
+
+    def _merge(self, kind: str, symbol: str, days: np.ndarray, cols: Dict[str, np.ndarray], replace: bool):
+        """Fold new rows into their year partitions; on a day already stored, `replace` overwrites `cols`."""
+        os.makedirs(self._dir(kind, symbol), exist_ok=True)
+        layout = self._layout(kind)
+        years = days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+        for year in np.unique(years).tolist():
+            sel = years == year
+            d, new = days[sel], {c: v[sel] for c, v in cols.items()}
+            path = os.path.join(self._dir(kind, symbol), f"{year}{self.ext}")
+            if os.path.exists(path):
+                old_days, old = self._load(path, kind, layout[1:])
+                if replace:
+                    all_days = np.union1d(old_days, d)
+                else:  # signals: a (day, type) already stored is kept once
+                    key = old_days * _TYPE_CODES + old["type"].astype(np.int64)
+                    keep = ~np.isin(d * _TYPE_CODES + new["type"].astype(np.int64), key)
+                    d, new = d[keep], {c: v[keep] for c, v in new.items()}
+                    all_days = np.concatenate([old_days, d])
+                merged = {c: np.full(len(all_days), np.nan) for c in layout[1:]}
+                at_old = np.searchsorted(all_days, old_days) if replace else np.arange(len(old_days))
+                at_new = np.searchsorted(all_days, d) if replace else np.arange(len(old_days), len(all_days))
+                for c in layout[1:]:
+                    merged[c][at_old] = old[c]
+                for c, v in new.items():
+                    merged[c][at_new] = v
+                d = all_days
+                new = merged
+            order = np.lexsort((new["type"], d)) if kind == "signals" else np.argsort(d, kind="stable")
+            self._save(path, kind, d[order], {c: np.asarray(new.get(c, np.full(len(d), np.nan)))[order]
+                                              for c in layout[1:]})
+
+    # -- writes --
+
+    def upsert_ticker(self, symbol: str):
+        os.makedirs(self._dir("metrics", symbol), exist_ok=True)
+
+    def upsert_daily(self, symbol: str, df: pd.DataFrame, extra_columns: Sequence[str] = ()):
+        """Same semantics as database.upsert_daily: a stored day gets every written column replaced."""
+        if df.empty:
+            return
+        written = list(DAILY_COLUMNS) + list(extra_columns)
+        with self._lock:
+            self._extend_schema("columns", written)
+            days = to_days(df["date"])
+            self._merge("metrics", symbol, days, {c: _float_column(df, c) for c in written}, replace=True)
+
+    def upsert_signals(self, symbol: str, events: List[Dict[str, Any]]):
+        if not events:
+            return
+        with self._lock:
+            known = set(self.schema["signal_types"])
+            if len(known.union(e["type"] for e in events)) > _TYPE_CODES:
+                raise ValueError(f"The columnar store holds at most {_TYPE_CODES} signal types")
+            self._extend_schema("signal_types", [e["type"] for e in events])
+            codes = {t: i for i, t in enumerate(self.schema["signal_types"])}
+            days = to_days([str(e["date"]) for e in events])
+            types = np.array([codes[e["type"]] for e in events], dtype=np.float64)
+            _, first = np.unique(days * _TYPE_CODES + types.astype(np.int64), return_index=True)
+            days, types = days[first], types[first]
+            self._merge("signals", symbol, days, {"type": types}, replace=False)
+
+    def has(self, symbol: str) -> bool:
+        """Whether any metrics partition is stored for `symbol`."""
+        return bool(self._parts("metrics", symbol))
+
+    def backfill(self, engine, symbol: str) -> int:
+        """Copy `symbol`'s whole SQLite history (metrics and signals) into the store; returns the rows copied.
+
+        For a symbol written here for the first time, e.g. after switching
+        backends on an existing database, so later (incremental) writes
+        extend a complete history instead of starting a partial one.
+        """
+        df = load_tail(engine, symbol, None).drop(columns=["volume"], errors="ignore")
+        self.upsert_daily(symbol, df, extra_columns=[c for c in df.columns[1:] if c not in DAILY_COLUMNS])
+        sig = SqliteStore(engine).load_signals([symbol])
+        self.upsert_signals(symbol, [{"date": d, "type": t} for d, t in
+                                     zip(from_days(sig["day"]).dt.strftime("%Y-%m-%d"), sig["type"])])
+        return len(df)
+
+    # -- reads --
+
+    def symbols(self) -> List[str]:
+        """Symbols with at least one metrics partition, sorted."""
+        d = os.path.join(self.root, "metrics")
+        if not os.path.isdir(d):
+            return []
+        return sorted(unquote(n) for n in os.listdir(d) if self._parts("metrics", unquote(n)))
+
+    def load_series(self, symbol: str, columns: Sequence[str] = ("close",), start: Optional[str] = None,
+                    end: Optional[str] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """One symbol's (days, {column: values}) between `start` and `end`, read from the overlapping years."""
+        self._check(columns)
+        return self._series(symbol, columns, *_bounds(start, end))
+
+    def _check(self, columns: Sequence[str]):
+        unknown = [c for c in columns if c not in self.schema["columns"]]
+        if unknown:
+            raise ValueError(f"Unknown column(s) {', '.join(unknown)}; available: {', '.join(self.schema['columns'])}")
+
+    def _series(self, symbol: str, columns: Sequence[str], lo: int, hi: int):
+        days, cols = [], {c: [] for c in columns}
+        for _, path in self._parts("metrics", symbol, lo, hi):
+            d, part = self._load(path, "metrics", columns)
+            a, b = np.searchsorted(d, lo), np.searchsorted(d, hi, side="right")
+            days.append(d[a:b])
+            for c in columns:
+                cols[c].append(np.array(part[c][a:b]))  # copies out of the map
+        if not days:
+            return np.empty(0, dtype=np.int64), {c: np.empty(0) for c in columns}
+        return np.concatenate(days), {c: np.concatenate(v) for c, v in cols.items()}
+
+    def load_panel(self, symbols: Sequence[str], columns: Sequence[str] = ("close",),
+                   start: Optional[str] = None, end: Optional[str] = None) -> StoredPanel:
+        """`columns` for `symbols` between `start` and `end`; days where all of them are NaN are left out."""
+        self._check(columns)
+        lo, hi = _bounds(start, end)
+        series = {}
+        for s in dict.fromkeys(symbols):
+            d, cols = self._series(s, columns, lo, hi)
+            keep = ~np.all([np.isnan(v) for v in cols.values()], axis=0) if columns else np.zeros(len(d), bool)
+            if keep.any():
+                series[s] = (d[keep], {c: v[keep] for c, v in cols.items()})
+        return _panel(list(symbols), series, columns)
+
+    def load_signals(self, symbols: Sequence[str], start: Optional[str] = None,
+                     end: Optional[str] = None) -> pd.DataFrame:
+        """Stored signals as a (ticker, day, type) frame ordered by ticker, day and type."""
+        lo, hi = _bounds(start, end)
+        names = self.schema["signal_types"]
+        tickers, days, types = [], [], []
+        for s in sorted(set(symbols)):
+            for _, path in self._parts("signals", s, lo, hi):
+                d, part = self._load(path, "signals", ["type"])
+                sel = (d >= lo) & (d <= hi)
+                tickers += [s] * int(sel.sum())
+                days.append(d[sel])
+                types += [names[int(t)] for t in part["type"][sel]]
+        df = pd.DataFrame({"ticker": tickers, "day": np.concatenate(days) if days else np.empty(0, np.int64),
+                           "type": types})
+        return df.sort_values(["ticker", "day", "type"], ignore_index=True)
+
+
+def open_store(cfg: Optional[Dict[str, Any]], engine):
+    """The history backend selected by the `storage:` config section (sqlite unless set)."""
+    opts = (cfg or {}).get("storage") or {}
+    backend = opts.get("backend", "sqlite")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {backend!r}; choose from {', '.join(BACKENDS)}")
+    if backend == "sqlite":
+        return SqliteStore(engine)
+    return ColumnarStore(opts.get("path", "data/store"), opts.get("format", "auto"))
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.async_fetch import AsyncFetcher, TokenBucket
+from src.retry import PermanentError, TransientError, backoff_delay, is_transient
+
+class FakeProvider:
+    """Injects per-ticker latency and a queue of errors raised before succeeding."""
+    hosts = {"prices": "prices.test", "fundamentals": "funds.test"}
+
+    def __init__(self, latency=None, errors=None, days=30):
+        self.latency = latency or {}
+        self.errors = {t: list(e) for t, e in (errors or {}).items()}
+        self.days = days
+        self.calls = []
+        self.active = self.peak = 0
+
+    async def prices(self, ticker, period="5y", start=None):
+        self.calls.append(ticker)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency.get(ticker, 0.005))
+            if self.errors.get(ticker):
+                raise self.errors[ticker].pop(0)
+            if ticker == "EMPTY":
+                return pd.DataFrame(columns=["date", "close"])
+            return pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=self.days),
+                                 "close": np.linspace(10.0, 20.0, self.days)})
+        finally:
+            self.active -= 1
+
+    async def fundamentals(self, ticker):
+        if ticker == "NOFUNDS":
+            raise PermanentError("no balance sheet")
+        return []
+
+def _fetcher(provider, **kw):
+    opts = dict(rate=0, concurrency=4, timeout=0.5, retries=3, backoff_base=0.001, backoff_max=0.01, seed=1)
+    opts.update(kw)
+    return AsyncFetcher(provider, **opts)
+
+def test_retries_transient_but_not_permanent_errors():
+    p = FakeProvider(errors={"FLAKY": [TransientError("429"), ConnectionError("reset")],
+                             "GONE": [PermanentError("unknown symbol")]})
+    res = {r.ticker: r for r in _fetcher(p).run(["OK", "FLAKY", "GONE", "EMPTY", "NOFUNDS"])}
+
+    assert res["OK"].ok and len(res["OK"].bundle.prices) == 30
+    assert res["FLAKY"].ok and p.calls.count("FLAKY") == 3
+    assert not res["GONE"].ok and p.calls.count("GONE") == 1
+    err = res["GONE"].errors[0]
+    assert (err.kind, err.error, err.transient, err.attempts) == ("prices", "PermanentError", False, 1)
+    assert not res["EMPTY"].ok and res["EMPTY"].errors[0].error == "NoData"
+    # fundamentals failures are reported but don't drop the ticker
+    assert res["NOFUNDS"].ok and res["NOFUNDS"].errors[0].kind == "fundamentals"
+
+def test_slow_symbol_times_out_without_stalling_others():
+    p = FakeProvider(latency={"SLOW": 5.0})
+    results = _fetcher(p, timeout=0.1, retries=0).run(["SLOW"] + [f"T{i}" for i in range(12)])
+
+    assert results[-1].ticker == "SLOW"  # completion order
+    slow = results[-1]
+    assert not slow.ok and slow.errors[0].error == "Timeout" and slow.errors[0].attempts == 1
+    assert all(r.ok for r in results[:-1])
+
+class BlockingProvider(FakeProvider):
+    """Downloads on threads like yfinance: a timed-out call keeps running until it returns."""
+    hosts = {"prices": "h", "fundamentals": "f"}
+
+    def __init__(self, block=0.3, **kw):
+        super().__init__(**kw)
+        self.block = block
+        self.lock = threading.Lock()
+
+    def _download(self, ticker):
+        with self.lock:
+            first = ticker not in self.calls
+            self.calls.append(ticker)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            if first:  # the first attempt outlives the timeout, then fails
+                time.sleep(self.block)
+                raise TransientError("late")
+            return pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=self.days),
+                                 "close": np.linspace(10.0, 20.0, self.days)})
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    async def prices(self, ticker, period="5y", start=None):
+        return await asyncio.to_thread(self._download, ticker)
+
+def test_timed_out_calls_keep_their_host_slot_until_they_return():
+    p = BlockingProvider(block=0.2)
+    results = _fetcher(p, per_host={"h": 2}, timeout=0.1, retries=3).run(["A", "B", "C", "D"])
+    assert all(r.ok for r in results)
+    assert p.peak <= 2  # abandoned downloads and their retries never overlap past the host cap
+    assert sorted(p.calls) == ["A", "A", "B", "B", "C", "C", "D", "D"]
+
+def test_a_hung_call_times_out_within_its_budget():
+    p = FakeProvider(latency={"HUNG": 3600.0})
+    t0 = time.perf_counter()
+    results = _fetcher(p, timeout=0.1, retries=2).run(["HUNG", "OK"])
+    assert time.perf_counter() - t0 < 2.0  # timeout * (retries + 1) plus slack, not an hour
+    hung = {r.ticker: r for r in results}["HUNG"]
+    assert not hung.ok and hung.errors[0].error == "Timeout"
+    assert p.calls.count("HUNG") == 1  # never retried beside the call still running
+
+def test_concurrency_cap():
+    p = FakeProvider(latency={f"T{i}": 0.02 for i in range(20)})
+    _fetcher(p, concurrency=3).run([f"T{i}" for i in range(20)])
+    assert p.peak == 3
+
+def test_token_bucket_waits(monkeypatch):
+    now, waits = [0.0], []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        waits.append(delay)
+        now[0] += delay
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+
+    async def take(n):
+        bucket = TokenBucket(rate=64, capacity=5, clock=lambda: now[0])
+        for _ in range(n):
+            await bucket.acquire()
+    asyncio.run(take(15))
+    # 5 banked, the other 10 at 64/s
+    assert waits == [1 / 64] * 10 and now[0] == 10 / 64
+
+def test_backoff_is_capped_full_jitter():
+    import random
+    rng = random.Random(0)
+    delays = [backoff_delay(a, base=0.5, cap=4.0, rng=rng) for a in range(10) for _ in range(50)]
+    assert 0 <= min(delays) and max(delays) <= 4.0
+
+def test_http_client_errors_are_classified_through_their_hierarchy():
+    requests = pytest.importorskip("requests")
+    curl = pytest.importorskip("curl_cffi.requests.exceptions")
+    yf = pytest.importorskip("yfinance.exceptions")
+
+    def http_error(cls, code):
+        resp = requests.Response()
+        resp.status_code = code
+        return cls(f"{code}", response=resp)
+
+    ex = requests.exceptions
+    for e in (ex.ConnectionError("reset"), ex.Timeout("slow"), ex.ReadTimeout("slow"), ex.ProxyError("proxy"),
+              ex.ChunkedEncodingError("cut"), curl.ConnectionError("reset"), curl.Timeout("slow"),
+              yf.YFRateLimitError(), http_error(ex.HTTPError, 429), http_error(ex.HTTPError, 503),
+              http_error(curl.HTTPError, 502)):
+        assert is_transient(e), repr(e)
+    for e in (http_error(ex.HTTPError, 404), ex.HTTPError("no response"), ex.InvalidURL("bad"),
+              ex.MissingSchema("bad"), PermanentError("gone"), ValueError("parse")):
+        assert not is_transient(e), repr(e)
+
+def test_run_batch_with_async_fetcher(tmp_path):
+    from src.database import get_engine, init_schema
+    from src.pipeline import run_batch
+    engine = get_engine(str(tmp_path / "a.db"))
+    init_schema(engine)
+    p = FakeProvider(latency={"SLOW": 5.0}, errors={"GONE": [PermanentError("unknown symbol")]}, days=260)
+    with _fetcher(p, timeout=0.1, retries=0) as fetcher:
+        summary = run_batch(["AAA", "GONE", "SLOW", "BBB"], engine, out_dir=str(tmp_path),
+                            compute_workers=0, fetcher=fetcher)
+    assert sorted(summary.ok) == ["AAA", "BBB"]
+    assert "PermanentError: unknown symbol" in summary.failed["GONE"]
+    assert "Timeout" in summary.failed["SLOW"]
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.backtest import run_backtest
+from src.database import get_engine, init_schema, upsert_daily, upsert_signals
+
+
+def _store(engine, symbol, dates, close, events):
+    upsert_daily(engine, symbol, pd.DataFrame({"date": dates, "close": close}))
+    upsert_signals(engine, symbol, [{"date": dates[i].date(), "type": t} for i, t in events])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = get_engine(str(tmp_path / "bt.db"))
+    init_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_hand_computed_returns_drawdowns_and_equity(engine):
+    dates = pd.bdate_range("2024-01-01", periods=6)
+    _store(engine, "A", dates, [100.0, 110.0, 99.0, 121.0, 110.0, 132.0], [(0, "golden_cross"), (3, "death_cross")])
+    _store(engine, "B", dates, [50.0] * 6, [])  # never holds a position, so it doesn't dilute the portfolio
+
+    res = run_backtest(engine, horizons=[1, 2])
+    g, d = res.signals.iloc[0], res.signals.iloc[1]
+    assert (g["type"], d["type"]) == ("golden_cross", "death_cross")
+    assert g["ret_1"] == pytest.approx(0.10) and g["dd_1"] == 0.0
+    assert g["ret_2"] == pytest.approx(-0.01) and g["dd_2"] == pytest.approx(-0.01)
+    # Death crosses are scored short: a falling close is a gain
+    assert d["ret_1"] == pytest.approx(11 / 121) and d["dd_1"] == 0.0
+    assert d["ret_2"] == pytest.approx(-11 / 121) and d["dd_2"] == pytest.approx(-11 / 121)
+
+    summary = res.summary.set_index(["type", "horizon"])
+    assert summary.loc[("golden_cross", 2), "hit_rate"] == 0.0
+    assert summary.loc[("death_cross", 1), "hit_rate"] == 1.0
+
+    # Long only: held from day 0 to the death cross on day 3, then flat
+    a = res.tickers.set_index("ticker").loc["A"]
+    assert a["total_return"] == pytest.approx(0.21)
+    assert a["max_drawdown"] == pytest.approx(0.99 / 1.1 - 1)
+    assert a["exposure"] == pytest.approx(0.6) and a["trades"] == 1
+    np.testing.assert_allclose(res.equity["equity"], [1.1, 0.99, 1.21, 1.21, 1.21])
+    assert res.equity["positions"].tolist() == [1, 1, 1, 0, 0]
+
+    short = run_backtest(engine, horizons=[1], long_only=False)
+    assert short.equity["equity"].iloc[-1] == pytest.approx(1.21 * (1 + 1 / 11) * 0.8)
+    assert short.tickers.set_index("ticker").loc["A", "trades"] == 2
+
+
+def test_chunking_does_not_change_results(engine):
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    for i in range(9):
+        start = int(rng.integers(0, 60))  # staggered listings give chunks different calendars
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates) - start)))
+        days = sorted(rng.choice(len(close), 6, replace=False).tolist())
+        kinds = ["golden_cross", "death_cross"] * 3
+        _store(engine, f"T{i}", dates[start:], close, list(zip(days, kinds)))
+
+    one = run_backtest(engine, chunk_size=1)
+    many = run_backtest(engine, chunk_size=4)
+    pd.testing.assert_frame_equal(one.signals, many.signals)
+    pd.testing.assert_frame_equal(one.summary, many.summary)
+    pd.testing.assert_frame_equal(one.tickers, many.tickers)
+    pd.testing.assert_frame_equal(one.equity, many.equity, check_exact=False, rtol=1e-12)
+    assert len(one.signals) == 54
+
+    sub = run_backtest(engine, symbols=["T0", "T3"], start="2023-03-01")
+    assert set(sub.tickers["ticker"]) == {"T0", "T3"}
+    assert (sub.signals["date"] >= pd.Timestamp("2023-03-01")).all()
+
+
+def test_horizons_count_each_symbols_own_trading_days(engine):
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range("2024-01-01", periods=120)
+    # Two exchanges with different holidays: a symbol's h-day return must not depend on its chunk mates
+    us = dates.delete([10, 11, 40, 75])
+    ns = dates.delete([5, 22, 23, 60, 90])
+    closes = {}
+    for i in range(6):
+        cal = ns if i % 2 else us
+        close = closes[i] = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(cal))))
+        days = sorted(rng.choice(len(cal) - 5, 5, replace=False).tolist())
+        kinds = ["golden_cross", "death_cross", "golden_cross", "death_cross", "golden_cross"]
+        _store(engine, f"S{i}.NS" if i % 2 else f"S{i}", cal, close, list(zip(days, kinds)))
+
+    one = run_backtest(engine, horizons=[1, 5], chunk_size=1)
+    for size in (2, 6):
+        other = run_backtest(engine, horizons=[1, 5], chunk_size=size)
+        pd.testing.assert_frame_equal(one.signals, other.signals)
+        pd.testing.assert_frame_equal(one.tickers, other.tickers)
+        pd.testing.assert_frame_equal(one.equity, other.equity, check_exact=False, rtol=1e-12)
+
+    # The 5-day return ends 5 of the symbol's own closes later, across the other exchange's holidays
+    sig = one.signals[one.signals["ticker"] == "S0"].iloc[0]
+    at = us.get_loc(sig["date"])
+    assert sig["ret_5"] == pytest.approx(closes[0][at + 5] / closes[0][at] - 1)
@@ -0,0 +1,88 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import src.data_fetcher as data_fetcher
+from src.cache import DataCache, seed_from_file
+from src.models import FundamentalsQuarter
+
+def _prices(n=300):
+    return pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=n), "close": np.linspace(1.0, 2.0, n)})
+
+def test_roundtrip_and_ttl(tmp_path):
+    cache = DataCache(str(tmp_path), ttl_prices=60)
+    assert cache.get_prices("NVDA", "5y") is None
+
+    cache.put_prices("NVDA", "5y", _prices())
+    hit = cache.get_prices("nvda", "5y")
+    pd.testing.assert_frame_equal(hit, _prices(), check_dtype=False)
+    assert cache.get_prices("NVDA", "1y") is None  # period is part of the key
+
+    cache.put_fundamentals("NVDA", [FundamentalsQuarter(period_end="2024-03-31", book_value=10, cash=None)])
+    q = cache.get_fundamentals("NVDA")
+    assert q[0].book_value == 10 and q[0].cash is None
+
+    cache.put_prices("OLD", "5y", _prices(), ttl=-1)  # already expired
+    assert cache.get_prices("OLD", "5y") is None
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    one = DataCache(str(tmp_path / "probe"))
+    one.put_prices("X", "5y", _prices())
+    entry = one._entries()[0][1]
+
+    cache = DataCache(str(tmp_path / "c"), max_bytes=int(entry * 2.5))
+    cache.put_prices("A", "5y", _prices())
+    cache.put_prices("B", "5y", _prices())
+    past = time.time() - 100
+    for _, _, path in cache._entries():
+        os.utime(os.path.join(path, "meta.json"), (past, past))
+    assert cache.get_prices("A", "5y") is not None  # touch A, so B is least recent
+    cache.put_prices("C", "5y", _prices())
+
+    assert cache.get_prices("B", "5y") is None
+    assert cache.get_prices("A", "5y") is not None
+    assert cache.get_prices("C", "5y") is not None
+
+def test_eviction_scans_the_directory_once(tmp_path, monkeypatch):
+    probe = DataCache(str(tmp_path / "probe"))
+    probe.put_prices("X", "5y", _prices(50))
+    entry = probe._entries()[0][1]
+
+    DataCache(str(tmp_path / "c")).put_prices("OLD", "5y", _prices(50))  # left by an earlier run
+    cache = DataCache(str(tmp_path / "c"), max_bytes=entry * 10)
+    scans = []
+    real = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or real())
+    for i in range(40):
+        cache.put_prices(f"T{i}", "5y", _prices(50))
+        assert cache.get_prices("T0", "5y") is not None  # kept warm, so never the one evicted
+    assert len(scans) == 1
+    assert len(real()) == 10 and cache._total == 10 * entry
+    assert cache.get_prices("OLD", "5y") is None and cache.get_prices("T1", "5y") is None
+
+def test_offline_seeded_fetch(tmp_path, monkeypatch):
+    csv = tmp_path / "TEST.csv"
+    _prices().rename(columns={"date": "Date", "close": "Close"}).to_csv(csv, index=False)
+    cache = DataCache(str(tmp_path / "cache"), offline=True)
+    assert seed_from_file(cache, str(csv)) == "TEST"
+
+    def _no_network(*a, **k):
+        raise AssertionError("network used")
+    monkeypatch.setattr(data_fetcher.yf, "download", _no_network)
+    monkeypatch.setattr(data_fetcher.yf, "Ticker", _no_network)
+    monkeypatch.setattr(data_fetcher, "_cache", cache)
+
+    raw = data_fetcher.fetch_raw_bundle("TEST", period="5y")
+    assert len(raw.prices) == 300 and raw.fundamentals_q == []
+    tail = data_fetcher.fetch_prices("TEST", start="2025-02-01")
+    assert tail["date"].min() >= pd.Timestamp("2025-02-01")
+
+def test_hit_and_miss_counts_survive_concurrent_gets(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    cache = DataCache(str(tmp_path))
+    cache.put_prices("A", "5y", _prices(20))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.get_prices("A" if i % 2 else "B", "5y"), range(2000)))
+    assert (cache.hits, cache.misses) == (1000, 1000)
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+import src.data_fetcher
+from src.data_fetcher import bundle_from_arrays, download_prices, fetch_price_chunk, fetch_prices_batch, split_closes
+
+def stub_download(closes, fail=(), calls=None):
+    """yf.download stand-in: (Price, Ticker) MultiIndex frame; `fail` symbols come back all-NaN once."""
+    failed_once = set()
+
+    def download(tickers, period):
+        if calls is not None:
+            calls.append(list(tickers))
+        data = {}
+        for t in tickers:
+            s = closes.get(t)
+            if s is None or (t in fail and t not in failed_once):
+                failed_once.add(t)
+                s = pd.Series(np.nan, index=next(iter(closes.values())).index)
+            data[("Close", t)] = s
+            data[("Open", t)] = s
+        df = pd.DataFrame(data)
+        df.columns = pd.MultiIndex.from_tuples(df.columns, names=["Price", "Ticker"])
+        return df
+    return download
+
+def _closes(n=5, days=10):
+    idx = pd.bdate_range("2024-01-01", periods=days)
+    return {f"T{i}": pd.Series(np.arange(days, dtype=float) + 100 * i, index=idx) for i in range(n)}
+
+def test_split_closes_returns_views_and_trims():
+    closes = _closes(3)
+    closes["T1"].iloc[:3] = np.nan   # listed later: still a view
+    closes["T2"].iloc[4] = np.nan    # holiday gap: filtered copy
+    df = stub_download(closes)(list(closes), "5y")
+    out = split_closes(df, list(closes))
+
+    assert out["T0"].close.base is out["T1"].close.base is not None  # rows of one block
+    assert out["T1"].dates[0] == np.datetime64("2024-01-04")
+    assert len(out["T1"].close) == 7 and len(out["T2"].close) == 9
+    assert not np.isnan(out["T2"].close).any()
+    assert out["T0"].frame()["close"].tolist() == closes["T0"].tolist()
+
+def test_chunk_retries_only_missing_symbols():
+    calls = []
+    got, errors = fetch_price_chunk(["T0", "T1", "T2", "NOPE"], retries=2,
+                                    download=stub_download(_closes(3), fail={"T1"}, calls=calls))
+    assert sorted(got) == ["T0", "T1", "T2"]
+    assert list(errors) == ["NOPE"]
+    assert calls == [["T0", "T1", "T2", "NOPE"], ["T1", "NOPE"], ["NOPE"]]
+
+def test_batch_chunks_and_survives_failed_calls():
+    calls = []
+    inner = stub_download(_closes(5), calls=calls)
+
+    def flaky(tickers, period):
+        if len(calls) == 0:
+            calls.append("boom")
+            raise ConnectionError("reset")
+        return inner(tickers, period)
+
+    got, errors = fetch_prices_batch([f"T{i}" for i in range(5)], chunk_size=2, download=flaky)
+    assert sorted(got) == [f"T{i}" for i in range(5)] and not errors
+    assert calls == ["boom", ["T0", "T1"], ["T2", "T3"], ["T4"]]
+
+def test_run_batch_with_batched_download(tmp_path, monkeypatch):
+    from src.database import get_engine, init_schema
+    from src.pipeline import run_batch
+    monkeypatch.setattr(src.data_fetcher, "fetch_fundamentals_q", lambda t: [])
+    idx = pd.bdate_range("2023-01-02", periods=300)
+    up = np.concatenate([np.linspace(200.0, 100.0, 150), np.linspace(100.0, 300.0, 150)])
+    closes = {t: pd.Series(up * (i + 1), index=idx) for i, t in enumerate(["AAA", "BBB", "CCC"])}
+
+    engine = get_engine(str(tmp_path / "b.db"))
+    init_schema(engine)
+    summary = run_batch(["AAA", "BBB", "CCC", "BAD"], engine, out_dir=str(tmp_path), compute_workers=0,
+                        fetch_batch_size=2, download=stub_download(closes))
+    assert sorted(summary.ok) == ["AAA", "BBB", "CCC"]
+    assert list(summary.failed) == ["BAD"] and summary.signals == 3
+
+
+def test_ohlcv_kept_through_download_and_split(monkeypatch):
+    closes = _closes(2)
+    closes["T1"].iloc[4] = np.nan
+    out = split_closes(stub_download(closes)(list(closes), "5y"), list(closes))
+    assert out["T0"].open is not None and out["T0"].high is None
+    assert out["T1"].open.tolist() == out["T1"].close.tolist()
+    bundle = bundle_from_arrays(out["T1"], fundamentals_q=[])
+    assert bundle.prices.open.tolist() == bundle.prices.close.tolist() and bundle.prices.volume is None
+
+    idx = pd.bdate_range("2024-01-01", periods=3)
+    wide = pd.DataFrame({("Close", "X"): [1.0, 2.0, 3.0], ("High", "X"): [1.5, 2.5, 3.5],
+                         ("Low", "X"): [0.5, 1.5, 2.5], ("Open", "X"): [1.0, 1.0, 2.0],
+                         ("Volume", "X"): [10, 20, 30]}, index=idx)
+    monkeypatch.setattr(src.data_fetcher.yf, "download", lambda *a, **k: wide)
+    df = download_prices("X")
+    assert df.columns.tolist() == ["date", "open", "high", "low", "close", "volume"]
+    assert df["volume"].tolist() == [10, 20, 30]
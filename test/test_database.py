@@ -1,8 +1,11 @@
 # tests/test_database.py
+import numpy as np
 import pandas as pd
 from sqlalchemy import text
 
-from src.database import get_engine, init_schema, upsert_daily, upsert_signals, upsert_ticker
+from src.database import (get_engine, init_schema, load_prices, stored_symbols, upsert_daily, upsert_daily_panel,
+                          upsert_prices, upsert_signals, upsert_ticker)
+from src.models import PriceColumns
 
 def test_daily_upsert_idempotent(tmp_path):
     db_path = tmp_path / "test.db"
@@ -40,3 +43,155 @@ def test_signal_unique_constraint(tmp_path):
     with engine.begin() as conn:
         cnt = conn.execute(text("SELECT COUNT(*) FROM signal_events WHERE symbol='TEST'")).scalar_one()
     assert cnt == 1
+
+def test_bulk_daily_upsert_nan_to_null(tmp_path):
+    engine = get_engine(str(tmp_path / "bulk.db"))
+    init_schema(engine)
+
+    dates = pd.bdate_range("2024-01-01", periods=3)
+    df = pd.DataFrame({
+        "date": dates,
+        "close": [1.0, 2.0, 3.0],
+        "sma50": [float("nan"), 1.5, 2.5],
+        "is_52w_high": [None, False, True],
+    })
+    upsert_daily(engine, "TEST", df)
+
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT date, sma50, sma200, is_52w_high FROM daily_metrics WHERE symbol='TEST' ORDER BY date"
+        )).all()
+    assert [r[0] for r in rows] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert rows[0][1] is None and rows[1][1] == 1.5
+    assert all(r[2] is None for r in rows)  # column absent from frame
+    assert [r[3] for r in rows] == [None, 0, 1]
+
+def test_panel_upsert_writes_every_ticker(tmp_path):
+    engine = get_engine(str(tmp_path / "panel.db"))
+    init_schema(engine)
+    df = pd.DataFrame({
+        "ticker": ["AAA", "AAA", "BBB"],
+        "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-01"]),
+        "close": [1.0, 2.0, 3.0],
+    })
+    upsert_daily_panel(engine, df)
+
+    with engine.begin() as conn:
+        rows = conn.execute(text("SELECT symbol, date, close FROM daily_metrics ORDER BY symbol, date")).all()
+        latest = conn.execute(text(
+            "SELECT t.symbol, date(l.day * 86400, 'unixepoch') FROM latest_days l JOIN tickers t ON t.id = l.symbol_id "
+            "ORDER BY t.symbol"
+        )).all()
+    assert [tuple(r) for r in rows] == [("AAA", "2024-01-01", 1.0), ("AAA", "2024-01-02", 2.0), ("BBB", "2024-01-01", 3.0)]
+    assert [tuple(r) for r in latest] == [("AAA", "2024-01-02"), ("BBB", "2024-01-01")]
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE tickers(id INTEGER PRIMARY KEY, symbol TEXT UNIQUE)",
+    "CREATE TABLE daily_metrics(symbol TEXT, date TEXT, close REAL, sma50 REAL, sma200 REAL, high_52w REAL, "
+    "bvps REAL, pb REAL, ev REAL, pct_from_52w_high REAL, is_52w_high INTEGER, rsi_14 REAL, UNIQUE(symbol,date))",
+    "CREATE TABLE signal_events(symbol TEXT, date TEXT, type TEXT, UNIQUE(symbol,date,type))",
+]
+
+def test_migrates_legacy_text_keyed_schema(tmp_path):
+    import sqlite3
+    from src.database import SCHEMA_VERSION, load_tail
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as raw:
+        for stmt in LEGACY_SCHEMA:
+            raw.execute(stmt)
+        raw.executemany("INSERT INTO daily_metrics(symbol,date,close,rsi_14) VALUES(?,?,?,?)",
+                        [("OLD", f"2024-01-{d:02d}", float(d), 50.0 + d) for d in range(1, 11)])
+        raw.execute("INSERT INTO signal_events VALUES('OLD','2024-01-05','golden_cross')")
+
+    engine = get_engine(str(path))
+    init_schema(engine)
+    with engine.begin() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar_one() == SCHEMA_VERSION
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar_one() == "wal"
+        row = conn.execute(text("SELECT close, rsi_14 FROM daily_metrics WHERE symbol='OLD' AND date='2024-01-10'")).one()
+        sig = conn.execute(text("SELECT date, type FROM signal_events WHERE symbol='OLD'")).one()
+    assert tuple(row) == (10.0, 60.0)
+    assert tuple(sig) == ("2024-01-05", "golden_cross")
+
+    tail = load_tail(engine, "OLD", 3)
+    assert tail["date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-08", "2024-01-09", "2024-01-10"]
+    init_schema(engine)  # already current: no-op
+
+def test_wal_reader_does_not_block_writer(tmp_path):
+    engine = get_engine(str(tmp_path / "wal.db"), {"busy_timeout": 100})
+    init_schema(engine)
+    df = pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=2), "close": [1.0, 2.0]})
+    upsert_daily(engine, "TEST", df)
+
+    with engine.connect() as reader:
+        reader.exec_driver_sql("BEGIN")
+        before = reader.exec_driver_sql("SELECT COUNT(*) FROM metrics").scalar_one()
+        upsert_daily(engine, "TEST2", df)  # would raise "database is locked" without WAL
+        assert reader.exec_driver_sql("SELECT COUNT(*) FROM metrics").scalar_one() == before
+        reader.exec_driver_sql("COMMIT")
+
+def test_rejects_unknown_pragmas(tmp_path):
+    import pytest
+    with pytest.raises(ValueError):
+        get_engine(str(tmp_path / "x.db"), {"journal_mode": "WAL; DROP TABLE tickers"})
+    with pytest.raises(ValueError):
+        get_engine(str(tmp_path / "x.db"), {"writable_schema": 1})
+
+
+def test_prices_round_trip_and_v2_upgrade(tmp_path):
+    engine = get_engine(str(tmp_path / "test.db"))
+    init_schema(engine)
+    with engine.begin() as conn:  # pretend this file predates the prices table
+        conn.exec_driver_sql("DROP TABLE prices")
+        conn.exec_driver_sql("PRAGMA user_version=2")
+    init_schema(engine)
+
+    day = np.arange(19000, 19005)
+    p = PriceColumns(day, [10.0, 11.0, 12.0, 13.0, 14.0], high=[11.0, 12.0, np.nan, 14.0, 15.0],
+                     low=[9.0, 10.0, 11.0, 12.0, 13.0], volume=[100, 200, np.nan, 400, 500])
+    upsert_prices(engine, "AAA", p)
+    upsert_prices(engine, "AAA", PriceColumns(day[-1:], [14.5]))  # re-download of the last day
+
+    got = load_prices(engine, "AAA")
+    assert got.day.tolist() == day.tolist()
+    assert got.close.tolist() == [10.0, 11.0, 12.0, 13.0, 14.5]
+    assert got.open is None and np.isnan(got.high[2]) and np.isnan(got.high[4])
+    assert got.volume[:2].tolist() == [100.0, 200.0]
+    assert load_prices(engine, "AAA", since_day=19002).day.tolist() == [19003, 19004]
+    assert len(load_prices(engine, "NOPE")) == 0
+    assert stored_symbols(engine) == ["AAA"] and stored_symbols(engine, "metrics") == []
+
+def test_symbol_id_from_a_rolled_back_transaction_is_not_reused(tmp_path):
+    from src.database import _symbol_id
+    engine = get_engine(str(tmp_path / "rb.db"))
+    init_schema(engine)
+    upsert_daily(engine, "KEEP", pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=2), "close": [1.0, 2.0]}))
+    try:
+        with engine.begin() as conn:
+            _symbol_id(conn, engine, "GONE")
+            _symbol_id(conn, engine, "KEEP")  # already committed: stays cached
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    upsert_daily(engine, "GONE", pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=3),
+                                               "close": [1.0, 2.0, 3.0]}))
+    with engine.connect() as conn:
+        n = conn.execute(text("SELECT COUNT(*) FROM daily_metrics WHERE symbol='GONE'")).scalar_one()
+        orphans = conn.execute(text("SELECT COUNT(*) FROM metrics WHERE symbol_id NOT IN "
+                                    "(SELECT id FROM tickers)")).scalar_one()
+    assert n == 3 and orphans == 0
+    engine.dispose()
+
+def test_load_fingerprints_for_some_or_all_symbols(tmp_path):
+    from src.database import load_fingerprints, save_fingerprints
+    engine = get_engine(str(tmp_path / "fp.db"))
+    init_schema(engine)
+    for i in range(50):
+        save_fingerprints(engine, f"S{i:02d}", {"process": f"p{i}", "export": f"e{i}"})
+    save_fingerprints(engine, "S01", {"export": None})
+
+    assert load_fingerprints(engine, ["S01", "S07", "S07", "NOPE"]) == {"S01": {"process": "p1"},
+                                                                        "S07": {"process": "p7", "export": "e7"}}
+    assert load_fingerprints(engine, []) == {}
+    assert len(load_fingerprints(engine)) == 50
+    engine.dispose()
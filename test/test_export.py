@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.export import Exporter, export_file, has_parquet
+from src.models import PriceRow, RawBundle
+from src.pipeline import EnhancedJSONEncoder, build_payload, compute_ticker
+
+def _result(ticker="AAA", days=300):
+    dates = pd.bdate_range("2023-01-02", periods=days)
+    closes = np.concatenate([np.linspace(200.0, 100.0, days // 2), np.linspace(100.0, 300.0, days - days // 2)])
+    rows = [PriceRow(date=d.date(), close=float(c)) for d, c in zip(dates, closes)]
+    return compute_ticker(RawBundle(ticker=ticker, prices=rows, fundamentals_q=[]), min_sma_days=200)
+
+def test_streamed_json_matches_payload_model(tmp_path):
+    res = _result()
+    path = tmp_path / "AAA.json"
+    export_file(res, str(path), chunk_rows=64)  # several chunks
+
+    streamed = json.loads(path.read_text())
+    expected = json.loads(json.dumps(build_payload(res).model_dump(), cls=EnhancedJSONEncoder))
+    expected["generated_at"] = streamed["generated_at"]
+    assert streamed == expected
+    assert "\n" not in path.read_text()  # compact
+
+def test_ndjson_and_columnar_exports(tmp_path):
+    res = _result()
+    export_file(res, str(tmp_path / "AAA.ndjson"), "ndjson")
+    lines = [json.loads(l) for l in (tmp_path / "AAA.ndjson").read_text().splitlines()]
+    kinds = [l["kind"] for l in lines]
+    assert kinds[0] == "meta" and kinds.count("metric") == 300 and kinds.count("signal") == len(res.events)
+    assert lines[1]["ticker"] == "AAA" and lines[1]["date"] == "2023-01-02"
+
+    if not has_parquet():
+        export_file(res, str(tmp_path / "AAA.columns.json"), "columnar")
+        doc = json.loads((tmp_path / "AAA.columns.json").read_text())
+        assert len(doc["columns"]["close"]) == 300
+        assert doc["columns"]["sma200"][198] is None and doc["columns"]["sma200"][199] is not None
+
+def test_combined_batch_file(tmp_path):
+    with Exporter(str(tmp_path), "json", combined=str(tmp_path / "all.json")) as ex:
+        for t in ("AAA", "BBB"):
+            ex.write(_result(t, 260))
+    doc = json.loads((tmp_path / "all.json").read_text())
+    assert [t["ticker"] for t in doc["tickers"]] == ["AAA", "BBB"]
+    assert all(len(t["metrics"]) == 260 for t in doc["tickers"])
+
+    with Exporter(str(tmp_path), "ndjson", combined=str(tmp_path / "all.ndjson")) as ex:
+        ex.write(_result("AAA", 10))
+        ex.write(_result("BBB", 10))
+    tickers = {json.loads(l)["ticker"] for l in (tmp_path / "all.ndjson").read_text().splitlines()}
+    assert tickers == {"AAA", "BBB"}
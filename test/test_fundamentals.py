@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import src.fundamentals
+from src.database import get_engine, init_schema, load_fundamentals
+from src.fundamentals import FundamentalsStore, download_fundamentals, next_due, parse_statement
+from src.models import FundamentalsColumns
+
+DAY = 86400
+
+
+def _statement(rows, ends):
+    return pd.DataFrame(rows, index=pd.to_datetime(ends)).T
+
+
+def _days(*ends):
+    return pd.to_datetime(list(ends)).to_numpy(dtype="datetime64[D]").astype(np.int64).tolist()
+
+
+class FakeTicker:
+    calls = []
+
+    def __init__(self, symbol, quarterly=True, shares=True, fail=False):
+        self.symbol, self.quarterly, self.shares, self.fail = symbol, quarterly, shares, fail
+
+    def __getattr__(self, attr):
+        FakeTicker.calls.append((self.symbol, attr))
+        if self.fail:
+            raise ValueError("no statements")
+        ends = ["2024-06-30", "2024-03-31"]
+        if attr in ("quarterly_balance_sheet", "balance_sheet"):
+            if attr == "quarterly_balance_sheet" and not self.quarterly:
+                return pd.DataFrame()
+            rows = {"Total Debt": [5.0, 4.0], "Cash And Cash Equivalents": [2.0, 1.0],
+                    "Stockholders Equity": [100.0, 90.0]}
+            if self.shares:
+                rows["Ordinary Shares Number"] = [10.0, 10.0]
+            return _statement(rows, ends if attr.startswith("quarterly") else ["2023-12-31"] * 2)
+        if attr in ("quarterly_income_stmt", "income_stmt"):
+            return _statement({"Total Revenue": [50.0, 40.0], "EBITDA": [8.0, 7.0]}, ends)
+        if attr == "info":
+            return {"sharesOutstanding": 12}
+        raise AttributeError(attr)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = get_engine(str(tmp_path / "f.db"))
+    init_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_parse_statement_matches_aliases_and_skips_non_dates():
+    df = pd.DataFrame({pd.Timestamp("2024-06-30"): [1.0, None, 3.0, "7", 9.0],
+                       "TTM": [0.0, 0.0, 0.0, 0.0, 0.0],
+                       pd.Timestamp("2024-03-31"): [2.0, 5.0, 4.0, None, 8.0]},
+                      index=["Total Debt", "Total Stockholder Equity", "Common Stock Equity", "Total Revenue", "Noise"])
+    cols = parse_statement(df)
+    assert cols.period_end.tolist() == _days("2024-03-31", "2024-06-30")
+    assert cols.values["total_debt"].tolist() == [2.0, 1.0]
+    assert cols.values["book_value"].tolist() == [5.0, 3.0]  # preferred label, the next one where it's empty
+    assert cols.values["revenue"][1] == 7.0 and np.isnan(cols.values["revenue"][0])
+    assert np.isnan(cols.values["ebitda"]).all()
+    assert len(parse_statement(pd.DataFrame())) == 0 and len(parse_statement(None)) == 0
+
+
+def test_download_merges_statements_and_falls_back(monkeypatch):
+    FakeTicker.calls = []
+    monkeypatch.setattr(src.fundamentals.yf, "Ticker", lambda s: FakeTicker(s))
+    cols = download_fundamentals("AAA")
+    assert cols.period_end.tolist() == _days("2024-03-31", "2024-06-30")
+    q = cols[1]
+    assert (q.total_debt, q.cash, q.book_value, q.shares_out, q.revenue, q.ebitda) == (5, 2, 100, 10, 50, 8)
+    assert ("AAA", "info") not in FakeTicker.calls and ("AAA", "balance_sheet") not in FakeTicker.calls
+
+    monkeypatch.setattr(src.fundamentals.yf, "Ticker", lambda s: FakeTicker(s, quarterly=False, shares=False))
+    cols = download_fundamentals("BBB")
+    assert cols.period_end.tolist() == _days("2023-12-31", "2024-03-31", "2024-06-30")
+    assert cols.values["shares_out"].tolist() == [12.0] * 3  # from info, as the balance sheet has none
+    assert cols.values["book_value"][0] == 100.0 and np.isnan(cols.values["revenue"][0])
+
+
+def test_store_fetches_only_due_symbols_and_keeps_data_on_failure(engine, monkeypatch):
+    FakeTicker.calls = []
+    failing = set()
+    monkeypatch.setattr(src.fundamentals.yf, "Ticker", lambda s: FakeTicker(s, fail=s in failing))
+    store = FundamentalsStore(engine, workers=4)
+    assert store.refresh(["A", "B", "C"]) == {}
+    fetched = len(FakeTicker.calls)
+    assert store.get("B").values["revenue"].tolist() == [40.0, 50.0]
+
+    again = FundamentalsStore(engine)  # a later run: nothing is due, so it reads the table only
+    assert again.refresh(["A", "B", "C"]) == {} and len(FakeTicker.calls) == fetched
+    assert again.get("A") == store.get("A")
+
+    # An older quarter no longer in the download stays stored; a failed fetch keeps what was there
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE fundamentals SET period_end = period_end - 365 WHERE period_end = "
+                          "(SELECT MIN(period_end) FROM fundamentals)"))
+    failing.add("C")
+    errors = again.refresh(["A", "C"], force=True)
+    assert list(errors) == ["C"] and "no statements" in errors["C"]
+    stored = load_fundamentals(engine, ["A", "B", "C"])
+    assert len(stored["A"]) == 3 and len(stored["B"]) == 2 and len(stored["C"]) == 2
+    with engine.connect() as conn:
+        meta = dict(conn.execute(text("SELECT t.symbol, m.error FROM fundamentals_meta m "
+                                      "JOIN tickers t ON t.id = m.symbol_id")).all())
+    assert meta == {"A": None, "B": None, "C": "ValueError: no statements"}
+
+
+def test_next_due_waits_for_the_next_report():
+    q = FundamentalsColumns(np.array(_days("2024-03-31", "2024-06-30")))
+    last = _days("2024-06-30")[0]
+    now = (last + 10) * DAY
+    assert next_due(q, now) == (last + 92 + 45) * DAY
+    assert next_due(q, (last + 200) * DAY) == (last + 203) * DAY  # overdue: polled every retry_days
+    assert next_due(FundamentalsColumns(np.empty(0)), now) == now + 92 * DAY
+
+
+def test_due_symbols_skip_a_cached_copy_that_is_not_newer(engine, tmp_path, monkeypatch):
+    from src.cache import DataCache
+    FakeTicker.calls = []
+    monkeypatch.setattr(src.fundamentals.yf, "Ticker", lambda s: FakeTicker(s))
+    cache = DataCache(str(tmp_path / "cache"))
+    old = FundamentalsColumns(np.array(_days("2024-03-31")), {"book_value": np.array([1.0])})
+    cache.put_fundamentals("A", old)
+    store = FundamentalsStore(engine, cache)
+    store.refresh(["A"])  # nothing stored yet: the cached quarter is used
+    assert FakeTicker.calls == [] and store.get("A").values["book_value"].tolist() == [1.0]
+
+    store.refresh(["A"], force=True)  # re-polled: the cached copy is no newer than the table, so download
+    assert ("A", "quarterly_balance_sheet") in FakeTicker.calls
+    assert store.get("A").period_end.tolist() == _days("2024-03-31", "2024-06-30")
+    assert cache.get_fundamentals("A").period_end.tolist() == _days("2024-03-31", "2024-06-30")
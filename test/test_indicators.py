@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from src.database import get_engine, init_schema
+from src.indicators import compute_indicators, load_engine_config, rolling_extrema
+from src.models import RawBundle, PriceRow
+from src.pipeline import run_batch
+from src.signals import detect_signals
+
+def _closes(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+def test_single_pass_matches_pandas():
+    close = _closes()
+    close[120] = np.nan
+    specs, _ = load_engine_config({"indicators": [
+        {"name": "sma", "window": 50}, {"name": "ema", "window": 12},
+        {"name": "bollinger", "window": 20, "k": 2},
+        {"name": "high", "window": 10}, {"name": "high", "window": 252}, {"name": "low", "window": 20},
+    ]})
+    out = compute_indicators(close, specs)
+    s = pd.Series(close)
+    np.testing.assert_allclose(out["sma_50"], s.rolling(50, min_periods=50).mean(), rtol=1e-9)
+    np.testing.assert_allclose(out["ema_12"], s.ewm(span=12, adjust=False, min_periods=12).mean())
+    mid, sd = s.rolling(20, min_periods=20).mean(), s.rolling(20, min_periods=20).std(ddof=0)
+    np.testing.assert_allclose(out["bb_upper_20_2"], mid + 2 * sd, rtol=1e-9)
+    for w in (10, 252):
+        np.testing.assert_array_equal(out[f"high_{w}"], s.rolling(w, min_periods=w).max())
+    np.testing.assert_array_equal(out["low_20"], s.rolling(20, min_periods=20).min())
+
+def test_rolling_extrema_many_windows():
+    x = np.random.default_rng(0).normal(size=5000)
+    got = rolling_extrema(x, [5, 50, 252], kind="min")
+    for w, arr in got.items():
+        np.testing.assert_array_equal(arr, pd.Series(x).rolling(w, min_periods=w).min())
+
+def test_bollinger_width_is_stable_at_high_prices_and_zero_when_flat():
+    close = 5e4 + np.cumsum(np.random.default_rng(1).normal(0, 0.01, 600))
+    close[300:360] = close[300]
+    specs, _ = load_engine_config({"indicators": [{"name": "bollinger", "window": 20, "k": 2}]})
+    out = compute_indicators(close, specs)
+    sd = np.array([np.std(close[i - 19:i + 1]) for i in range(19, 600)])  # pandas' online std is noisy here too
+    np.testing.assert_allclose(out["bb_upper_20_2"][19:] - out["bb_mid_20"][19:], 2 * sd, rtol=1e-9, atol=1e-10)
+    assert np.array_equal(out["bb_upper_20_2"][319:360], close[319:360])  # flat windows: zero width, exactly
+
+def test_windows_share_one_prefix_and_one_extrema_sweep(monkeypatch):
+    import src.indicators as ind
+    sweeps = []
+    real = ind.rolling_max_windows
+    monkeypatch.setattr(ind, "rolling_max_windows", lambda x, ws: sweeps.append(sorted(ws)) or real(x, ws))
+    close = _closes(600)
+    close[300:400] = close[300]
+    specs, _ = load_engine_config({"indicators": [
+        {"name": "sma", "window": 20}, {"name": "sma", "window": 50}, {"name": "sma", "window": 200},
+        {"name": "bollinger", "window": 20, "k": 2}, {"name": "high", "window": 10}, {"name": "high", "window": 252},
+    ]})
+    ctx = ind.Context(close)
+    for sp in specs:
+        for kind, w in ind.INDICATORS[sp["name"]].extrema(sp):
+            ctx.plan_extrema(kind, w)
+    out = {}
+    for sp in specs:
+        out.update(ind.INDICATORS[sp["name"]].fn(ctx, sp))
+    assert [k for k in ctx._memo if k[0] == "prefix"] == [("prefix", "close")]
+    assert sweeps == [[10, 252]]
+    s = pd.Series(close)
+    for w in (20, 50, 200):
+        want = s.rolling(w, min_periods=w).mean().to_numpy()
+        np.testing.assert_allclose(out[f"sma_{w}"], want, rtol=1e-12)
+        assert w > 100 or np.array_equal(out[f"sma_{w}"][299 + w:400], want[299 + w:400])  # flat: exact, as pandas
+
+def test_unknown_names_rejected():
+    with pytest.raises(ValueError, match="indicator"):
+        load_engine_config({"indicators": ["nope"]})
+    with pytest.raises(ValueError, match="signal"):
+        load_engine_config({"signals": [{"name": "nope"}]})
+
+def test_signal_rules_fire_on_expected_days():
+    close = np.r_[np.full(30, 100.0), 90.0, 95.0, 80.0]
+    df = pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=len(close)), "close": close})
+    specs, rules = load_engine_config({"signals": [{"name": "new_low", "window": 20},
+                                                   {"name": "bollinger_break", "window": 20}]})
+    for col, arr in compute_indicators(close, specs).items():
+        df[col] = arr
+    events = detect_signals("T", df, rules)
+    got = [(str(e.date), e.type) for e in events]
+    assert (str(df["date"].iloc[30].date()), "new_low_20") in got
+    assert (str(df["date"].iloc[32].date()), "new_low_20") in got  # breaks the day-30 low again
+    assert (str(df["date"].iloc[30].date()), "bb_break_down_20") in got
+
+def test_batch_persists_indicator_columns_and_signals(tmp_path):
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    close = _closes(300)
+    bundle = RawBundle(ticker="AAA", prices=[PriceRow(date=d.date(), close=float(c)) for d, c in zip(dates, close)])
+    engine = get_engine(str(tmp_path / "ind.db"))
+    init_schema(engine)
+    specs, rules = load_engine_config({"indicators": [{"name": "rsi"}], "signals": [{"name": "ema_cross"}]})
+
+    summary = run_batch(["AAA"], engine, out_dir=str(tmp_path), compute_workers=0,
+                        fetch=lambda t, period: bundle, indicators=specs, signal_rules=rules)
+    assert summary.ok == ["AAA"]
+    with engine.begin() as conn:
+        rsi = conn.execute(text("SELECT rsi_14, ema_12 FROM daily_metrics ORDER BY date DESC LIMIT 1")).one()
+        kinds = {r[0] for r in conn.execute(text("SELECT DISTINCT type FROM signal_events"))}
+    assert 0 <= rsi[0] <= 100 and rsi[1] > 0
+    assert kinds & {"ema_cross_up_12_26", "ema_cross_down_12_26"}
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import instrument
+from src.database import get_engine, init_schema
+from src.instrument import Recorder, set_recorder
+from src.models import PriceRow, RawBundle
+from src.pipeline import run_batch
+from src.retry import TransientError, retry_call
+
+
+def _fake_fetch(ticker, period="5y"):
+    if ticker == "BAD":
+        raise RuntimeError(f"No price data for {ticker}. Check symbol/network.")
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    rows = [PriceRow(date=d.date(), close=float(c)) for d, c in zip(dates, np.linspace(100.0, 200.0, 300))]
+    return RawBundle(ticker=ticker, prices=rows, fundamentals_q=[])
+
+
+@pytest.fixture
+def recorder():
+    rec = Recorder()
+    set_recorder(rec)
+    yield rec
+    set_recorder(None)
+
+
+def test_disabled_hooks_are_no_ops():
+    set_recorder(None)
+    fn = lambda: 1  # noqa: E731
+    assert instrument.timed("fetch", fn) is fn
+    assert instrument.stage("fetch") is instrument.stage("other")
+    instrument.count("rows", 5)  # nothing to record into
+
+
+def test_report_and_prometheus_text(recorder):
+    with recorder.stage("process"):
+        pass
+    recorder.add_time("process", 0.5)
+    recorder.count("rows_upserted", 10)
+    r = recorder.report()
+    assert r["stages"]["process"]["count"] == 2
+    assert r["stages"]["process"]["max_sec"] == 0.5
+    assert r["counters"] == {"rows_upserted": 10}
+    prom = recorder.prometheus()
+    assert 'funds_stage_calls_total{stage="process"} 2' in prom
+    assert "funds_rows_upserted_total 10" in prom
+
+
+def test_retries_are_counted(recorder):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TransientError("throttled")
+        return "ok"
+    assert retry_call(flaky, tries=3, sleep=lambda s: None) == "ok"
+    assert recorder.counters["retries"] == 2
+
+
+def test_batch_records_every_stage(tmp_path, recorder):
+    engine = get_engine(str(tmp_path / "batch.db"))
+    init_schema(engine)
+    run_batch(["AAA", "BAD", "BBB"], engine, out_dir=str(tmp_path / "out"), compute_workers=0, fetch=_fake_fetch)
+
+    r = recorder.report()
+    for name in ("fetch", "process", "signals", "upsert_daily", "upsert_signals", "export"):
+        assert name in r["stages"], name
+    assert r["stages"]["fetch"]["count"] == 3
+    assert r["stages"]["process"]["count"] == 2
+    assert r["counters"]["rows_upserted"] == 600
+    assert r["counters"]["tickers_failed"] == 1
+    assert r["counters"]["export_bytes"] > 0
+
+    recorder.write(str(tmp_path / "run_report.json"))
+    assert json.loads((tmp_path / "run_report.json").read_text())["counters"]["tickers_ok"] == 2
@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.kernels import MetricWindows, RollingMax, RollingMean, rolling_max, rolling_mean, rolling_min
+
+
+def _series(n=1500, seed=0, gaps=(7, 400, 401, 1000)):
+    x = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, n)))
+    x[list(gaps)] = np.nan
+    return x
+
+
+def test_streaming_and_batch_match_pandas():
+    x = _series()
+    s = pd.Series(x)
+    for w in (1, 2, 50, 200, 252):
+        want = s.rolling(w, min_periods=w).mean().to_numpy()
+        for got in (RollingMean(w).extend(x), rolling_mean(x[None, :], w)[0]):
+            assert np.array_equal(np.isnan(got), np.isnan(want)), w
+            np.testing.assert_allclose(got, want, rtol=1e-14)
+        assert np.array_equal(RollingMax(w).extend(x), s.rolling(w, min_periods=w).max().to_numpy(), equal_nan=True)
+        assert np.array_equal(RollingMax(w, "min").extend(x), rolling_min(x[None, :], w)[0], equal_nan=True)
+        assert np.array_equal(RollingMax(w).extend(x), rolling_max(x[None, :], w)[0], equal_nan=True)
+
+
+def test_batch_mean_is_within_tolerance_of_pandas_and_rejects_empty_windows():
+    rng = np.random.default_rng(3)
+    for _ in range(20):
+        x = rng.lognormal(3, 1.5, int(rng.integers(50, 800)))
+        x[rng.random(len(x)) < 0.02] = np.nan
+        w = int(rng.integers(1, 60))
+        want = pd.Series(x).rolling(w, min_periods=w).mean().to_numpy()
+        got = rolling_mean(x[None, :], w)[0]
+        assert np.array_equal(np.isnan(got), np.isnan(want))
+        np.testing.assert_allclose(got, want, rtol=1e-13)
+    for fn in (rolling_mean, rolling_max, rolling_min):
+        with pytest.raises(ValueError, match="window must be >= 1"):
+            fn(np.ones((1, 5)), 0)
+
+
+def test_flat_stretches_give_the_same_crossovers_as_pandas():
+    from src.signals import cross_transitions
+    for seed in range(40):
+        x = _series(1260, seed=seed, gaps=(950,))
+        x[600:900] = x[600]  # a halted stock carried at its last price
+        x[1000:1100] = -x[1000]
+        s = pd.Series(x)
+        want = [s.rolling(w, min_periods=w).mean().to_numpy() for w in (50, 200)]
+        for got in ([rolling_mean(x[None, :], w)[0] for w in (50, 200)],
+                    [RollingMean(w).extend(x) for w in (50, 200)]):
+            for g, v in zip(got, want):
+                assert np.array_equal(g[799:900], v[799:900])  # every window inside the flat stretch
+            for g, v in zip(cross_transitions(*got), cross_transitions(*want)):
+                assert np.array_equal(g, v), seed
+
+
+def test_leading_padding_does_not_change_batch_mean():
+    x = _series(600, gaps=(7, 400))
+    padded = np.r_[np.full(123, np.nan), x]
+    assert np.array_equal(rolling_mean(padded[None, :], 50)[0, 123:], rolling_mean(x[None, :], 50)[0], equal_nan=True)
+
+
+@pytest.mark.parametrize("make", [lambda: RollingMean(50), lambda: RollingMax(30), lambda: RollingMax(30, "min")])
+def test_state_round_trips_and_resumes(make):
+    x = _series()
+    whole = make().extend(x)
+    k = make()
+    k.extend(x[:900])
+    resumed = type(k).from_dict(json.loads(json.dumps(k.to_dict())))
+    tail = []
+    for v in x[900:]:
+        p = resumed.peek(v)
+        assert resumed.peek(v) == pytest.approx(p, nan_ok=True)  # peek leaves the state alone
+        tail.append(resumed.push(v))
+        assert p == pytest.approx(tail[-1], rel=1e-14, nan_ok=True)
+    np.testing.assert_allclose(tail, whole[900:], rtol=1e-14)
+
+
+def test_metric_windows_continue_a_series():
+    x = _series(700, gaps=())
+    mw = MetricWindows.from_closes(x[:-1], min_sma_days=200, last_day=10)
+    got = mw.push(x[-1], day=11)
+    assert got["sma50"] == pytest.approx(x[-50:].mean(), rel=1e-14)
+    assert got["sma200"] == pytest.approx(x[-200:].mean(), rel=1e-14)
+    assert got["high_52w"] == x[-252:].max()
+    assert got["pct_from_52w_high"] == pytest.approx(x[-1] / x[-252:].max() - 1, rel=1e-12)
+    with pytest.raises(ValueError):
+        mw.push(1.0, day=11)
+    short = MetricWindows.from_closes(x[:100]).peek(x[100])
+    assert np.isnan(short["sma200"]) and np.isnan(short["high_52w"]) and short["is_52w_high"] is False
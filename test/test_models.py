@@ -0,0 +1,62 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models import (ArrayBundle, FundamentalsQuarter, PriceColumns, PriceRow, RawBundle,
+                        validate_price_frame, validate_processed_frame)
+from src.processor import process_bundle
+
+def test_price_frame_constraints():
+    df = pd.DataFrame({
+        "date": ["2024-01-02", "2024-01-03"],
+        "high": [11.0, None], "low": [10.0, 9.0],
+        "close": [10.5, 9.5], "volume": [1000, None],
+    })
+    out = validate_price_frame(df)
+    assert out["volume"].iloc[1] is pd.NA
+
+    with pytest.raises(ValueError, match="high must be >= low"):
+        validate_price_frame(df.assign(high=[9.0, None]))
+    with pytest.raises(ValueError, match="date"):
+        validate_price_frame(df.assign(date=["2024-01-02", "not a date"]))
+    with pytest.raises(ValueError, match="close"):
+        validate_price_frame(df.assign(close=[10.5, None]))
+
+def test_processed_frame_rejects_bad_types():
+    df = pd.DataFrame({"date": ["2024-01-02"], "close": [1.0], "is_52w_high": ["yes"]})
+    with pytest.raises(ValueError, match="is_52w_high"):
+        validate_processed_frame(df)
+    with pytest.raises(ValueError, match="sma50"):
+        validate_processed_frame(df.assign(is_52w_high=None, sma50=["abc"]))
+
+
+def test_array_bundle_round_trip_and_parity():
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    rows = [PriceRow(date=d.date(), close=100.0 + i, volume=None if i % 7 else 1000) for i, d in enumerate(dates)]
+    fqs = [FundamentalsQuarter(period_end=pd.Timestamp("2023-03-31").date(), book_value=5e9, shares_out=1e8, cash=None)]
+    raw = RawBundle(ticker="AAA", prices=rows, fundamentals_q=fqs)
+    arr = ArrayBundle.from_bundle(raw)
+
+    assert arr.prices.close.dtype == np.float64 and arr.prices.day.dtype == np.int64 and arr.prices.open is None
+    assert arr.prices[7] == rows[7] and arr.prices[8].volume is None
+    assert list(arr.prices[:3]) == rows[:3]
+    assert arr.fundamentals_q == fqs
+    assert arr.to_bundle().prices == rows
+    assert pickle.loads(pickle.dumps(arr)).prices[299] == rows[299]
+    assert arr.nbytes < 300 * 8 * 3 + 100
+
+    want, _ = process_bundle(raw)
+    got, _ = process_bundle(arr)
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
+
+
+def test_price_columns_from_frame_drops_empty_columns():
+    v = validate_price_frame(pd.DataFrame({"date": ["2024-01-02", "2024-01-03"], "close": [1.0, 2.0],
+                                           "volume": [None, 5]}))
+    cols = PriceColumns.from_frame(v)
+    assert cols.high is None and np.isnan(cols.volume[0]) and cols.volume[1] == 5.0
+    assert cols.frame(["close", "high"])["high"].isna().all()
+    with pytest.raises(ValueError, match="close"):
+        PriceColumns(np.arange(3), np.ones(2))
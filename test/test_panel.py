@@ -0,0 +1,112 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models import RawBundle, PriceRow, FundamentalsQuarter
+from src.panel import align_fundamentals, align_fundamentals_panel, process_panel, rolling_max
+from src.processor import OUTPUT_COLUMNS, process_bundle
+
+
+def _universe(n_days=400, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2021-01-01", periods=n_days)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, (4, n_days)), axis=1))
+    close[1, :30] = np.nan                      # listed late
+    close[2, [100, 101, 250]] = np.nan          # holes inside its range
+    close[3, 350:] = np.nan                     # delisted
+    fqs = [
+        [FundamentalsQuarter(period_end=dt.date(2021, 3, 31), book_value=2e9, shares_out=1e7, total_debt=3e8, cash=1e8),
+         FundamentalsQuarter(period_end=dt.date(2021, 9, 30), book_value=None, shares_out=2e7, total_debt=None, cash=5e7)],
+        [FundamentalsQuarter(period_end=dt.date(2020, 12, 31), book_value=1e9, shares_out=1e7, total_debt=0, cash=0),
+         FundamentalsQuarter(period_end=dt.date(2021, 6, 30), book_value=-5.0, shares_out=1e7, total_debt=1e6, cash=None)],
+        [],
+        [FundamentalsQuarter(period_end=dt.date(2021, 2, 1), book_value=5e8, shares_out=None, total_debt=2e7, cash=1e7)],
+    ]
+    return ["AAA", "BBB", "CCC", "DDD"], dates, close, fqs
+
+
+def _per_ticker(ticker, dates, row, fqs):
+    keep = ~np.isnan(row)
+    prices = [PriceRow(date=d.date(), close=float(c)) for d, c in zip(dates[keep], row[keep])]
+    df, _ = process_bundle(RawBundle(ticker=ticker, prices=prices, fundamentals_q=fqs))
+    return df
+
+
+def test_panel_matches_process_bundle_exactly():
+    tickers, dates, close, fqs = _universe()
+    funds = align_fundamentals_panel(dates.to_numpy(), close, fqs)
+    long = process_panel(tickers, dates, close, funds, block_rows=3)
+    assert list(long.columns) == ["ticker"] + OUTPUT_COLUMNS
+    for i, t in enumerate(tickers):
+        got = long[long["ticker"] == t].reset_index(drop=True)
+        want = _per_ticker(t, dates, close[i], fqs[i])
+        assert (got["date"].to_numpy() == want["date"].to_numpy()).all()
+        for col in OUTPUT_COLUMNS[1:]:
+            assert np.array_equal(got[col].to_numpy(dtype=float), want[col].to_numpy(dtype=float), equal_nan=True), (t, col)
+
+
+def test_wide_layout_matches_long():
+    tickers, dates, close, fqs = _universe(seed=1)
+    funds = align_fundamentals_panel(dates.to_numpy(), close, fqs)
+    wide = process_panel(tickers, dates, close, funds, layout="wide")
+    long = process_panel(tickers, dates, close, funds)
+    ti, di = np.nonzero(~np.isnan(close))
+    assert np.array_equal(wide["pb"][ti, di], long["pb"].to_numpy(), equal_nan=True)
+    assert wide["is_52w_high"].dtype == bool
+
+
+def test_rolling_max_matches_pandas():
+    x = np.random.default_rng(2).normal(size=(3, 600))
+    x[1, 300] = np.nan
+    for w in (1, 5, 252, 256):
+        want = pd.DataFrame(x.T).rolling(w, min_periods=w).max().to_numpy().T
+        assert np.array_equal(rolling_max(x, w), want, equal_nan=True)
+
+
+def test_bad_shape_and_layout_rejected():
+    with pytest.raises(ValueError):
+        process_panel(["A"], pd.bdate_range("2021-01-01", periods=3), np.ones((2, 3)))
+    with pytest.raises(ValueError):
+        process_panel(["A"], pd.bdate_range("2021-01-01", periods=3), np.ones((1, 3)), layout="tall")
+
+
+def _q(day, **vals):
+    return FundamentalsQuarter(period_end=day, **vals)
+
+
+def test_asof_join_uses_quarters_before_span_and_weekends():
+    dates = pd.bdate_range("2024-01-01", periods=10).to_numpy()  # Mon 1st .. Fri 12th
+    fqs = [_q(dt.date(2023, 12, 31), book_value=1.0),             # before the first price
+           _q(dt.date(2024, 1, 6), book_value=2.0, cash=5.0)]     # a Saturday
+    out = align_fundamentals(dates, fqs)
+    assert out["book_value"].tolist() == [1.0] * 5 + [2.0] * 5
+    assert np.isnan(out["cash"][:5]).all() and (out["cash"][5:] == 5.0).all()
+
+
+def test_reporting_lag_delays_each_quarter():
+    dates = pd.bdate_range("2024-01-01", periods=10).to_numpy()
+    fqs = [_q(dt.date(2023, 12, 31), book_value=1.0), _q(dt.date(2024, 1, 3), book_value=2.0)]
+    out = align_fundamentals(dates, fqs, lag_days=5)   # known Jan 5 and Jan 8
+    assert np.isnan(out["book_value"][:4]).all()
+    assert out["book_value"][4:].tolist() == [1.0] + [2.0] * 5
+
+
+def test_panel_alignment_matches_single_ticker():
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range("2022-01-01", periods=300)
+    close = rng.normal(100, 1, (6, 300))
+    close[0, :50] = np.nan
+    close[4, 200:] = np.nan
+    fqs = [[_q((dates[0] + pd.Timedelta(days=int(d))).date(), book_value=float(v), shares_out=None if v > 8 else 1e6)
+            for d, v in zip(rng.integers(-200, 500, n), rng.uniform(0, 10, n))]
+           for n in (5, 0, 12, 1, 7, 3)]
+    for lag in (0, 45):
+        panel = align_fundamentals_panel(dates.to_numpy(), close, fqs, lag_days=lag)
+        for i in range(6):
+            pos = np.flatnonzero(~np.isnan(close[i]))
+            one = align_fundamentals(dates.to_numpy()[pos], fqs[i], lag_days=lag)
+            for k in ("book_value", "shares_out"):
+                assert np.array_equal(panel[k][i, pos], one[k], equal_nan=True), (i, k, lag)
+                assert np.isnan(np.delete(panel[k][i], pos)).all()
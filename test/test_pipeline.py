@@ -0,0 +1,127 @@
+import json
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.database import get_engine, init_schema
+from src.models import RawBundle, PriceRow
+from src.pipeline import resolve_tickers, run_batch
+
+def _fake_fetch(ticker, period="5y"):
+    if ticker == "BAD":
+        raise RuntimeError(f"No price data for {ticker}. Check symbol/network.")
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    # Dip then rally so the 50/200 SMAs cross
+    closes = np.concatenate([np.linspace(200.0, 100.0, 150), np.linspace(100.0, 300.0, 150)])
+    rows = [PriceRow(date=d.date(), close=float(c)) for d, c in zip(dates, closes)]
+    return RawBundle(ticker=ticker, prices=rows, fundamentals_q=[])
+
+def test_resolve_tickers_sources(tmp_path):
+    f = tmp_path / "tickers.txt"
+    f.write_text("NVDA\nAAPL, MSFT  # comment\n\nNVDA\n")
+    assert resolve_tickers("NVDA, AAPL", None, None) == ["NVDA", "AAPL"]
+    assert resolve_tickers(None, str(f), None) == ["NVDA", "AAPL", "MSFT"]
+    assert resolve_tickers(None, None, {"tickers": ["RELIANCE.NS"]}) == ["RELIANCE.NS"]
+
+def test_batch_persists_exports_and_isolates_failures(tmp_path):
+    engine = get_engine(str(tmp_path / "batch.db"))
+    init_schema(engine)
+    out_dir = tmp_path / "out"
+
+    summary = run_batch(["AAA", "BAD", "BBB"], engine, out_dir=str(out_dir),
+                        fetch_workers=2, compute_workers=0, fetch=_fake_fetch)
+
+    assert sorted(summary.ok) == ["AAA", "BBB"]
+    assert list(summary.failed) == ["BAD"]
+    assert summary.signals == 2  # one golden cross per ticker
+
+    with engine.begin() as conn:
+        cnt = conn.execute(text("SELECT COUNT(*) FROM daily_metrics")).scalar_one()
+        sig = conn.execute(text("SELECT COUNT(*) FROM signal_events WHERE type='golden_cross'")).scalar_one()
+    assert cnt == 600
+    assert sig == 2
+
+    payload = json.loads((out_dir / "AAA.json").read_text())
+    assert payload["ticker"] == "AAA"
+    assert len(payload["metrics"]) == 300
+
+def test_incremental_batch_only_adds_new_days(tmp_path, monkeypatch):
+    import src.data_fetcher
+    import src.pipeline
+    engine = get_engine(str(tmp_path / "inc.db"))
+    init_schema(engine)
+    full = _fake_fetch("AAA")
+
+    # First run stores 205 days; the golden cross happens on day 208
+    first = RawBundle(ticker="AAA", prices=full.prices[:205], fundamentals_q=[])
+    run_batch(["AAA"], engine, out_dir=str(tmp_path), compute_workers=0, fetch=lambda t, period: first)
+
+    def _fake_prices(ticker, period="5y", start=None):
+        rows = [(pd.Timestamp(p.date), p.close) for p in full.prices if pd.Timestamp(p.date) >= pd.Timestamp(start)]
+        return pd.DataFrame(rows, columns=["date", "close"])
+    monkeypatch.setattr(src.pipeline, "fetch_prices", _fake_prices)
+    monkeypatch.setattr(src.data_fetcher, "fetch_fundamentals_q", lambda t: [])
+
+    summary = run_batch(["AAA"], engine, out_dir=str(tmp_path), compute_workers=0, incremental=True)
+    assert summary.signals == 1
+    again = run_batch(["AAA"], engine, out_dir=str(tmp_path), compute_workers=0, incremental=True)
+    assert again.ok == ["AAA"] and again.signals == 0
+
+    with engine.begin() as conn:
+        cnt = conn.execute(text("SELECT COUNT(*) FROM daily_metrics")).scalar_one()
+        sma = conn.execute(text("SELECT sma200 FROM daily_metrics WHERE date=:d"),
+                           {"d": str(full.prices[-1].date)}).scalar_one()
+    assert cnt == 300
+    assert abs(sma - np.mean([p.close for p in full.prices[-200:]])) < 1e-9
+    # The full run's export keeps its whole history; the refresh rows go beside it
+    assert len(json.loads((tmp_path / "AAA.json").read_text())["metrics"]) == 205
+    delta = json.loads((tmp_path / "AAA.delta.json").read_text())
+    assert delta["notes"]["incremental_since"] and len(delta["metrics"]) == 95  # the second refresh had nothing to write
+
+def test_incremental_indicators_match_a_full_run(tmp_path, monkeypatch):
+    import src.data_fetcher
+    import src.pipeline
+    from src.database import load_tail
+    from src.indicators import load_engine_config
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range("2021-01-04", periods=700)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 700)))
+    volume = rng.integers(1_000, 5_000, 700).astype(float)
+    rows = [PriceRow(date=d.date(), close=float(c), volume=float(v)) for d, c, v in zip(dates, closes, volume)]
+    indicators, rules = load_engine_config({
+        "indicators": [{"name": "sma", "window": 300}, {"name": "ema", "window": 200}, "rsi", "macd"],
+        "signals": [{"name": "volume_spike", "window": 20, "k": 1.5}]})
+    kw = dict(compute_workers=0, indicators=indicators, signal_rules=rules)
+
+    full_db = get_engine(str(tmp_path / "full.db"))
+    init_schema(full_db)
+    run_batch(["AAA"], full_db, out_dir=str(tmp_path / "full"),
+              fetch=lambda t, period: RawBundle(ticker=t, prices=rows, fundamentals_q=[]), **kw)
+
+    engine = get_engine(str(tmp_path / "inc.db"))
+    init_schema(engine)
+    run_batch(["AAA"], engine, out_dir=str(tmp_path / "inc"),
+              fetch=lambda t, period: RawBundle(ticker=t, prices=rows[:649], fundamentals_q=[]), **kw)
+    upto = {"n": 650}
+
+    def _fake_prices(ticker, period="5y", start=None):
+        df = pd.DataFrame({"date": dates[:upto["n"]], "close": closes[:upto["n"]], "volume": volume[:upto["n"]]})
+        return df[df["date"] >= pd.Timestamp(start)].reset_index(drop=True)
+    monkeypatch.setattr(src.pipeline, "fetch_prices", _fake_prices)
+    monkeypatch.setattr(src.data_fetcher, "fetch_fundamentals_q", lambda t: [])
+    inc = run_batch(["AAA"], engine, out_dir=str(tmp_path / "inc"), incremental=True, **kw)  # one new day
+    upto["n"] = 700
+    inc.signals += run_batch(["AAA"], engine, out_dir=str(tmp_path / "inc"), incremental=True, **kw).signals
+
+    want, got = load_tail(full_db, "AAA", 51), load_tail(engine, "AAA", 51)
+    assert got["date"].tolist() == want["date"].tolist()
+    for col in ["sma_300", "ema_200", "rsi_14", "macd_12_26", "vol_avg_20"]:
+        assert not np.isnan(got[col].to_numpy(float)).any()
+        np.testing.assert_allclose(got[col].to_numpy(float), want[col].to_numpy(float), rtol=1e-12, err_msg=col)
+    with full_db.connect() as conn:
+        spikes = conn.execute(text("SELECT COUNT(*) FROM signal_events WHERE type LIKE 'volume_spike%' "
+                                   "AND date >= :d"), {"d": str(dates[649].date())}).scalar_one()
+    assert spikes > 0 and inc.signals == spikes
+    full_db.dispose()
+    engine.dispose()
@@ -35,3 +35,70 @@ def test_sma_windows_and_52w_metrics():
     # On a strictly rising series, last row is new 52w high
     assert bool(df["is_52w_high"].iloc[-1]) is True
     assert df["pct_from_52w_high"].iloc[-1] == 0.0
+
+def test_extend_bundle_matches_full_recompute():
+    from src.processor import extend_bundle, history_window
+    dates = pd.bdate_range("2023-01-02", periods=400)
+    closes = 100 + np.cumsum(np.sin(np.arange(400) / 7.0))
+    full, _ = process_bundle(_bundle_from_prices(list(zip(dates, closes))), min_sma_days=200)
+
+    tail = full.iloc[:390].tail(history_window(200))
+    new = _bundle_from_prices(list(zip(dates[385:], closes[385:])))  # overlap is ignored
+    ext, rows = extend_bundle(tail, new, min_sma_days=200)
+
+    assert len(ext) == len(rows) == 10
+    expected = full.iloc[390:].reset_index(drop=True)
+    for col in ["close", "sma50", "sma200", "high_52w", "pct_from_52w_high"]:
+        np.testing.assert_allclose(ext[col].to_numpy(float), expected[col].to_numpy(float))
+
+def test_columnar_validation_matches_row_models():
+    dates = pd.bdate_range("2024-01-01", periods=260)
+    bun = _bundle_from_prices(list(zip(dates, np.arange(100.0, 360.0))))
+    _, lazy = process_bundle(bun, validate="columns")
+    _, eager = process_bundle(bun, validate="rows")
+
+    assert len(lazy) == len(eager)
+    assert lazy.records() == [r.model_dump() for r in eager]
+    assert lazy[-1] == eager[-1]
+    assert lazy[:3] == eager[:3]
+
+def test_fundamentals_asof_with_reporting_lag():
+    dates = pd.bdate_range("2024-01-01", periods=30)
+    bun = _bundle_from_prices(list(zip(dates, np.full(30, 10.0))))
+    bun.fundamentals_q = [
+        FundamentalsQuarter(period_end=pd.Timestamp("2023-12-31").date(), book_value=100.0, shares_out=10.0),
+        FundamentalsQuarter(period_end=pd.Timestamp("2024-01-06").date(), book_value=200.0, shares_out=10.0),
+    ]
+    df, _ = process_bundle(bun)
+    # The quarter before the first price applies from day one; the Saturday one from Monday
+    assert df["bvps"].iloc[0] == 10.0 and df["bvps"].iloc[5] == 20.0
+
+    df, _ = process_bundle(bun, fundamentals_lag_days=14)
+    assert np.isnan(df["bvps"].iloc[0])
+    assert df.loc[df["date"] == "2024-01-15", "bvps"].item() == 10.0
+    assert df.loc[df["date"] == "2024-01-22", "bvps"].item() == 20.0
+
+def test_flat_and_halted_series_match_the_pandas_baseline():
+    from src.panel import process_panel
+    from src.signals import detect_crossovers
+    dates = pd.bdate_range("2019-01-01", periods=1260)
+    for seed in range(20):
+        closes = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, 1260)))
+        closes[600:900] = closes[600]  # flat: carried at the last price
+        keep = np.r_[0:1000, 1080:1260]  # halted: no rows at all, then resumes at the same price
+        closes[1080:] = closes[999] * closes[1080:] / closes[1080]
+        bun = _bundle_from_prices(list(zip(dates[keep], closes[keep])))
+        df, _ = process_bundle(bun, min_sma_days=200)
+
+        # The baseline process_bundle: pandas' strict rolling means over the traded rows
+        base = df[["date", "close"]].copy()
+        base["sma50"] = base["close"].rolling(50, min_periods=50).mean()
+        base["sma200"] = base["close"].rolling(200, min_periods=200).mean()
+        for col in ("sma50", "sma200"):
+            np.testing.assert_allclose(df[col].to_numpy(float), base[col].to_numpy(float), rtol=1e-13)
+        assert detect_crossovers("TEST", df)[0] == detect_crossovers("TEST", base)[0], seed
+
+        wide = np.full((1, 1260), np.nan)
+        wide[0, keep] = closes[keep]
+        panel = process_panel(["TEST"], dates, wide, layout="long")
+        assert detect_crossovers("TEST", panel)[0] == detect_crossovers("TEST", base)[0], seed
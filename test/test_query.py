@@ -0,0 +1,106 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from src.database import get_engine, init_schema, upsert_daily, upsert_signals
+from src.query import MetricsReader, make_server
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = get_engine(str(tmp_path / "q.db"))
+    init_schema(engine)
+    dates = pd.bdate_range("2024-01-01", periods=10)
+    for i, sym in enumerate(["A", "B", "C"]):
+        close = [100.0 * (i + 1) + d for d in range(10)]
+        upsert_daily(engine, sym, pd.DataFrame({"date": dates, "close": close, "sma50": close}))
+    upsert_signals(engine, "A", [{"date": dates[2].date(), "type": "golden_cross"}])
+    upsert_signals(engine, "B", [{"date": dates[8].date(), "type": "death_cross"}])
+    yield engine
+    engine.dispose()
+
+
+def test_latest_history_and_signals(engine):
+    with MetricsReader(engine) as r:
+        got = r.latest(["B", "NOPE", "A"], ["close"])
+        assert got["columns"] == ["symbol", "date", "close"]
+        assert got["rows"] == [["B", "2024-01-12", 209.0], ["A", "2024-01-12", 109.0]]
+        assert got["missing"] == ["NOPE"]
+
+        h = r.history("A", "2024-01-03", "2024-01-05", ["close", "sma200"])
+        assert h["rows"] == [["2024-01-03", 102.0, None], ["2024-01-04", 103.0, None], ["2024-01-05", 104.0, None]]
+        assert h["signals"] == [["2024-01-03", "golden_cross"]]
+        assert len(r.history("A")["rows"]) == 10 and r.history("A", end="2024-01-02")["signals"] == []
+        with pytest.raises(KeyError):
+            r.history("NOPE")
+        with pytest.raises(ValueError, match="Unknown column"):
+            r.latest(["A"], ["bogus"])
+
+        assert r.signals(days=3)["rows"] == [["B", "death_cross", "2024-01-11"]]
+        assert [row[0] for row in r.signals(since="2024-01-01")["rows"]] == ["B", "A"]
+        assert r.signals(since="2024-01-01", types=["golden_cross"])["rows"] == [["A", "golden_cross", "2024-01-03"]]
+
+
+def test_cache_serves_hits_and_drops_only_symbols_written_since(engine):
+    with MetricsReader(engine) as r:
+        r.history("A"), r.history("B"), r.latest(["A", "B"])
+        r.history("A"), r.latest(["A", "B"])
+        assert r.stats["hits"] == 3
+
+        upsert_daily(engine, "A", pd.DataFrame({"date": [pd.Timestamp("2024-01-15")], "close": [1.0]}))
+        assert [row[1:3] for row in r.latest(["A", "B"])["rows"]] == [["2024-01-15", 1.0], ["2024-01-12", 209.0]]
+        assert r.history("A")["rows"][-1][:2] == ["2024-01-15", 1.0]
+        assert r.stats["invalidations"] == 2  # A's history and latest row; B stays cached
+        hits = r.stats["hits"]
+        r.history("B")
+        assert r.stats["hits"] == hits + 1
+
+
+def test_cache_is_bounded_and_optional(engine):
+    with MetricsReader(engine, cache_bytes=1) as r:
+        r.history("A"), r.history("A")
+        assert r.stats["hits"] == 0 and r.cache_info()["cache_bytes"] == 0
+    with MetricsReader(engine) as r:
+        one = r.history("A")
+        size = r.cache_info()["cache_bytes"]
+    with MetricsReader(engine, cache_bytes=int(size * 2.5)) as r:
+        for s in ("A", "B", "C"):
+            r.history(s)
+        assert r.stats["evictions"] == 1 and r.cache_info()["cache_bytes"] <= size * 2.5
+        r.history("B")
+        assert r.stats["hits"] == 1  # A was least recently used
+    with MetricsReader(engine, cache_bytes=0) as r:
+        assert r.history("A") == one and r.history("A") == one
+        assert r.stats["hits"] == 0 and r.cache_info()["cache_entries"] == 0
+
+
+def test_http_routes(engine):
+    with MetricsReader(engine) as r:
+        server = make_server(r, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def get(path):
+            try:
+                with urllib.request.urlopen(base + path) as resp:
+                    return resp.status, json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read())
+
+        try:
+            assert get("/latest?symbols=A,C&columns=close")[1]["rows"] == [["A", "2024-01-12", 109.0],
+                                                                          ["C", "2024-01-12", 309.0]]
+            status, body = get("/history?symbol=B&start=2024-01-11&columns=close")
+            assert status == 200 and body["rows"] == [["2024-01-11", 208.0], ["2024-01-12", 209.0]]
+            assert get("/signals?since=2024-01-01&types=death_cross")[1]["rows"] == [["B", "death_cross", "2024-01-11"]]
+            assert get("/stats")[1]["requests"] == 3
+            assert get("/history?symbol=ZZZ")[0] == 404
+            assert get("/latest")[0] == 400
+            assert get("/nope")[0] == 404
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+from src.database import get_engine, init_schema, to_days, upsert_daily, upsert_signals
+from src.screen import compile_filter, screen, screen_query
+
+def _metrics(close, pct, pb, start="2024-03-01"):
+    return pd.DataFrame({
+        "date": pd.bdate_range(start, periods=2),
+        "close": [close * 0.9, close], "pct_from_52w_high": [-0.5, pct], "pb": [pb, pb],
+        "sma50": [1.0, 2.0], "sma200": [1.5, 1.5],
+    })
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = get_engine(str(tmp_path / "screen.db"))
+    init_schema(engine)
+    upsert_daily(engine, "AAA", _metrics(100, -0.02, 2.5))
+    upsert_daily(engine, "BBB", _metrics(50, -0.20, 1.0))
+    upsert_daily(engine, "CCC", _metrics(10, -0.01, 8.0))
+    upsert_signals(engine, "AAA", [{"date": "2024-02-25", "type": "golden_cross"}])
+    upsert_signals(engine, "CCC", [{"date": "2023-12-01", "type": "golden_cross"}])
+    return engine
+
+def test_screen_latest_rows_with_signal_window(engine):
+    df = screen(engine, "pct_from_52w_high >= -5% and pb < 3 and golden_cross within 10 days")
+    assert df["symbol"].tolist() == ["AAA"]
+    assert df["date"].iloc[0] == "2024-03-04"  # latest row, not the first
+
+    df = screen(engine, ["sma50 > sma200", "not golden_cross within 30 d"], order_by="close", descending=True)
+    assert df["symbol"].tolist() == ["BBB", "CCC"]
+    assert screen(engine, "pb > 2 or close < 20", limit=1)["symbol"].tolist() == ["AAA"]
+
+def test_filter_rejects_unknown_columns_and_injection():
+    with pytest.raises(ValueError, match="Unknown column"):
+        compile_filter("nope > 1", ["close"])
+    with pytest.raises(ValueError):
+        compile_filter("close > 1; DROP TABLE daily_metrics", ["close"])
+    sql, params = compile_filter("golden_cross within 5", ["close"])
+    assert params == ["golden_cross", 5]
+    for bad in ("golden_crosss within 10 days", "close within 10 days", "not ema_cross_up_12_26 within 5"):
+        with pytest.raises(ValueError, match="Unknown signal"):
+            compile_filter(bad, ["close"])
+    assert compile_filter("ema_cross_up_12_26 within 5", ["close"], ["ema_cross_up_12_26"])[1][0] == "ema_cross_up_12_26"
+
+def test_screen_rejects_unknown_columns_and_signals(engine):
+    with pytest.raises(ValueError, match=r"Unknown column\(s\) \['clsoe'\]"):
+        screen(engine, columns=["clsoe", "pb"])
+    with pytest.raises(ValueError, match="Unknown signal 'golden_crosss'"):
+        screen(engine, "golden_crosss within 10 days")
+    upsert_signals(engine, "BBB", [{"date": "2024-03-01", "type": "rsi_oversold_14"}])
+    assert screen(engine, "rsi_oversold_14 within 10 days", columns=["pb"])["symbol"].tolist() == ["BBB"]
+
+def test_screen_scales_to_many_symbols(tmp_path):
+    engine = get_engine(str(tmp_path / "big.db"))
+    init_schema(engine)
+    frame = _metrics(100, -0.02, 2.5)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO tickers(id,symbol) VALUES(?,?)", [(i, f"S{i:05d}") for i in range(10_000)])
+        rows = [(i, d, 1.0 + i % 7, -0.01 * (i % 10), float(i % 5))
+                for i in range(10_000) for d in to_days(["2024-03-01", "2024-03-04"]).tolist()]
+        conn.exec_driver_sql("INSERT INTO metrics(symbol_id,day,close,pct_from_52w_high,pb) VALUES(?,?,?,?,?)", rows)
+        conn.exec_driver_sql("INSERT INTO latest_days(symbol_id,day) SELECT symbol_id, MAX(day) FROM metrics GROUP BY symbol_id")
+    upsert_daily(engine, "S00000", frame)
+
+    # One primary-key probe into metrics (and signals) per symbol, never a scan; timings live in bench/
+    sql, params = screen_query(engine, "pb < 3 and close > 0 and not golden_cross within 10 days")
+    with engine.connect() as conn:
+        plan = [r[3] for r in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, tuple(params)).all()]
+    assert "SEARCH m USING PRIMARY KEY (symbol_id=? AND day=?)" in plan
+    assert "SEARCH s USING PRIMARY KEY (symbol_id=? AND type=? AND day>?)" in plan
+    assert not any(p.startswith("SCAN m") or p.startswith("SCAN s") for p in plan)
+
+    df = screen(engine, "pb < 3 and close > 0")
+    assert len(df) == 6_000  # pb = i % 5 in {0, 1, 2}
+    assert df.loc[df["symbol"] == "S00000", "pb"].item() == 2.5
+
+def test_screen_command_checks_format_and_closes_its_session(engine, tmp_path, monkeypatch):
+    import json
+    import yaml
+    from typer.testing import CliRunner
+    from src.main import app
+    from src.service import Session
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(yaml.safe_dump({"db_path": str(tmp_path / "screen.db"), "cache": {"dir": str(tmp_path / "c")}}))
+    closed = []
+    monkeypatch.setattr(Session, "close", lambda self, _close=Session.close: (closed.append(1), _close(self)))
+    runner = CliRunner()
+
+    bad = runner.invoke(app, ["screen", "--format", "xml", "--config", str(cfg)])
+    assert bad.exit_code == 2 and "--format must be one of table, csv, json" in bad.output
+    ok = runner.invoke(app, ["screen", "-w", "pb < 3", "--columns", "close", "--format", "json", "--config", str(cfg)])
+    assert ok.exit_code == 0 and [r["symbol"] for r in json.loads(ok.output)] == ["AAA", "BBB"]
+    assert closed == [1]
@@ -0,0 +1,139 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bench import synthetic
+from src.data_fetcher import set_cache
+from src.lazy import lazy_import
+from src.service import Session
+
+
+A, B = synthetic.tickers(2)
+
+
+@pytest.fixture
+def session(tmp_path):
+    root = str(tmp_path / "cache")
+    synthetic.seed_cache(root, synthetic.tickers(2), days=400)
+    cfg = synthetic.cache_config(root, str(tmp_path / "app.db"), str(tmp_path / "out"))
+    s = Session(cfg)
+    yield s
+    s.close()
+    set_cache(None)
+
+
+def test_cli_import_skips_heavy_modules():
+    probe = ("import sys, src.main; "
+             "print(','.join(m for m in ('pandas', 'numpy', 'sqlalchemy', 'pydantic', 'yfinance') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == ""
+
+
+def test_lazy_module_loads_on_first_use():
+    mod = lazy_import("colorsys")
+    assert "not loaded" in repr(mod)
+    assert mod.rgb_to_hsv(1.0, 0.0, 0.0)[0] == 0.0
+    assert "(loaded)" in repr(mod)
+
+
+def test_serve_loop_reuses_session(session):
+    jobs = [
+        {"id": 1, "cmd": "ping"},
+        {"id": 2, "cmd": "run", "ticker": A},
+        {"id": 3, "cmd": "run", "ticker": A, "incremental": True},
+        {"id": 4, "cmd": "nope"},
+        {"id": 5, "cmd": "batch", "tickers": B, "compute_workers": 0},
+        {"id": 6, "cmd": "screen", "columns": ["close"], "sort": "close"},
+        {"cmd": "quit"},
+        {"id": 7, "cmd": "ping"},
+    ]
+    out = io.StringIO()
+    lines = [json.dumps(j) + "\n" for j in jobs[:4]] + ["not json\n"] + [json.dumps(j) + "\n" for j in jobs[4:]]
+    assert session.serve(lines, out) == 7
+    replies = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r.get("id") for r in replies] == [1, 2, 3, 4, None, 5, 6]
+    assert replies[0]["result"] == "pong"
+    assert replies[1]["ok"] and replies[1]["result"]["rows"] == 400
+    assert replies[2]["result"]["up_to_date"]
+    assert not replies[3]["ok"] and "unknown cmd" in replies[3]["error"]
+    assert not replies[4]["ok"]
+    assert replies[5]["result"]["ok"] == [B]
+    assert sorted(r["symbol"] for r in replies[6]["result"]) == [A, B]
+    assert all("elapsed_ms" in r for r in replies)
+
+
+def test_recompute_uses_only_stored_data(session, monkeypatch):
+    first = session.run_ticker(A)
+    assert first.result.prices is not None and first.result.prices.volume is not None
+
+    def no_network(*a, **k):
+        raise AssertionError("recompute must not fetch")
+    monkeypatch.setattr("src.data_fetcher.fetch_prices", no_network)
+    monkeypatch.setattr("src.data_fetcher.download_prices", no_network)
+    summary = session.recompute()
+    assert summary.ok == [A] and summary.unchanged == [A]  # stored inputs hash the same as the fetched ones
+    summary = session.recompute(force=True)
+    assert summary.ok == [A] and not summary.failed and not summary.unchanged
+    assert summary.signals == len(first.result.events)
+    summary = session.recompute([A, "MISSING"])
+    assert "No stored prices" in summary.failed["MISSING"]
+
+
+def test_tick_prices_a_provisional_close_against_stored_windows(session):
+    import numpy as np
+    from src.panel import panel_metrics
+
+    session.run_ticker(A)
+    closes = synthetic.gbm_prices(A, days=400)["close"].to_numpy()
+    high = closes.max() * 1.1
+    want = panel_metrics(np.r_[closes, high][None, :])
+    got = session.tick(A, high)
+    assert got["after"] == str(synthetic.gbm_prices(A, days=400)["date"].iloc[-1].date())
+    for k in ("sma50", "sma200", "high_52w", "pct_from_52w_high"):
+        assert got[k] == pytest.approx(want[k][0, -1], rel=1e-12)
+    assert got["is_52w_high"] is True
+    # Peeking doesn't advance the windows
+    assert session.tick(A, closes[-1])["sma50"] == pytest.approx(np.mean(closes[-49:].tolist() + [closes[-1]]))
+    with pytest.raises(RuntimeError, match="No stored metrics"):
+        session.tick("UNKNOWN", 1.0)
+
+
+def test_unchanged_ticker_is_skipped_until_inputs_or_config_change(session, monkeypatch):
+    import os
+    from src import pipeline
+
+    first = session.run_ticker(A)
+    assert not first.unchanged and os.path.exists(first.output)
+    calls = []
+    monkeypatch.setattr("src.service.compute_ticker",
+                        lambda *a, **k: calls.append(a) or pipeline.compute_ticker(*a, **k))
+
+    assert session.run_ticker(A).unchanged and not calls
+    assert not session.run_ticker(A, force=True).unchanged and len(calls) == 1
+    os.remove(first.output)  # a missing export is redone, the upserts are not
+    upserts = []
+    monkeypatch.setattr("src.service.persist_result", lambda *a, **k: upserts.append(a))
+    again = session.run_ticker(A)
+    assert not again.unchanged and os.path.exists(first.output) and not upserts
+    session.params = {**session.params, "min_sma_days": 150}
+    assert not session.run_ticker(A).unchanged and len(upserts) == 1
+
+    session.params = {**session.params, "min_sma_days": 200}
+    summary = session.batch([A, B], compute_workers=0)
+    assert summary.unchanged == [] and sorted(summary.ok) == [A, B]
+    summary = session.batch([A, B], compute_workers=0)
+    assert sorted(summary.unchanged) == [A, B]
+
+
+def test_incremental_run_exports_beside_the_full_history(session):
+    full = session.run_ticker(A)
+    before = os.path.getmtime(full.output)
+    inc = session.run_ticker(A, incremental=True)
+    assert inc.output == os.path.join(session.out_dir, f"{A}.delta.json")
+    assert os.path.getmtime(full.output) == before
+    with open(full.output, encoding="utf-8") as f:
+        assert len(json.load(f)["metrics"]) == 400
@@ -17,3 +17,54 @@ def test_crossovers_detected_and_early_period_suppressed():
     assert types == ["golden_cross", "death_cross"]
     # Contexts correspond to events and include prev/cur values
     assert all(k in contexts[0] for k in ["sma50_prev","sma200_prev","sma50_cur","sma200_cur"])
+
+def _detect_crossovers_loop(ticker, df):
+    """Row-by-row reference (the original implementation) for parity checks."""
+    d = df.copy()
+    d["date"] = pd.to_datetime(d["date"], errors="coerce")
+    d = d.dropna(subset=["date"]).sort_values("date", kind="stable").reset_index(drop=True)
+    out, prev = [], None
+    for _, row in d.iterrows():
+        sma50, sma200 = row.get("sma50"), row.get("sma200")
+        if pd.isna(sma50) or pd.isna(sma200):
+            prev = None
+            continue
+        cur = 1 if float(sma50) >= float(sma200) else 0
+        if prev is not None and prev[0] != cur:
+            out.append({
+                "date": str(pd.to_datetime(row["date"]).date()),
+                "sma50_prev": prev[1], "sma200_prev": prev[2],
+                "sma50_cur": float(sma50), "sma200_cur": float(sma200),
+                "type": "golden_cross" if cur == 1 else "death_cross",
+            })
+        prev = (cur, float(sma50), float(sma200))
+    return out
+
+def test_vectorized_parity_with_loop_and_panel():
+    import numpy as np
+    from src.signals import detect_crossovers_panel
+
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range("2020-01-01", periods=600)
+    panel50, panel200 = [], []
+    for k in range(5):
+        s50 = 100 + np.cumsum(rng.normal(0, 1, 600))
+        s200 = 100 + np.cumsum(rng.normal(0, 0.3, 600))
+        s50[:49] = np.nan
+        s200[:199] = np.nan
+        s50[rng.integers(200, 600, 5)] = np.nan  # gaps reset the state
+        panel50.append(s50)
+        panel200.append(s200)
+        df = pd.DataFrame({"date": dates, "sma50": s50, "sma200": s200}).sample(frac=1.0, random_state=k)
+
+        events, contexts = detect_crossovers(f"T{k}", df)
+        assert contexts == _detect_crossovers_loop(f"T{k}", df)
+        assert [(str(e.date), e.type) for e in events] == [(c["date"], c["type"]) for c in contexts]
+
+    panel = detect_crossovers_panel([f"T{k}" for k in range(5)], dates, np.array(panel50), np.array(panel200))
+    expected = []
+    for k in range(5):
+        df = pd.DataFrame({"date": dates, "sma50": panel50[k], "sma200": panel200[k]})
+        expected += [(f"T{k}", c["date"], c["type"]) for c in _detect_crossovers_loop(f"T{k}", df)]
+    assert [(e.ticker, str(e.date), e.type) for e in panel] == expected
+    assert detect_crossovers("T", pd.DataFrame({"date": [], "sma50": [], "sma200": []})) == ([], [])
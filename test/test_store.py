@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import synthetic
+from src.backtest import run_backtest
+from src.data_fetcher import set_cache
+from src.database import get_engine, init_schema
+from src.service import Session
+from src.store import ColumnarStore, SqliteStore, open_store
+
+
+@pytest.fixture
+def stores(tmp_path):
+    engine = get_engine(str(tmp_path / "s.db"))
+    init_schema(engine)
+    yield SqliteStore(engine), ColumnarStore(str(tmp_path / "store"), "npy")
+    engine.dispose()
+
+
+def _fill(store):
+    dates = pd.bdate_range("2023-12-20", periods=15)
+    df = pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), "close": np.arange(15.0) + 1,
+                       "sma50": [None] * 5 + list(np.arange(10.0)), "is_52w_high": [True, False, None] * 5})
+    events = [{"date": dates[1].date(), "type": "golden_cross"}, {"date": dates[10].date(), "type": "death_cross"}]
+    for s in ("A", "B.NS"):
+        store.upsert_ticker(s)
+        store.upsert_daily(s, df.where(pd.notna(df), None))
+        store.upsert_signals(s, events + events[:1])
+    # Rewrites a day (every written column is replaced) and adds an indicator column for A only
+    store.upsert_daily("A", pd.DataFrame({"date": ["2023-12-22", "2024-02-01"], "close": [99.0, 7.0],
+                                          "rsi14": [55.0, 60.0]}), extra_columns=["rsi14"])
+    store.upsert_signals("A", [{"date": "2024-02-01", "type": "rsi_oversold"}])
+
+
+def test_backends_read_back_the_same_history(stores):
+    for store in stores:
+        _fill(store)
+    sq, col = stores
+    assert sq.symbols() == col.symbols() == ["A", "B.NS"]
+    for cols, start, end in [(["close"], None, None), (["close", "sma50", "is_52w_high"], "2023-12-22", None),
+                             (["sma50"], "2024-01-01", "2024-01-05"), (["close", "rsi14"], None, "2024-12-31")]:
+        a = sq.load_panel(["B.NS", "A", "ZZ"], cols, start, end)
+        b = col.load_panel(["B.NS", "A", "ZZ"], cols, start, end)
+        np.testing.assert_array_equal(a.days, b.days)
+        for c in cols:
+            np.testing.assert_array_equal(a.values[c], b.values[c])
+    pd.testing.assert_frame_equal(sq.load_signals(["A", "B.NS"]), col.load_signals(["A", "B.NS"]))
+    pd.testing.assert_frame_equal(sq.load_signals(["A"], "2024-01-01"), col.load_signals(["A"], "2024-01-01"))
+
+    p = col.load_panel(["A"], ["close", "sma50", "rsi14"], "2023-12-22", "2023-12-22")
+    assert p.values["close"][0].tolist() == [99.0] and np.isnan(p.values["sma50"][0, 0])
+    assert np.isnan(col.load_panel(["B.NS"], ["rsi14"]).values["rsi14"]).all()  # written before the column existed
+    with pytest.raises(ValueError, match="Unknown column"):
+        col.load_panel(["A"], ["bogus"])
+
+
+def test_columnar_partitions_are_per_symbol_year_and_replaced_whole(stores):
+    _, col = stores
+    _fill(col)
+    assert sorted(os.listdir(os.path.join(col.root, "metrics", "A"))) == ["2023.npy", "2024.npy"]
+    leftovers = [f for _, _, files in os.walk(col.root) for f in files if f.endswith(".tmp")]
+    assert leftovers == []
+    days, cols = col.load_series("A", ["close"], start="2024-01-01")
+    assert len(days) == 8 and cols["close"][-1] == 7.0
+
+    again = ColumnarStore(col.root)  # schema and format come from the store itself
+    assert again.schema["columns"][-1] == "rsi14" and again.ext == ".npy"
+    with pytest.raises(ValueError, match="holds npy"):
+        ColumnarStore(col.root, "parquet")
+    assert isinstance(open_store({}, None), SqliteStore)
+    with pytest.raises(ValueError, match="Unknown storage backend"):
+        open_store({"storage": {"backend": "csv"}}, None)
+
+
+def test_columnar_signal_types_stay_inside_the_key_range(stores, monkeypatch):
+    _, col = stores
+    monkeypatch.setattr("src.store._TYPE_CODES", 2)
+    col.upsert_signals("A", [{"date": "2024-01-02", "type": "golden_cross"},
+                             {"date": "2024-01-02", "type": "death_cross"}])
+    with pytest.raises(ValueError, match="at most 2 signal types"):
+        col.upsert_signals("A", [{"date": "2024-01-03", "type": "rsi_oversold"}])
+    assert col.schema["signal_types"] == ["golden_cross", "death_cross"]
+
+
+def test_backtest_reads_either_backend(tmp_path):
+    engine = get_engine(str(tmp_path / "bt.db"))
+    init_schema(engine)
+    col = ColumnarStore(str(tmp_path / "store"), "npy")
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range("2022-06-01", periods=260)
+    for i in range(5):
+        start = int(rng.integers(0, 40))
+        df = pd.DataFrame({"date": dates[start:], "close": 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 260 - start)))})
+        days = sorted(rng.choice(200, 4, replace=False).tolist())
+        events = [{"date": dates[start + j].date(), "type": t}
+                  for j, t in zip(days, ["golden_cross", "death_cross"] * 2)]
+        for store in (SqliteStore(engine), col):
+            store.upsert_daily(f"T{i}", df)
+            store.upsert_signals(f"T{i}", events)
+
+    a = run_backtest(engine, horizons=[5, 20], chunk_size=2)
+    b = run_backtest(engine, horizons=[5, 20], chunk_size=2, store=col)
+    pd.testing.assert_frame_equal(a.signals, b.signals)
+    pd.testing.assert_frame_equal(a.tickers, b.tickers)
+    pd.testing.assert_frame_equal(a.equity, b.equity)
+    engine.dispose()
+
+
+def test_session_writes_the_columnar_backend_alongside_sqlite(tmp_path):
+    root = str(tmp_path / "cache")
+    ticker = synthetic.tickers(1)[0]
+    synthetic.seed_cache(root, [ticker], days=400)
+    cfg = synthetic.cache_config(root, str(tmp_path / "app.db"), str(tmp_path / "out"))
+    cfg["storage"] = {"backend": "columnar", "path": str(tmp_path / "store")}
+    with Session(cfg) as session:
+        out = session.run_ticker(ticker)
+        assert session.store.symbols() == [ticker]
+        p = session.store.load_panel([ticker], ["close", "sma200"])
+        np.testing.assert_allclose(p.values["close"][0], out.result.df["close"].to_numpy())
+        assert len(session.store.load_signals([ticker])) == len(out.result.events)
+        assert session.backtest(horizons=[5]).to_dict()["summary"] == \
+            run_backtest(session.engine, horizons=[5]).to_dict()["summary"]
+    set_cache(None)
+
+
+def test_switching_to_columnar_backfills_before_an_incremental_write(tmp_path, monkeypatch):
+    import src.data_fetcher
+    import src.pipeline
+    from src.models import PriceRow, RawBundle
+    from src.pipeline import run_batch
+    engine = get_engine(str(tmp_path / "sw.db"))
+    init_schema(engine)
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    closes = np.concatenate([np.linspace(200.0, 100.0, 150), np.linspace(100.0, 300.0, 150)])
+    rows = [PriceRow(date=d.date(), close=float(c)) for d, c in zip(dates, closes)]
+    run_batch(["AAA"], engine, out_dir=str(tmp_path), compute_workers=0,
+              fetch=lambda t, period: RawBundle(ticker=t, prices=rows[:290], fundamentals_q=[]))
+
+    monkeypatch.setattr(src.pipeline, "fetch_prices", lambda t, period="5y", start=None: pd.DataFrame(
+        {"date": dates, "close": closes})[lambda df: df["date"] >= pd.Timestamp(start)])
+    monkeypatch.setattr(src.data_fetcher, "fetch_fundamentals_q", lambda t: [])
+    col = ColumnarStore(str(tmp_path / "store"), "npy")  # switched on for an existing database
+    run_batch(["AAA"], engine, out_dir=str(tmp_path), compute_workers=0, incremental=True, store=col)
+
+    sq = SqliteStore(engine)
+    cols = ["close", "sma50", "is_52w_high"]
+    a, b = sq.load_panel(["AAA"], cols), col.load_panel(["AAA"], cols)
+    assert len(b.days) == 300
+    np.testing.assert_array_equal(a.days, b.days)
+    for c in a.values:
+        np.testing.assert_array_equal(a.values[c], b.values[c])
+    pd.testing.assert_frame_equal(sq.load_signals(["AAA"]), col.load_signals(["AAA"]))
+    assert len(col.load_signals(["AAA"])) == 1
+    engine.dispose()